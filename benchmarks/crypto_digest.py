@@ -0,0 +1,84 @@
+"""
+Time and peak memory of the str based Cryptographer.digest path against
+the incremental Digest fed with raw body chunks.
+
+    python -m benchmarks.crypto_digest --size-mb 8 --chunk-kb 64
+"""
+import argparse
+import io
+import json
+import time
+import tracemalloc
+from typing import Callable
+
+from common.crypto.constants import HashingAlgorithm
+from common.crypto.digest import Digest, digest_file
+from common.crypto.main import Cryptographer
+
+
+def make_body(size: int) -> bytes:
+    item = b'{"id": "item", "descriptor": {"name": "catalog entry"}, "price": {"value": "10.0"}},'
+    return (item * (size // len(item) + 1))[:size]
+
+
+def measure(func: Callable[[], str], repeat: int) -> dict:
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = (time.perf_counter() - start) / repeat
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": elapsed, "peak_bytes": peak}
+
+
+def run(size_mb: int = 8, chunk_kb: int = 64, repeat: int = 5) -> dict:
+    size = size_mb * 1024 * 1024
+    chunk_size = chunk_kb * 1024
+    # Simulates the ASGI receive stream, chunks are already in memory
+    chunks = [make_body(chunk_size) for _ in range(size // chunk_size)]
+    body_file = io.BytesIO(b"".join(chunks))
+
+    def str_path() -> str:
+        # What callers had to do before: join the body, decode it, let digest encode it again
+        return Cryptographer.digest(HashingAlgorithm.BLAKE2B, b"".join(chunks).decode())
+
+    def chunked() -> str:
+        digest = Digest()
+        for chunk in chunks:
+            digest.update(memoryview(chunk))
+        return digest.b64digest()
+
+    def file_blocks() -> str:
+        body_file.seek(0)
+        return digest_file(body_file, block_size=chunk_size)
+
+    return {
+        "size_bytes": size,
+        "chunk_bytes": chunk_size,
+        "runs": [
+            {"name": "str_path", **measure(str_path, repeat)},
+            {"name": "digest_chunks", **measure(chunked, repeat)},
+            {"name": "digest_file", **measure(file_blocks, repeat)},
+        ]
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=int, default=8)
+    parser.add_argument("--chunk-kb", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print the raw results as JSON")
+    args = parser.parse_args()
+    results = run(args.size_mb, args.chunk_kb, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for entry in results["runs"]:
+        print(f'{entry["name"]:<15} {entry["seconds"] * 1000:>9.2f} ms  '
+              f'peak {entry["peak_bytes"] / 1024:>10.1f} KiB')
+
+
+if __name__ == "__main__":
+    main()
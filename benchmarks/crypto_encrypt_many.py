@@ -0,0 +1,80 @@
+"""
+Throughput of Cryptographer.encrypt_many against the per call
+Cryptographer(...).encrypt loop, for an increasing number of pool workers.
+Every job seals a challenge the size of an on_subscribe challenge.
+
+    python -m benchmarks.crypto_encrypt_many --jobs 20000 --keys 20000
+"""
+import argparse
+import base64
+import json
+import os
+import secrets
+import time
+
+from nacl.public import PrivateKey
+
+from common.crypto.batch import BatchEncryptor, EncryptionJob
+from common.crypto.cache import key_cache
+from common.crypto.constants import EncryptionAlgorithm
+from common.crypto.main import Cryptographer
+
+
+def make_jobs(count: int, keys: int) -> list[EncryptionJob]:
+    public_keys = [base64.b64encode(bytes(PrivateKey.generate().public_key)).decode() for _ in range(keys)]
+    return [EncryptionJob(public_keys[index % keys], secrets.token_urlsafe(32)) for index in range(count)]
+
+
+def per_call_loop(jobs: list[EncryptionJob]) -> list[str]:
+    return [
+        Cryptographer(job.public_key, EncryptionAlgorithm.X25519.value).encrypt(job.message)
+        for job in jobs
+    ]
+
+
+def run(jobs: int = 20000, keys: int = 20000, mode: str = BatchEncryptor.PROCESS,
+        workers: list[int] | None = None) -> dict:
+    data = make_jobs(jobs, keys)
+    workers = workers or sorted({1, 2, 4, os.cpu_count() or 1})
+    results: dict = {"jobs": jobs, "keys": keys, "mode": mode, "runs": []}
+
+    key_cache.clear()
+    start = time.perf_counter()
+    per_call_loop(data)
+    elapsed = time.perf_counter() - start
+    results["runs"].append({"name": "per_call_loop", "workers": 1, "seconds": elapsed,
+                            "jobs_per_second": jobs / elapsed})
+
+    for count in workers:
+        key_cache.clear()
+        with BatchEncryptor(mode=mode, max_workers=count, inline_threshold=0) as encryptor:
+            # Start the pool, and its worker processes, outside of the measurement
+            encryptor.encrypt(make_jobs(count * encryptor.chunk_size, count))
+            start = time.perf_counter()
+            encryptor.encrypt(data)
+            elapsed = time.perf_counter() - start
+        results["runs"].append({"name": "encrypt_many", "workers": count, "seconds": elapsed,
+                                "jobs_per_second": jobs / elapsed})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=20000)
+    parser.add_argument("--keys", type=int, default=20000, help="Distinct recipients, one job each by default")
+    parser.add_argument("--mode", choices=[BatchEncryptor.PROCESS, BatchEncryptor.THREAD],
+                        default=BatchEncryptor.PROCESS)
+    parser.add_argument("--workers", type=int, nargs="*")
+    parser.add_argument("--json", action="store_true", help="Print the raw results as JSON")
+    args = parser.parse_args()
+    results = run(args.jobs, args.keys, args.mode, args.workers)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for entry in results["runs"]:
+        print(f'{entry["name"]:<15} workers={entry["workers"]:<3} '
+              f'{entry["jobs_per_second"]:>12.0f} jobs/s  ({entry["seconds"]:.3f}s)')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Throughput of Cryptographer.verify_many against the per call
+verify_signature loop, for an increasing number of pool workers.
+
+    python -m benchmarks.crypto_verify_many --checks 20000 --keys 500
+"""
+import argparse
+import base64
+import json
+import os
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+from common.crypto.batch import BatchVerifier, SignatureCheck
+from common.crypto.cache import key_cache
+from common.crypto.constants import SigningAlgorithm
+from common.crypto.main import Cryptographer
+
+
+def make_checks(count: int, keys: int) -> list[SignatureCheck]:
+    private_keys = [ed25519.Ed25519PrivateKey.generate() for _ in range(keys)]
+    public_keys = [
+        base64.b64encode(key.public_key().public_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PublicFormat.Raw
+        )).decode()
+        for key in private_keys
+    ]
+    checks = []
+    for index in range(count):
+        message = f'{{"context": {{"message_id": "{index}"}}}}'
+        signature = base64.b64encode(private_keys[index % keys].sign(message.encode())).decode()
+        checks.append(SignatureCheck(public_keys[index % keys], signature, message))
+    return checks
+
+
+def per_call_loop(checks: list[SignatureCheck]) -> list[bool]:
+    return [
+        Cryptographer(check.public_key, SigningAlgorithm.ED25519.value).verify_signature(
+            check.signature, check.message
+        )
+        for check in checks
+    ]
+
+
+def run(checks: int = 20000, keys: int = 500, mode: str = BatchVerifier.THREAD,
+        workers: list[int] | None = None) -> dict:
+    data = make_checks(checks, keys)
+    workers = workers or sorted({1, 2, 4, os.cpu_count() or 1})
+    results: dict = {"checks": checks, "keys": keys, "mode": mode, "runs": []}
+
+    key_cache.clear()
+    start = time.perf_counter()
+    per_call_loop(data)
+    elapsed = time.perf_counter() - start
+    results["runs"].append({"name": "per_call_loop", "workers": 1, "seconds": elapsed,
+                            "checks_per_second": checks / elapsed})
+
+    for count in workers:
+        key_cache.clear()
+        with BatchVerifier(mode=mode, max_workers=count, inline_threshold=0) as verifier:
+            # Start the pool outside of the measurement
+            verifier.executor
+            start = time.perf_counter()
+            verifier.verify(data)
+            elapsed = time.perf_counter() - start
+        results["runs"].append({"name": "verify_many", "workers": count, "seconds": elapsed,
+                                "checks_per_second": checks / elapsed})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--checks", type=int, default=20000)
+    parser.add_argument("--keys", type=int, default=500)
+    parser.add_argument("--mode", choices=[BatchVerifier.THREAD, BatchVerifier.PROCESS], default=BatchVerifier.THREAD)
+    parser.add_argument("--workers", type=int, nargs="*")
+    parser.add_argument("--json", action="store_true", help="Print the raw results as JSON")
+    args = parser.parse_args()
+    results = run(args.checks, args.keys, args.mode, args.workers)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for entry in results["runs"]:
+        print(f'{entry["name"]:<15} workers={entry["workers"]:<3} '
+              f'{entry["checks_per_second"]:>12.0f} checks/s  ({entry["seconds"]:.3f}s)')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import os
+from contextlib import contextmanager
+from typing import Iterator
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'wade.settings')
+django.setup()
+
+from django.conf import settings
+from django.test.utils import setup_databases, teardown_databases
+
+
+def benchmark_aliases() -> list[str]:
+    """
+    Every database the benchmarks may read or write: default, the registry
+    database, its replicas and the shards.
+    """
+    from registry import sharding
+    return list(dict.fromkeys([
+        'default', settings.REGISTRY_DATABASE, *settings.REGISTRY_DATABASE_REPLICAS, *sharding.all_shards()
+    ]))
+
+
+@contextmanager
+def benchmark_database(keepdb: bool = False) -> Iterator[list[str]]:
+    """
+    Runs the benchmark against throw away test databases (test_<name>) for
+    every alias of benchmark_aliases() so that production data is never
+    touched. Replicas follow their TEST MIRROR like in the tests. keepdb
+    reuses populated databases between runs.
+    """
+    aliases = benchmark_aliases()
+    old_config = setup_databases(verbosity=0, interactive=False, keepdb=keepdb, aliases=aliases)
+    try:
+        yield aliases
+    finally:
+        teardown_databases(old_config, verbosity=0, keepdb=keepdb)
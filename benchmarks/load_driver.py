@@ -0,0 +1,228 @@
+"""
+Replays request lines (as written by `manage.py generate_registry`) against
+a running server at a fixed rate and reports a latency histogram, the
+response statuses and the errors.
+
+Requests are sent open loop: request i is due at start + i / rate whatever
+the server's latency, at most --concurrency are in flight. Latency is taken
+from the due time, so a server (or driver) falling behind shows up in the
+histogram instead of silently lowering the rate. Lines carrying their
+signing key are stamped and signed again just before being sent. /subscribe
+lines need a server running with SUBSCRIBE_ENABLED.
+
+    python -m benchmarks.load_driver subscribe_requests.jsonl --url http://127.0.0.1:8000 --rate 200
+"""
+import argparse
+import asyncio
+import base64
+import bisect
+import json
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from itertools import islice
+
+import httpx
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+from common.crypto.authorization import parse_authorization_header, sign_authorization_header
+
+
+# Upper bounds of the histogram buckets in milliseconds, the last bucket is unbounded
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+# Timestamp layout of the subscribe message (settings.DATETIME_FORMAT)
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+
+class Histogram:
+
+    def __init__(self, bounds_ms: tuple[float, ...] = BUCKETS_MS) -> None:
+        self.bounds_ms = bounds_ms
+        self.counts = [0] * (len(bounds_ms) + 1)
+        self.samples: list[float] = []
+
+    def add(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds_ms, seconds * 1000)] += 1
+        self.samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def percentile(self, fraction: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+    def buckets(self) -> list[tuple[str, int]]:
+        labels = [f'<= {bound} ms' for bound in self.bounds_ms] + [f'> {self.bounds_ms[-1]} ms']
+        return list(zip(labels, self.counts))
+
+    def render(self, width: int = 40) -> list[str]:
+        peak = max(self.counts) or 1
+        return [f'{label:>12} {count:8d} {"#" * round(width * count / peak)}' for label, count in self.buckets()]
+
+
+@dataclass
+class LoadReport:
+    rate: float
+    sent: int = 0
+    statuses: Counter = field(default_factory=Counter)
+    errors: Counter = field(default_factory=Counter)
+    # First response body or exception of every kind of error
+    error_samples: dict[str, str] = field(default_factory=dict)
+    histogram: Histogram = field(default_factory=Histogram)
+    seconds: float = 0.0
+    # Most seconds a request was sent after it was due
+    max_lag: float = 0.0
+
+    @property
+    def achieved_rate(self) -> float:
+        return self.sent / self.seconds if self.seconds else 0.0
+
+    def error(self, kind: str, sample: str) -> None:
+        self.errors[kind] += 1
+        self.error_samples.setdefault(kind, sample[:500])
+
+    def as_dict(self) -> dict:
+        return {
+            'rate': self.rate,
+            'achieved_rate': self.achieved_rate,
+            'sent': self.sent,
+            'seconds': self.seconds,
+            'max_lag_ms': self.max_lag * 1000,
+            'statuses': dict(self.statuses),
+            'errors': dict(self.errors),
+            'error_samples': self.error_samples,
+            'p50_ms': self.histogram.percentile(0.5) * 1000,
+            'p90_ms': self.histogram.percentile(0.9) * 1000,
+            'p99_ms': self.histogram.percentile(0.99) * 1000,
+            'max_ms': max(self.histogram.samples, default=0.0) * 1000,
+            'histogram': dict(self.histogram.buckets()),
+        }
+
+
+def read_requests(path: str, limit: int | None = None) -> list[dict]:
+    with open(path) as file:
+        return [json.loads(line) for line in islice((line for line in file if line.strip()), limit)]
+
+
+def body_bytes(body) -> bytes:
+    # Compact JSON, the bytes generate_registry signs
+    return json.dumps(body, separators=(',', ':')).encode()
+
+
+def resign(request: dict, now: float, valid_for: int = 60) -> tuple[dict, bytes]:
+    """
+    Headers and body of a request line stamped with now and signed again
+    with the line's signing key.
+    """
+    body = request['body']
+    headers = dict(request.get('headers', {}))
+    private_key = request.get('signing_private_key')
+    if private_key is None or 'Authorization' not in headers:
+        return headers, body_bytes(body)
+    body = json.loads(json.dumps(body))
+    body['message']['timestamp'] = datetime.fromtimestamp(now, timezone.utc).strftime(TIMESTAMP_FORMAT)
+    content = body_bytes(body)
+    header = parse_authorization_header(headers['Authorization'])
+    headers['Authorization'] = sign_authorization_header(
+        ed25519.Ed25519PrivateKey.from_private_bytes(base64.b64decode(private_key)),
+        header.subscriber_id, header.unique_key_id, content, int(now), int(now) + valid_for
+    )
+    return headers, content
+
+
+class LoadDriver:
+
+    def __init__(self, base_url: str, rate: float, concurrency: int = 200, timeout: float = 10.0,
+                 resign: bool = True) -> None:
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.base_url = base_url.rstrip('/')
+        self.rate = rate
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.resign = resign
+
+    async def send(self, client: httpx.AsyncClient, request: dict, due: float, report: LoadReport) -> None:
+        if self.resign:
+            headers, content = resign(request, time.time())
+        else:
+            headers, content = request.get('headers', {}), body_bytes(request['body'])
+        try:
+            response = await client.request(request.get('method', 'POST'), self.base_url + request['path'],
+                                             headers=headers, content=content)
+        except httpx.HTTPError as exc:
+            report.error(type(exc).__name__, repr(exc))
+        else:
+            report.statuses[response.status_code] += 1
+            if response.status_code >= 400:
+                report.error(f'HTTP {response.status_code}', response.text)
+        finally:
+            report.histogram.add(time.perf_counter() - due)
+
+    async def run(self, requests: list[dict]) -> LoadReport:
+        report = LoadReport(self.rate)
+        slots = asyncio.Semaphore(self.concurrency)
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+
+        async def send(request: dict, due: float) -> None:
+            try:
+                await self.send(client, request, due, report)
+            finally:
+                slots.release()
+
+        async with httpx.AsyncClient(limits=limits, timeout=self.timeout) as client:
+            tasks = []
+            start = time.perf_counter()
+            for index, request in enumerate(requests):
+                due = start + index / self.rate
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await slots.acquire()
+                report.max_lag = max(report.max_lag, time.perf_counter() - due)
+                report.sent += 1
+                tasks.append(asyncio.create_task(send(request, due)))
+            await asyncio.gather(*tasks)
+            report.seconds = time.perf_counter() - start
+        return report
+
+
+def run(path: str, url: str = 'http://127.0.0.1:8000', rate: float = 100.0, concurrency: int = 200,
+        limit: int | None = None, timeout: float = 10.0, resign: bool = True) -> dict:
+    driver = LoadDriver(url, rate, concurrency=concurrency, timeout=timeout, resign=resign)
+    report = asyncio.run(driver.run(read_requests(path, limit)))
+    return {**report.as_dict(), 'histogram_lines': report.histogram.render()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help='Request lines, NDJSON')
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--rate', type=float, default=100.0, help='Requests per second')
+    parser.add_argument('--concurrency', type=int, default=200, help='Requests in flight at most')
+    parser.add_argument('--limit', type=int, default=None, help='Send only the first LIMIT requests')
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('--no-resign', action='store_true', help='Send the requests as written')
+    parser.add_argument('--json', action='store_true', help='Print the raw results as JSON')
+    args = parser.parse_args()
+    results = run(args.path, args.url, args.rate, args.concurrency, args.limit, args.timeout, not args.no_resign)
+    if args.json:
+        print(json.dumps({key: value for key, value in results.items() if key != 'histogram_lines'}, indent=2))
+        return
+    print(f"{results['sent']} requests in {results['seconds']:.1f}s, {results['achieved_rate']:.1f}/s "
+          f"(target {results['rate']:.1f}/s, max lag {results['max_lag_ms']:.1f} ms)")
+    print(f"p50 {results['p50_ms']:.1f} ms  p90 {results['p90_ms']:.1f} ms  p99 {results['p99_ms']:.1f} ms  "
+          f"max {results['max_ms']:.1f} ms")
+    print('statuses ' + ', '.join(f'{status}: {count}' for status, count in sorted(results['statuses'].items())))
+    for line in results['histogram_lines']:
+        print(line)
+    for kind, count in results['errors'].items():
+        print(f"{count:8d} {kind}: {results['error_samples'][kind]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Write throughput of ContractRequestLogger rows, one INSERT per request
+against the buffered bulk writer.
+
+    python -m benchmarks.monitor_contract_log --rows 20000 --batch-size 500
+"""
+import argparse
+import json
+import time
+
+from benchmarks.django_db import benchmark_database
+
+from monitor.models import ContractRequestLogger
+from monitor.writer import ContractRequestBuffer
+
+
+def run(rows: int = 20000, batch_size: int = 500, flush_interval: float = 0.05) -> dict:
+    with benchmark_database():
+        sync = ContractRequestBuffer(durability=ContractRequestBuffer.SYNC)
+        start = time.perf_counter()
+        for index in range(rows):
+            sync.log('registry', 'bench.example.com', f'sync-{index}')
+        sync_seconds = time.perf_counter() - start
+
+        buffer = ContractRequestBuffer(max_batch=batch_size, max_delay=flush_interval)
+        start = time.perf_counter()
+        for index in range(rows):
+            buffer.log('registry', 'bench.example.com', f'buffered-{index}')
+        enqueue_seconds = time.perf_counter() - start
+        buffer.stop(timeout=None)
+        buffered_seconds = time.perf_counter() - start
+        assert ContractRequestLogger.objects.count() == 2 * rows
+    return {
+        'rows': rows,
+        'batch_size': batch_size,
+        'sync_rows_per_second': rows / sync_seconds,
+        'buffered_rows_per_second': rows / buffered_seconds,
+        # Time the request path spends in log()
+        'buffered_enqueue_us': enqueue_seconds / rows * 1e6,
+        'flushes': buffer.flushes,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--flush-interval', type=float, default=0.05)
+    parser.add_argument('--json', action='store_true', help='Print the raw results as JSON')
+    args = parser.parse_args()
+    results = run(args.rows, args.batch_size, args.flush_interval)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"sync inserts    {results['sync_rows_per_second']:>10.0f} rows/s")
+    print(f"buffered writer {results['buffered_rows_per_second']:>10.0f} rows/s "
+          f"({results['flushes']} flushes, {results['buffered_enqueue_us']:.1f} us per log())")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Overhead of monitor.instrumentation: the cost of one histogram observation
+and of a stage() block with metrics on and off, and the per request cost of
+MetricsMiddleware + RouteMiddleware on the full ASGI application. Requests
+are GET /lookup rejected by validation, about the cheapest request served,
+so the relative overhead is an upper bound for real lookups and subscribes.
+
+    python -m benchmarks.monitor_metrics --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+
+from benchmarks import django_db  # noqa: F401, sets Django up
+
+from django.core.asgi import get_asgi_application
+from django.test import override_settings
+
+from monitor.instrumentation import MetricsMiddleware, get_metrics, reset_metrics, stage
+from monitor.metrics import Histogram
+
+
+def per_call_ns(call, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        call()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def micro(calls: int) -> dict:
+    histogram = Histogram('benchmark_seconds', 'Benchmark', ('route', 'stage'))
+
+    def observe() -> None:
+        histogram.observe(0.001, 'lookup', 'validate')
+
+    def block() -> None:
+        with stage('benchmark'):
+            pass
+
+    results = {'observe_ns': per_call_ns(observe, calls), 'stage_on_ns': per_call_ns(block, calls)}
+    with override_settings(METRICS_ENABLED=False):
+        results['stage_off_ns'] = per_call_ns(block, calls)
+    return results
+
+
+async def serve(application, requests: int) -> list[float]:
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': '/lookup', 'query_string': b'domain=unknown',
+        'headers': [(b'host', b'localhost')],
+        'server': ('localhost', 80), 'client': ('127.0.0.1', 1), 'scheme': 'http',
+    }
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        pass
+
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await application(scope, receive, send)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def run(requests: int = 2000, rounds: int = 5, calls: int = 200000) -> dict:
+    reset_metrics()
+    # Every request is a 400, keep django.request from logging each one
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+    application = MetricsMiddleware(get_asgi_application())
+    results: dict = {'micro': micro(calls), 'requests': requests, 'rounds': rounds}
+    medians = {'off': [], 'on': []}
+    # Interleaved rounds so drift (caches, frequency scaling) hits both alike
+    for _ in range(rounds):
+        for name, enabled in (('off', False), ('on', True)):
+            with override_settings(METRICS_ENABLED=enabled):
+                medians[name].append(statistics.median(asyncio.run(serve(application, requests))))
+    for name, samples in medians.items():
+        results[f'request_{name}_us'] = min(samples) * 1e6
+    results['overhead_us'] = results['request_on_us'] - results['request_off_us']
+    results['overhead_percent'] = results['overhead_us'] / results['request_off_us'] * 100
+    results['series'] = sum(1 for _ in get_metrics().request_duration.collect())
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per round')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--calls', type=int, default=200000, help='Calls per micro benchmark')
+    parser.add_argument('--json', action='store_true', help='Print the raw results as JSON')
+    args = parser.parse_args()
+    results = run(args.requests, args.rounds, args.calls)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    micro_results = results['micro']
+    print(f"observe {micro_results['observe_ns']:.0f} ns  stage() on {micro_results['stage_on_ns']:.0f} ns  "
+          f"off {micro_results['stage_off_ns']:.0f} ns")
+    print(f"request p50 metrics off {results['request_off_us']:.1f} us  on {results['request_on_us']:.1f} us  "
+          f"overhead {results['overhead_us']:.1f} us ({results['overhead_percent']:.1f}%)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Runs the benchmark suite under pytest. Tests marked `benchmark` are
+skipped unless --bench is given, the `bench` fixture times a suite
+benchmark and the session ends with the results written to --bench-json
+and compared against --bench-baseline, failing on regressions and on a
+baseline run over other dataset sizes.
+
+    python -m pytest benchmarks --bench --bench-dataset small
+    python -m pytest benchmarks --bench -k crypto --bench-save-baseline
+"""
+import pytest
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    group = parser.getgroup('benchmarks')
+    group.addoption('--bench', action='store_true', help='Run the tests marked benchmark')
+    group.addoption('--bench-dataset', default='small', help='Dataset size: small, medium or large')
+    group.addoption('--bench-rounds', type=int, default=5)
+    group.addoption('--bench-min-time', type=float, default=0.05, help='Minimum seconds per round')
+    group.addoption('--bench-json', default=None, help='Write the results to this file')
+    group.addoption('--bench-baseline', default=None, help='Baseline results, benchmarks/baseline.json by default')
+    group.addoption('--bench-save-baseline', action='store_true', help='Write the results as the new baseline')
+    group.addoption('--bench-threshold', type=float, default=None,
+                    help='Fraction slower than the baseline reported as a regression')
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    config.addinivalue_line('markers', 'benchmark: benchmark, only run with --bench')
+    config._bench_results = None
+    config._bench_comparisons = []
+    config._bench_mismatch = None
+
+
+def pytest_collection_modifyitems(config: pytest.Config, items: list[pytest.Item]) -> None:
+    if config.getoption('--bench'):
+        return
+    skip = pytest.mark.skip(reason='benchmarks run with --bench')
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture
+def bench(request: pytest.FixtureRequest):
+    """
+    bench(name) runs the suite benchmark `name` and records its result.
+    """
+    from benchmarks import suite
+    config = request.config
+    dataset_name = config.getoption('--bench-dataset')
+    if config._bench_results is None:
+        config._bench_results = suite.new_results(suite.get_dataset(dataset_name), dataset_name)
+
+    def run(name: str) -> dict:
+        entry = suite.BENCHMARKS[name]
+        if entry.database:
+            request.getfixturevalue('db')
+        result = suite.run_benchmark(entry, suite.get_dataset(dataset_name), config.getoption('--bench-rounds'),
+                                     config.getoption('--bench-min-time'))
+        config._bench_results['benchmarks'][name] = result
+        return result
+    return run
+
+
+def pytest_sessionfinish(session: pytest.Session, exitstatus: int) -> None:
+    config = session.config
+    results = config._bench_results
+    if not results or not results['benchmarks']:
+        return
+    from benchmarks import suite
+    if config.getoption('--bench-json'):
+        suite.save_results(results, config.getoption('--bench-json'))
+    baseline_path = config.getoption('--bench-baseline') or suite.DEFAULT_BASELINE
+    if config.getoption('--bench-save-baseline'):
+        suite.save_results(results, baseline_path)
+        return
+    baseline = suite.load_results(baseline_path)
+    if baseline is None:
+        return
+    threshold = config.getoption('--bench-threshold')
+    try:
+        config._bench_comparisons = suite.compare(
+            results, baseline, suite.DEFAULT_THRESHOLD if threshold is None else threshold
+        )
+    except suite.BaselineMismatch as exc:
+        config._bench_mismatch = str(exc)
+        if session.exitstatus == pytest.ExitCode.OK:
+            session.exitstatus = pytest.ExitCode.TESTS_FAILED
+        return
+    if suite.regressions(config._bench_comparisons) and session.exitstatus == pytest.ExitCode.OK:
+        session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus: int, config: pytest.Config) -> None:
+    results = config._bench_results
+    if not results or not results['benchmarks']:
+        return
+    from benchmarks import suite
+    terminalreporter.section('benchmarks')
+    for name, result in results['benchmarks'].items():
+        terminalreporter.write_line(suite.format_result(name, result))
+    if config._bench_mismatch:
+        terminalreporter.write_line(f'{config._bench_mismatch}, not compared against the baseline', red=True, bold=True)
+    if config._bench_comparisons:
+        terminalreporter.section('against baseline')
+        for comparison in config._bench_comparisons:
+            terminalreporter.write_line(suite.format_comparison(comparison))
+        regressions = suite.regressions(config._bench_comparisons)
+        if regressions:
+            terminalreporter.write_line(f'{len(regressions)} benchmarks regressed', red=True, bold=True)
@@ -0,0 +1,99 @@
+"""
+Cost of AuthorizationVerifier.verify per stage against a raw Ed25519
+verify of the same signing string. Keys are resolved from memory so the
+numbers show the pipeline overhead, not the database.
+
+    python -m benchmarks.registry_authorization --requests 20000
+"""
+import argparse
+import base64
+import json
+import os
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'wade.settings')
+django.setup()
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+from common.crypto.authorization import build_authorization_header, signing_string
+from common.crypto.constants import HashingAlgorithm
+from common.crypto.main import Cryptographer
+from registry.authentication import AuthorizationVerifier, SigningKey, SubscriberKeyResolver
+
+
+class MemoryResolver(SubscriberKeyResolver):
+
+    def __init__(self, keys: dict[str, SigningKey]) -> None:
+        super().__init__()
+        self.keys = keys
+
+    def load(self, unique_key_id: str) -> SigningKey | None:
+        return self.keys.get(unique_key_id)
+
+
+def run(requests: int = 20000, keys: int = 100, body_size: int = 4096) -> dict:
+    now = int(time.time())
+    body = (b'{"context": {"action": "on_search"}}' * (body_size // 36 + 1))[:body_size]
+    digest = Cryptographer.digest(HashingAlgorithm.BLAKE2B, body)
+    message = signing_string(now - 5, now + 60, digest).encode()
+    private_keys = [ed25519.Ed25519PrivateKey.generate() for _ in range(keys)]
+    signing_keys, headers = {}, []
+    for index, private_key in enumerate(private_keys):
+        public_key = base64.b64encode(private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.Raw, format=serialization.PublicFormat.Raw
+        )).decode()
+        signing_keys[f'key-{index}'] = SigningKey('bench.example.com', f'key-{index}', public_key)
+        headers.append(build_authorization_header(
+            'bench.example.com', f'key-{index}', 'ed25519', now - 5, now + 60,
+            base64.b64encode(private_key.sign(message)).decode()
+        ))
+    verifier = AuthorizationVerifier(MemoryResolver(signing_keys), clock_skew=0)
+
+    public_keys = [key.public_key() for key in private_keys]
+    signatures = [private_key.sign(message) for private_key in private_keys]
+    start = time.perf_counter()
+    for index in range(requests):
+        public_keys[index % keys].verify(signatures[index % keys], message)
+    raw = (time.perf_counter() - start) / requests
+
+    stages = dict.fromkeys(AuthorizationVerifier.STAGES, 0.0)
+    start = time.perf_counter()
+    for index in range(requests):
+        verified = verifier.verify(headers[index % keys], body)
+        for stage, seconds in verified.timings.items():
+            stages[stage] += seconds
+    total = (time.perf_counter() - start) / requests
+
+    return {
+        'requests': requests,
+        'body_bytes': body_size,
+        'raw_verify_us': raw * 1e6,
+        'verifier_us': total * 1e6,
+        'overhead_ratio': total / raw,
+        'stages_us': {stage: seconds / requests * 1e6 for stage, seconds in stages.items()},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--keys', type=int, default=100)
+    parser.add_argument('--body-size', type=int, default=4096)
+    parser.add_argument('--json', action='store_true', help='Print the raw results as JSON')
+    args = parser.parse_args()
+    results = run(args.requests, args.keys, args.body_size)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"raw ed25519 verify {results['raw_verify_us']:>8.1f} us")
+    print(f"verifier           {results['verifier_us']:>8.1f} us  ({results['overhead_ratio']:.2f}x)")
+    for stage, micros in results['stages_us'].items():
+        print(f"  {stage:<16} {micros:>8.1f} us")
+
+
+if __name__ == '__main__':
+    main()
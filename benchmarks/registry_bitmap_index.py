@@ -0,0 +1,70 @@
+"""
+Query latency and memory footprint of the in process participant bitmap
+index, built from synthetic rows (no database needed).
+
+    python -m benchmarks.registry_bitmap_index --participants 200000
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from uuid import UUID
+
+from benchmarks.django_db import django  # noqa: F401 configures settings
+
+from registry.bitmap_index import ParticipantBitmapIndex
+
+
+DOMAINS = ['retail', 'mobility', 'logistics']
+TYPES = ['BAP', 'BPP']
+
+
+def run(participants: int = 200000, cities: int = 300, queries: int = 1000, seed: int = 42) -> dict:
+    rng = random.Random(seed)
+    city_codes = [f'std:{code:03d}' for code in range(cities)]
+    index = ParticipantBitmapIndex()
+    start = time.perf_counter()
+    for position in range(participants):
+        index.add_row(UUID(int=rng.getrandbits(128)), f'key-{position // 2}', rng.choice(DOMAINS),
+                      rng.choice(TYPES), rng.sample(city_codes, rng.randint(1, 5)))
+    build_seconds = time.perf_counter() - start
+
+    samples, matches = [], 0
+    for _ in range(queries):
+        domain, type, city = rng.choice(DOMAINS), rng.choice(TYPES), rng.choice(city_codes)
+        start = time.perf_counter()
+        matches += len(index.query(domain, type, [city]))
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        'participants': participants,
+        'build_seconds': build_seconds,
+        'p50_us': statistics.median(samples) * 1e6,
+        'p99_us': samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e6,
+        'mean_matches': matches / queries,
+        'memory': index.memory_report(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--participants', type=int, default=200000)
+    parser.add_argument('--cities', type=int, default=300)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', action='store_true', help='Print the raw results as JSON')
+    args = parser.parse_args()
+    results = run(args.participants, args.cities, args.queries, args.seed)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{results['participants']} participants built in {results['build_seconds']:.2f}s")
+    print(f"p50 {results['p50_us']:.1f} us  p99 {results['p99_us']:.1f} us  "
+          f"{results['mean_matches']:.1f} matches per query")
+    for part, size in results['memory'].items():
+        print(f"  {part:<16} {size:>12}")
+
+
+if __name__ == '__main__':
+    main()
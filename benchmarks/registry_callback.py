@@ -0,0 +1,72 @@
+"""
+Verifications per second of the on_subscribe callback verifier against a
+local stand-in server: one client per call sequentially versus the shared
+pooled client with concurrent calls limited per host. Hosts are emulated
+with subscriber_ids sharing the same server, whose transport sends every
+callback there.
+
+    python -m benchmarks.registry_callback --subscribers 500 --hosts 20 --latency 0.02
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import benchmarks.django_db  # noqa: F401 configures Django
+
+from registry.callback import CallbackResult, CallbackTarget, CallbackVerifier
+from registry.stub_server import CallbackStubServer
+
+
+def make_targets(stub: CallbackStubServer, count: int, hosts: int) -> list[CallbackTarget]:
+    targets = []
+    for index in range(count):
+        subscriber_id = f'sub{index % hosts}.example.com'
+        targets.append(CallbackTarget(f'key-{index}', subscriber_id, '/ondc', stub.register(subscriber_id)))
+    return targets
+
+
+async def sequential(verifier: CallbackVerifier, targets: list[CallbackTarget]) -> list[CallbackResult]:
+    results = []
+    for target in targets:
+        async with verifier.client() as client:
+            results.append(await verifier.verify(client, target))
+    return results
+
+
+def run(subscribers: int = 500, hosts: int = 20, latency: float = 0.02, per_host_limit: int = 4) -> dict:
+    results: dict = {'subscribers': subscribers, 'hosts': hosts, 'latency': latency,
+                     'per_host_limit': per_host_limit, 'runs': []}
+    with CallbackStubServer(delay=latency) as stub:
+        targets = make_targets(stub, subscribers, hosts)
+        verifier = CallbackVerifier(per_host_limit=per_host_limit, transport=stub.transport())
+        for name, call in (('sequential', sequential), ('pooled', lambda verifier, targets: verifier.verify_many(targets))):
+            stub.peak = 0
+            start = time.perf_counter()
+            outcome = asyncio.run(call(verifier, targets))
+            elapsed = time.perf_counter() - start
+            results['runs'].append({'name': name, 'seconds': elapsed, 'peak_concurrency': stub.peak,
+                                    'verified': sum(result.verified for result in outcome),
+                                    'verifications_per_second': subscribers / elapsed})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--subscribers', type=int, default=500)
+    parser.add_argument('--hosts', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds every callback takes to answer')
+    parser.add_argument('--per-host-limit', type=int, default=4)
+    parser.add_argument('--json', action='store_true', help='Print the raw results as JSON')
+    args = parser.parse_args()
+    results = run(args.subscribers, args.hosts, args.latency, args.per_host_limit)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for entry in results['runs']:
+        print(f'{entry["name"]:<12} {entry["verifications_per_second"]:>10.0f} verifications/s  '
+              f'verified={entry["verified"]} peak={entry["peak_concurrency"]} ({entry["seconds"]:.3f}s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+End to end invalidation latency of the registry change feed: the time from
+just before a Subscriber save to the change event reaching a callback of a
+ChangeListener, plus the publish -> dispatch latency the listener measures
+itself. Runs against a throw away test database.
+
+    python -m benchmarks.registry_change_feed --changes 1000
+"""
+import argparse
+import json
+import statistics
+import time
+from threading import Event
+
+from benchmarks.django_db import benchmark_database
+from benchmarks.registry_lookup import percentile
+
+from django.test import override_settings
+
+from registry.change_feed import ChangeListener
+from registry.models import Subscriber
+
+
+def run(changes: int = 1000, keepdb: bool = False) -> dict:
+    with benchmark_database(keepdb=keepdb), override_settings(REGISTRY_CHANGE_FEED=True):
+        started: dict[str, float] = {}
+        latencies: list[float] = []
+        done = Event()
+
+        def on_events(events) -> None:
+            now = time.perf_counter()
+            for event in events:
+                if event.pk in started:
+                    latencies.append(now - started.pop(event.pk))
+            if len(latencies) >= changes:
+                done.set()
+
+        listener = ChangeListener('default', on_events=on_events, poll_interval=0.1).start()
+        try:
+            listener.connected.wait(10)
+            Subscriber.objects.filter(unique_key_id__startswith='feed-bench-').delete()
+            begin = time.perf_counter()
+            for index in range(changes):
+                unique_key_id = f'feed-bench-{index}'
+                started[unique_key_id] = time.perf_counter()
+                Subscriber.objects.create(unique_key_id=unique_key_id, subscriber_id=f'np{index}.example.com',
+                                          callback_url='/', country='IND')
+            done.wait(30)
+            seconds = time.perf_counter() - begin
+        finally:
+            listener.stop(5)
+        published = list(listener.latencies)
+        return {
+            'changes': changes,
+            'received': len(latencies),
+            'changes_per_second': changes / seconds,
+            'end_to_end_p50_ms': statistics.median(latencies) * 1000,
+            'end_to_end_p99_ms': percentile(latencies, 0.99) * 1000,
+            'publish_to_dispatch_p50_ms': statistics.median(published) * 1000,
+            'publish_to_dispatch_p99_ms': percentile(published, 0.99) * 1000,
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--changes', type=int, default=1000, help='Subscribers saved')
+    parser.add_argument('--keepdb', action='store_true', help='Keep the test database for the next run')
+    parser.add_argument('--json', action='store_true', help='Print the raw results as JSON')
+    args = parser.parse_args()
+    results = run(args.changes, args.keepdb)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{results['received']}/{results['changes']} changes received, "
+          f"{results['changes_per_second']:.0f} saves/s")
+    print(f"save -> callback     p50 {results['end_to_end_p50_ms']:.2f} ms  p99 {results['end_to_end_p99_ms']:.2f} ms")
+    print(f"publish -> dispatch  p50 {results['publish_to_dispatch_p50_ms']:.2f} ms  "
+          f"p99 {results['publish_to_dispatch_p99_ms']:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Records per second of the bulk subscribe ingestion against the per
+request WriteSubscriberSerializer path.
+
+    python -m benchmarks.registry_ingest --records 2000 --batch-size 500
+"""
+import argparse
+import copy
+import json
+import time
+from pathlib import Path
+
+from benchmarks.django_db import benchmark_database
+
+from registry.ingest import SubscriberBulkIngestor
+from registry.models import Subscriber
+from registry.serializers import WriteSubscriberSerializer
+
+
+FIXTURES = Path(__file__).resolve().parent.parent / 'registry' / 'fixtures' / 'subscribe_request_passing.json'
+
+
+def make_payloads(count: int, prefix: str) -> list[dict]:
+    with open(FIXTURES, 'r') as file:
+        templates = json.load(file)
+    payloads = []
+    for index in range(count):
+        payload = copy.deepcopy(templates[index % len(templates)])
+        message = payload['message']
+        message['request_id'] = f'{prefix}-request-{index}'
+        message['entity']['unique_key_id'] = f'{prefix}-key-{index}'
+        for participant in message['network_participant']:
+            for position, seller in enumerate(participant.get('seller_on_record') or []):
+                seller['unique_key_id'] = f'{prefix}-sor-{index}-{position}'
+        payloads.append(payload)
+    return payloads
+
+
+def serializer_path(payloads: list[dict]) -> None:
+    for payload in payloads:
+        serializer = WriteSubscriberSerializer(data=payload, context={'ignore_expiry': True})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+
+def run(records: int = 2000, batch_size: int = 500) -> dict:
+    with benchmark_database():
+        payloads = make_payloads(records, 'serializer')
+        start = time.perf_counter()
+        serializer_path(payloads)
+        serializer_seconds = time.perf_counter() - start
+
+        report = SubscriberBulkIngestor(batch_size=batch_size, ignore_expiry=True) \
+            .ingest(make_payloads(records, 'bulk'))
+        assert not report.errors, report.errors[:3]
+        total = Subscriber.objects.count()
+    return {
+        'records': records,
+        'batch_size': batch_size,
+        'subscribers_written': total,
+        'serializer_records_per_second': records / serializer_seconds,
+        'bulk_records_per_second': report.records_per_second,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--records', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--json', action='store_true', help='Print the raw results as JSON')
+    args = parser.parse_args()
+    results = run(args.records, args.batch_size)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"serializer path {results['serializer_records_per_second']:>10.0f} records/s")
+    print(f"bulk ingestion  {results['bulk_records_per_second']:>10.0f} records/s "
+          f"(batch size {results['batch_size']})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""
+Memory and lookup latency of the key ring (registry.keyring) against the
+resolver path it replaces: a resolved SigningKey parsed through the key
+cache, warm when verifies hit a small set of keys and thrashing when they
+spread over every key. Memory is reported per 100k keys as growth of the
+process's RSS, which also covers the key material OpenSSL allocates for
+every parsed signing key, next to what the ring's Python objects take.
+
+With --database the keys are loaded into a throw away test database and
+the streamed load and a query per key are timed as well.
+
+    python -m benchmarks.registry_keyring --keys 100000
+    python -m benchmarks.registry_keyring --keys 100000 --database
+"""
+import argparse
+import base64
+import gc
+import json
+import random
+import os
+import resource
+import statistics
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from benchmarks.django_db import benchmark_database
+from benchmarks.registry_lookup import percentile
+
+from common.crypto.constants import SigningAlgorithm
+from registry.authentication import SigningKey, SubscriberKeyResolver
+from registry.keyring import SUBSCRIBED, SUBSCRIBER, KeyRing
+from registry.synthetic import SyntheticRegistry, load
+
+
+def rss() -> int:
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # Peak instead of current RSS where there is no procfs, in bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def rows(keys: int, seed: int) -> list[tuple]:
+    rng = random.Random(seed)
+    now = datetime.now(dt_timezone.utc)
+    valid_from, valid_until = now - timedelta(days=30), now + timedelta(days=335)
+    return [
+        (f'ring-{index}', f'np{index // 4}.example.com', valid_from, valid_until, SUBSCRIBED,
+         base64.b64encode(rng.randbytes(32)).decode(), base64.b64encode(rng.randbytes(32)).decode(), SUBSCRIBER)
+        for index in range(keys)
+    ]
+
+
+def timed_lookups(lookup, unique_key_ids: list[str], batch: int = 100) -> list[float]:
+    """
+    Seconds per lookup of each batch of `batch` lookups, timer overhead amortized.
+    """
+    samples = []
+    for start in range(0, len(unique_key_ids), batch):
+        chunk = unique_key_ids[start:start + batch]
+        begin = time.perf_counter()
+        for unique_key_id in chunk:
+            lookup(unique_key_id)
+        samples.append((time.perf_counter() - begin) / len(chunk))
+    return samples
+
+
+def summary(samples: list[float]) -> dict:
+    return {'p50_ns': statistics.median(samples) * 1e9, 'p99_ns': percentile(samples, 0.99) * 1e9}
+
+
+def memory(keys: int, seed: int) -> tuple[KeyRing, dict]:
+    key_rows = rows(keys, seed)
+    gc.collect()
+    before = rss()
+    started = time.perf_counter()
+    ring = KeyRing(refresh_interval=0)
+    for row in key_rows:
+        ring.add_row(row)
+    seconds = time.perf_counter() - started
+    grown = rss() - before
+    scale = 100000 / keys
+    report = ring.memory_report()
+    return ring, {
+        'keys': len(ring),
+        'build_keys_per_second': keys / seconds,
+        'rss_growth_mb_per_100k': grown * scale / 2 ** 20,
+        'python_objects_mb_per_100k': report['total'] * scale / 2 ** 20,
+        'python_objects_bytes_per_key': {key: value / keys for key, value in report.items() if key != 'entries'},
+    }
+
+
+def lookups(ring: KeyRing, keys: int, samples: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    spread = [f'ring-{rng.randrange(keys)}' for _ in range(samples)]
+    # Fits the default key cache of 4096 parsed keys
+    hot = [f'ring-{rng.randrange(min(keys, 1000))}' for _ in range(samples)]
+    misses = [f'missing-{index}' for index in range(samples)]
+    algo = SigningAlgorithm.ED25519.value
+
+    # What the resolver holds once a key id was queried: the base64 key,
+    # parsed through the process wide key cache on every verify
+    resolver = SubscriberKeyResolver(ttl=3600)
+    for entry in ring._entries.values():
+        public_key = base64.b64encode(entry.signing_key.public_bytes_raw()).decode()
+        key = SigningKey(entry.subscriber_id, entry.unique_key_id, public_key)
+        resolver._entries[entry.unique_key_id] = (float('inf'), key)
+
+    def ring_verify_key(unique_key_id: str):
+        return ring.resolve(unique_key_id).load_signing_key(algo)
+
+    def resolver_verify_key(unique_key_id: str):
+        return resolver.resolve(unique_key_id).load_signing_key(algo)
+
+    return {
+        'ring_hot_keys': summary(timed_lookups(ring_verify_key, hot)),
+        'ring_spread_keys': summary(timed_lookups(ring_verify_key, spread)),
+        'ring_miss': summary(timed_lookups(ring.resolve, misses)),
+        'resolver_hot_keys': summary(timed_lookups(resolver_verify_key, hot)),
+        'resolver_spread_keys': summary(timed_lookups(resolver_verify_key, spread)),
+    }
+
+
+def database(keys: int, samples: int, seed: int, keepdb: bool) -> dict:
+    with benchmark_database(keepdb=keepdb):
+        # Windows opened up to 200 days ago, still valid for a year from their start
+        registry = SyntheticRegistry(seed=seed, epoch=datetime.now(dt_timezone.utc) - timedelta(days=200))
+        subscribers = max(keys // 2, 1)
+        report = load(registry.subscribers(0, subscribers))
+        started = time.perf_counter()
+        ring = KeyRing.build(refresh_interval=0)
+        seconds = time.perf_counter() - started
+        unique_key_ids = list(ring._entries)[:samples]
+        resolver = SubscriberKeyResolver(ttl=0)
+        return {
+            'subscribers': report.subscribers,
+            'sellers': report.sellers,
+            'loaded_keys': len(ring),
+            'load_seconds': seconds,
+            'load_keys_per_second': len(ring) / seconds,
+            'query_per_key': summary(timed_lookups(resolver.load, unique_key_ids, batch=10)),
+        }
+
+
+def run(keys: int = 100000, samples: int = 100000, seed: int = 42, with_database: bool = False,
+        keepdb: bool = False) -> dict:
+    ring, results = memory(keys, seed)
+    results['lookups'] = lookups(ring, keys, samples, seed)
+    if with_database:
+        results['database'] = database(keys, min(samples, 2000), seed, keepdb)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keys', type=int, default=100000, help='Keys in the ring')
+    parser.add_argument('--samples', type=int, default=100000, help='Lookups timed per path')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database', action='store_true', help='Also time the streamed load from Postgres')
+    parser.add_argument('--keepdb', action='store_true', help='Keep the test database for the next run')
+    parser.add_argument('--json', action='store_true', help='Print the raw results as JSON')
+    args = parser.parse_args()
+    results = run(args.keys, args.samples, args.seed, args.database, args.keepdb)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{results['keys']} keys parsed at {results['build_keys_per_second']:.0f} keys/s")
+    print(f"per 100k keys: {results['rss_growth_mb_per_100k']:.1f} MB RSS growth, "
+          f"{results['python_objects_mb_per_100k']:.1f} MB of it in Python objects")
+    print('bytes per key: ' + ', '.join(f'{part} {size:.0f}'
+                                        for part, size in results['python_objects_bytes_per_key'].items()))
+    for path, latency in results['lookups'].items():
+        print(f"{path:<26} p50 {latency['p50_ns']:8.0f} ns  p99 {latency['p99_ns']:8.0f} ns")
+    if 'database' in results:
+        database = results['database']
+        print(f"streamed load of {database['loaded_keys']} keys in {database['load_seconds']:.2f}s "
+              f"({database['load_keys_per_second']:.0f} keys/s)")
+        print(f"query per key            p50 {database['query_per_key']['p50_ns'] / 1000:8.0f} µs  "
+              f"p99 {database['query_per_key']['p99_ns'] / 1000:8.0f} µs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Latency of registry lookups by domain, type and city over a synthetic
+network of participants, together with the plan Postgres picks.
+
+    python -m benchmarks.registry_lookup --participants 100000 --queries 500
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from benchmarks.django_db import benchmark_database
+
+from registry.lookup import lookup_subscribers
+from registry.models import NetworkParticipant, SellerOnRecord, Subscriber
+
+
+DOMAINS = [choice for choice, _ in Subscriber.ONDCDomainType.choices]
+TYPES = [Subscriber.SubscriberType.BAP, Subscriber.SubscriberType.BPP]
+
+
+def populate(participants: int, cities: int, seed: int, batch_size: int = 5000) -> list[str]:
+    rng = random.Random(seed)
+    city_codes = [f'std:{code:03d}' for code in range(cities)]
+    subscribers, network = [], []
+    for index in range(participants // 2):
+        subscriber = Subscriber(
+            unique_key_id=f'bench-{index}', subscriber_id=f'np{index}.example.com',
+            callback_url='/ondc/onboarding', country='IND',
+            key_pair={'signing_public_key': 'QSax2KT4UiTUWUqoVUaEcWhBcGTTNu+Sf8EMDRY1GaE='},
+            status=Subscriber.SubscriptionStatus.SUBSCRIBED,
+        )
+        subscribers.append(subscriber)
+        for _ in range(2):
+            network.append(NetworkParticipant(
+                subscriber=subscriber, domain=rng.choice(DOMAINS), type=rng.choice(TYPES),
+                city_code=rng.sample(city_codes, rng.randint(1, 5)),
+            ))
+    Subscriber.objects.bulk_create(subscribers, batch_size=batch_size)
+    NetworkParticipant.objects.bulk_create(network, batch_size=batch_size)
+    sellers = [
+        SellerOnRecord(unique_key_id=f'bench-sor-{index}', network_participant=participant,
+                       city_code=participant.city_code, key_pair={})
+        for index, participant in enumerate(network[::20])
+    ]
+    SellerOnRecord.objects.bulk_create(sellers, batch_size=batch_size)
+    return city_codes
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run(participants: int = 100000, cities: int = 300, queries: int = 500,
+        seed: int = 42, keepdb: bool = False) -> dict:
+    with benchmark_database(keepdb=keepdb):
+        if not NetworkParticipant.objects.exists():
+            populate(participants, cities, seed)
+        from django.db import connection
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        rng = random.Random(seed + 1)
+        city_codes = [f'std:{code:03d}' for code in range(cities)]
+        samples = []
+        for _ in range(queries):
+            domain, type, city = rng.choice(DOMAINS), rng.choice(TYPES), rng.choice(city_codes)
+            start = time.perf_counter()
+            list(lookup_subscribers(domain=domain, type=type, city=[city]))
+            samples.append(time.perf_counter() - start)
+        plan = NetworkParticipant.objects.filter(
+            domain=DOMAINS[0], type=TYPES[1], city_code__contains=[city_codes[0]]
+        ).explain(analyze=True)
+        return {
+            'participants': NetworkParticipant.objects.count(),
+            'queries': queries,
+            'p50_ms': statistics.median(samples) * 1000,
+            'p99_ms': percentile(samples, 0.99) * 1000,
+            'mean_ms': statistics.fmean(samples) * 1000,
+            'uses_gin_index': 'registry_np_city_code_gin' in plan,
+            'plan': plan,
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--participants', type=int, default=100000)
+    parser.add_argument('--cities', type=int, default=300)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--keepdb', action='store_true', help='Keep the populated database for the next run')
+    parser.add_argument('--json', action='store_true', help='Print the raw results as JSON')
+    args = parser.parse_args()
+    results = run(args.participants, args.cities, args.queries, args.seed, args.keepdb)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{results['participants']} participants, {results['queries']} lookups")
+    print(f"p50 {results['p50_ms']:.2f} ms  p99 {results['p99_ms']:.2f} ms  mean {results['mean_ms']:.2f} ms")
+    print(results['plan'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Per stage throughput of the subscription pipeline (registry.pipeline) run in
+process against a throw away test database, with every callback answered by
+the local stub server over plain http and every certificate taken as valid
+(so check_ssl only costs its grouping and rate limiting here). Stage batches are drained the way dedicated onboarding
+workers would take them: onboarding batches first, bulk re-verification
+batches when no onboarding batch is due, so the report also shows how long
+new subscribers take while a re-verification backlog is queued.
+
+    python -m benchmarks.registry_pipeline --onboarding 200 --reverify 2000
+"""
+import argparse
+import base64
+import json
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from benchmarks.django_db import benchmark_database
+
+from django.test import override_settings
+from django.utils import timezone
+
+from registry.callback import CallbackVerifier
+from registry.models import Subscriber
+from registry.pipeline import (
+    ONBOARDING, REVERIFY, STAGES, VALIDATE_KEYS, HostRateLimiter, SubscriptionPipeline, batches,
+)
+from registry.stub_server import CallbackStubServer, StubCertificateChecker
+
+
+class Driver:
+    """
+    Stand in for the stage queues: of the batches due, onboarding ones are
+    taken before re-verification ones, each lane in the order it was sent.
+    """
+
+    def __init__(self, batch_size: int) -> None:
+        self.batch_size = batch_size
+        self.queued: list[tuple] = []
+        self.sequence = 0
+
+    def __call__(self, stage, unique_key_ids, lane, attempt, countdown) -> None:
+        due = time.perf_counter() + (countdown or 0)
+        for batch in batches(list(unique_key_ids), self.batch_size):
+            self.sequence += 1
+            self.queued.append((lane != ONBOARDING, due, self.sequence, stage, batch, lane, attempt))
+
+    def next(self) -> tuple | None:
+        now = time.perf_counter()
+        due = [item for item in self.queued if item[1] <= now]
+        if not due and self.queued:
+            time.sleep(max(0.0, min(item[1] for item in self.queued) - now))
+            return self.next()
+        if not due:
+            return None
+        item = min(due)
+        self.queued.remove(item)
+        return item
+
+
+def create_subscribers(stub: CallbackStubServer, prefix: str, count: int, status: str) -> list[str]:
+    now = timezone.now()
+    signing_key = base64.b64encode(bytes(32)).decode()
+    subscribers = []
+    for index in range(count):
+        subscriber_id = f'{prefix}{index}.example.com'
+        subscribers.append(Subscriber(
+            unique_key_id=f'{prefix}-{index}', subscriber_id=subscriber_id, callback_url='/ondc',
+            country='IND', status=status, valid_from=now - timedelta(days=1), valid_until=now + timedelta(days=365),
+            key_pair={'signing_public_key': signing_key, 'encryption_public_key': stub.register(subscriber_id)},
+        ))
+    Subscriber.objects.bulk_create(subscribers, batch_size=1000)
+    return [subscriber.unique_key_id for subscriber in subscribers]
+
+
+def run(onboarding: int = 200, reverify: int = 2000, batch_size: int = 200, host_rate: int = 0,
+        keepdb: bool = False) -> dict:
+    # A single process runs the pipeline, the per process cache counts every call
+    with benchmark_database(keepdb=keepdb), CallbackStubServer() as stub, override_settings(
+            SUBSCRIPTION_HOST_RATE=host_rate, SUBSCRIPTION_RATE_LIMIT_CACHE='default',
+            SUBSCRIPTION_RATE_LIMIT_SINGLE_PROCESS=True):
+        Subscriber.objects.filter(unique_key_id__startswith='pipeline-').delete()
+        bulk_ids = create_subscribers(stub, 'pipeline-bulk', reverify, Subscriber.SubscriptionStatus.SUBSCRIBED)
+        new_ids = create_subscribers(stub, 'pipeline-new', onboarding, Subscriber.SubscriptionStatus.INITIATED)
+        driver = Driver(batch_size)
+        pipeline = SubscriptionPipeline(HostRateLimiter(), CallbackVerifier(transport=stub.transport()),
+                                        StubCertificateChecker(), forward=driver)
+        stages = defaultdict(lambda: {'items': 0, 'seconds': 0.0, 'batches': 0})
+        finished: dict[str, float] = {}
+
+        begin = time.perf_counter()
+        # The backlog is queued first, onboarding still runs ahead of it
+        driver(VALIDATE_KEYS, bulk_ids, REVERIFY, 0, None)
+        driver(VALIDATE_KEYS, new_ids, ONBOARDING, 0, None)
+        while (item := driver.next()) is not None:
+            _, _, _, stage, batch, lane, attempt = item
+            report = pipeline.run(stage, batch, lane, attempt)
+            totals = stages[f'{stage}:{lane}']
+            totals['items'] += report.items
+            totals['seconds'] += report.seconds
+            totals['batches'] += 1
+            if not any(queued[5] == lane for queued in driver.queued):
+                finished.setdefault(lane, time.perf_counter() - begin)
+        seconds = time.perf_counter() - begin
+        subscribed = Subscriber.objects.filter(unique_key_id__startswith='pipeline-',
+                                               status=Subscriber.SubscriptionStatus.SUBSCRIBED).count()
+        return {
+            'subscribers': onboarding + reverify,
+            'subscribed': subscribed,
+            'seconds': seconds,
+            'onboarding_done_seconds': finished.get(ONBOARDING),
+            'reverify_done_seconds': finished.get(REVERIFY),
+            'stages': {
+                key: {**totals, 'items_per_second': totals['items'] / totals['seconds'] if totals['seconds'] else 0.0}
+                for key, totals in sorted(stages.items(), key=lambda pair: STAGES.index(pair[0].split(':')[0]))
+            },
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--onboarding', type=int, default=200, help='New subscribers onboarded')
+    parser.add_argument('--reverify', type=int, default=2000, help='Subscribers in the re-verification backlog')
+    parser.add_argument('--batch-size', type=int, default=200, help='Subscribers per stage batch')
+    parser.add_argument('--host-rate', type=int, default=0,
+                        help='Calls per second per subscriber host, 0 disables')
+    parser.add_argument('--keepdb', action='store_true', help='Keep the test database for the next run')
+    parser.add_argument('--json', action='store_true', help='Print the raw results as JSON')
+    args = parser.parse_args()
+    results = run(args.onboarding, args.reverify, args.batch_size, args.host_rate, args.keepdb)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{results['subscribed']}/{results['subscribers']} subscribed in {results['seconds']:.2f}s, "
+          f"onboarding done after {results['onboarding_done_seconds']:.2f}s, "
+          f"re-verification after {results['reverify_done_seconds']:.2f}s")
+    for key, totals in results['stages'].items():
+        print(f"{key:<28} {totals['items']:6d} in {totals['batches']:4d} batches  "
+              f"{totals['items_per_second']:8.0f} subscribers/s")
+
+
+if __name__ == '__main__':
+    main()
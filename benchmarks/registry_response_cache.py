@@ -0,0 +1,83 @@
+"""
+p50/p99 latency and CPU time per lookup request with and without the
+fragment response cache, through the full Django request path.
+
+    python -m benchmarks.registry_response_cache --participants 20000 --requests 500
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from benchmarks.django_db import benchmark_database
+from benchmarks.registry_lookup import DOMAINS, TYPES, percentile, populate
+
+from django.core.cache import caches
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from registry.models import NetworkParticipant
+
+
+def measure(client: Client, bodies: list[dict], etags: dict[int, str] | None = None) -> dict:
+    samples, cpu = [], []
+    url = reverse('lookup')
+    for index, body in enumerate(bodies):
+        headers = {'HTTP_IF_NONE_MATCH': etags[index]} if etags and index in etags else {}
+        start, start_cpu = time.perf_counter(), time.process_time()
+        response = client.post(url, body, content_type='application/json', **headers)
+        samples.append(time.perf_counter() - start)
+        cpu.append(time.process_time() - start_cpu)
+        if etags is not None and response.has_header('ETag'):
+            etags[index] = response['ETag']
+    return {
+        'p50_ms': statistics.median(samples) * 1000,
+        'p99_ms': percentile(samples, 0.99) * 1000,
+        'cpu_ms_per_request': statistics.fmean(cpu) * 1000,
+    }
+
+
+def run(participants: int = 20000, cities: int = 300, requests: int = 500, seed: int = 42,
+        keepdb: bool = False) -> dict:
+    with benchmark_database(keepdb=keepdb):
+        if not NetworkParticipant.objects.exists():
+            populate(participants, cities, seed)
+        rng = random.Random(seed + 1)
+        city_codes = [f'std:{code:03d}' for code in range(cities)]
+        bodies = [{'domain': rng.choice(DOMAINS), 'type': rng.choice(TYPES), 'city': rng.choice(city_codes)}
+                  for _ in range(requests)]
+        client = Client()
+        results: dict = {'participants': NetworkParticipant.objects.count(), 'requests': requests, 'runs': {}}
+        with override_settings(LOOKUP_RESPONSE_CACHE=False):
+            results['runs']['serializers'] = measure(client, bodies)
+        with override_settings(LOOKUP_RESPONSE_CACHE=True):
+            caches['default'].clear()
+            etags: dict[int, str] = {}
+            results['runs']['cache_cold'] = measure(client, bodies, etags)
+            results['runs']['cache_warm'] = measure(client, bodies)
+            results['runs']['not_modified'] = measure(client, bodies, etags)
+        return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--participants', type=int, default=20000)
+    parser.add_argument('--cities', type=int, default=300)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--keepdb', action='store_true', help='Keep the populated database for the next run')
+    parser.add_argument('--json', action='store_true', help='Print the raw results as JSON')
+    args = parser.parse_args()
+    results = run(args.participants, args.cities, args.requests, args.seed, args.keepdb)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{results['participants']} participants, {results['requests']} lookups per run")
+    for name, entry in results['runs'].items():
+        print(f"{name:<13} p50 {entry['p50_ms']:7.2f} ms  p99 {entry['p99_ms']:7.2f} ms  "
+              f"cpu {entry['cpu_ms_per_request']:6.2f} ms/request")
+
+
+if __name__ == '__main__':
+    main()
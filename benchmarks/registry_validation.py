@@ -0,0 +1,85 @@
+"""
+WriteSubscriberSerializer.is_valid() through the DRF serializers and
+through the compiled plan (SUBSCRIBE_FAST_VALIDATION), over the subscribe
+fixtures in registry/fixtures. Unique checks run against an empty test
+database.
+
+    python -m benchmarks.registry_validation --rounds 200
+"""
+import argparse
+import copy
+import json
+import statistics
+import time
+from pathlib import Path
+
+from benchmarks.django_db import benchmark_database
+from benchmarks.registry_lookup import percentile
+
+from django.test import override_settings
+
+from registry.serializers import WriteSubscriberSerializer
+
+FIXTURES = Path(__file__).resolve().parent.parent / 'registry' / 'fixtures'
+
+
+def load_fixtures() -> list[dict]:
+    payloads = []
+    for name in ('subscribe_request_passing.json', 'subscribe_request_fail.json', 'subscriber_update_passing.json'):
+        with open(FIXTURES / name) as file:
+            payloads.extend(json.load(file))
+    return payloads
+
+
+def measure(payloads: list[dict], rounds: int) -> dict:
+    samples, cpu, valid = [], [], 0
+    for _ in range(rounds):
+        for payload in payloads:
+            data = copy.deepcopy(payload)
+            start, start_cpu = time.perf_counter(), time.process_time()
+            serializer = WriteSubscriberSerializer(data=data, context={'ignore_expiry': True})
+            valid += serializer.is_valid()
+            samples.append(time.perf_counter() - start)
+            cpu.append(time.process_time() - start_cpu)
+    return {
+        'validations': len(samples),
+        'valid': valid,
+        'p50_us': statistics.median(samples) * 1e6,
+        'p99_us': percentile(samples, 0.99) * 1e6,
+        'cpu_us_per_validation': statistics.fmean(cpu) * 1e6,
+    }
+
+
+def run(rounds: int = 200, keepdb: bool = False) -> dict:
+    payloads = load_fixtures()
+    with benchmark_database(keepdb=keepdb):
+        results: dict = {'payloads': len(payloads), 'rounds': rounds, 'runs': {}}
+        for name, fast in (('drf', False), ('compiled', True)):
+            with override_settings(SUBSCRIBE_FAST_VALIDATION=fast):
+                # Warm up, the compiled plan is built on first use
+                measure(payloads, 1)
+                results['runs'][name] = measure(payloads, rounds)
+        results['speedup'] = (results['runs']['drf']['cpu_us_per_validation']
+                              / results['runs']['compiled']['cpu_us_per_validation'])
+        return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--keepdb', action='store_true', help='Keep the test database for the next run')
+    parser.add_argument('--json', action='store_true', help='Print the raw results as JSON')
+    args = parser.parse_args()
+    results = run(args.rounds, args.keepdb)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{results['payloads']} fixtures x {results['rounds']} rounds")
+    for name, entry in results['runs'].items():
+        print(f"{name:<9} p50 {entry['p50_us']:8.1f} us  p99 {entry['p99_us']:8.1f} us  "
+              f"cpu {entry['cpu_us_per_validation']:8.1f} us/validation  ({entry['valid']} valid)")
+    print(f"speedup {results['speedup']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
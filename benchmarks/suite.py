@@ -0,0 +1,445 @@
+"""
+Benchmark suite shared by `manage.py bench` and the pytest plugin
+(benchmarks.pytest_plugin): Cryptographer key loading, signature checks,
+encryption and digests, WriteSubscriberSerializer validation and create,
+and registry lookups, over a dataset of configurable size.
+
+Every benchmark is timed in rounds of as many calls as fit in min_time,
+results are JSON documents compared by median time per call against a
+stored baseline run over a dataset of the same sizes.
+
+    python manage.py bench --dataset small --save-baseline
+    python manage.py bench --dataset small --threshold 0.1
+"""
+import base64
+import copy
+import itertools
+import json
+import platform
+import random
+import statistics
+import time
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / 'baseline.json'
+# Slower than the baseline by more than this fraction is a regression
+DEFAULT_THRESHOLD = 0.10
+FIXTURES = Path(__file__).resolve().parent.parent / 'registry' / 'fixtures' / 'subscribe_request_passing.json'
+
+CRYPTO = 'crypto'
+SERIALIZERS = 'serializers'
+LOOKUP = 'lookup'
+GROUPS = (CRYPTO, SERIALIZERS, LOOKUP)
+
+
+@dataclass(frozen=True)
+class Dataset:
+    keys: int = 100
+    body_size: int = 4096
+    participants: int = 2000
+    cities: int = 50
+    seed: int = 42
+
+
+DATASETS = {
+    'small': Dataset(),
+    'medium': Dataset(keys=1000, body_size=64 * 1024, participants=20000, cities=300),
+    'large': Dataset(keys=10000, body_size=1024 * 1024, participants=100000, cities=300),
+}
+
+
+def get_dataset(name: str = 'small', **sizes: int | None) -> Dataset:
+    """
+    A named dataset with the given sizes overridden, None keeps the default.
+    """
+    return replace(DATASETS[name], **{key: value for key, value in sizes.items() if value is not None})
+
+
+@dataclass(frozen=True)
+class Benchmark:
+    name: str
+    group: str
+    # Builds the data for the dataset and returns the callable being timed
+    setup: Callable[[Dataset], Callable[[], Any]]
+    database: bool = False
+
+
+BENCHMARKS: dict[str, Benchmark] = {}
+
+
+def benchmark(group: str, database: bool = False) -> Callable:
+    def register(setup: Callable[[Dataset], Callable[[], Any]]) -> Callable:
+        name = f'{group}.{setup.__name__}'
+        BENCHMARKS[name] = Benchmark(name, group, setup, database)
+        return setup
+    return register
+
+
+def select(names: Iterable[str] = (), groups: Iterable[str] = ()) -> list[Benchmark]:
+    names, groups = set(names), set(groups)
+    unknown = names - BENCHMARKS.keys()
+    if unknown:
+        raise KeyError(f'Unknown benchmarks {", ".join(sorted(unknown))}')
+    return [
+        entry for name, entry in sorted(BENCHMARKS.items())
+        if (not names and not groups) or name in names or entry.group in groups
+    ]
+
+
+def measure(func: Callable[[], Any], rounds: int = 5, min_time: float = 0.05) -> dict:
+    """
+    Seconds per call of func: the calls per round are doubled until a round
+    takes min_time, then `rounds` rounds are timed.
+    """
+    func()
+    iterations = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        iterations *= 2
+    samples = [elapsed / iterations]
+    for _ in range(rounds - 1):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        samples.append((time.perf_counter() - start) / iterations)
+    median = statistics.median(samples)
+    return {
+        'rounds': rounds,
+        'iterations': iterations,
+        'median_us': median * 1e6,
+        'min_us': min(samples) * 1e6,
+        'mean_us': statistics.fmean(samples) * 1e6,
+        'stddev_us': statistics.pstdev(samples) * 1e6,
+        'ops_per_second': 1 / median if median else None,
+    }
+
+
+def run_benchmark(entry: Benchmark, dataset: Dataset, rounds: int = 5, min_time: float = 0.05) -> dict:
+    return {'group': entry.group, **measure(entry.setup(dataset), rounds, min_time)}
+
+
+def run_suite(entries: Iterable[Benchmark], dataset: Dataset, dataset_name: str = 'custom', rounds: int = 5,
+              min_time: float = 0.05, progress: Callable[[str, dict], None] | None = None) -> dict:
+    results = new_results(dataset, dataset_name)
+    for entry in entries:
+        results['benchmarks'][entry.name] = result = run_benchmark(entry, dataset, rounds, min_time)
+        if progress is not None:
+            progress(entry.name, result)
+    return results
+
+
+def new_results(dataset: Dataset, dataset_name: str = 'custom') -> dict:
+    return {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'dataset': dataset_name,
+            'sizes': asdict(dataset),
+        },
+        'benchmarks': {},
+    }
+
+
+def save_results(results: dict, path: str | Path) -> None:
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+def load_results(path: str | Path) -> dict | None:
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+@dataclass(frozen=True)
+class Comparison:
+    name: str
+    baseline_us: float | None
+    current_us: float | None
+    status: str
+
+    REGRESSION = 'regression'
+    IMPROVEMENT = 'improvement'
+    UNCHANGED = 'unchanged'
+    NEW = 'new'
+    MISSING = 'missing'
+
+    @property
+    def ratio(self) -> float | None:
+        if not self.baseline_us or self.current_us is None:
+            return None
+        return self.current_us / self.baseline_us
+
+
+class BaselineMismatch(ValueError):
+    pass
+
+
+def dataset_mismatch(results: dict, baseline: dict) -> str | None:
+    """
+    Why results and baseline are not comparable, None when both ran over
+    datasets of the same sizes.
+    """
+    current, previous = results.get('meta', {}), baseline.get('meta', {})
+    if current.get('sizes') == previous.get('sizes'):
+        return None
+    return (f"the baseline ran over the {previous.get('dataset')} dataset {previous.get('sizes')}, "
+            f"these results over the {current.get('dataset')} dataset {current.get('sizes')}")
+
+
+def compare(results: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list[Comparison]:
+    """
+    Median time per call of every benchmark against the baseline, a
+    benchmark is a regression when it got slower by more than threshold.
+    Baseline entries not run this time are reported as missing.
+    Raises BaselineMismatch when the baseline ran over other dataset sizes.
+    """
+    mismatch = dataset_mismatch(results, baseline)
+    if mismatch:
+        raise BaselineMismatch(f'Not comparable, {mismatch}')
+    current, previous = results['benchmarks'], baseline['benchmarks']
+    comparisons = []
+    for name in sorted(current.keys() | previous.keys()):
+        now = current[name]['median_us'] if name in current else None
+        before = previous[name]['median_us'] if name in previous else None
+        if before is None:
+            status = Comparison.NEW
+        elif now is None:
+            status = Comparison.MISSING
+        elif now > before * (1 + threshold):
+            status = Comparison.REGRESSION
+        elif now < before * (1 - threshold):
+            status = Comparison.IMPROVEMENT
+        else:
+            status = Comparison.UNCHANGED
+        comparisons.append(Comparison(name, before, now, status))
+    return comparisons
+
+
+def regressions(comparisons: Iterable[Comparison]) -> list[Comparison]:
+    return [comparison for comparison in comparisons if comparison.status == Comparison.REGRESSION]
+
+
+def format_result(name: str, result: dict) -> str:
+    return (f"{name:<36} {result['median_us']:12.2f} us/call  (min {result['min_us']:.2f}, "
+            f"stddev {result['stddev_us']:.2f}, {result['rounds']}x{result['iterations']} calls)")
+
+
+def format_comparison(comparison: Comparison) -> str:
+    ratio = comparison.ratio
+    change = f'{(ratio - 1) * 100:+7.1f}%' if ratio is not None else ' ' * 8
+    before = f'{comparison.baseline_us:12.2f}' if comparison.baseline_us is not None else ' ' * 12
+    now = f'{comparison.current_us:12.2f}' if comparison.current_us is not None else ' ' * 12
+    return f'{comparison.name:<36} {before} -> {now} us  {change}  {comparison.status}'
+
+
+# CRYPTO
+
+def _signing_keys(count: int, seed: int) -> list:
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+    rng = random.Random(seed)
+    return [ed25519.Ed25519PrivateKey.from_private_bytes(rng.randbytes(32)) for _ in range(count)]
+
+
+def _encoded(public_bytes: bytes) -> str:
+    return base64.b64encode(public_bytes).decode()
+
+
+def _signing_public_keys(dataset: Dataset) -> list[str]:
+    from cryptography.hazmat.primitives import serialization
+    return [
+        _encoded(key.public_key().public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw))
+        for key in _signing_keys(dataset.keys, dataset.seed)
+    ]
+
+
+@benchmark(CRYPTO)
+def load_key(dataset: Dataset) -> Callable[[], Any]:
+    # Parsing, the key cache is emptied for every key
+    from common.crypto.cache import key_cache
+    from common.crypto.constants import SigningAlgorithm
+    from common.crypto.main import Cryptographer
+    keys = itertools.cycle(_signing_public_keys(dataset))
+
+    def call():
+        public_key = next(keys)
+        key_cache.invalidate(public_key)
+        return Cryptographer(public_key, SigningAlgorithm.ED25519.value)
+    return call
+
+
+@benchmark(CRYPTO)
+def load_key_cached(dataset: Dataset) -> Callable[[], Any]:
+    from common.crypto.constants import SigningAlgorithm
+    from common.crypto.main import Cryptographer
+    keys = itertools.cycle(_signing_public_keys(dataset))
+    return lambda: Cryptographer(next(keys), SigningAlgorithm.ED25519.value)
+
+
+@benchmark(CRYPTO)
+def verify(dataset: Dataset) -> Callable[[], Any]:
+    from common.crypto.constants import SigningAlgorithm
+    from common.crypto.main import Cryptographer
+    message = '{"context": {"action": "search"}}'
+    checks = itertools.cycle([
+        (Cryptographer(public_key, SigningAlgorithm.ED25519.value), _encoded(private_key.sign(message.encode())))
+        for public_key, private_key in zip(_signing_public_keys(dataset), _signing_keys(dataset.keys, dataset.seed))
+    ])
+
+    def call():
+        cryptographer, signature = next(checks)
+        assert cryptographer.verify_signature(signature, message)
+    return call
+
+
+@benchmark(CRYPTO)
+def encrypt(dataset: Dataset) -> Callable[[], Any]:
+    from nacl.public import PrivateKey
+    from common.crypto.constants import EncryptionAlgorithm
+    from common.crypto.main import Cryptographer
+    rng = random.Random(dataset.seed)
+    cryptographers = itertools.cycle([
+        Cryptographer(_encoded(bytes(PrivateKey(rng.randbytes(32)).public_key)), EncryptionAlgorithm.X25519.value)
+        for _ in range(min(dataset.keys, 100))
+    ])
+    return lambda: next(cryptographers).encrypt('challenge-string-of-the-on_subscribe-call')
+
+
+@benchmark(CRYPTO)
+def digest(dataset: Dataset) -> Callable[[], Any]:
+    from common.crypto.constants import HashingAlgorithm
+    from common.crypto.main import Cryptographer
+    body = random.Random(dataset.seed).randbytes(dataset.body_size)
+    return lambda: Cryptographer.digest(HashingAlgorithm.BLAKE2B, body)
+
+
+# SERIALIZERS
+
+def _payloads(prefix: str) -> Iterable[dict]:
+    """
+    Endless subscribe payloads from the passing fixtures, every one with
+    its own request and key ids.
+    """
+    with open(FIXTURES) as file:
+        templates = json.load(file)
+    for index in itertools.count():
+        payload = copy.deepcopy(templates[index % len(templates)])
+        message = payload['message']
+        message['request_id'] = f'{prefix}-request-{index}'
+        message['entity']['unique_key_id'] = f'{prefix}-key-{index}'
+        for participant in message['network_participant']:
+            for position, seller in enumerate(participant.get('seller_on_record') or []):
+                seller['unique_key_id'] = f'{prefix}-sor-{index}-{position}'
+        yield payload
+
+
+@benchmark(SERIALIZERS, database=True)
+def validate(dataset: Dataset) -> Callable[[], Any]:
+    # The DRF serializers, whatever SUBSCRIBE_FAST_VALIDATION is set to
+    from rest_framework import serializers
+    from registry.serializers import WriteSubscriberSerializer
+    payloads = _payloads(f'validate-{time.monotonic_ns()}')
+    return lambda: serializers.Serializer.run_validation(
+        WriteSubscriberSerializer(context={'ignore_expiry': True}), next(payloads)
+    )
+
+
+@benchmark(SERIALIZERS, database=True)
+def validate_compiled(dataset: Dataset) -> Callable[[], Any]:
+    from registry.fast_validation import get_validator
+    from registry.serializers import WriteSubscriberSerializer
+    validator = get_validator(WriteSubscriberSerializer)
+    payloads = _payloads(f'validate-compiled-{time.monotonic_ns()}')
+    return lambda: validator.run_validation(next(payloads), {'ignore_expiry': True})
+
+
+@benchmark(SERIALIZERS, database=True)
+def create(dataset: Dataset) -> Callable[[], Any]:
+    # is_valid() and save(), every call inserts a subscriber tree
+    from registry.serializers import WriteSubscriberSerializer
+    payloads = _payloads(f'create-{time.monotonic_ns()}')
+
+    def call():
+        serializer = WriteSubscriberSerializer(data=next(payloads), context={'ignore_expiry': True})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+    return call
+
+
+# LOOKUP
+
+# Holds the sizes the lookup rows of a kept database were populated for
+POPULATED_MARKER = 'bench-dataset'
+
+
+def _populated(dataset: Dataset) -> list[str]:
+    """
+    Populates the lookup rows, unless a kept database already holds them
+    for the same sizes. Rows populated for other sizes are replaced.
+    """
+    from benchmarks.registry_lookup import populate
+    from registry.models import Subscriber
+    sizes = {'participants': dataset.participants, 'cities': dataset.cities, 'seed': dataset.seed}
+    marker = Subscriber.objects.filter(unique_key_id=POPULATED_MARKER).values_list('key_pair', flat=True).first()
+    if marker != sizes:
+        Subscriber.objects.filter(unique_key_id__startswith='bench-').delete()
+        populate(dataset.participants, dataset.cities, dataset.seed)
+        # Never SUBSCRIBED, lookups leave it out
+        Subscriber.objects.create(unique_key_id=POPULATED_MARKER, subscriber_id='bench-dataset.example.com',
+                                  callback_url='/', country='IND', key_pair=sizes,
+                                  status=Subscriber.SubscriptionStatus.UNSUBSCRIBED)
+    return [f'std:{code:03d}' for code in range(dataset.cities)]
+
+
+def _filters(dataset: Dataset) -> Iterable[dict]:
+    from benchmarks.registry_lookup import DOMAINS, TYPES
+    city_codes = _populated(dataset)
+    rng = random.Random(dataset.seed + 1)
+    return itertools.cycle([
+        {'domain': rng.choice(DOMAINS), 'type': rng.choice(TYPES), 'city': [rng.choice(city_codes)]}
+        for _ in range(500)
+    ])
+
+
+@benchmark(LOOKUP, database=True)
+def filters(dataset: Dataset) -> Callable[[], Any]:
+    from registry.lookup import find_subscribers
+    queries = _filters(dataset)
+    return lambda: list(find_subscribers(**next(queries)))
+
+
+@benchmark(LOOKUP, database=True)
+def subscriber_id(dataset: Dataset) -> Callable[[], Any]:
+    from registry.lookup import find_subscribers
+    _populated(dataset)
+    rng = random.Random(dataset.seed + 2)
+    subscriber_ids = itertools.cycle([f'np{rng.randrange(dataset.participants // 2)}.example.com'
+                                      for _ in range(500)])
+    return lambda: list(find_subscribers(subscriber_id=next(subscriber_ids)))
+
+
+@benchmark(LOOKUP, database=True)
+def view(dataset: Dataset) -> Callable[[], Any]:
+    # The whole request path of POST /lookup
+    from django.test import Client
+    from django.urls import reverse
+    queries = _filters(dataset)
+    client, url = Client(), reverse('lookup')
+
+    def call():
+        response = client.post(url, next(queries), content_type='application/json')
+        assert response.status_code == 200, response.status_code
+    return call
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.test import SimpleTestCase
+from common.crypto.authorization import parse_authorization_header, signing_string
+from common.crypto.constants import HashingAlgorithm
+from common.crypto.main import Cryptographer
+from registry.synthetic import SyntheticRegistry, signed_request
+from .load_driver import *
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.received.append((self.path, dict(self.headers), body))
+        status = 400 if self.path == '/reject' else 200
+        payload = b'{"error": "rejected"}' if status == 400 else b'{"message": {"ack": {"status": "ACK"}}}'
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHistogram(SimpleTestCase):
+
+    def test_buckets(self):
+        histogram = Histogram((1, 10, 100))
+        for seconds in (0.0005, 0.001, 0.005, 0.05, 0.5):
+            histogram.add(seconds)
+        self.assertEqual(histogram.counts, [2, 1, 1, 1])
+        self.assertEqual(histogram.percentile(0.5), 0.005)
+        self.assertEqual(len(histogram.render()), 4)
+
+
+class TestLoadDriver(SimpleTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.received = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        super().tearDown()
+
+    def test_replay_at_rate(self):
+        requests = [signed_request(subscriber, now=1600000000) for subscriber in SyntheticRegistry().subscribers(0, 20)]
+        requests[3]['path'] = '/reject'
+        started = time.time()
+        report = asyncio.run(LoadDriver(self.url, rate=100, concurrency=5).run(requests))
+        self.assertEqual(report.sent, 20)
+        self.assertEqual(report.statuses, {200: 19, 400: 1})
+        self.assertEqual(report.errors, {'HTTP 400': 1})
+        self.assertEqual(len(report.histogram), 20)
+        # 20 requests at 100/s take at least 190ms
+        self.assertGreaterEqual(report.seconds, 0.19)
+
+        # Stamped and signed again when sent
+        path, headers, body = self.server.received[0]
+        header = parse_authorization_header(headers['Authorization'])
+        self.assertGreaterEqual(header.created, int(started))
+        self.assertNotEqual(json.loads(body)['message']['timestamp'], requests[0]['body']['message']['timestamp'])
+        digest = Cryptographer.digest(HashingAlgorithm.BLAKE2B, body)
+        public_key = requests[0]['body']['message']['entity']['key_pair']['signing_public_key']
+        self.assertTrue(Cryptographer(public_key, 'ED25519').verify_signature(
+            header.signature, signing_string(header.created, header.expires, digest)
+        ))
+
+    def test_connection_errors(self):
+        request = signed_request(SyntheticRegistry().subscriber(0))
+        report = asyncio.run(LoadDriver('http://127.0.0.1:1', rate=50, timeout=1).run([request] * 2))
+        self.assertEqual(report.errors, {'ConnectError': 2})
+        self.assertEqual(len(report.histogram), 2)
@@ -0,0 +1,63 @@
+import pytest
+from django.test import SimpleTestCase
+from .suite import *
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('name', sorted(BENCHMARKS))
+def test_benchmark(name, bench):
+    bench(name)
+
+
+def results(**medians: float) -> dict:
+    return {'benchmarks': {name.replace('_', '.', 1): {'median_us': median} for name, median in medians.items()}}
+
+
+class TestCompare(SimpleTestCase):
+
+    def test_statuses(self):
+        comparisons = compare(
+            results(crypto_verify=120.0, crypto_digest=80.0, lookup_filters=1050.0, lookup_view=900.0),
+            results(crypto_verify=100.0, crypto_digest=100.0, lookup_filters=1000.0, serializers_create=5.0),
+            threshold=0.1
+        )
+        self.assertEqual({comparison.name: comparison.status for comparison in comparisons}, {
+            'crypto.verify': Comparison.REGRESSION,
+            'crypto.digest': Comparison.IMPROVEMENT,
+            'lookup.filters': Comparison.UNCHANGED,
+            'lookup.view': Comparison.NEW,
+            'serializers.create': Comparison.MISSING,
+        })
+        self.assertEqual([comparison.name for comparison in regressions(comparisons)], ['crypto.verify'])
+
+    def test_threshold(self):
+        self.assertFalse(regressions(compare(results(crypto_verify=120.0), results(crypto_verify=100.0), 0.25)))
+
+    def test_refuses_other_dataset_sizes(self):
+        small, large = results(crypto_verify=100.0), results(crypto_verify=1000.0)
+        small['meta'] = new_results(get_dataset('small'), 'small')['meta']
+        large['meta'] = new_results(get_dataset('large'), 'large')['meta']
+        with self.assertRaises(BaselineMismatch):
+            compare(large, small)
+        # Only the sizes count, not the name they were given
+        large['meta'] = new_results(get_dataset('small'), 'custom')['meta']
+        self.assertEqual(len(regressions(compare(large, small))), 1)
+
+    def test_measure(self):
+        calls = []
+        result = measure(lambda: calls.append(1), rounds=3, min_time=0.001)
+        self.assertEqual(result['rounds'], 3)
+        # Warm up, the calibration rounds and 2 more rounds
+        self.assertEqual(len(calls), 1 + (2 * result['iterations'] - 1) + 2 * result['iterations'])
+        self.assertGreater(result['ops_per_second'], 0)
+
+    def test_select(self):
+        self.assertTrue(all(entry.group == CRYPTO for entry in select(groups=[CRYPTO])))
+        self.assertEqual([entry.name for entry in select(names=['lookup.view'])], ['lookup.view'])
+        self.assertEqual(len(select()), len(BENCHMARKS))
+        with self.assertRaises(KeyError):
+            select(names=['crypto.unknown'])
+
+    def test_dataset_overrides(self):
+        dataset = get_dataset('medium', participants=500, keys=None)
+        self.assertEqual((dataset.participants, dataset.keys), (500, DATASETS['medium'].keys))
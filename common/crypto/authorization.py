@@ -0,0 +1,115 @@
+import base64
+import re
+from dataclasses import dataclass
+
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+from common.crypto.constants import SigningAlgorithm
+from common.crypto.digest import Digest
+from common.crypto.exception import AuthorizationExpired, InvalidAuthorizationHeader
+
+
+SIGNED_HEADERS = "(created) (expires) digest"
+DIGEST_PREFIX = "BLAKE-512="
+
+_PARAMETER = re.compile(r'(\w+)="([^"]*)"')
+_REQUIRED_PARAMETERS = ("keyId", "algorithm", "created", "expires", "signature")
+_ALGORITHMS = {
+    "ed25519": SigningAlgorithm.ED25519.value,
+    "ed448": SigningAlgorithm.ED448.value,
+}
+
+
+@dataclass(frozen=True, slots=True)
+class AuthorizationHeader:
+    subscriber_id: str
+    unique_key_id: str
+    algorithm: str
+    created: int
+    expires: int
+    headers: str
+    signature: str
+
+    @property
+    def key_id(self) -> str:
+        return f"{self.subscriber_id}|{self.unique_key_id}|{self.algorithm.lower()}"
+
+    def check_window(self, now: int, clock_skew: int = 0) -> None:
+        """
+        Rejects headers outside of their (created, expires) window, this must
+        run before any key lookup or crypto.
+        """
+        if self.created - clock_skew > now or self.expires + clock_skew < now:
+            raise AuthorizationExpired(self.created, self.expires, now)
+
+
+def parse_authorization_header(header: str) -> AuthorizationHeader:
+    """
+    Parses a Beckn authorization header of the form
+    Signature keyId="{subscriber_id}|{unique_key_id}|{algorithm}",algorithm="ed25519",
+    created="...",expires="...",headers="(created) (expires) digest",signature="..."
+    """
+    if not header:
+        raise InvalidAuthorizationHeader("header is missing")
+    scheme, _, parameters = header.strip().partition(" ")
+    if scheme != "Signature":
+        raise InvalidAuthorizationHeader(f"unsupported scheme {scheme}")
+    values = dict(_PARAMETER.findall(parameters))
+    missing = [name for name in _REQUIRED_PARAMETERS if name not in values]
+    if missing:
+        raise InvalidAuthorizationHeader(f"missing {', '.join(missing)}")
+    try:
+        subscriber_id, unique_key_id, key_algorithm = values["keyId"].split("|")
+    except ValueError:
+        raise InvalidAuthorizationHeader("keyId must be subscriber_id|unique_key_id|algorithm")
+    algorithm = _ALGORITHMS.get(values["algorithm"].lower())
+    if algorithm is None or key_algorithm.lower() != values["algorithm"].lower():
+        raise InvalidAuthorizationHeader(f"unsupported algorithm {values['algorithm']}")
+    headers = values.get("headers", SIGNED_HEADERS)
+    if headers != SIGNED_HEADERS:
+        raise InvalidAuthorizationHeader(f"signed headers must be {SIGNED_HEADERS}")
+    try:
+        created, expires = int(values["created"]), int(values["expires"])
+    except ValueError:
+        raise InvalidAuthorizationHeader("created and expires must be unix timestamps")
+    if expires < created:
+        raise InvalidAuthorizationHeader("expires is lower than created")
+    return AuthorizationHeader(
+        subscriber_id=subscriber_id,
+        unique_key_id=unique_key_id,
+        algorithm=algorithm,
+        created=created,
+        expires=expires,
+        headers=headers,
+        signature=values["signature"],
+    )
+
+
+def signing_string(created: int, expires: int, digest: str) -> str:
+    """
+    Builds the Beckn signing string, digest is the base64 BLAKE2b-512 of the body
+    """
+    return f"(created): {created}\n(expires): {expires}\ndigest: {DIGEST_PREFIX}{digest}"
+
+
+def build_authorization_header(subscriber_id: str, unique_key_id: str, algorithm: str,
+                               created: int, expires: int, signature: str) -> str:
+    algorithm = algorithm.lower()
+    return (
+        f'Signature keyId="{subscriber_id}|{unique_key_id}|{algorithm}",'
+        f'algorithm="{algorithm}",created="{created}",expires="{expires}",'
+        f'headers="{SIGNED_HEADERS}",signature="{signature}"'
+    )
+
+
+def sign_authorization_header(private_key: ed25519.Ed25519PrivateKey, subscriber_id: str, unique_key_id: str,
+                              body: bytes, created: int, expires: int) -> str:
+    """
+    Authorization header a network participant sends with body, signed
+    with its Ed25519 signing key
+    """
+    digest = Digest().update(body).b64digest()
+    signature = private_key.sign(signing_string(created, expires, digest).encode())
+    return build_authorization_header(
+        subscriber_id, unique_key_id, "ed25519", created, expires, base64.b64encode(signature).decode()
+    )
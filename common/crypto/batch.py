@@ -0,0 +1,234 @@
+import base64
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+from cryptography.exceptions import InvalidSignature
+
+from common.crypto.constants import EncryptionAlgorithm, SigningAlgorithm
+from common.crypto.exception import CryptographicOperationNotSupportedForAlgorithm
+from common.crypto.main import Cryptographer
+
+
+class SignatureCheck(NamedTuple):
+    public_key: str
+    signature: str
+    message: str
+    algo: str = SigningAlgorithm.ED25519.value
+
+
+class EncryptionJob(NamedTuple):
+    public_key: str
+    message: str | bytes
+    algo: str = EncryptionAlgorithm.X25519.value
+
+
+# [(input index, public key, algo, signature, message), ...] ordered by key
+_Chunk = list[tuple[int, str, str, str, str]]
+# [(input index, public key, algo, message), ...] ordered by key
+_EncryptionChunk = list[tuple[int, str, str, str | bytes]]
+
+
+def _verify_chunk(chunk: _Chunk) -> list[tuple[int, bool]]:
+    # Runs inside the pool, checks of the same key are adjacent so every key
+    # is parsed once per chunk (and served from the process key cache after)
+    results = []
+    loaded: tuple[str, str] | None = None
+    key = None
+    for index, public_key, algo, signature, message in chunk:
+        if loaded != (public_key, algo):
+            loaded = (public_key, algo)
+            try:
+                key = Cryptographer.load_signing_key(public_key, algo)
+            except ValueError:
+                key = None
+        if key is None:
+            results.append((index, False))
+            continue
+        try:
+            key.verify(Cryptographer.bytes_from_encoded(signature), message.encode())
+            results.append((index, True))
+        except (InvalidSignature, ValueError):
+            results.append((index, False))
+    return results
+
+
+def _encrypt_chunk(chunk: _EncryptionChunk) -> list[tuple[int, str | None]]:
+    # Runs inside the pool, jobs of the same key are adjacent so every sealed
+    # box is built once per chunk (and served from the process key cache after)
+    results = []
+    loaded: tuple[str, str] | None = None
+    key = None
+    for index, public_key, algo, message in chunk:
+        if loaded != (public_key, algo):
+            loaded = (public_key, algo)
+            try:
+                key = Cryptographer.load_encryption_key(public_key, algo)
+            except ValueError:
+                key = None
+        if key is None:
+            results.append((index, None))
+            continue
+        if isinstance(message, str):
+            message = message.encode()
+        results.append((index, base64.b64encode(key.encrypt(message)).decode()))
+    return results
+
+
+class _BatchPool:
+    """
+    Thread or process pool shared by the batch operations, small batches run
+    inline. Items are grouped by key before chunking.
+    """
+
+    THREAD = "thread"
+    PROCESS = "process"
+
+    def __init__(self, mode: str = THREAD, max_workers: int | None = None,
+                 chunk_size: int = 256, inline_threshold: int = 64) -> None:
+        if mode not in (self.THREAD, self.PROCESS):
+            raise ValueError(f"Unknown pool mode {mode}")
+        self.mode = mode
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.inline_threshold = inline_threshold
+        self._executor: Executor | None = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            pool_class = ThreadPoolExecutor if self.mode == self.THREAD else ProcessPoolExecutor
+            self._executor = pool_class(max_workers=self.max_workers)
+        return self._executor
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def split(self, groups: Iterable[list]) -> list[list]:
+        ordered = [entry for group in groups for entry in group]
+        return [ordered[start:start + self.chunk_size] for start in range(0, len(ordered), self.chunk_size)]
+
+    def run(self, worker: Callable[[list], list], count: int, chunks: list[list]) -> Iterator[tuple]:
+        if count <= self.inline_threshold:
+            for chunk in chunks:
+                yield from worker(chunk)
+            return
+        futures = [self.executor.submit(worker, chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+class BatchVerifier(_BatchPool):
+    """
+    Verifies many (public_key, signature, message[, algo]) checks at once.
+    Checks are grouped by key and algorithm so that every key is parsed once
+    per chunk, and fixed size chunks are fanned out over a thread or process
+    pool.
+    OpenSSL releases the GIL while verifying so threads scale with cores.
+    Malformed keys or signatures verify as False instead of aborting the batch.
+    """
+
+    def __enter__(self) -> "BatchVerifier":
+        return self
+
+    def chunks(self, checks: Iterable[SignatureCheck | tuple]) -> tuple[int, list[_Chunk]]:
+        groups: dict[tuple[str, str], list[tuple[int, str, str, str, str]]] = {}
+        count = 0
+        for index, item in enumerate(checks):
+            check = item if isinstance(item, SignatureCheck) else SignatureCheck(*item)
+            algo = check.algo.upper()
+            if algo not in SigningAlgorithm.__members__.keys():
+                raise CryptographicOperationNotSupportedForAlgorithm(
+                    f"{algo} does not support signature verification"
+                )
+            groups.setdefault((check.public_key, algo), []).append(
+                (index, check.public_key, algo, check.signature, check.message)
+            )
+            count += 1
+        return count, self.split(groups.values())
+
+    def iter_verify(self, checks: Iterable[SignatureCheck | tuple]) -> Iterator[tuple[int, bool]]:
+        """
+        Yields (input index, result) pairs as soon as their chunk finishes.
+        """
+        count, chunks = self.chunks(checks)
+        return self.run(_verify_chunk, count, chunks)
+
+    def verify(self, checks: Iterable[SignatureCheck | tuple]) -> list[bool]:
+        """
+        Returns the results in input order.
+        """
+        checks = list(checks)
+        results = [False] * len(checks)
+        for index, result in self.iter_verify(checks):
+            results[index] = result
+        return results
+
+
+def verify_many(checks: Iterable[SignatureCheck | tuple], mode: str = BatchVerifier.THREAD,
+                max_workers: int | None = None) -> list[bool]:
+    with BatchVerifier(mode=mode, max_workers=max_workers) as verifier:
+        return verifier.verify(checks)
+
+
+class BatchEncryptor(_BatchPool):
+    """
+    Seals many (public_key, message[, algo]) jobs at once and returns their
+    base64 output. Jobs are grouped by key so that every key's sealed box is
+    built once per chunk, and every worker keeps the boxes it built in its
+    key cache for the next chunks. Sealing draws a fresh ephemeral key per
+    message, which dominates the cost, so the chunks default to a process
+    pool. Malformed keys give None instead of aborting the batch.
+    """
+
+    def __init__(self, mode: str = _BatchPool.PROCESS, max_workers: int | None = None,
+                 chunk_size: int = 256, inline_threshold: int = 64) -> None:
+        super().__init__(mode, max_workers, chunk_size, inline_threshold)
+
+    def __enter__(self) -> "BatchEncryptor":
+        return self
+
+    def chunks(self, jobs: Iterable[EncryptionJob | tuple]) -> tuple[int, list[_EncryptionChunk]]:
+        groups: dict[tuple[str, str], _EncryptionChunk] = {}
+        count = 0
+        for index, item in enumerate(jobs):
+            job = item if isinstance(item, EncryptionJob) else EncryptionJob(*item)
+            algo = job.algo.upper()
+            if algo not in EncryptionAlgorithm.__members__.keys():
+                raise CryptographicOperationNotSupportedForAlgorithm(
+                    f"{algo} does not support message encryption"
+                )
+            groups.setdefault((job.public_key, algo), []).append((index, job.public_key, algo, job.message))
+            count += 1
+        return count, self.split(groups.values())
+
+    def iter_encrypt(self, jobs: Iterable[EncryptionJob | tuple]) -> Iterator[tuple[int, str | None]]:
+        """
+        Yields (input index, base64 output) pairs as soon as their chunk finishes.
+        """
+        count, chunks = self.chunks(jobs)
+        return self.run(_encrypt_chunk, count, chunks)
+
+    def encrypt(self, jobs: Iterable[EncryptionJob | tuple]) -> list[str | None]:
+        """
+        Returns the base64 outputs in input order.
+        """
+        jobs = list(jobs)
+        results: list[str | None] = [None] * len(jobs)
+        for index, result in self.iter_encrypt(jobs):
+            results[index] = result
+        return results
+
+
+def encrypt_many(jobs: Iterable[EncryptionJob | tuple], mode: str = BatchEncryptor.PROCESS,
+                 max_workers: int | None = None) -> list[str | None]:
+    with BatchEncryptor(mode=mode, max_workers=max_workers) as encryptor:
+        return encryptor.encrypt(jobs)
@@ -0,0 +1,102 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Callable, Hashable
+
+
+@dataclass(frozen=True)
+class KeyCacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    maxsize: int
+
+
+class KeyCache:
+    """
+    Size bounded LRU cache of parsed public keys, keyed by the base64
+    encoded key and the algorithm it was loaded for.
+    """
+
+    DEFAULT_MAXSIZE = 4096
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE) -> None:
+        if maxsize < 1:
+            raise ValueError("maxsize must be a positive integer")
+        self.maxsize = maxsize
+        self._entries: OrderedDict[tuple[str, str], Any] = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get_or_load(self, public_key: str, algo: str, loader: Callable[[], Any]) -> Any:
+        key = (public_key, algo)
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+        # Parse outside of the lock, a duplicate parse on a race is harmless
+        value = loader()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._evict()
+        return value
+
+    def invalidate(self, public_key: str, algo: str | None = None) -> int:
+        """
+        Drops the cached entries of a (rotated) key. Without an algo all
+        the algorithms the key was loaded for are dropped.
+        Returns the number of removed entries.
+        """
+        with self._lock:
+            if algo is not None:
+                return 1 if self._entries.pop((public_key, algo), None) is not None else 0
+            keys = [key for key in self._entries if key[0] == public_key]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def resize(self, maxsize: int) -> None:
+        if maxsize < 1:
+            raise ValueError("maxsize must be a positive integer")
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    @property
+    def stats(self) -> KeyCacheStats:
+        return KeyCacheStats(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            size=len(self._entries),
+            maxsize=self.maxsize,
+        )
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+# Process wide cache shared by every Cryptographer
+key_cache = KeyCache()
@@ -0,0 +1,92 @@
+import base64
+from typing import AsyncIterable, BinaryIO, Iterable
+
+from cryptography.hazmat.primitives import hashes
+
+from common.crypto.constants import HashingAlgorithm
+from common.crypto.exception import CryptographyAlgorithmNotSupported
+
+
+HashingAlgorithmHandlers = {
+    HashingAlgorithm.BLAKE2B.value: hashes.BLAKE2b
+}
+
+# Digest size in bytes, BLAKE2b-512 as required for the Beckn digest header
+DIGEST_SIZE = 64
+DEFAULT_BLOCK_SIZE = 64 * 1024
+
+BytesLike = bytes | bytearray | memoryview
+
+
+class Digest:
+    """
+    Incremental digest of a request body. Chunks are handed to OpenSSL
+    through the buffer protocol, so bytes, bytearray and memoryview chunks
+    (e.g. the ASGI http.request body) are hashed without being copied.
+    """
+
+    def __init__(self, algo: HashingAlgorithm = HashingAlgorithm.BLAKE2B) -> None:
+        try:
+            algorithm = HashingAlgorithmHandlers[algo.value]
+        except KeyError:
+            raise CryptographyAlgorithmNotSupported(algo.value)
+        self.algo = algo
+        self._hash = hashes.Hash(algorithm(DIGEST_SIZE))
+        self._value: bytes | None = None
+        self.length = 0
+
+    def update(self, chunk: BytesLike) -> "Digest":
+        if self._value is not None:
+            raise ValueError("Digest has already been finalized")
+        if chunk:
+            self._hash.update(chunk)
+            self.length += len(chunk)
+        return self
+
+    def digest(self) -> bytes:
+        if self._value is None:
+            self._value = self._hash.finalize()
+        return self._value
+
+    def b64digest(self) -> str:
+        return base64.b64encode(self.digest()).decode()
+
+
+def digest_chunks(chunks: Iterable[BytesLike], algo: HashingAlgorithm = HashingAlgorithm.BLAKE2B) -> str:
+    digest = Digest(algo)
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.b64digest()
+
+
+async def adigest_chunks(chunks: AsyncIterable[BytesLike],
+                         algo: HashingAlgorithm = HashingAlgorithm.BLAKE2B) -> str:
+    digest = Digest(algo)
+    async for chunk in chunks:
+        digest.update(chunk)
+    return digest.b64digest()
+
+
+def digest_file(file: BinaryIO, algo: HashingAlgorithm = HashingAlgorithm.BLAKE2B,
+                block_size: int = DEFAULT_BLOCK_SIZE) -> str:
+    """
+    Hashes a binary file like object in fixed size blocks. A single buffer is
+    reused when the file supports readinto, keeping peak memory at block_size.
+    """
+    digest = Digest(algo)
+    if hasattr(file, "readinto"):
+        buffer = bytearray(block_size)
+        view = memoryview(buffer)
+        while True:
+            read = file.readinto(view)
+            if not read:
+                break
+            digest.update(view[:read])
+    else:
+        while True:
+            block = file.read(block_size)
+            if not block:
+                break
+            digest.update(block)
+    return digest.b64digest()
+
@@ -12,4 +12,19 @@ class CryptographicOperationNotSupportedForAlgorithm(Exception):
 
 class CryptographyAlgorithmNotSupported(Exception):
     def __init__(self, algo: str) -> None:
-        super().__init__(f"{algo} is not  supported")
\ No newline at end of file
+        super().__init__(f"{algo} is not  supported")
+
+class AuthorizationError(Exception):
+    ...
+
+class InvalidAuthorizationHeader(AuthorizationError):
+    def __init__(self, reason: str) -> None:
+        super().__init__(f"Invalid authorization header, {reason}")
+
+class AuthorizationExpired(AuthorizationError):
+    def __init__(self, created: int, expires: int, now: int) -> None:
+        super().__init__(f"Authorization window {created}-{expires} does not include {now}")
+
+class SignatureVerificationFailed(AuthorizationError):
+    def __init__(self, key_id: str) -> None:
+        super().__init__(f"Signature could not be verified for {key_id}")
@@ -0,0 +1,51 @@
+from threading import Lock
+from time import perf_counter
+from typing import Callable
+
+
+Observer = Callable[[str, float, float], None]
+
+# Called with (operation, started, seconds) after every timed operation, started is a
+# perf_counter() value. Replaced as a whole so timed never sees it change midway
+_observers: tuple[Observer, ...] = ()
+_lock = Lock()
+
+
+def add_observer(observer: Observer) -> None:
+    """
+    Installs a function receiving every Cryptographer operation (verify,
+    encrypt, digest, load_key) with its start and duration.
+    """
+    global _observers
+    with _lock:
+        if observer not in _observers:
+            _observers = _observers + (observer,)
+
+
+def remove_observer(observer: Observer) -> None:
+    global _observers
+    with _lock:
+        _observers = tuple(installed for installed in _observers if installed != observer)
+
+
+class timed:
+    """
+    Times the enclosed block for the installed observers, costs one global
+    lookup when none is installed.
+    """
+    __slots__ = ("operation", "started")
+
+    def __init__(self, operation: str) -> None:
+        self.operation = operation
+        self.started = None
+
+    def __enter__(self) -> None:
+        if _observers:
+            self.started = perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        if self.started is None:
+            return
+        seconds = perf_counter() - self.started
+        for observer in _observers:
+            observer(self.operation, self.started, seconds)
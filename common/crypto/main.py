@@ -8,6 +8,9 @@ from cryptography.hazmat.primitives.asymmetric import ed25519, ed448
 from cryptography.exceptions import InvalidSignature
 
 from common.crypto.x25519 import X25519PublicKey
+from common.crypto.cache import key_cache
+from common.crypto.digest import Digest, HashingAlgorithmHandlers
+from common.crypto.hooks import timed
 
 from common.crypto.constants import EncryptionAlgorithm, HashingAlgorithm, SigningAlgorithm
 from common.crypto.exception import *
@@ -26,10 +29,6 @@ EncryptionAlgorithmHandlers = {
     EncryptionAlgorithm.X25519.value: X25519PublicKey
 }
 
-HashingAlgorithmHandlers = {
-    HashingAlgorithm.BLAKE2B.value: hashes.BLAKE2b
-}
-
 
 
 
@@ -42,23 +41,40 @@ class Cryptographer:
     def bytes_from_encoded(_string: str) -> bytes:
         return base64.b64decode(_string)
     
+    @staticmethod
+    def parse_key(algorithm, public_key: str):
+        with timed("load_key"):
+            return algorithm.from_public_bytes(Cryptographer.bytes_from_encoded(public_key))
+
     @staticmethod
     def load_signing_key(public_key: str, algo: str) -> SigningPublicKey:
-        public_bytes = Cryptographer.bytes_from_encoded(public_key)
         try:
             algorithm = SigningAlgorithmHandlers[algo.upper()]
-            return algorithm.from_public_bytes(public_bytes)
         except KeyError:
             raise SigningAlgorithmNotSupported(algo)
+        return key_cache.get_or_load(
+            public_key, algo.upper(),
+            lambda: Cryptographer.parse_key(algorithm, public_key)
+        )
     
     @staticmethod
     def load_encryption_key(public_key: str, algo: str) -> EncryptionPublicKey:
-        public_bytes = Cryptographer.bytes_from_encoded(public_key)
         try:
             algorithm = EncryptionAlgorithmHandlers[algo.upper()]
-            return algorithm.from_public_bytes(public_bytes)  
         except KeyError:
             raise EncryptionAlgorithmNotSupported(algo)
+        return key_cache.get_or_load(
+            public_key, algo.upper(),
+            lambda: Cryptographer.parse_key(algorithm, public_key)
+        )
+
+    """
+    Drops the parsed key from the process wide key cache, must be called
+    when a subscriber rotates its keys.
+    """
+    @staticmethod
+    def invalidate_key(public_key: str, algo: str | None = None) -> int:
+        return key_cache.invalidate(public_key, algo.upper() if algo else None)
     
     def __init__(self, public_key: str, algo: str) -> None:
         self.algo = algo.upper()
@@ -78,11 +94,32 @@ class Cryptographer:
             raise CryptographicOperationNotSupportedForAlgorithm(
                 f"{self.algo} does not support signature verification"
             )
-        try:
-            self.public_key.verify(Cryptographer.bytes_from_encoded(signature), message.encode())
-            return True
-        except InvalidSignature:
-            return False
+        with timed("verify"):
+            try:
+                self.public_key.verify(Cryptographer.bytes_from_encoded(signature), message.encode())
+                return True
+            except InvalidSignature:
+                return False
+    """
+    Verifies many (public_key, signature, message[, algo]) checks at once
+    over a thread or process pool and returns the results in input order.
+    See common.crypto.batch.BatchVerifier to reuse the pool or stream results.
+    """
+    @staticmethod
+    def verify_many(checks, mode: str = "thread", max_workers: int | None = None) -> list[bool]:
+        from common.crypto.batch import verify_many
+        return verify_many(checks, mode=mode, max_workers=max_workers)
+
+    """
+    Seals many (public_key, message[, algo]) jobs at once over a process or
+    thread pool and returns the base64 outputs in input order, None for
+    malformed keys. See common.crypto.batch.BatchEncryptor to reuse the pool.
+    """
+    @staticmethod
+    def encrypt_many(jobs, mode: str = "process", max_workers: int | None = None) -> list[str | None]:
+        from common.crypto.batch import encrypt_many
+        return encrypt_many(jobs, mode=mode, max_workers=max_workers)
+
     """
     Encrypts plain text message and returns base64 encoded string.
     The encryption uses OAEP padding with SHA256 algorithm
@@ -92,20 +129,23 @@ class Cryptographer:
             raise CryptographicOperationNotSupportedForAlgorithm(
                 f"{self.algo} does not support message encryption"
             )
-        return base64.b64encode(
-            self.public_key.encrypt(
-                message.encode()
-            )
-        ).decode()
+        with timed("encrypt"):
+            return base64.b64encode(
+                self.public_key.encrypt(
+                    message.encode()
+                )
+            ).decode()
     
     """
-    Returns base64 encoded hash
+    Returns base64 encoded hash. Raw bodies should be passed as bytes, large
+    or streamed bodies should use common.crypto.digest.Digest instead
     """
     @staticmethod
-    def digest(algo: HashingAlgorithm, message: str) -> str:
-        digest = hashes.Hash(HashingAlgorithmHandlers[algo.value](64))
-        digest.update(message.encode())
-        return base64.b64encode(digest.finalize()).decode()
+    def digest(algo: HashingAlgorithm, message: str | bytes | memoryview) -> str:
+        if isinstance(message, str):
+            message = message.encode()
+        with timed("digest"):
+            return Digest(algo).update(message).b64digest()
         
 
     
@@ -0,0 +1,62 @@
+from unittest import TestCase
+from .authorization import *
+from .exception import *
+from .constants import HashingAlgorithm
+from .main import Cryptographer
+
+
+class TestParseAuthorizationHeader(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.header = build_authorization_header(
+            "sit.grab.in", "27baa06d-f90a-486c-85e5-cc621b787f04", "ed25519",
+            1641287875, 1641291475, "c2lnbmF0dXJl"
+        )
+
+    def test_parse_pass(self):
+        parsed = parse_authorization_header(self.header)
+        self.assertEqual(parsed.subscriber_id, "sit.grab.in")
+        self.assertEqual(parsed.unique_key_id, "27baa06d-f90a-486c-85e5-cc621b787f04")
+        self.assertEqual(parsed.algorithm, SigningAlgorithm.ED25519.value)
+        self.assertEqual((parsed.created, parsed.expires), (1641287875, 1641291475))
+        self.assertEqual(parsed.signature, "c2lnbmF0dXJl")
+        self.assertEqual(parsed.key_id, "sit.grab.in|27baa06d-f90a-486c-85e5-cc621b787f04|ed25519")
+
+    def test_parse_fail(self):
+        for header in [
+            "",
+            self.header.replace("Signature", "Bearer"),
+            self.header.replace('signature="c2lnbmF0dXJl"', ""),
+            self.header.replace("sit.grab.in|", ""),
+            self.header.replace('algorithm="ed25519"', 'algorithm="rsa"'),
+            self.header.replace('created="1641287875"', 'created="yesterday"'),
+            self.header.replace('created="1641287875"', 'created="1641291476"'),
+            self.header.replace("(created) (expires) digest", "digest"),
+        ]:
+            self.assertRaises(InvalidAuthorizationHeader, parse_authorization_header, header)
+
+    def test_window(self):
+        parsed = parse_authorization_header(self.header)
+        parsed.check_window(1641287875)
+        parsed.check_window(1641291475)
+        parsed.check_window(1641287870, clock_skew=5)
+        self.assertRaises(AuthorizationExpired, parsed.check_window, 1641287874)
+        self.assertRaises(AuthorizationExpired, parsed.check_window, 1641291476)
+
+    def test_signing_string(self):
+        self.assertEqual(
+            signing_string(1641287875, 1641291475, "abc="),
+            "(created): 1641287875\n(expires): 1641291475\ndigest: BLAKE-512=abc="
+        )
+
+    def test_sign(self):
+        private_key = ed25519.Ed25519PrivateKey.generate()
+        public_key = base64.b64encode(private_key.public_key().public_bytes_raw()).decode()
+        body = b'{"context": {"action": "subscribe"}}'
+        parsed = parse_authorization_header(
+            sign_authorization_header(private_key, "sit.grab.in", "key-1", body, 1641287875, 1641291475)
+        )
+        self.assertEqual(parsed.key_id, "sit.grab.in|key-1|ed25519")
+        message = signing_string(parsed.created, parsed.expires, Cryptographer.digest(HashingAlgorithm.BLAKE2B, body))
+        self.assertTrue(Cryptographer(public_key, "ED25519").verify_signature(parsed.signature, message))
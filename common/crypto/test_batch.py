@@ -0,0 +1,138 @@
+from unittest import TestCase
+from .batch import BatchEncryptor, BatchVerifier, EncryptionJob, SignatureCheck
+from .main import *
+from .exception import *
+
+import base64
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, ed448
+from nacl.public import PrivateKey, SealedBox
+
+
+def serialize_public_key(public_key: ed25519.Ed25519PublicKey | ed448.Ed448PublicKey) -> str:
+    public_bytes = public_key.public_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PublicFormat.Raw
+    )
+    return base64.b64encode(public_bytes).decode()
+
+
+def signed_checks(count: int, keys: int = 3) -> tuple[list[SignatureCheck], list[bool]]:
+    private_keys = [ed25519.Ed25519PrivateKey.generate() for _ in range(keys)]
+    checks, expected = [], []
+    for index in range(count):
+        private_key = private_keys[index % keys]
+        message = f"message {index}"
+        signature = base64.b64encode(private_key.sign(message.encode())).decode()
+        valid = index % 5 != 0
+        checks.append(SignatureCheck(
+            serialize_public_key(private_key.public_key()),
+            signature,
+            message if valid else message + "tampered",
+        ))
+        expected.append(valid)
+    return checks, expected
+
+
+class TestBatchVerifier(TestCase):
+
+    def test_results_in_input_order_inline(self):
+        checks, expected = signed_checks(20)
+        self.assertEqual(Cryptographer.verify_many(checks), expected)
+
+    def test_results_in_input_order_thread_pool(self):
+        checks, expected = signed_checks(300)
+        with BatchVerifier(max_workers=4, chunk_size=16, inline_threshold=0) as verifier:
+            self.assertEqual(verifier.verify(checks), expected)
+
+    def test_results_in_input_order_process_pool(self):
+        checks, expected = signed_checks(100)
+        with BatchVerifier(mode=BatchVerifier.PROCESS, max_workers=2, chunk_size=32,
+                           inline_threshold=0) as verifier:
+            self.assertEqual(verifier.verify(checks), expected)
+
+    def test_iter_verify_streams_every_index(self):
+        checks, expected = signed_checks(100)
+        with BatchVerifier(max_workers=2, chunk_size=10, inline_threshold=0) as verifier:
+            streamed = dict(verifier.iter_verify(checks))
+        self.assertEqual(sorted(streamed), list(range(100)))
+        self.assertEqual([streamed[index] for index in range(100)], expected)
+
+    def test_mixed_algorithms_and_plain_tuples(self):
+        ed448_key = ed448.Ed448PrivateKey.generate()
+        ed25519_key = ed25519.Ed25519PrivateKey.generate()
+        checks = [
+            (serialize_public_key(ed448_key.public_key()),
+             base64.b64encode(ed448_key.sign(b"a")).decode(), "a", "ed448"),
+            (serialize_public_key(ed25519_key.public_key()),
+             base64.b64encode(ed25519_key.sign(b"b")).decode(), "b"),
+        ]
+        self.assertEqual(Cryptographer.verify_many(checks), [True, True])
+
+    def test_malformed_input_is_false(self):
+        checks, _ = signed_checks(2)
+        checks = [
+            checks[0]._replace(public_key="AAAA"),
+            checks[1]._replace(signature="not base64!"),
+        ]
+        self.assertEqual(Cryptographer.verify_many(checks), [False, False])
+
+    def test_unsupported_algorithm_raises(self):
+        checks, _ = signed_checks(1)
+        self.assertRaises(
+            CryptographicOperationNotSupportedForAlgorithm,
+            Cryptographer.verify_many,
+            [checks[0]._replace(algo=EncryptionAlgorithm.X25519.value)]
+        )
+
+
+def encryption_jobs(count: int, keys: int = 3) -> tuple[list[EncryptionJob], list[SealedBox]]:
+    private_keys = [PrivateKey.generate() for _ in range(keys)]
+    jobs, boxes = [], []
+    for index in range(count):
+        private_key = private_keys[index % keys]
+        jobs.append(EncryptionJob(base64.b64encode(bytes(private_key.public_key)).decode(), f"challenge {index}"))
+        boxes.append(SealedBox(private_key))
+    return jobs, boxes
+
+
+class TestBatchEncryptor(TestCase):
+
+    def assertOpens(self, outputs: list[str | None], jobs: list[EncryptionJob], boxes: list[SealedBox]) -> None:
+        self.assertEqual(len(outputs), len(jobs))
+        for output, job, box in zip(outputs, jobs, boxes):
+            self.assertEqual(box.decrypt(base64.b64decode(output)).decode(), job.message)
+
+    def test_results_in_input_order_inline(self):
+        jobs, boxes = encryption_jobs(20)
+        self.assertOpens(Cryptographer.encrypt_many(jobs), jobs, boxes)
+
+    def test_results_in_input_order_thread_pool(self):
+        jobs, boxes = encryption_jobs(300)
+        with BatchEncryptor(mode=BatchEncryptor.THREAD, max_workers=4, chunk_size=16,
+                            inline_threshold=0) as encryptor:
+            self.assertOpens(encryptor.encrypt(jobs), jobs, boxes)
+
+    def test_results_in_input_order_process_pool(self):
+        jobs, boxes = encryption_jobs(100)
+        with BatchEncryptor(max_workers=2, chunk_size=32, inline_threshold=0) as encryptor:
+            self.assertOpens(encryptor.encrypt(jobs), jobs, boxes)
+
+    def test_bytes_and_plain_tuples(self):
+        jobs, boxes = encryption_jobs(1)
+        output, = Cryptographer.encrypt_many([(jobs[0].public_key, b"raw", "x25519")])
+        self.assertEqual(boxes[0].decrypt(base64.b64decode(output)), b"raw")
+
+    def test_malformed_key_is_none(self):
+        jobs, _ = encryption_jobs(2)
+        outputs = Cryptographer.encrypt_many([jobs[0]._replace(public_key="AAAA"), jobs[1]])
+        self.assertIsNone(outputs[0])
+        self.assertIsNotNone(outputs[1])
+
+    def test_unsupported_algorithm_raises(self):
+        jobs, _ = encryption_jobs(1)
+        self.assertRaises(
+            CryptographicOperationNotSupportedForAlgorithm,
+            Cryptographer.encrypt_many,
+            [jobs[0]._replace(algo=SigningAlgorithm.ED25519.value)]
+        )
@@ -0,0 +1,96 @@
+from unittest import TestCase
+from .cache import KeyCache, key_cache
+from .main import *
+from .exception import *
+
+import base64
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+from nacl.public import PrivateKey
+
+
+def serialize_public_key(public_key: ed25519.Ed25519PublicKey) -> str:
+    public_bytes = public_key.public_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PublicFormat.Raw
+    )
+    return base64.b64encode(public_bytes).decode()
+
+
+class TestKeyCache(TestCase):
+
+    def test_lru_eviction(self):
+        cache = KeyCache(maxsize=2)
+        cache.get_or_load("a", "ED25519", lambda: 1)
+        cache.get_or_load("b", "ED25519", lambda: 2)
+        # Touch "a" so that "b" becomes the least recently used entry
+        cache.get_or_load("a", "ED25519", lambda: 10)
+        cache.get_or_load("c", "ED25519", lambda: 3)
+        self.assertIn(("a", "ED25519"), cache)
+        self.assertNotIn(("b", "ED25519"), cache)
+        self.assertEqual(cache.stats.evictions, 1)
+        self.assertEqual(cache.stats.hits, 1)
+        self.assertEqual(cache.stats.misses, 3)
+
+    def test_invalidate_all_algorithms(self):
+        cache = KeyCache()
+        cache.get_or_load("a", "ED25519", lambda: 1)
+        cache.get_or_load("a", "X25519", lambda: 2)
+        cache.get_or_load("b", "X25519", lambda: 3)
+        self.assertEqual(cache.invalidate("a"), 2)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.invalidate("b", "ED25519"), 0)
+
+    def test_failed_load_is_not_cached(self):
+        cache = KeyCache()
+        def loader():
+            raise ValueError("bad key")
+        self.assertRaises(ValueError, cache.get_or_load, "a", "ED25519", loader)
+        self.assertEqual(len(cache), 0)
+
+    def test_resize_evicts(self):
+        cache = KeyCache(maxsize=3)
+        for key in "abc":
+            cache.get_or_load(key, "ED25519", lambda: key)
+        cache.resize(1)
+        self.assertEqual(len(cache), 1)
+        self.assertIn(("c", "ED25519"), cache)
+        self.assertRaises(ValueError, KeyCache, 0)
+
+
+class TestCryptographerKeyCache(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        key_cache.clear()
+
+    def test_signing_key_is_parsed_once(self):
+        public_key = serialize_public_key(ed25519.Ed25519PrivateKey.generate().public_key())
+        first = Cryptographer(public_key, SigningAlgorithm.ED25519.value)
+        second = Cryptographer(public_key, SigningAlgorithm.ED25519.value)
+        self.assertIs(first.public_key, second.public_key)
+        self.assertEqual(key_cache.stats.misses, 1)
+        self.assertEqual(key_cache.stats.hits, 1)
+
+    def test_encryption_key_is_parsed_once(self):
+        public_key = base64.b64encode(PrivateKey.generate().public_key._public_key).decode()
+        first = Cryptographer(public_key, EncryptionAlgorithm.X25519.value)
+        second = Cryptographer(public_key, EncryptionAlgorithm.X25519.value)
+        self.assertIs(first.public_key.sealed_box, second.public_key.sealed_box)
+
+    def test_invalidate_key(self):
+        public_key = serialize_public_key(ed25519.Ed25519PrivateKey.generate().public_key())
+        first = Cryptographer(public_key, SigningAlgorithm.ED25519.value)
+        self.assertEqual(Cryptographer.invalidate_key(public_key), 1)
+        second = Cryptographer(public_key, SigningAlgorithm.ED25519.value)
+        self.assertIsNot(first.public_key, second.public_key)
+
+    def test_unsupported_algorithm_is_not_cached(self):
+        public_key = serialize_public_key(ed25519.Ed25519PrivateKey.generate().public_key())
+        self.assertRaises(
+            SigningAlgorithmNotSupported,
+            Cryptographer.load_signing_key,
+            public_key, "ecdsa"
+        )
+        self.assertEqual(len(key_cache), 0)
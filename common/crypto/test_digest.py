@@ -0,0 +1,71 @@
+from unittest import IsolatedAsyncioTestCase, TestCase
+from .digest import *
+from .main import *
+
+import base64
+import io
+from cryptography.hazmat.primitives import hashes
+
+
+def expected_digest(message: bytes) -> str:
+    digest = hashes.Hash(hashes.BLAKE2b(64))
+    digest.update(message)
+    return base64.b64encode(digest.finalize()).decode()
+
+
+class TestDigest(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.body = b'{"context": {"domain": "retail"}}' * 4096
+
+    def test_chunks_match_one_shot(self):
+        digest = Digest()
+        view = memoryview(self.body)
+        for start in range(0, len(self.body), 1000):
+            digest.update(view[start:start + 1000])
+        self.assertEqual(digest.b64digest(), expected_digest(self.body))
+        self.assertEqual(digest.length, len(self.body))
+
+    def test_matches_str_path(self):
+        self.assertEqual(
+            Cryptographer.digest(HashingAlgorithm.BLAKE2B, self.body.decode()),
+            digest_chunks([self.body[:10], bytearray(self.body[10:])])
+        )
+        self.assertEqual(
+            Cryptographer.digest(HashingAlgorithm.BLAKE2B, self.body),
+            expected_digest(self.body)
+        )
+
+    def test_digest_file(self):
+        self.assertEqual(digest_file(io.BytesIO(self.body), block_size=4096), expected_digest(self.body))
+
+    def test_digest_file_without_readinto(self):
+        class Reader:
+            def __init__(self, data: bytes) -> None:
+                self.data = io.BytesIO(data)
+
+            def read(self, size: int) -> bytes:
+                return self.data.read(size)
+
+        self.assertEqual(digest_file(Reader(self.body), block_size=333), expected_digest(self.body))
+
+    def test_empty_body(self):
+        self.assertEqual(Digest().b64digest(), expected_digest(b""))
+
+    def test_update_after_finalize_fails(self):
+        digest = Digest()
+        digest.b64digest()
+        self.assertRaises(ValueError, digest.update, b"late")
+
+
+class TestAsyncDigest(IsolatedAsyncioTestCase):
+
+    async def test_async_chunks(self):
+        body = b"a" * 100000
+
+        async def receive():
+            for start in range(0, len(body), 65536):
+                yield memoryview(body)[start:start + 65536]
+
+        self.assertEqual(await adigest_chunks(receive()), expected_digest(body))
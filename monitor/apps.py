@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MonitorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'monitor'
+
+    def ready(self) -> None:
+        from . import instrumentation
+        instrumentation.install()
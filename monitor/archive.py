@@ -0,0 +1,81 @@
+import gzip
+import json
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator
+
+from django.db import connection
+
+
+@dataclass(frozen=True)
+class Segment:
+    # Byte offset and length of the gzip member inside the archive file
+    offset: int
+    length: int
+    rows: int
+    first_created: str
+    last_created: str
+
+
+def _write_segment(file, rows: list[dict]) -> Segment:
+    payload = ''.join(json.dumps(row, separators=(',', ':')) + '\n' for row in rows).encode()
+    compressed = gzip.compress(payload)
+    offset = file.tell()
+    file.write(compressed)
+    return Segment(offset, len(compressed), len(rows), rows[0]['created'], rows[-1]['created'])
+
+
+def archive_table(table: str, directory: str | Path, segment_rows: int = 10000) -> tuple[Path, Path]:
+    """
+    Streams a (detached) partition ordered by created into <table>.ndjson.gz.
+    Every segment_rows rows form an independent gzip member, so the file is
+    still a valid gzip stream while <table>.index.json lists the offset and
+    created range of every member for random access.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    data_path = directory / f'{table}.ndjson.gz'
+    index_path = directory / f'{table}.index.json'
+    segments: list[Segment] = []
+    quote = connection.ops.quote_name
+    with open(data_path, 'wb') as file, connection.chunked_cursor() as cursor:
+        cursor.execute(f'SELECT target, origin, request_id, created FROM {quote(table)} ORDER BY created, request_id')
+        rows: list[dict] = []
+        while chunk := cursor.fetchmany(2000):
+            for target, origin, request_id, created in chunk:
+                rows.append({'target': target, 'origin': origin, 'request_id': request_id,
+                             'created': created.isoformat()})
+                if len(rows) == segment_rows:
+                    segments.append(_write_segment(file, rows))
+                    rows = []
+        if rows:
+            segments.append(_write_segment(file, rows))
+    with open(index_path, 'w') as file:
+        json.dump({'table': table, 'segments': [asdict(segment) for segment in segments]}, file)
+    return data_path, index_path
+
+
+def read_index(index_path: str | Path) -> list[Segment]:
+    with open(index_path, 'r') as file:
+        return [Segment(**segment) for segment in json.load(file)['segments']]
+
+
+def read_archive(data_path: str | Path, index_path: str | Path, created_from: datetime | None = None,
+                 created_to: datetime | None = None) -> Iterator[dict]:
+    """
+    Rows of an archive within [created_from, created_to], only the segments
+    overlapping the range are read and decompressed.
+    """
+    with open(data_path, 'rb') as file:
+        for segment in read_index(index_path):
+            first = datetime.fromisoformat(segment.first_created)
+            last = datetime.fromisoformat(segment.last_created)
+            if (created_to is not None and first > created_to) or (created_from is not None and last < created_from):
+                continue
+            file.seek(segment.offset)
+            for line in gzip.decompress(file.read(segment.length)).splitlines():
+                row = json.loads(line)
+                created = datetime.fromisoformat(row['created'])
+                if (created_from is None or created >= created_from) and (created_to is None or created <= created_to):
+                    yield row
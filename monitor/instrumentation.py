@@ -0,0 +1,249 @@
+"""
+Request instrumentation recorded into monitor.metrics histograms and served
+on /metrics. MetricsMiddleware wraps the ASGI application and times every
+HTTP request, RouteMiddleware names it after its URL pattern, and the hooks
+below add the time spent in stages (validation, crypto, Celery enqueue) and
+ORM queries to the request being served.
+"""
+from contextvars import ContextVar
+from dataclasses import dataclass
+from threading import Lock
+from time import perf_counter
+
+from celery.signals import after_task_publish, before_task_publish
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.deprecation import MiddlewareMixin
+
+from common.crypto import hooks as crypto_hooks
+from .metrics import MetricsRegistry
+
+
+# Route of requests that matched no URL pattern and label of work done outside of any request
+UNMATCHED = 'unmatched'
+BACKGROUND = 'background'
+METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+@dataclass(slots=True)
+class RequestMetrics:
+    route: str = UNMATCHED
+    queries: int = 0
+    query_seconds: float = 0.0
+
+
+# Shared by reference with the threads sync views run in, which get a copy of the context
+_current: ContextVar[RequestMetrics | None] = ContextVar('request_metrics', default=None)
+
+
+def metrics_enabled() -> bool:
+    return settings.METRICS_ENABLED
+
+
+def current_request() -> RequestMetrics | None:
+    return _current.get()
+
+
+def current_route() -> str:
+    request = _current.get()
+    return BACKGROUND if request is None else request.route
+
+
+class Metrics:
+
+    def __init__(self, registry: MetricsRegistry | None = None, max_series: int | None = None) -> None:
+        self.registry = registry or MetricsRegistry()
+        max_series = settings.METRICS_MAX_SERIES if max_series is None else max_series
+        self.request_duration = self.registry.histogram(
+            'wade_http_request_duration_seconds', 'Seconds from receiving a request to sending its response',
+            ('route', 'method', 'status'), max_series=max_series
+        )
+        self.stage_duration = self.registry.histogram(
+            'wade_stage_duration_seconds', 'Seconds spent in one stage of a request',
+            ('route', 'stage'), max_series=max_series
+        )
+        self.query_duration = self.registry.histogram(
+            'wade_db_query_duration_seconds', 'Seconds per ORM query', ('route',), max_series=max_series
+        )
+        self.queries_per_request = self.registry.histogram(
+            'wade_db_queries_per_request', 'ORM queries run by a request', ('route',),
+            buckets=QUERY_COUNT_BUCKETS, max_series=max_series
+        )
+        self.enqueue_duration = self.registry.histogram(
+            'wade_celery_enqueue_duration_seconds', 'Seconds spent publishing a Celery task',
+            ('route', 'task'), max_series=max_series
+        )
+        self.change_feed_latency = self.registry.histogram(
+            'wade_change_feed_latency_seconds', 'Seconds from publishing a registry change to its dispatch',
+            ('model',), max_series=max_series
+        )
+        # Stage throughput is rate(..._batch_size_sum) / rate(..._duration_seconds_sum)
+        self.subscription_stage_duration = self.registry.histogram(
+            'wade_subscription_stage_duration_seconds', 'Seconds per batch of a subscription pipeline stage',
+            ('stage', 'lane'), max_series=max_series
+        )
+        self.subscription_stage_batch_size = self.registry.histogram(
+            'wade_subscription_stage_batch_size', 'Subscribers per batch of a subscription pipeline stage',
+            ('stage', 'lane'), buckets=BATCH_SIZE_BUCKETS, max_series=max_series
+        )
+
+    def observe_request(self, request: RequestMetrics, method: str, status: int, seconds: float) -> None:
+        method = method if method in METHODS else 'other'
+        self.request_duration.observe(seconds, request.route, method, f'{status // 100}xx')
+        self.queries_per_request.observe(request.queries, request.route)
+
+    def render(self) -> str:
+        return self.registry.render()
+
+
+_metrics: Metrics | None = None
+_metrics_lock = Lock()
+
+
+def get_metrics() -> Metrics:
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = Metrics()
+    return _metrics
+
+
+def reset_metrics() -> None:
+    global _metrics
+    with _metrics_lock:
+        _metrics = None
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    get_metrics().stage_duration.observe(seconds, current_route(), name)
+
+
+class stage:
+    """
+    Times the enclosed block as stage `name` of the current request (or of
+    background work), stage names must come from code, never from input.
+    """
+    __slots__ = ('name', 'started')
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.started = None
+
+    def __enter__(self) -> 'stage':
+        if settings.METRICS_ENABLED:
+            self.started = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.started is not None:
+            observe_stage(self.name, perf_counter() - self.started)
+
+
+def _observe_crypto(operation: str, started: float, seconds: float) -> None:
+    observe_stage(f'crypto.{operation}', seconds)
+
+
+def query_wrapper(execute, sql, params, many, context):
+    """
+    connection.execute_wrappers entry counting and timing the queries run
+    while serving a request.
+    """
+    request = _current.get()
+    if request is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = perf_counter() - started
+        request.queries += 1
+        request.query_seconds += seconds
+        get_metrics().query_duration.observe(seconds, request.route)
+
+
+def install() -> None:
+    """
+    Connects the crypto hook when metrics are enabled, called when the
+    monitor app is ready. Database connections get query_wrapper as they open.
+    """
+    if metrics_enabled():
+        crypto_hooks.add_observer(_observe_crypto)
+    else:
+        crypto_hooks.remove_observer(_observe_crypto)
+
+
+@receiver(setting_changed)
+def _reinstall_on_setting_changed(setting: str, **kwargs) -> None:
+    if setting.startswith('METRICS_'):
+        reset_metrics()
+        install()
+
+
+@receiver(connection_created)
+def _wrap_connection(sender, connection, **kwargs) -> None:
+    if metrics_enabled() and query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
+
+
+# Task id -> perf_counter() at before_task_publish, publishing is synchronous in the calling thread
+_publishing: dict[str, float] = {}
+
+
+@before_task_publish.connect
+def _task_publishing(sender=None, headers=None, **kwargs) -> None:
+    if metrics_enabled() and headers and 'id' in headers:
+        _publishing[headers['id']] = perf_counter()
+
+
+@after_task_publish.connect
+def _task_published(sender=None, headers=None, **kwargs) -> None:
+    started = _publishing.pop((headers or {}).get('id'), None)
+    if started is not None:
+        get_metrics().enqueue_duration.observe(perf_counter() - started, current_route(), str(sender))
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request by route, method and status
+    class, and counting the ORM queries it ran.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] != 'http' or not metrics_enabled():
+            return await self.app(scope, receive, send)
+        request = RequestMetrics()
+        token = _current.set(request)
+        status = 500
+
+        async def send_status(message) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            _current.reset(token)
+            get_metrics().observe_request(request, scope.get('method', ''), status, perf_counter() - started)
+
+
+class RouteMiddleware(MiddlewareMixin):
+    """
+    Labels the current request with its URL pattern, paths themselves are
+    never used as labels so the number of series stays bounded.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs) -> None:
+        metrics = _current.get()
+        if metrics is not None and request.resolver_match is not None:
+            metrics.route = request.resolver_match.route or request.resolver_match.view_name or UNMATCHED
@@ -0,0 +1,62 @@
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+from django.utils import timezone
+
+from monitor import partitions
+from monitor.archive import archive_table
+
+
+class Command(BaseCommand):
+    help = ('Creates upcoming ContractRequestLogger partitions and detaches, archives or drops expired ones, '
+            'expired rows of the default partition included')
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--interval', choices=[partitions.DAY, partitions.MONTH],
+                            default=settings.CONTRACT_LOG_PARTITION_INTERVAL)
+        parser.add_argument('--ahead', type=int, default=settings.CONTRACT_LOG_PARTITIONS_AHEAD,
+                            help='Number of future partitions to keep ready')
+        parser.add_argument('--retention-days', type=int, default=settings.CONTRACT_LOG_RETENTION_DAYS)
+        parser.add_argument('--archive-dir', default=settings.CONTRACT_LOG_ARCHIVE_DIR,
+                            help='Write expired partitions as compressed NDJSON before dropping them')
+        parser.add_argument('--detach-only', action='store_true',
+                            help='Detach expired partitions but keep their tables')
+        parser.add_argument('--backfill', action='store_true',
+                            help='Move rows of the default partition into partitions of their own')
+
+    def backfill(self, day: date, last: date, interval: str) -> None:
+        while day <= last:
+            partition = partitions.partition_for(day, interval)
+            if partitions.create_partition(partition):
+                self.stdout.write(f'Backfilled {partition.name}')
+            day = partition.end
+
+    def handle(self, *args, **options) -> None:
+        interval = options['interval']
+        today = timezone.localdate()
+
+        if held := partitions.default_partition_range():
+            first, last = timezone.localdate(held[0]), timezone.localdate(held[1])
+            if not options['backfill']:
+                # Expired rows of the default partition get partitions of their own, pruned below
+                last = min(last, today - timedelta(days=options['retention_days'] + 1))
+            self.backfill(first, last, interval)
+
+        day = today
+        for _ in range(options['ahead'] + 1):
+            partition = partitions.partition_for(day, interval)
+            if partitions.create_partition(partition):
+                self.stdout.write(f'Created {partition.name}')
+            day = partition.end
+
+        for partition in partitions.expired_partitions(options['retention_days'], today):
+            partitions.detach_partition(partition)
+            pruned = partitions.prune_request_ids(partition.end_at)
+            self.stdout.write(f'Detached {partition.name}, pruned {pruned} request ids')
+            if options['archive_dir']:
+                data_path, _ = archive_table(partition.name, options['archive_dir'])
+                self.stdout.write(f'Archived {partition.name} to {data_path}')
+            if not options['detach_only']:
+                partitions.drop_table(partition.name)
+                self.stdout.write(f'Dropped {partition.name}')
@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from monitor.profiler import issue_token
+
+
+class Command(BaseCommand):
+    help = ('Prints a token profiling every request that sends it in the PROFILER_HEADER header, '
+            'for PROFILER_TOKEN_MAX_AGE seconds. PROFILER_ENABLED must be on')
+
+    def handle(self, *args, **options) -> None:
+        self.stdout.write(f'{settings.PROFILER_HEADER}: {issue_token()}')
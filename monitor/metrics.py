@@ -0,0 +1,148 @@
+import bisect
+import math
+from threading import Lock, local
+from typing import Iterable, Iterator
+
+
+# Seconds, from a cached lookup to a slow callback
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Label value every series past a histogram's max_series is folded into
+OVERFLOW = 'other'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Series:
+    """
+    One label combination of a histogram. Every thread observes into its own
+    cell (bucket counts then the sum), so observe() never takes a lock and
+    never loses an increment, collect() adds the cells up.
+    """
+    __slots__ = ('bounds', '_local', '_cells', '_lock')
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self._local = local()
+        self._cells: list[list[float]] = []
+        self._lock = Lock()
+
+    def _new_cell(self) -> list[float]:
+        cell = [0] * (len(self.bounds) + 1) + [0.0]
+        with self._lock:
+            self._cells.append(cell)
+        self._local.cell = cell
+        return cell
+
+    def observe(self, value: float) -> None:
+        try:
+            cell = self._local.cell
+        except AttributeError:
+            cell = self._new_cell()
+        cell[bisect.bisect_left(self.bounds, value)] += 1
+        cell[-1] += value
+
+    def collect(self) -> tuple[list[int], float]:
+        """
+        Per bucket counts (the last one above every bound) and the sum.
+        """
+        counts = [0] * (len(self.bounds) + 1)
+        total = 0.0
+        with self._lock:
+            cells = list(self._cells)
+        for cell in cells:
+            for index in range(len(counts)):
+                counts[index] += cell[index]
+            total += cell[-1]
+        return counts, total
+
+
+class Histogram:
+    """
+    Histogram with at most max_series label combinations, observations of
+    any further combination are counted under OVERFLOW for every label.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS, max_series: int = 500) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.max_series = max_series
+        self._series: dict[tuple[str, ...], Series] = {}
+        self._lock = Lock()
+
+    def labels(self, *values: str) -> Series:
+        series = self._series.get(values)
+        if series is not None:
+            return series
+        if len(values) != len(self.labelnames):
+            raise ValueError(f'{self.name} takes the labels {", ".join(self.labelnames)}')
+        with self._lock:
+            if values not in self._series and len(self._series) >= self.max_series:
+                values = (OVERFLOW,) * len(self.labelnames)
+            if values not in self._series:
+                self._series[values] = Series(self.buckets)
+            return self._series[values]
+
+    def observe(self, value: float, *values: str) -> None:
+        self.labels(*values).observe(value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def collect(self) -> Iterator[tuple[tuple[str, ...], list[int], float]]:
+        with self._lock:
+            series = list(self._series.items())
+        for values, entry in sorted(series):
+            counts, total = entry.collect()
+            yield values, counts, total
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for values, counts, total in self.collect():
+            labels = [f'{name}="{escape(value)}"' for name, value in zip(self.labelnames, values)]
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                bucket_labels = ','.join(labels + [f'le="{format_value(bound)}"'])
+                lines.append(f'{self.name}_bucket{{{bucket_labels}}} {cumulative}')
+            series_labels = '{' + ','.join(labels) + '}' if labels else ''
+            lines.append(f'{self.name}_sum{series_labels} {format_value(total)}')
+            lines.append(f'{self.name}_count{series_labels} {cumulative}')
+        return lines
+
+
+def escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+class MetricsRegistry:
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Histogram] = {}
+        self._lock = Lock()
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS, max_series: int = 500) -> Histogram:
+        """
+        The histogram registered under name, created on first use.
+        """
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, documentation, labelnames, buckets, max_series)
+            return self._metrics[name]
+
+    def get(self, name: str) -> Histogram | None:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        return ''.join(line + '\n' for _, metric in metrics for line in metric.render())
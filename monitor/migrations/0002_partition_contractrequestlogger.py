@@ -0,0 +1,65 @@
+from django.db import migrations, models
+
+
+# Rebuilds monitor_contractrequestlogger as a table range partitioned by
+# created. Partitioned tables need the partition key in every unique
+# constraint so the primary key becomes (request_id, created). Existing rows
+# land in the default partition, `manage.py contract_log_partitions --backfill`
+# moves them into their own partitions.
+PARTITION_SQL = """
+ALTER TABLE monitor_contractrequestlogger RENAME TO monitor_contractrequestlogger_legacy;
+ALTER INDEX monitor_contractrequestlogger_pkey RENAME TO monitor_contractrequestlogger_legacy_pkey;
+CREATE TABLE monitor_contractrequestlogger (
+    target varchar(265) NOT NULL,
+    origin varchar(265) NOT NULL,
+    request_id varchar(80) NOT NULL,
+    created timestamp with time zone NOT NULL,
+    PRIMARY KEY (request_id, created)
+) PARTITION BY RANGE (created);
+CREATE TABLE monitor_contractrequestlogger_default
+    PARTITION OF monitor_contractrequestlogger DEFAULT;
+INSERT INTO monitor_contractrequestlogger (target, origin, request_id, created)
+    SELECT target, origin, request_id, created FROM monitor_contractrequestlogger_legacy;
+DROP TABLE monitor_contractrequestlogger_legacy;
+CREATE INDEX monitor_con_target_5eaeca_idx ON monitor_contractrequestlogger (target, origin);
+CREATE INDEX monitor_con_created_idx ON monitor_contractrequestlogger (created);
+"""
+
+UNPARTITION_SQL = """
+ALTER TABLE monitor_contractrequestlogger RENAME TO monitor_contractrequestlogger_partitioned;
+ALTER INDEX monitor_contractrequestlogger_pkey RENAME TO monitor_contractrequestlogger_partitioned_pkey;
+CREATE TABLE monitor_contractrequestlogger (
+    target varchar(265) NOT NULL,
+    origin varchar(265) NOT NULL,
+    request_id varchar(80) NOT NULL PRIMARY KEY,
+    created timestamp with time zone NOT NULL
+);
+INSERT INTO monitor_contractrequestlogger (target, origin, request_id, created)
+    SELECT DISTINCT ON (request_id) target, origin, request_id, created
+    FROM monitor_contractrequestlogger_partitioned ORDER BY request_id, created;
+DROP TABLE monitor_contractrequestlogger_partitioned CASCADE;
+CREATE INDEX monitor_con_target_5eaeca_idx ON monitor_contractrequestlogger (target, origin);
+CREATE INDEX monitor_contractrequestlogger_request_id_like
+    ON monitor_contractrequestlogger (request_id varchar_pattern_ops);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(PARTITION_SQL, reverse_sql=UNPARTITION_SQL),
+            ],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='contractrequestlogger',
+                    index=models.Index(fields=['created'], name='monitor_con_created_idx'),
+                ),
+            ],
+        ),
+    ]
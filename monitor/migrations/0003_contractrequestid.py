@@ -0,0 +1,49 @@
+from django.db import migrations, models
+
+
+# Keys of the rows logged before the table existed, the oldest row of a
+# duplicated request id keeps it
+BACKFILL_SQL = """
+INSERT INTO monitor_contractrequestid (target, request_id, created)
+    SELECT DISTINCT ON (target, request_id) target, request_id, created
+    FROM monitor_contractrequestlogger ORDER BY target, request_id, created
+ON CONFLICT DO NOTHING;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0002_partition_contractrequestlogger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContractRequestId',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target', models.CharField(editable=False, max_length=265)),
+                ('request_id', models.CharField(editable=False, max_length=80)),
+                ('created', models.DateTimeField(editable=False)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created'], name='monitor_con_id_created_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='contractrequestid',
+            constraint=models.UniqueConstraint(fields=('target', 'request_id'),
+                                               name='monitor_contract_request_id_unique'),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+        # Migration 0002 already made (request_id, created) the primary key
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='contractrequestlogger',
+                    constraint=models.UniqueConstraint(fields=('request_id', 'created'),
+                                                       name='monitor_contractrequestlogger_pkey'),
+                ),
+            ],
+        ),
+    ]
@@ -5,10 +5,36 @@ from django.db import models
 class ContractRequestLogger(models.Model):
     target = models.CharField(max_length=265, editable=False)
     origin = models.CharField(max_length=265, editable=False)
+    # The ORM needs a single column key, request_id is unique per target through ContractRequestId
     request_id = models.CharField(max_length=80, primary_key=True)
     created = models.DateTimeField(auto_created=True, editable=False)
 
+    # The table is range partitioned by created (see migration 0002), the
+    # database primary key is (request_id, created)
     class Meta:
         indexes = [
-            models.Index(fields=['target', 'origin'])
+            models.Index(fields=['target', 'origin']),
+            models.Index(fields=['created'], name='monitor_con_created_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['request_id', 'created'], name='monitor_contractrequestlogger_pkey'),
+        ]
+
+
+class ContractRequestId(models.Model):
+    """
+    Unpartitioned (target, request_id) key of the logged contract requests,
+    partitioned tables can't hold a unique constraint without created.
+    Rows are pruned together with the partitions they were logged in.
+    """
+    target = models.CharField(max_length=265, editable=False)
+    request_id = models.CharField(max_length=80, editable=False)
+    created = models.DateTimeField(editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['target', 'request_id'], name='monitor_contract_request_id_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['created'], name='monitor_con_id_created_idx'),
         ]
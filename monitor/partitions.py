@@ -0,0 +1,148 @@
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ContractRequestId, ContractRequestLogger
+
+
+TABLE = ContractRequestLogger._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+DAY = 'day'
+MONTH = 'month'
+
+
+@dataclass(frozen=True)
+class Partition:
+    name: str
+    start: date
+    end: date
+
+    @property
+    def start_at(self) -> datetime:
+        return timezone.make_aware(datetime.combine(self.start, datetime.min.time()))
+
+    @property
+    def end_at(self) -> datetime:
+        return timezone.make_aware(datetime.combine(self.end, datetime.min.time()))
+
+
+def partition_for(day: date, interval: str = MONTH) -> Partition:
+    """
+    The partition holding the given day, partitions cover one day or one
+    calendar month in the current time zone.
+    """
+    if interval == DAY:
+        return Partition(f'{TABLE}_p{day:%Y%m%d}', day, day + timedelta(days=1))
+    if interval == MONTH:
+        start = day.replace(day=1)
+        end = (start + timedelta(days=32)).replace(day=1)
+        return Partition(f'{TABLE}_p{start:%Y%m}', start, end)
+    raise ValueError(f'Unknown partition interval {interval}')
+
+
+def parse_partition(name: str) -> Partition | None:
+    suffix = name.removeprefix(f'{TABLE}_p')
+    if suffix == name or not suffix.isdigit():
+        return None
+    if len(suffix) == 8:
+        return partition_for(datetime.strptime(suffix, '%Y%m%d').date(), DAY)
+    if len(suffix) == 6:
+        return partition_for(datetime.strptime(suffix, '%Y%m').date(), MONTH)
+    return None
+
+
+def list_partitions() -> list[Partition]:
+    """
+    Range partitions currently attached, ordered by start.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+            JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+            WHERE parent.relname = %s
+            """,
+            [TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = [partition for partition in map(parse_partition, names) if partition is not None]
+    return sorted(partitions, key=lambda partition: partition.start)
+
+
+def create_partition(partition: Partition) -> bool:
+    """
+    Creates the partition unless it exists. Rows of its range sitting in the
+    default partition are moved into it, Postgres refuses to attach a range
+    that the default partition already holds.
+    Returns True when the partition was created.
+    """
+    quote = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [partition.name])
+        if cursor.fetchone()[0] is not None:
+            return False
+        bounds = [partition.start_at, partition.end_at]
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {quote(DEFAULT_PARTITION)} WHERE created >= %s AND created < %s)',
+            bounds
+        )
+        moving = cursor.fetchone()[0]
+        if moving:
+            cursor.execute(f'ALTER TABLE {quote(TABLE)} DETACH PARTITION {quote(DEFAULT_PARTITION)}')
+        cursor.execute(
+            f'CREATE TABLE {quote(partition.name)} PARTITION OF {quote(TABLE)} '
+            f'FOR VALUES FROM (%s) TO (%s)',
+            bounds
+        )
+        if moving:
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM {quote(DEFAULT_PARTITION)} '
+                f'WHERE created >= %s AND created < %s RETURNING *) '
+                f'INSERT INTO {quote(partition.name)} SELECT * FROM moved',
+                bounds
+            )
+            cursor.execute(f'ALTER TABLE {quote(TABLE)} ATTACH PARTITION {quote(DEFAULT_PARTITION)} DEFAULT')
+    return True
+
+
+def detach_partition(partition: Partition) -> None:
+    with connection.cursor() as cursor:
+        quote = connection.ops.quote_name
+        cursor.execute(f'ALTER TABLE {quote(TABLE)} DETACH PARTITION {quote(partition.name)}')
+
+
+def prune_request_ids(before: datetime) -> int:
+    """
+    Drops the ContractRequestId keys of rows logged before `before`, once
+    their partitions are detached.
+    """
+    return ContractRequestId.objects.filter(created__lt=before).delete()[0]
+
+
+def drop_table(name: str) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {connection.ops.quote_name(name)}')
+
+
+def default_partition_range() -> tuple[datetime, datetime] | None:
+    """
+    Oldest and newest created held by the default partition, the rows that
+    still need a partition of their own.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT min(created), max(created) FROM {connection.ops.quote_name(DEFAULT_PARTITION)}')
+        oldest, newest = cursor.fetchone()
+    return None if oldest is None else (oldest, newest)
+
+
+def expired_partitions(retention_days: int, today: date | None = None) -> list[Partition]:
+    """
+    Attached partitions whose whole range is older than the retention period.
+    """
+    today = today or timezone.localdate()
+    cutoff = today - timedelta(days=retention_days)
+    return [partition for partition in list_partitions() if partition.end <= cutoff]
@@ -0,0 +1,285 @@
+"""
+Opt-in sampling profiler for single requests. ProfilerMiddleware profiles a
+PROFILER_SAMPLE_RATE fraction of requests, and every request carrying a
+valid token (`manage.py profile_token`) in the PROFILER_HEADER header. While
+such a request is served a sampler thread records the stack of the thread
+serving it every PROFILER_INTERVAL seconds, and its SQL queries and crypto
+operations are recorded as spans. The profile is written to
+PROFILER_DIRECTORY as a speedscope file (https://www.speedscope.app) or as
+collapsed stacks for flamegraph.pl, keeping the PROFILER_MAX_FILES newest.
+
+With PROFILER_ENABLED off the middleware removes itself from the chain.
+"""
+import json
+import random
+import re
+import sys
+import time
+import uuid
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from threading import Condition, Lock, Thread, get_ident
+from typing import Iterator
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from common.crypto import hooks as crypto_hooks
+
+
+SPEEDSCOPE = 'speedscope'
+COLLAPSED = 'collapsed'
+TOKEN_SALT = 'monitor.profiler'
+# Samples kept per request, a request running longer keeps its first ones
+MAX_SAMPLES = 100000
+
+# (function, file, first line) of a code object
+Frame = tuple[str, str, int]
+
+
+@dataclass
+class Span:
+    kind: str
+    label: str
+    start: float
+    end: float
+
+
+@dataclass
+class RequestProfile:
+    name: str
+    thread_id: int = field(default_factory=get_ident)
+    started: float = field(default_factory=time.perf_counter)
+    finished: float | None = None
+    # (perf_counter(), stack from the outermost frame in)
+    samples: list[tuple[float, tuple[Frame, ...]]] = field(default_factory=list)
+    spans: list[Span] = field(default_factory=list)
+
+    def add_sample(self, at: float, stack: tuple[Frame, ...]) -> None:
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append((at, stack))
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.spans.append(Span('sql', statement_label(sql), started, time.perf_counter()))
+
+    def crypto_observer(self, operation: str, started: float, seconds: float) -> None:
+        # The observer sees every thread's operations
+        if get_ident() == self.thread_id:
+            self.spans.append(Span('crypto', operation, started, started + seconds))
+
+
+def statement_label(sql: str, length: int = 80) -> str:
+    # Parameters are never part of the label, only the statement text
+    return ' '.join(sql.split())[:length]
+
+
+def frame_stack(frame) -> tuple[Frame, ...]:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+class Sampler:
+    """
+    One daemon thread sampling the threads of every profile in progress,
+    it waits without waking up while no request is profiled.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._profiles: dict[int, RequestProfile] = {}
+        self._condition = Condition()
+        self._thread: Thread | None = None
+
+    def start(self, profile: RequestProfile) -> None:
+        with self._condition:
+            self._profiles[profile.thread_id] = profile
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name='request-profiler', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def stop(self, profile: RequestProfile) -> None:
+        with self._condition:
+            self._profiles.pop(profile.thread_id, None)
+
+    def sample(self) -> None:
+        with self._condition:
+            profiles = list(self._profiles.values())
+        frames = sys._current_frames()
+        now = time.perf_counter()
+        for profile in profiles:
+            frame = frames.get(profile.thread_id)
+            if frame is not None:
+                profile.add_sample(now, frame_stack(frame))
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._profiles:
+                    self._condition.wait()
+            self.sample()
+            time.sleep(self.interval)
+
+
+_sampler: Sampler | None = None
+_sampler_lock = Lock()
+
+
+def get_sampler() -> Sampler:
+    global _sampler
+    if _sampler is None:
+        with _sampler_lock:
+            if _sampler is None:
+                _sampler = Sampler(settings.PROFILER_INTERVAL)
+    return _sampler
+
+
+@contextmanager
+def profiling(profile: RequestProfile) -> Iterator[RequestProfile]:
+    """
+    Samples the calling thread and records its SQL and crypto spans into
+    profile for the duration of the block.
+    """
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(profile.sql_wrapper))
+        crypto_hooks.add_observer(profile.crypto_observer)
+        stack.callback(crypto_hooks.remove_observer, profile.crypto_observer)
+        get_sampler().start(profile)
+        stack.callback(get_sampler().stop, profile)
+        try:
+            yield profile
+        finally:
+            profile.finished = time.perf_counter()
+
+
+def issue_token() -> str:
+    """
+    A token for the PROFILER_HEADER header, valid PROFILER_TOKEN_MAX_AGE seconds.
+    """
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(uuid.uuid4().hex)
+
+
+def token_authorized(token: str) -> bool:
+    try:
+        signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=settings.PROFILER_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def speedscope(profile: RequestProfile) -> dict:
+    frames: dict[Frame, int] = {}
+
+    def index(frame: Frame) -> int:
+        return frames.setdefault(frame, len(frames))
+
+    end = (profile.finished or time.perf_counter()) - profile.started
+    samples, weights = [], []
+    previous = profile.started
+    for at, stack in profile.samples:
+        samples.append([index(frame) for frame in stack])
+        weights.append(at - previous)
+        previous = at
+    events = []
+    for span in sorted(profile.spans, key=lambda span: span.start):
+        frame = index((f'{span.kind}: {span.label}', span.kind, 0))
+        events.append({'type': 'O', 'frame': frame, 'at': span.start - profile.started})
+        events.append({'type': 'C', 'frame': frame, 'at': span.end - profile.started})
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': profile.name,
+        'exporter': 'wade',
+        'activeProfileIndex': 0,
+        'shared': {'frames': [{'name': name, 'file': file, 'line': line} for name, file, line in frames]},
+        'profiles': [
+            {'type': 'sampled', 'name': f'{profile.name} stacks', 'unit': 'seconds',
+             'startValue': 0, 'endValue': end, 'samples': samples, 'weights': weights},
+            {'type': 'evented', 'name': f'{profile.name} SQL and crypto', 'unit': 'seconds',
+             'startValue': 0, 'endValue': end, 'events': events},
+        ],
+    }
+
+
+def collapsed(profile: RequestProfile) -> str:
+    """
+    flamegraph.pl input weighted in microseconds, every sample weighs the
+    time since the previous one. Spans are stacks of their own under
+    [sql] and [crypto].
+    """
+    weights: dict[str, float] = {}
+    previous = profile.started
+    for at, stack in profile.samples:
+        line = ';'.join(f'{name} ({Path(file).name}:{line})' for name, file, line in stack)
+        weights[line] = weights.get(line, 0.0) + (at - previous) * 1e6
+        previous = at
+    for span in profile.spans:
+        line = f'[{span.kind}];{span.label.replace(";", ",")}'
+        weights[line] = weights.get(line, 0.0) + (span.end - span.start) * 1e6
+    return ''.join(f'{line} {max(round(weight), 1)}\n' for line, weight in weights.items())
+
+
+def enforce_retention(directory: Path, max_files: int) -> None:
+    profiles = sorted(directory.glob('*.profile.*'), key=lambda path: path.stat().st_mtime)
+    for path in profiles[:max(len(profiles) - max_files, 0)]:
+        path.unlink(missing_ok=True)
+
+
+def save(profile: RequestProfile, directory: Path | str | None = None, output: str | None = None,
+         max_files: int | None = None) -> Path:
+    directory = Path(directory or settings.PROFILER_DIRECTORY)
+    output = output or settings.PROFILER_FORMAT
+    directory.mkdir(parents=True, exist_ok=True)
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', profile.name).strip('-')[:60]
+    stem = f'{time.strftime("%Y%m%dT%H%M%S")}-{slug}-{uuid.uuid4().hex[:8]}.profile'
+    if output == SPEEDSCOPE:
+        path = directory / f'{stem}.speedscope.json'
+        path.write_text(json.dumps(speedscope(profile)))
+    elif output == COLLAPSED:
+        path = directory / f'{stem}.collapsed.txt'
+        path.write_text(collapsed(profile))
+    else:
+        raise ValueError(f'Unknown profile format {output}')
+    enforce_retention(directory, settings.PROFILER_MAX_FILES if max_files is None else max_files)
+    return path
+
+
+def should_profile(request) -> bool:
+    token = request.headers.get(settings.PROFILER_HEADER)
+    if token is not None and token_authorized(token):
+        return True
+    return settings.PROFILER_SAMPLE_RATE > 0 and random.random() < settings.PROFILER_SAMPLE_RATE
+
+
+class ProfilerMiddleware:
+    """
+    Profiles the requests picked by should_profile() and names the written
+    file in the response's PROFILER_HEADER-File header. Runs sync, so the
+    whole request below it is served by the thread being sampled.
+    """
+
+    def __init__(self, get_response) -> None:
+        if not settings.PROFILER_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not should_profile(request):
+            return self.get_response(request)
+        profile = RequestProfile(f'{request.method} {request.path}')
+        with profiling(profile):
+            response = self.get_response(request)
+        response[f'{settings.PROFILER_HEADER}-File'] = save(profile).name
+        return response
@@ -0,0 +1,244 @@
+import hashlib
+import math
+import time
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Callable, Protocol
+
+from django.conf import settings
+from rest_framework import serializers
+
+
+class BloomFilter:
+    """
+    Fixed size Bloom filter over a bytearray, sized from the expected number
+    of items and the tolerated false positive rate.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> list[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + index * second) % self.size for index in range(self.hashes)]
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class ReplayBackend(Protocol):
+    # Whether an id reported as seen was certainly seen (no false positives)
+    exact: bool
+    # Whether the backend sees the ids of every process accepting requests
+    shared: bool
+
+    def might_contain(self, request_id: str) -> bool:
+        ...
+
+    def add(self, request_id: str) -> None:
+        ...
+
+
+class LocalReplayBackend:
+    """
+    In process time bucketed Bloom filters, buckets older than the window
+    are dropped so memory is bounded by window / bucket_seconds filters.
+    Only `shared` when this is the only process accepting requests.
+    """
+
+    exact = False
+
+    def __init__(self, window: int, bucket_seconds: int, capacity: int, error_rate: float,
+                 clock: Callable[[], float] = time.time, shared: bool = False) -> None:
+        self.window = window
+        self.bucket_seconds = bucket_seconds
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.clock = clock
+        self.shared = shared
+        self._buckets: dict[int, BloomFilter] = {}
+        self._lock = Lock()
+
+    def _live_buckets(self) -> list[BloomFilter]:
+        current = int(self.clock() // self.bucket_seconds)
+        oldest = current - math.ceil(self.window / self.bucket_seconds)
+        for bucket in [bucket for bucket in self._buckets if bucket < oldest]:
+            del self._buckets[bucket]
+        if current not in self._buckets:
+            self._buckets[current] = BloomFilter(self.capacity, self.error_rate)
+        return [self._buckets[bucket] for bucket in sorted(self._buckets, reverse=True)]
+
+    def might_contain(self, request_id: str) -> bool:
+        with self._lock:
+            return any(request_id in bucket for bucket in self._live_buckets())
+
+    def add(self, request_id: str) -> None:
+        with self._lock:
+            self._live_buckets()[0].add(request_id)
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(len(bucket.bits) for bucket in self._buckets.values())
+
+
+class RedisReplayBackend:
+    """
+    One Redis set per time bucket, expired by Redis after the window so
+    every worker shares the same view of recent request ids.
+    """
+
+    exact = True
+    shared = True
+
+    def __init__(self, client: Any, window: int, bucket_seconds: int, prefix: str = 'replay',
+                 clock: Callable[[], float] = time.time) -> None:
+        self.client = client
+        self.window = window
+        self.bucket_seconds = bucket_seconds
+        self.prefix = prefix
+        self.clock = clock
+
+    def _keys(self) -> list[str]:
+        current = int(self.clock() // self.bucket_seconds)
+        oldest = current - math.ceil(self.window / self.bucket_seconds)
+        return [f'{self.prefix}:{bucket}' for bucket in range(current, oldest - 1, -1)]
+
+    def might_contain(self, request_id: str) -> bool:
+        pipeline = self.client.pipeline(transaction=False)
+        for key in self._keys():
+            pipeline.sismember(key, request_id)
+        return any(pipeline.execute())
+
+    def add(self, request_id: str) -> None:
+        key = self._keys()[0]
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.sadd(key, request_id)
+        pipeline.expire(key, self.window + 2 * self.bucket_seconds)
+        pipeline.execute()
+
+
+@dataclass(frozen=True)
+class ReplayGuardStats:
+    checks: int
+    filter_hits: int
+    replays: int
+    false_positives: int
+    db_checks: int
+
+    @property
+    def db_round_trips_saved(self) -> int:
+        return self.checks - self.db_checks
+
+    @property
+    def false_positive_rate(self) -> float:
+        return self.false_positives / self.filter_hits if self.filter_hits else 0.0
+
+
+class ReplayGuard:
+    """
+    Answers whether a request_id was already used. Ids are recorded once
+    the request using them committed, so a request failing validation or
+    its write can be sent again. The backend decides when it is exact and
+    shared by every process. Otherwise the database stays authoritative:
+    ids the filter may have seen are confirmed there (Bloom false
+    positives), and ids it hasn't seen are checked there too unless this
+    process sees every request.
+    """
+
+    def __init__(self, backend: ReplayBackend, exists_in_db: Callable[[str], bool]) -> None:
+        self.backend = backend
+        self.exists_in_db = exists_in_db
+        self._lock = Lock()
+        self.checks = self.filter_hits = self.replays = self.false_positives = self.db_checks = 0
+
+    def is_replay(self, request_id: str) -> bool:
+        hit = self.backend.might_contain(request_id)
+        if hit:
+            checked = not self.backend.exact
+            replay = self.exists_in_db(request_id) if checked else True
+        else:
+            # A replay sent to another process would only show in the database
+            checked = not self.backend.shared
+            replay = self.exists_in_db(request_id) if checked else False
+        with self._lock:
+            self.checks += 1
+            self.db_checks += checked
+            self.replays += replay
+            if hit:
+                self.filter_hits += 1
+                self.false_positives += not replay
+        return replay
+
+    def record(self, request_id: str) -> None:
+        self.backend.add(request_id)
+
+    @property
+    def stats(self) -> ReplayGuardStats:
+        return ReplayGuardStats(self.checks, self.filter_hits, self.replays, self.false_positives, self.db_checks)
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.checks = self.filter_hits = self.replays = self.false_positives = self.db_checks = 0
+
+
+def contract_request_exists(request_id: str) -> bool:
+    # One probe of the unique (target, request_id) index instead of one per log partition
+    from .models import ContractRequestId
+    return ContractRequestId.objects.filter(target=settings.HOSTNAME, request_id=request_id).exists()
+
+
+def build_replay_guard() -> ReplayGuard:
+    window = settings.REPLAY_GUARD_WINDOW
+    bucket_seconds = settings.REPLAY_GUARD_BUCKET_SECONDS
+    if settings.REPLAY_GUARD_BACKEND == 'redis':
+        import redis
+        backend: ReplayBackend = RedisReplayBackend(
+            redis.Redis.from_url(settings.REPLAY_GUARD_REDIS_URL), window, bucket_seconds
+        )
+    else:
+        backend = LocalReplayBackend(
+            window, bucket_seconds, settings.REPLAY_GUARD_BUCKET_CAPACITY, settings.REPLAY_GUARD_ERROR_RATE,
+            shared=settings.REPLAY_GUARD_SINGLE_PROCESS,
+        )
+    return ReplayGuard(backend, contract_request_exists)
+
+
+_guard: ReplayGuard | None = None
+_guard_lock = Lock()
+
+
+def get_replay_guard() -> ReplayGuard:
+    global _guard
+    if _guard is None:
+        with _guard_lock:
+            if _guard is None:
+                _guard = build_replay_guard()
+    return _guard
+
+
+def reset_replay_guard() -> None:
+    global _guard
+    with _guard_lock:
+        _guard = None
+
+
+class UniqueRequestIdValidator:
+    """
+    Drop in replacement of the UniqueValidator over ContractRequestLogger
+    that queries the database only where the replay guard can't decide.
+    Callers record the id with get_replay_guard().record() once the request
+    committed.
+    """
+    message = 'This field must be unique.'
+    requires_context = False
+
+    def __call__(self, value: str) -> None:
+        if get_replay_guard().is_replay(value):
+            raise serializers.ValidationError(self.message, code='unique')
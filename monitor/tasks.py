@@ -0,0 +1,16 @@
+from celery import shared_task
+from django.utils.dateparse import parse_datetime
+
+from .models import ContractRequestLogger
+from .writer import write_rows
+
+
+@shared_task(ignore_result=True)
+def write_contract_requests(rows: list[dict]) -> int:
+    return write_rows([
+        ContractRequestLogger(
+            target=row['target'], origin=row['origin'], request_id=row['request_id'],
+            created=parse_datetime(row['created'])
+        )
+        for row in rows
+    ])
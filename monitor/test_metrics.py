@@ -0,0 +1,143 @@
+import asyncio
+from threading import Thread
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from common.crypto.constants import HashingAlgorithm
+from common.crypto.main import Cryptographer
+from .instrumentation import *
+from .instrumentation import _current
+from .metrics import *
+
+
+class TestHistogram(SimpleTestCase):
+
+    def test_render(self):
+        histogram = Histogram('latency_seconds', 'Latency', ('route',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, 'lookup')
+        self.assertEqual(histogram.render(), [
+            '# HELP latency_seconds Latency',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{route="lookup",le="0.1"} 2',
+            'latency_seconds_bucket{route="lookup",le="1.0"} 3',
+            'latency_seconds_bucket{route="lookup",le="+Inf"} 4',
+            'latency_seconds_sum{route="lookup"} 3.65',
+            'latency_seconds_count{route="lookup"} 4',
+        ])
+
+    def test_threads_do_not_lose_observations(self):
+        histogram = Histogram('work_seconds', 'Work')
+        threads = [Thread(target=lambda: [histogram.observe(0.01) for _ in range(10000)]) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        (_, counts, total), = histogram.collect()
+        self.assertEqual(sum(counts), 80000)
+        self.assertAlmostEqual(total, 800.0)
+
+    def test_series_are_bounded(self):
+        histogram = Histogram('paths_seconds', 'Paths', ('route', 'status'), max_series=3)
+        for index in range(10):
+            histogram.observe(0.01, f'/path/{index}', '2xx')
+        series = {values: sum(counts) for values, counts, _ in histogram.collect()}
+        self.assertEqual(len(series), 4)
+        self.assertEqual(series[(OVERFLOW, OVERFLOW)], 7)
+
+    def test_escapes_label_values(self):
+        histogram = Histogram('odd_seconds', 'Odd', ('route',), buckets=(1.0,))
+        histogram.observe(0.5, 'a"b\\c')
+        self.assertIn('odd_seconds_count{route="a\\"b\\\\c"} 1', histogram.render())
+
+
+class TestInstrumentation(SimpleTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        reset_metrics()
+        self.addCleanup(reset_metrics)
+
+    def series(self, histogram: Histogram) -> dict[tuple[str, ...], int]:
+        return {values: sum(counts) for values, counts, _ in histogram.collect()}
+
+    def test_stage_outside_requests(self):
+        with stage('sweep'):
+            pass
+        self.assertEqual(self.series(get_metrics().stage_duration), {(BACKGROUND, 'sweep'): 1})
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        with stage('sweep'):
+            pass
+        Cryptographer.digest(HashingAlgorithm.BLAKE2B, 'body')
+        self.assertEqual(self.series(get_metrics().stage_duration), {})
+
+    def test_crypto_operations(self):
+        Cryptographer.digest(HashingAlgorithm.BLAKE2B, 'body')
+        self.assertEqual(self.series(get_metrics().stage_duration), {(BACKGROUND, 'crypto.digest'): 1})
+
+    def test_asgi_middleware(self):
+        async def app(scope, receive, send):
+            current_request().route = 'lookup'
+            with stage('validate'):
+                pass
+            await send({'type': 'http.response.start', 'status': 404, 'headers': []})
+            await send({'type': 'http.response.body', 'body': b''})
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(MetricsMiddleware(app)({'type': 'http', 'method': 'PROPFIND'}, None, send))
+        self.assertEqual(len(sent), 2)
+        metrics = get_metrics()
+        self.assertEqual(self.series(metrics.request_duration), {('lookup', 'other', '4xx'): 1})
+        self.assertEqual(self.series(metrics.stage_duration), {('lookup', 'validate'): 1})
+        self.assertEqual(self.series(metrics.queries_per_request), {('lookup',): 1})
+        self.assertIsNone(current_request())
+
+    def test_django_route_label(self):
+        from django.core.asgi import get_asgi_application
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            pass
+
+        scope = {'type': 'http', 'method': 'GET', 'path': '/metrics', 'query_string': b'', 'headers': [],
+                 'server': ('testserver', 80), 'client': ('127.0.0.1', 1), 'scheme': 'http'}
+        asyncio.run(MetricsMiddleware(get_asgi_application())(scope, receive, send))
+        self.assertEqual(self.series(get_metrics().request_duration), {('metrics', 'GET', '2xx'): 1})
+
+    def test_failing_request_is_recorded_as_5xx(self):
+        async def app(scope, receive, send):
+            raise RuntimeError('boom')
+
+        with self.assertRaises(RuntimeError):
+            asyncio.run(MetricsMiddleware(app)({'type': 'http', 'method': 'GET'}, None, None))
+        self.assertEqual(self.series(get_metrics().request_duration), {(UNMATCHED, 'GET', '5xx'): 1})
+
+    def test_query_wrapper(self):
+        request = RequestMetrics(route='lookup')
+        token = _current.set(request)
+        try:
+            for _ in range(3):
+                self.assertEqual(query_wrapper(lambda *args: 'rows', 'SELECT 1', None, False, {}), 'rows')
+        finally:
+            _current.reset(token)
+        self.assertEqual(request.queries, 3)
+        self.assertEqual(self.series(get_metrics().query_duration), {('lookup',): 3})
+
+    def test_metrics_endpoint(self):
+        with stage('sweep'):
+            pass
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], CONTENT_TYPE)
+        self.assertIn('wade_stage_duration_seconds_count{route="background",stage="sweep"} 1',
+                      response.content.decode())
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_metrics_endpoint_disabled(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
@@ -0,0 +1,91 @@
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from .archive import archive_table, read_archive, read_index
+from .models import ContractRequestId, ContractRequestLogger
+from .partitions import *
+from .writer import write_rows
+
+import io
+import tempfile
+from datetime import date, datetime, timedelta
+
+
+class TestPartitionNaming(SimpleTestCase):
+
+    def test_month_partition(self):
+        partition = partition_for(date(2026, 12, 18), MONTH)
+        self.assertEqual(partition.name, f'{TABLE}_p202612')
+        self.assertEqual((partition.start, partition.end), (date(2026, 12, 1), date(2027, 1, 1)))
+        self.assertEqual(parse_partition(partition.name), partition)
+
+    def test_day_partition(self):
+        partition = partition_for(date(2026, 2, 28), DAY)
+        self.assertEqual(partition.name, f'{TABLE}_p20260228')
+        self.assertEqual(partition.end, date(2026, 3, 1))
+        self.assertEqual(parse_partition(partition.name), partition)
+
+    def test_parse_ignores_other_tables(self):
+        self.assertIsNone(parse_partition(DEFAULT_PARTITION))
+        self.assertIsNone(parse_partition('registry_subscriber'))
+
+
+class TestContractLogPartitions(TestCase):
+
+    def log(self, request_id: str, created: datetime) -> None:
+        ContractRequestLogger.objects.create(
+            target='registry', origin='sit.grab.in', request_id=request_id, created=created
+        )
+
+    def test_create_partition_moves_default_rows(self):
+        now = timezone.now()
+        self.log('request-1', now)
+        partition = partition_for(timezone.localdate(now), MONTH)
+        self.assertTrue(create_partition(partition))
+        self.assertFalse(create_partition(partition))
+        self.assertIn(partition, list_partitions())
+        self.assertIsNone(default_partition_range())
+        self.assertEqual(ContractRequestLogger.objects.get().request_id, 'request-1')
+
+    def test_expired_partitions(self):
+        today = timezone.localdate()
+        old = partition_for(today - timedelta(days=120), MONTH)
+        current = partition_for(today, MONTH)
+        create_partition(old)
+        create_partition(current)
+        self.assertEqual(expired_partitions(90, today), [old])
+
+    def test_command_prunes_expired_default_rows(self):
+        now = timezone.now()
+        self.log('expired', now - timedelta(days=400))
+        self.log('kept', now)
+        call_command('contract_log_partitions', interval=DAY, ahead=0, retention_days=90, stdout=io.StringIO())
+        self.assertEqual(list(ContractRequestLogger.objects.values_list('request_id', flat=True)), ['kept'])
+
+    def test_prune_request_ids(self):
+        partition = partition_for(date(2025, 1, 1), DAY)
+        create_partition(partition)
+        write_rows([ContractRequestLogger(target='registry', origin='sit.grab.in', request_id=f'request-{index}',
+                                          created=partition.start_at + timedelta(hours=index * 12))
+                    for index in range(3)])
+        self.assertEqual(prune_request_ids(partition.end_at), 2)
+        self.assertEqual(list(ContractRequestId.objects.values_list('request_id', flat=True)), ['request-2'])
+
+    def test_archive_round_trip(self):
+        partition = partition_for(date(2025, 1, 1), DAY)
+        create_partition(partition)
+        for minute in range(25):
+            self.log(f'request-{minute}', partition.start_at + timedelta(minutes=minute))
+        detach_partition(partition)
+        with tempfile.TemporaryDirectory() as directory:
+            data_path, index_path = archive_table(partition.name, directory, segment_rows=10)
+            self.assertEqual([segment.rows for segment in read_index(index_path)], [10, 10, 5])
+            rows = list(read_archive(data_path, index_path))
+            self.assertEqual([row['request_id'] for row in rows], [f'request-{minute}' for minute in range(25)])
+            window = list(read_archive(
+                data_path, index_path,
+                created_from=partition.start_at + timedelta(minutes=12),
+                created_to=partition.start_at + timedelta(minutes=14),
+            ))
+            self.assertEqual([row['request_id'] for row in window], ['request-12', 'request-13', 'request-14'])
+        self.assertEqual(ContractRequestLogger.objects.count(), 0)
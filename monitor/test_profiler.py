@@ -0,0 +1,87 @@
+import json
+import os
+import tempfile
+import time
+from threading import Thread
+from pathlib import Path
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from common.crypto.constants import HashingAlgorithm
+from common.crypto.main import Cryptographer
+from .profiler import *
+
+
+def busy(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class TestProfiler(SimpleTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def profile(self) -> RequestProfile:
+        with profiling(RequestProfile('GET /lookup')) as profile:
+            busy(0.05)
+            Cryptographer.digest(HashingAlgorithm.BLAKE2B, 'body')
+        return profile
+
+    def test_samples_and_spans(self):
+        profile = self.profile()
+        self.assertGreater(len(profile.samples), 2)
+        in_busy = sum(stack[-1][0] == 'busy' for _, stack in profile.samples)
+        self.assertGreater(in_busy, len(profile.samples) / 2)
+        self.assertEqual([(span.kind, span.label) for span in profile.spans], [('crypto', 'digest')])
+
+    def test_other_threads_are_not_recorded(self):
+        with profiling(RequestProfile('GET /lookup')) as profile:
+            thread = Thread(target=Cryptographer.digest, args=(HashingAlgorithm.BLAKE2B, 'body'))
+            thread.start()
+            thread.join()
+        self.assertEqual(profile.spans, [])
+
+    def test_speedscope(self):
+        document = json.loads(save(self.profile(), self.directory, SPEEDSCOPE).read_text())
+        sampled, evented = document['profiles']
+        self.assertEqual(len(sampled['samples']), len(sampled['weights']))
+        frames = document['shared']['frames']
+        self.assertIn('busy', {frames[index]['name'] for sample in sampled['samples'] for index in sample})
+        self.assertEqual([event['type'] for event in evented['events']], ['O', 'C'])
+        self.assertEqual(frames[evented['events'][0]['frame']]['name'], 'crypto: digest')
+
+    def test_collapsed(self):
+        lines = save(self.profile(), self.directory, COLLAPSED).read_text().splitlines()
+        self.assertTrue(any(line.startswith('[crypto];digest ') for line in lines))
+        stack, weight = max((line.rsplit(' ', 1) for line in lines), key=lambda item: int(item[1]))
+        self.assertTrue(stack.split(';')[-1].startswith('busy (test_profiler.py:'))
+
+    def test_retention(self):
+        profile = RequestProfile('GET /lookup')
+        for index in range(5):
+            path = save(profile, self.directory, COLLAPSED, max_files=3)
+            os.utime(path, (index, index))
+        self.assertEqual(len(list(self.directory.iterdir())), 3)
+
+    def test_tokens(self):
+        self.assertTrue(token_authorized(issue_token()))
+        self.assertFalse(token_authorized('forged:token'))
+        with override_settings(PROFILER_TOKEN_MAX_AGE=-1):
+            self.assertFalse(token_authorized(issue_token()))
+
+    def test_middleware(self):
+        with override_settings(PROFILER_ENABLED=True, PROFILER_DIRECTORY=self.directory):
+            response = self.client.get(reverse('metrics'), HTTP_X_WADE_PROFILE=issue_token())
+            self.assertTrue((self.directory / response['X-Wade-Profile-File']).exists())
+            response = self.client.get(reverse('metrics'), HTTP_X_WADE_PROFILE='forged:token')
+            self.assertNotIn('X-Wade-Profile-File', response)
+            with override_settings(PROFILER_SAMPLE_RATE=1.0):
+                self.assertIn('X-Wade-Profile-File', self.client.get(reverse('metrics')))
+
+    def test_middleware_disabled(self):
+        response = self.client.get(reverse('metrics'), HTTP_X_WADE_PROFILE=issue_token())
+        self.assertNotIn('X-Wade-Profile-File', response)
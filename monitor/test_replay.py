@@ -0,0 +1,189 @@
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from .models import ContractRequestLogger
+from .replay import *
+from .writer import write_rows
+
+
+class FakeRedis:
+    """
+    Just enough of redis.Redis for RedisReplayBackend, expiry follows the given clock.
+    """
+
+    def __init__(self, clock: Callable[[], float]) -> None:
+        self.clock = clock
+        self.sets: dict[str, set[str]] = {}
+        self.expiry: dict[str, float] = {}
+
+    def _alive(self, key: str) -> set[str]:
+        if key in self.expiry and self.expiry[key] <= self.clock():
+            self.sets.pop(key, None)
+            self.expiry.pop(key, None)
+        return self.sets.get(key, set())
+
+    def sismember(self, key: str, value: str) -> bool:
+        return value in self._alive(key)
+
+    def sadd(self, key: str, value: str) -> int:
+        self._alive(key)
+        self.sets.setdefault(key, set()).add(value)
+        return 1
+
+    def expire(self, key: str, seconds: int) -> bool:
+        self.expiry[key] = self.clock() + seconds
+        return True
+
+    def pipeline(self, transaction: bool = True) -> 'FakeRedisPipeline':
+        return FakeRedisPipeline(self)
+
+class FakeRedisPipeline:
+
+    def __init__(self, client: FakeRedis) -> None:
+        self.client = client
+        self.commands: list = []
+
+    def __getattr__(self, name: str):
+        return lambda *args: self.commands.append((name, args))
+
+    def execute(self) -> list:
+        return [getattr(self.client, name)(*args) for name, args in self.commands]
+
+
+class Clock:
+
+    def __init__(self, now: float = 1700000000) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestBloomFilter(SimpleTestCase):
+
+    def test_no_false_negatives_and_bounded_false_positives(self):
+        bloom = BloomFilter(capacity=5000, error_rate=0.01)
+        for index in range(5000):
+            bloom.add(f'request-{index}')
+        self.assertTrue(all(f'request-{index}' in bloom for index in range(5000)))
+        false_positives = sum(f'other-{index}' in bloom for index in range(10000))
+        self.assertLess(false_positives / 10000, 0.03)
+
+
+class BackendTestMixin:
+
+    def make_backend(self, clock: Clock) -> ReplayBackend:
+        raise NotImplementedError
+
+    def test_expires_after_window(self):
+        clock = Clock()
+        backend = self.make_backend(clock)
+        self.assertFalse(backend.might_contain('request-1'))
+        backend.add('request-1')
+        clock.now += 20
+        self.assertTrue(backend.might_contain('request-1'))
+        self.assertFalse(backend.might_contain('request-2'))
+        clock.now += 30
+        self.assertFalse(backend.might_contain('request-1'))
+
+
+class TestLocalReplayBackend(BackendTestMixin, SimpleTestCase):
+
+    def make_backend(self, clock: Clock) -> ReplayBackend:
+        return LocalReplayBackend(35, 5, capacity=1000, error_rate=0.001, clock=clock)
+
+    def test_memory_is_bounded(self):
+        clock = Clock()
+        backend = self.make_backend(clock)
+        for second in range(600):
+            clock.now += 1
+            backend.add(f'request-{second}')
+        bucket_bytes = len(BloomFilter(1000, 0.001).bits)
+        self.assertLessEqual(backend.memory_bytes, bucket_bytes * (35 // 5 + 2))
+
+
+class TestRedisReplayBackend(BackendTestMixin, SimpleTestCase):
+
+    def make_backend(self, clock: Clock) -> ReplayBackend:
+        return RedisReplayBackend(FakeRedis(clock), 35, 5, clock=clock)
+
+
+class TestReplayGuard(SimpleTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.persisted: set[str] = set()
+        self.db_checks = 0
+        self.guard = ReplayGuard(LocalReplayBackend(35, 5, 1000, 0.001, shared=True), self.exists_in_db)
+
+    def exists_in_db(self, request_id: str) -> bool:
+        self.db_checks += 1
+        return request_id in self.persisted
+
+    def test_new_ids_skip_the_database(self):
+        for index in range(100):
+            self.assertFalse(self.guard.is_replay(f'request-{index}'))
+        self.assertEqual(self.db_checks, 0)
+        self.assertEqual(self.guard.stats.db_round_trips_saved, 100)
+
+    def test_replay_falls_back_to_database(self):
+        self.guard.is_replay('request-1')
+        self.guard.record('request-1')
+        self.persisted.add('request-1')
+        self.assertTrue(self.guard.is_replay('request-1'))
+        self.assertEqual(self.db_checks, 1)
+        self.assertEqual(self.guard.stats.replays, 1)
+
+    def test_unpersisted_hit_counts_as_false_positive(self):
+        # e.g. a request whose log row was lost
+        self.guard.record('request-1')
+        self.assertFalse(self.guard.is_replay('request-1'))
+        self.assertEqual(self.guard.stats.false_positives, 1)
+        self.assertEqual(self.guard.stats.false_positive_rate, 1.0)
+
+    def test_per_process_filter_checks_new_ids_in_the_database(self):
+        # Used through another process, this one's filter never saw it
+        guard = ReplayGuard(LocalReplayBackend(35, 5, 1000, 0.001), self.exists_in_db)
+        self.persisted.add('request-1')
+        self.assertTrue(guard.is_replay('request-1'))
+        self.assertFalse(guard.is_replay('request-2'))
+        self.assertEqual(guard.stats.db_round_trips_saved, 0)
+
+    def test_shared_exact_backend_decides_alone(self):
+        guard = ReplayGuard(RedisReplayBackend(FakeRedis(Clock()), 35, 5), self.exists_in_db)
+        self.assertFalse(guard.is_replay('request-1'))
+        # Committed, not logged yet
+        guard.record('request-1')
+        self.assertTrue(guard.is_replay('request-1'))
+        self.assertEqual(self.db_checks, 0)
+
+    def test_unrecorded_request_can_be_retried(self):
+        # Failed another validator or its write, the id was never recorded
+        guard = ReplayGuard(RedisReplayBackend(FakeRedis(Clock()), 35, 5), self.exists_in_db)
+        self.assertFalse(guard.is_replay('request-1'))
+        self.assertFalse(guard.is_replay('request-1'))
+
+
+class TestUniqueRequestIdValidator(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        reset_replay_guard()
+
+    def tearDown(self) -> None:
+        reset_replay_guard()
+        super().tearDown()
+
+    def test_logged_request_is_rejected(self):
+        validator = UniqueRequestIdValidator()
+        validator('request-1')
+        write_rows([ContractRequestLogger(
+            request_id='request-1', target=settings.HOSTNAME, origin='sit.grab.in', created=timezone.now()
+        )])
+        with self.assertRaises(serializers.ValidationError):
+            validator('request-1')
+
+    @override_settings(REPLAY_GUARD_SINGLE_PROCESS=True)
+    def test_unseen_request_does_not_query(self):
+        with self.assertNumQueries(0):
+            UniqueRequestIdValidator()('request-2')
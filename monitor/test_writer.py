@@ -0,0 +1,146 @@
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase
+from .models import ContractRequestId, ContractRequestLogger
+from .writer import *
+
+import time
+from datetime import timedelta
+from threading import Event, Thread
+
+
+class RecordingWriter:
+
+    def __init__(self, gate: Event | None = None) -> None:
+        self.batches: list[list[str]] = []
+        self.gate = gate
+
+    def __call__(self, rows: list[ContractRequestLogger]) -> int:
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.batches.append([row.request_id for row in rows])
+        return len(rows)
+
+
+class FlakyWriter(RecordingWriter):
+
+    def __init__(self, failures: int) -> None:
+        super().__init__()
+        self.failures = failures
+
+    def __call__(self, rows: list[ContractRequestLogger]) -> int:
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('database is down')
+        return super().__call__(rows)
+
+
+def wait_until(condition, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.005)
+    return condition()
+
+
+class TestContractRequestBuffer(SimpleTestCase):
+
+    def test_flushes_full_batches(self):
+        writer = RecordingWriter()
+        buffer = ContractRequestBuffer(max_batch=10, max_delay=60, writer=writer)
+        for index in range(25):
+            buffer.log('registry', 'sit.grab.in', f'request-{index}')
+        self.assertTrue(wait_until(lambda: len(writer.batches) == 2))
+        self.assertEqual([len(batch) for batch in writer.batches], [10, 10])
+        buffer.stop()
+        self.assertEqual([len(batch) for batch in writer.batches], [10, 10, 5])
+        self.assertEqual(buffer.written, 25)
+
+    def test_flushes_after_max_delay(self):
+        writer = RecordingWriter()
+        buffer = ContractRequestBuffer(max_batch=100, max_delay=0.02, writer=writer)
+        buffer.log('registry', 'sit.grab.in', 'request-1')
+        self.assertTrue(wait_until(lambda: writer.batches == [['request-1']]))
+        buffer.stop()
+
+    def test_backpressure(self):
+        gate = Event()
+        writer = RecordingWriter(gate)
+        buffer = ContractRequestBuffer(max_batch=2, max_delay=0, max_buffer=2, block_timeout=0.05, writer=writer)
+        buffer.log('registry', 'sit.grab.in', 'request-1')
+        buffer.log('registry', 'sit.grab.in', 'request-2')
+        # The writer thread holds the first batch until the gate opens
+        self.assertTrue(wait_until(lambda: len(buffer) == 0))
+        buffer.log('registry', 'sit.grab.in', 'request-3')
+        buffer.log('registry', 'sit.grab.in', 'request-4')
+        # Still full after block_timeout, request-5 is written synchronously (and waits on the gate too)
+        thread = Thread(target=buffer.log, args=('registry', 'sit.grab.in', 'request-5'))
+        thread.start()
+        self.assertTrue(wait_until(lambda: buffer.blocked == 1))
+        time.sleep(0.1)
+        gate.set()
+        thread.join(5)
+        buffer.stop()
+        self.assertIn(['request-5'], writer.batches)
+        self.assertEqual(buffer.flushes, 2)
+        self.assertEqual(buffer.written, 5)
+
+    def test_failed_batches_are_retried(self):
+        writer = FlakyWriter(failures=2)
+        buffer = ContractRequestBuffer(max_batch=10, max_delay=0, retry_delay=0.01, writer=writer)
+        buffer.log('registry', 'sit.grab.in', 'request-1')
+        buffer.log('registry', 'sit.grab.in', 'request-2')
+        self.assertTrue(wait_until(lambda: buffer.written == 2))
+        self.assertEqual(buffer.failures, 2)
+        self.assertEqual(sorted(request_id for batch in writer.batches for request_id in batch),
+                         ['request-1', 'request-2'])
+        buffer.stop()
+
+    def test_log_never_raises(self):
+        buffer = ContractRequestBuffer(durability=ContractRequestBuffer.SYNC, writer=FlakyWriter(failures=1))
+        buffer.log('registry', 'sit.grab.in', 'request-1')
+        self.assertEqual(buffer.lost, 1)
+
+    def test_sync_durability(self):
+        writer = RecordingWriter()
+        buffer = ContractRequestBuffer(durability=ContractRequestBuffer.SYNC, writer=writer)
+        buffer.log('registry', 'sit.grab.in', 'request-1')
+        self.assertEqual(writer.batches, [['request-1']])
+        self.assertIsNone(buffer._thread)
+
+    def test_log_after_stop_writes_directly(self):
+        writer = RecordingWriter()
+        buffer = ContractRequestBuffer(writer=writer)
+        buffer.stop()
+        buffer.log('registry', 'sit.grab.in', 'request-1')
+        self.assertEqual(writer.batches, [['request-1']])
+
+    def test_unknown_durability(self):
+        self.assertRaises(ValueError, ContractRequestBuffer, durability='eventually')
+
+
+class TestWriteRows(TestCase):
+
+    def test_flush_writes_rows(self):
+        buffer = ContractRequestBuffer(max_batch=2, max_delay=60)
+        # No log() call so no writer thread, the rows are flushed from the test thread
+        for index in range(3):
+            buffer._rows.append(ContractRequestLogger(
+                target=settings.HOSTNAME, origin='sit.grab.in', request_id=f'request-{index}',
+                created=timezone.now()
+            ))
+        with self.assertNumQueries(2):
+            self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(ContractRequestLogger.objects.count(), 3)
+
+    def test_duplicates_are_skipped(self):
+        created = timezone.now()
+        rows = [
+            ContractRequestLogger(target=settings.HOSTNAME, origin='sit.grab.in', request_id=request_id,
+                                  created=created + timedelta(seconds=index))
+            for index, request_id in enumerate(['request-1', 'request-2', 'request-1'])
+        ]
+        self.assertEqual(write_rows(rows), 2)
+        self.assertEqual(write_rows(rows[:1]), 0)
+        self.assertEqual(ContractRequestLogger.objects.count(), 2)
+        self.assertEqual(ContractRequestId.objects.count(), 2)
@@ -1,3 +1,13 @@
-from django.shortcuts import render
+from django.http import Http404, HttpRequest, HttpResponse
 
-# Create your views here.
+from .instrumentation import get_metrics, metrics_enabled
+from .metrics import CONTENT_TYPE
+
+
+def metrics(request: HttpRequest) -> HttpResponse:
+    """
+    Every histogram in the Prometheus text format.
+    """
+    if not metrics_enabled():
+        raise Http404()
+    return HttpResponse(get_metrics().render(), content_type=CONTENT_TYPE)
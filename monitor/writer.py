@@ -0,0 +1,257 @@
+import atexit
+import logging
+import time
+from datetime import datetime
+from threading import Condition, Lock, Thread
+from typing import Callable
+
+from django.conf import settings
+from django.db import connections, router
+from django.utils import timezone
+
+from .models import ContractRequestId, ContractRequestLogger
+
+
+logger = logging.getLogger(__name__)
+
+
+def write_rows(rows: list[ContractRequestLogger]) -> int:
+    """
+    Inserts the rows whose (target, request_id) isn't logged yet, in one
+    statement claiming their ContractRequestId first. Duplicates are replays
+    the replay guard raced with, they are skipped and not counted.
+    """
+    if not rows:
+        return 0
+    connection = connections[router.db_for_write(ContractRequestLogger)]
+    quote = connection.ops.quote_name
+    values = ', '.join(['(%s, %s, %s, %s::timestamptz)'] * len(rows))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH batch (target, origin, request_id, created) AS (VALUES {values}), '
+            f'claimed AS (INSERT INTO {quote(ContractRequestId._meta.db_table)} (target, request_id, created) '
+            f'SELECT target, request_id, created FROM batch ON CONFLICT DO NOTHING RETURNING target, request_id) '
+            f'INSERT INTO {quote(ContractRequestLogger._meta.db_table)} (target, origin, request_id, created) '
+            f'SELECT DISTINCT ON (target, request_id) target, origin, request_id, created '
+            f'FROM batch JOIN claimed USING (target, request_id)',
+            [value for row in rows for value in (row.target, row.origin, row.request_id, row.created)]
+        )
+        return cursor.rowcount
+
+
+class ContractRequestBuffer:
+    """
+    Collects ContractRequestLogger rows in memory and writes them with one
+    write_rows() statement per batch, claiming their ContractRequestId,
+    when max_batch rows are waiting or the oldest row waited max_delay
+    seconds.
+
+    durability:
+        sync     - every log() writes immediately, nothing is buffered
+        buffered - a background thread flushes the batches
+        celery   - batches are handed to the write_contract_requests task
+
+    When max_buffer rows are waiting log() blocks for up to block_timeout
+    seconds (backpressure) and then writes its row synchronously. A batch
+    the background thread fails to write goes back to the head of the buffer
+    and is retried after retry_delay seconds, doubled up to max_retry_delay
+    while the failures last. log() never raises, it runs from on_commit
+    callbacks once the request's own rows are committed.
+    """
+
+    SYNC = 'sync'
+    BUFFERED = 'buffered'
+    CELERY = 'celery'
+
+    def __init__(self, max_batch: int = 500, max_delay: float = 0.05, max_buffer: int = 10000,
+                 block_timeout: float = 1.0, durability: str = BUFFERED, retry_delay: float = 0.5,
+                 max_retry_delay: float = 30.0, writer: Callable[[list[ContractRequestLogger]], int] = write_rows) -> None:
+        if durability not in (self.SYNC, self.BUFFERED, self.CELERY):
+            raise ValueError(f'Unknown durability {durability}')
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_buffer = max_buffer
+        self.block_timeout = block_timeout
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.durability = durability
+        self.writer = writer
+        self._rows: list[ContractRequestLogger] = []
+        self._oldest: float | None = None
+        self._condition = Condition(Lock())
+        self._thread: Thread | None = None
+        self._stopping = False
+        self.written = 0
+        self.flushes = 0
+        self.blocked = 0
+        self.failures = 0
+        self.lost = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def log(self, target: str, origin: str, request_id: str, created: datetime | None = None) -> None:
+        row = ContractRequestLogger(
+            target=target, origin=origin, request_id=request_id, created=created or timezone.now()
+        )
+        try:
+            self.put(row)
+        except Exception:
+            # The row can't be written anywhere right now, failing the committed request wouldn't help
+            self.lost += 1
+            logger.exception('Failed to write contract request %s', request_id)
+
+    def put(self, row: ContractRequestLogger) -> None:
+        if self.durability == self.SYNC or self._stopping:
+            self._count(self.writer([row]))
+            return
+        with self._condition:
+            full = len(self._rows) >= self.max_buffer
+            if full:
+                self.blocked += 1
+                full = not self._condition.wait_for(lambda: len(self._rows) < self.max_buffer, self.block_timeout)
+            if not full:
+                self._append(row)
+        if full:
+            # Degrades to sync durability for this row instead of failing the request
+            self._count(self.writer([row]))
+            return
+        self._ensure_started()
+
+    def _append(self, row: ContractRequestLogger) -> None:
+        if not self._rows:
+            self._oldest = time.monotonic()
+        self._rows.append(row)
+        if len(self._rows) >= self.max_batch:
+            self._condition.notify_all()
+
+    def flush(self) -> int:
+        """
+        Writes everything buffered so far from the calling thread.
+        """
+        written = 0
+        while batch := self._take(force=True):
+            try:
+                written += self._write(batch)
+            except Exception:
+                self._requeue(batch)
+                raise
+        return written
+
+    def _take(self, force: bool = False) -> list[ContractRequestLogger]:
+        with self._condition:
+            due = self._oldest is not None and time.monotonic() - self._oldest >= self.max_delay
+            if not self._rows or not (force or due or len(self._rows) >= self.max_batch):
+                return []
+            batch, self._rows = self._rows[:self.max_batch], self._rows[self.max_batch:]
+            self._oldest = time.monotonic() if self._rows else None
+            self._condition.notify_all()
+            return batch
+
+    def _requeue(self, batch: list[ContractRequestLogger]) -> None:
+        # Back at the head, the rows keep their order and count against max_buffer again
+        with self._condition:
+            self._rows[:0] = batch
+            self._oldest = time.monotonic()
+
+    def _write(self, batch: list[ContractRequestLogger]) -> int:
+        self.flushes += 1
+        if self.durability == self.CELERY:
+            from .tasks import write_contract_requests
+            write_contract_requests.delay([
+                {'target': row.target, 'origin': row.origin, 'request_id': row.request_id,
+                 'created': row.created.isoformat()}
+                for row in batch
+            ])
+            written = len(batch)
+        else:
+            written = self.writer(batch)
+        self._count(written)
+        return written
+
+    def _count(self, written: int) -> None:
+        # Request threads write synchronously next to the background thread
+        with self._condition:
+            self.written += written
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._condition:
+            if self._thread is None and not self._stopping:
+                self._thread = Thread(target=self._run, name='contract-request-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        failures = 0
+        try:
+            while True:
+                with self._condition:
+                    if self._stopping:
+                        break
+                    if failures:
+                        timeout = min(self.retry_delay * 2 ** (failures - 1), self.max_retry_delay)
+                        self._condition.wait(timeout)
+                        if self._stopping:
+                            break
+                    timeout = self.max_delay
+                    if self._oldest is not None:
+                        timeout = max(0.0, self._oldest + self.max_delay - time.monotonic())
+                    if len(self._rows) < self.max_batch:
+                        self._condition.wait(timeout)
+                while batch := self._take(force=bool(failures)):
+                    try:
+                        self._write(batch)
+                        failures = 0
+                    except Exception:
+                        failures += 1
+                        self.failures += 1
+                        logger.exception('Failed to write %d contract requests, retrying', len(batch))
+                        self._requeue(batch)
+                        connections.close_all()
+                        break
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush %d contract requests at stop', len(self._rows))
+        finally:
+            connections.close_all()
+
+    def stop(self, timeout: float | None = 5.0) -> None:
+        """
+        Stops the background thread after a final flush, pending rows are
+        written from the calling thread when no thread was running.
+        """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        else:
+            self.flush()
+
+
+_buffer: ContractRequestBuffer | None = None
+_buffer_lock = Lock()
+
+
+def get_contract_logger() -> ContractRequestBuffer:
+    """
+    Process wide buffer configured from the CONTRACT_LOG_* settings, flushed at exit.
+    """
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = ContractRequestBuffer(
+                    max_batch=settings.CONTRACT_LOG_BATCH_SIZE,
+                    max_delay=settings.CONTRACT_LOG_FLUSH_INTERVAL,
+                    max_buffer=settings.CONTRACT_LOG_MAX_BUFFER,
+                    block_timeout=settings.CONTRACT_LOG_BLOCK_TIMEOUT,
+                    retry_delay=settings.CONTRACT_LOG_RETRY_DELAY,
+                    max_retry_delay=settings.CONTRACT_LOG_MAX_RETRY_DELAY,
+                    durability=settings.CONTRACT_LOG_DURABILITY,
+                )
+                atexit.register(_buffer.stop)
+    return _buffer
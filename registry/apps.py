@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RegistryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'registry'
+
+    def ready(self) -> None:
+        from . import change_feed, signals
+        change_feed.register(signals.apply_changes)
@@ -0,0 +1,198 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Callable
+
+from cryptography.exceptions import InvalidSignature
+from django.conf import settings
+
+from common.crypto.authorization import AuthorizationHeader, parse_authorization_header, signing_string
+from common.crypto.digest import Digest
+from common.crypto.exception import AuthorizationError, SignatureVerificationFailed
+from common.crypto.main import Cryptographer, SigningPublicKey
+from monitor.instrumentation import metrics_enabled, observe_stage
+from . import keyring, sharding
+from .models import Subscriber
+
+
+class UnknownSigningKey(AuthorizationError):
+    def __init__(self, key_id: str) -> None:
+        super().__init__(f"No subscriber key found for {key_id}")
+
+
+@dataclass(frozen=True, slots=True)
+class SigningKey:
+    subscriber_id: str
+    unique_key_id: str
+    signing_public_key: str
+
+    def load_signing_key(self, algo: str) -> SigningPublicKey:
+        return Cryptographer.load_signing_key(self.signing_public_key, algo)
+
+
+class SubscriberKeyResolver:
+    """
+    Resolves the signing key of a SUBSCRIBED subscriber's unique_key_id,
+    within its validity window, with at most one query per key id. Results
+    are kept in a bounded LRU for ttl seconds (negative_ttl for unknown key
+    ids, which callers pick freely) and dropped by the registry signals as
+    soon as the subscriber changes.
+    """
+
+    def __init__(self, ttl: float | None = None, negative_ttl: float | None = None, maxsize: int | None = None,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.ttl = settings.AUTHORIZATION_KEY_TTL if ttl is None else ttl
+        self.negative_ttl = settings.AUTHORIZATION_UNKNOWN_KEY_TTL if negative_ttl is None else negative_ttl
+        self.maxsize = maxsize or settings.AUTHORIZATION_KEY_CACHE_SIZE
+        self.clock = clock
+        self._entries: OrderedDict[str, tuple[float, SigningKey | None]] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self, unique_key_id: str) -> SigningKey | None:
+        def select(using: str | None) -> tuple | None:
+            # Keys outside their validity window fail before the expiry sweep marks them
+            return Subscriber.objects.using(using).active() \
+                .filter(unique_key_id=unique_key_id, status=Subscriber.SubscriptionStatus.SUBSCRIBED) \
+                .values_list('subscriber_id', 'key_pair').first()
+        # The key id doesn't tell the shard, every shard is asked at once
+        if sharding.sharding_enabled():
+            row = next((row for row in sharding.scatter(select) if row is not None), None)
+        else:
+            row = select(None)
+        if row is None or not row[1].get('signing_public_key'):
+            return None
+        return SigningKey(row[0], unique_key_id, row[1]['signing_public_key'])
+
+    def resolve(self, unique_key_id: str) -> SigningKey | None:
+        now = self.clock()
+        entry = self._entries.get(unique_key_id)
+        if entry is not None and entry[0] > now:
+            with self._lock:
+                try:
+                    self._entries.move_to_end(unique_key_id)
+                except KeyError:
+                    # Evicted or invalidated meanwhile
+                    pass
+            return entry[1]
+        key = self.load(unique_key_id)
+        ttl = self.ttl if key is not None else self.negative_ttl
+        with self._lock:
+            if ttl > 0:
+                self._entries[unique_key_id] = (now + ttl, key)
+                self._entries.move_to_end(unique_key_id)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.pop(unique_key_id, None)
+        return key
+
+    def invalidate(self, unique_key_id: str) -> None:
+        with self._lock:
+            self._entries.pop(unique_key_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+default_resolver = SubscriberKeyResolver()
+
+
+class RequestKeyResolver:
+    """
+    Resolves the signing key a subscribe request registers, from its
+    message.entity: verifying the request against it proves the sender
+    holds the private key of the subscriber_id and unique_key_id it claims.
+    """
+
+    def __init__(self, entity: dict) -> None:
+        self.entity = entity if isinstance(entity, dict) else {}
+
+    def resolve(self, unique_key_id: str) -> SigningKey | None:
+        key_pair = self.entity.get('key_pair')
+        signing_public_key = key_pair.get('signing_public_key') if isinstance(key_pair, dict) else None
+        subscriber_id = self.entity.get('subscriber_id')
+        if self.entity.get('unique_key_id') != unique_key_id or not isinstance(subscriber_id, str) \
+                or not isinstance(signing_public_key, str):
+            return None
+        return SigningKey(subscriber_id, unique_key_id, signing_public_key)
+
+
+def default_key_resolver() -> 'SubscriberKeyResolver | keyring.KeyRing':
+    # The key ring resolves from memory, the resolver with a query per key id
+    if keyring.keyring_enabled():
+        return keyring.get_keyring()
+    return default_resolver
+
+
+@dataclass(slots=True)
+class VerifiedAuthorization:
+    header: AuthorizationHeader
+    key: SigningKey | keyring.KeyEntry
+    digest: str
+    # Seconds spent in each stage of the pipeline
+    timings: dict[str, float] = field(default_factory=dict)
+
+
+class AuthorizationVerifier:
+    """
+    Verifies a Beckn Authorization header against the request body:
+    parse -> window -> lookup -> digest -> verify. The created/expires window
+    is checked before any lookup or crypto, the key is resolved once per key
+    id and the digest is computed once (or passed in when already streamed).
+    """
+
+    STAGES = ('parse', 'window', 'lookup', 'digest', 'verify')
+
+    def __init__(self, resolver: 'SubscriberKeyResolver | keyring.KeyRing | None' = None,
+                 clock_skew: int | None = None, clock: Callable[[], float] = time.time) -> None:
+        self.resolver = resolver if resolver is not None else default_key_resolver()
+        self.clock_skew = settings.AUTHORIZATION_CLOCK_SKEW if clock_skew is None else clock_skew
+        self.clock = clock
+
+    def verify(self, authorization: str, body: bytes | memoryview | None = None,
+               digest: str | None = None) -> VerifiedAuthorization:
+        if body is None and digest is None:
+            raise ValueError('Either the body or its digest is required')
+        timings: dict[str, float] = {}
+        mark = time.perf_counter()
+
+        def lap(stage: str) -> None:
+            nonlocal mark
+            now = time.perf_counter()
+            timings[stage] = now - mark
+            mark = now
+
+        header = parse_authorization_header(authorization)
+        lap('parse')
+
+        header.check_window(int(self.clock()), self.clock_skew)
+        lap('window')
+
+        key = self.resolver.resolve(header.unique_key_id)
+        if key is None or key.subscriber_id != header.subscriber_id:
+            raise UnknownSigningKey(header.key_id)
+        lap('lookup')
+
+        if digest is None:
+            digest = Digest().update(body).b64digest()
+        lap('digest')
+
+        try:
+            public_key = key.load_signing_key(header.algorithm)
+            public_key.verify(
+                Cryptographer.bytes_from_encoded(header.signature),
+                signing_string(header.created, header.expires, digest).encode()
+            )
+        except (InvalidSignature, ValueError):
+            raise SignatureVerificationFailed(header.key_id)
+        lap('verify')
+
+        if metrics_enabled():
+            for name, seconds in timings.items():
+                observe_stage(f'authorization.{name}', seconds)
+        return VerifiedAuthorization(header=header, key=key, digest=digest, timings=timings)
@@ -0,0 +1,247 @@
+import sys
+from threading import RLock
+from typing import Iterable, Iterator
+from uuid import UUID
+
+from django.conf import settings
+
+from . import sharding
+from .models import NetworkParticipant
+
+
+def _set_bit(bitmap: bytearray, position: int) -> None:
+    byte = position >> 3
+    if byte >= len(bitmap):
+        bitmap.extend(bytes(byte - len(bitmap) + 1))
+    bitmap[byte] |= 1 << (position & 7)
+
+
+def _positions(bits: int) -> Iterator[int]:
+    """
+    Set bits of `bits`, one pass over its bytes rather than a big int
+    operation per bit.
+    """
+    for byte_index, byte in enumerate(bits.to_bytes((bits.bit_length() + 7) // 8, 'little')):
+        while byte:
+            lowest = byte & -byte
+            yield (byte_index << 3) + lowest.bit_length() - 1
+            byte ^= lowest
+
+
+class ParticipantBitmapIndex:
+    """
+    In process (domain, type, city) index over NetworkParticipant rows.
+    Every participant gets a dense integer id and every domain, type and
+    city keeps an int bitset of those ids, a lookup is a bitwise AND of the
+    bitsets (OR across the requested cities) without any conversion.
+    Bulk loads set bits in bytearrays and turn them into ints once, single
+    rows update the ints. Ids of removed participants are reused so the
+    bitsets stay dense.
+    """
+
+    def __init__(self) -> None:
+        self._lock = RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._positions: dict[UUID, int] = {}
+        # position -> (participant id, subscriber pk), None for free slots
+        self._rows: list[tuple[UUID, str] | None] = []
+        # position -> (domain, type, cities) so that removal clears the right bitsets
+        self._attributes: list[tuple[str, str | None, tuple[str, ...]] | None] = []
+        self._free: list[int] = []
+        self._live = 0
+        self._by_domain: dict[str, int] = {}
+        self._by_type: dict[str, int] = {}
+        self._by_city: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, participant_id: UUID) -> bool:
+        return participant_id in self._positions
+
+    @classmethod
+    def build(cls, queryset=None) -> 'ParticipantBitmapIndex':
+        index = cls()
+        index.load(queryset)
+        return index
+
+    def load(self, queryset=None) -> None:
+        """
+        Adds the participants of queryset, by default those of every shard
+        or of the registry database.
+        """
+        if queryset is None:
+            if not sharding.sharding_enabled():
+                return self.load(NetworkParticipant.objects.all())
+            for alias in sharding.registry_databases():
+                self.load(NetworkParticipant.objects.using(alias))
+            return
+        rows = queryset.values_list('id', 'subscriber_id', 'domain', 'type', 'city_code') \
+            .order_by().iterator(chunk_size=5000)
+        live = bytearray()
+        by_domain: dict[str, bytearray] = {}
+        by_type: dict[str, bytearray] = {}
+        by_city: dict[str, bytearray] = {}
+        with self._lock:
+            for participant_id, subscriber_id, domain, type, city_code in rows:
+                if participant_id in self._positions:
+                    self.remove(participant_id)
+                position, cities = self._place(participant_id, subscriber_id, domain, type, city_code)
+                _set_bit(live, position)
+                _set_bit(by_domain.setdefault(domain, bytearray()), position)
+                if type is not None:
+                    _set_bit(by_type.setdefault(type, bytearray()), position)
+                for city in cities:
+                    _set_bit(by_city.setdefault(city, bytearray()), position)
+            self._live |= int.from_bytes(live, 'little')
+            for bitsets, loaded in ((self._by_domain, by_domain), (self._by_type, by_type),
+                                    (self._by_city, by_city)):
+                for key, bitmap in loaded.items():
+                    bitsets[key] = bitsets.get(key, 0) | int.from_bytes(bitmap, 'little')
+
+    def add(self, participant: NetworkParticipant) -> None:
+        self.add_row(participant.id, participant.subscriber_id, participant.domain,
+                     participant.type, participant.city_code)
+
+    def add_row(self, participant_id: UUID, subscriber_id: str, domain: str,
+                type: str | None, city_code: Iterable[str]) -> None:
+        with self._lock:
+            if participant_id in self._positions:
+                self.remove(participant_id)
+            position, cities = self._place(participant_id, subscriber_id, domain, type, city_code)
+            bit = 1 << position
+            self._live |= bit
+            self._by_domain[domain] = self._by_domain.get(domain, 0) | bit
+            if type is not None:
+                self._by_type[type] = self._by_type.get(type, 0) | bit
+            for city in cities:
+                self._by_city[city] = self._by_city.get(city, 0) | bit
+
+    def _place(self, participant_id: UUID, subscriber_id: str, domain: str, type: str | None,
+               city_code: Iterable[str]) -> tuple[int, tuple[str, ...]]:
+        if self._free:
+            position = self._free.pop()
+        else:
+            position = len(self._rows)
+            self._rows.append(None)
+            self._attributes.append(None)
+        cities = tuple(set(city_code))
+        self._positions[participant_id] = position
+        self._rows[position] = (participant_id, subscriber_id)
+        self._attributes[position] = (domain, type, cities)
+        return position, cities
+
+    def remove(self, participant_id: UUID) -> None:
+        with self._lock:
+            position = self._positions.pop(participant_id, None)
+            if position is None:
+                return
+            domain, type, cities = self._attributes[position]
+            mask = ~(1 << position)
+            self._live &= mask
+            self._by_domain[domain] &= mask
+            if type is not None:
+                self._by_type[type] &= mask
+            for city in cities:
+                self._by_city[city] &= mask
+            self._rows[position] = None
+            self._attributes[position] = None
+            self._free.append(position)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+
+    def _match(self, domain: str | None, type: str | None, city: list[str] | None) -> int:
+        bits = self._live
+        if domain is not None:
+            bits &= self._by_domain.get(domain, 0)
+        if type is not None:
+            bits &= self._by_type.get(type, 0)
+        if city:
+            cities = 0
+            for code in city:
+                cities |= self._by_city.get(code, 0)
+            bits &= cities
+        return bits
+
+    def query(self, domain: str | None = None, type: str | None = None,
+              city: list[str] | None = None, limit: int | None = None) -> list[UUID] | None:
+        """
+        Ids of the participants matching all the given filters, None skips a
+        filter. None when more than `limit` participants match.
+        """
+        with self._lock:
+            bits = self._match(domain, type, city)
+            if limit is not None and bits.bit_count() > limit:
+                return None
+            rows = self._rows
+            return [rows[position][0] for position in _positions(bits)]
+
+    def query_subscribers(self, domain: str | None = None, type: str | None = None,
+                          city: list[str] | None = None) -> set[str]:
+        with self._lock:
+            bits = self._match(domain, type, city)
+            rows = self._rows
+            return {rows[position][1] for position in _positions(bits)}
+
+    def count(self, domain: str | None = None, type: str | None = None,
+              city: list[str] | None = None) -> int:
+        with self._lock:
+            return self._match(domain, type, city).bit_count()
+
+    def memory_report(self) -> dict[str, int]:
+        """
+        Approximate bytes held by each part of the index.
+        """
+        def bitsets(mapping: dict[str, int]) -> int:
+            return sys.getsizeof(mapping) + sum(
+                sys.getsizeof(key) + sys.getsizeof(bitmap) for key, bitmap in mapping.items()
+            )
+        report = {
+            'participants': len(self._positions),
+            'domain_bitsets': bitsets(self._by_domain),
+            'type_bitsets': bitsets(self._by_type),
+            'city_bitsets': bitsets(self._by_city),
+            'live_bitset': sys.getsizeof(self._live),
+            'id_map': sys.getsizeof(self._positions) + sys.getsizeof(self._rows)
+                      + sys.getsizeof(self._attributes) + sys.getsizeof(self._free),
+            'rows': sum(
+                sys.getsizeof(row) + sys.getsizeof(row[0]) + sys.getsizeof(attributes)
+                for row, attributes in zip(self._rows, self._attributes) if row is not None
+            ),
+        }
+        report['total'] = sum(value for key, value in report.items() if key != 'participants')
+        return report
+
+
+_index: ParticipantBitmapIndex | None = None
+_index_lock = RLock()
+
+
+def index_enabled() -> bool:
+    return getattr(settings, 'REGISTRY_BITMAP_INDEX', False)
+
+
+def get_index() -> ParticipantBitmapIndex:
+    """
+    Process wide index, built from the database on first use.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ParticipantBitmapIndex.build()
+    return _index
+
+
+def reset_index() -> None:
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def is_index_built() -> bool:
+    return _index is not None
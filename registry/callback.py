@@ -0,0 +1,190 @@
+import asyncio
+import secrets
+import ssl
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Iterable
+from urllib.parse import urlsplit
+
+import httpx
+from django.conf import settings
+from django.utils import timezone
+
+from common.crypto.batch import BatchEncryptor, EncryptionJob
+from common.crypto.constants import EncryptionAlgorithm
+from common.crypto.main import Cryptographer
+from . import sharding
+from .models import Subscriber
+from .signals import notify_bulk_updated
+
+
+SubscriptionStatus = Subscriber.SubscriptionStatus
+
+
+@dataclass(frozen=True)
+class CallbackTarget:
+    unique_key_id: str
+    subscriber_id: str
+    callback_url: str
+    encryption_public_key: str
+
+    @classmethod
+    def from_subscriber(cls, subscriber: Subscriber | dict) -> 'CallbackTarget':
+        get = subscriber.get if isinstance(subscriber, dict) else lambda name: getattr(subscriber, name)
+        return cls(
+            unique_key_id=get('unique_key_id'),
+            subscriber_id=get('subscriber_id'),
+            callback_url=get('callback_url'),
+            encryption_public_key=(get('key_pair') or {}).get('encryption_public_key', ''),
+        )
+
+    @property
+    def url(self) -> str:
+        # Always a path on the subscriber_id host, answering the challenge there proves control of the domain.
+        # Only the path of a host or scheme stored before callback_url was validated is kept.
+        path = urlsplit(self.callback_url).path.lstrip('/')
+        return f"https://{self.subscriber_id}/{path}".rstrip('/') + '/on_subscribe'
+
+
+@dataclass(frozen=True)
+class CallbackResult:
+    unique_key_id: str
+    status: str
+    error: str | None = None
+    seconds: float = 0.0
+    # The callback could not be reached, a later attempt may pass
+    retryable: bool = False
+
+    @property
+    def verified(self) -> bool:
+        return self.status == SubscriptionStatus.SUBSCRIBED
+
+
+def _is_ssl_error(exc: BaseException) -> bool:
+    while exc is not None:
+        if isinstance(exc, ssl.SSLError):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+class CallbackVerifier:
+    """
+    Sends the on_subscribe challenge to many subscribers at once. The
+    challenge is sealed with the subscriber's X25519 key and the callback
+    must answer with the plain challenge. All requests share one pooled
+    httpx client, with a global and a per host concurrency limit.
+    """
+
+    def __init__(self, per_host_limit: int | None = None, max_connections: int | None = None,
+                 timeout: float | None = None, verify_ssl: bool | ssl.SSLContext = True,
+                 transport: httpx.AsyncBaseTransport | None = None) -> None:
+        self.per_host_limit = per_host_limit or settings.CALLBACK_PER_HOST_LIMIT
+        self.max_connections = max_connections or settings.CALLBACK_MAX_CONNECTIONS
+        self.timeout = timeout or settings.CALLBACK_TIMEOUT
+        self.verify_ssl = verify_ssl
+        # Replaces the connection pool, the stub server's transport in tests and benchmarks
+        self.transport = transport
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            timeout=self.timeout,
+            verify=self.verify_ssl,
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections),
+            transport=self.transport,
+        )
+
+    @staticmethod
+    def seal(targets: list[CallbackTarget]) -> list[tuple[str, str | None]]:
+        """
+        A fresh challenge per target and its sealed form, None when the key is
+        unusable. Sealed in bulk over threads, Celery's prefork workers can't
+        start a process pool.
+        """
+        challenges = [secrets.token_urlsafe(32) for _ in targets]
+        with BatchEncryptor(mode=BatchEncryptor.THREAD) as encryptor:
+            sealed = encryptor.encrypt(
+                EncryptionJob(target.encryption_public_key, challenge) for target, challenge in zip(targets, challenges)
+            )
+        return list(zip(challenges, sealed))
+
+    async def verify(self, client: httpx.AsyncClient, target: CallbackTarget,
+                     sealed: tuple[str, str | None] | None = None) -> CallbackResult:
+        """
+        sealed is the (challenge, encrypted challenge) pair of seal(), sealed
+        here when not given.
+        """
+        started = time.perf_counter()
+        if sealed is None:
+            challenge = secrets.token_urlsafe(32)
+            try:
+                encrypted = Cryptographer(target.encryption_public_key, EncryptionAlgorithm.X25519.value) \
+                    .encrypt(challenge)
+            except Exception as exc:
+                return CallbackResult(target.unique_key_id, SubscriptionStatus.UNDER_SUBSCRIPTION,
+                                      f'Invalid encryption key: {exc}', time.perf_counter() - started)
+        else:
+            challenge, encrypted = sealed
+            if encrypted is None:
+                return CallbackResult(target.unique_key_id, SubscriptionStatus.UNDER_SUBSCRIPTION,
+                                      'Invalid encryption key', time.perf_counter() - started)
+        try:
+            response = await client.post(target.url, json={
+                'subscriber_id': target.subscriber_id,
+                'challenge': encrypted,
+            })
+            response.raise_for_status()
+            answer = response.json().get('answer')
+        except (httpx.HTTPError, OSError) as exc:
+            if _is_ssl_error(exc):
+                return CallbackResult(target.unique_key_id, SubscriptionStatus.INVALID_SSL,
+                                      f'{type(exc).__name__}: {exc}', time.perf_counter() - started)
+            return CallbackResult(target.unique_key_id, SubscriptionStatus.UNDER_SUBSCRIPTION,
+                                  f'{type(exc).__name__}: {exc}', time.perf_counter() - started,
+                                  retryable=not isinstance(exc, httpx.HTTPStatusError))
+        except (ValueError, AttributeError):
+            answer = None
+        if not isinstance(answer, str) or not secrets.compare_digest(answer, challenge):
+            return CallbackResult(target.unique_key_id, SubscriptionStatus.UNDER_SUBSCRIPTION,
+                                  'Challenge answer mismatch', time.perf_counter() - started)
+        return CallbackResult(target.unique_key_id, SubscriptionStatus.SUBSCRIBED,
+                              seconds=time.perf_counter() - started)
+
+    async def verify_many(self, targets: Iterable[CallbackTarget],
+                          client: httpx.AsyncClient | None = None) -> list[CallbackResult]:
+        """
+        Results are returned in input order, the challenges are sealed up front.
+        """
+        targets = list(targets)
+        sealed = self.seal(targets)
+        host_limits: dict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(self.per_host_limit))
+
+        async def limited(client: httpx.AsyncClient, target: CallbackTarget, pair: tuple) -> CallbackResult:
+            async with host_limits[urlsplit(target.url).netloc]:
+                return await self.verify(client, target, pair)
+
+        if client is not None:
+            return list(await asyncio.gather(*(limited(client, target, pair) for target, pair in zip(targets, sealed))))
+        async with self.client() as client:
+            return list(await asyncio.gather(*(limited(client, target, pair) for target, pair in zip(targets, sealed))))
+
+
+def set_statuses(statuses: dict[str, list[str]]) -> dict[str, int]:
+    """
+    Moves the subscribers to their status, one UPDATE per status on every
+    database holding some of them, and returns how many moved per status.
+    """
+    now = timezone.now()
+    updated: dict[str, int] = defaultdict(int)
+    located = sharding.locate(Subscriber, {key for keys in statuses.values() for key in keys})
+    for using, keys in located.items():
+        keys = set(keys)
+        for status, unique_key_ids in statuses.items():
+            unique_key_ids = [key for key in unique_key_ids if key in keys]
+            if unique_key_ids:
+                updated[status] += Subscriber.objects.using(using).filter(unique_key_id__in=unique_key_ids) \
+                    .update(status=status, updated=now)
+        notify_bulk_updated(list(keys), using=using)
+    return dict(updated)
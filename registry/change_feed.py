@@ -0,0 +1,290 @@
+"""
+Cross-process change feed of the registry tables on Postgres LISTEN/NOTIFY.
+
+Writes of Subscriber, NetworkParticipant and SellerOnRecord rows (through
+the signals of registry.signals) append a RegistryChange row, whose id is
+the change's version, and NOTIFY a compact `model|version|published|pk`
+event on REGISTRY_CHANGE_FEED_CHANNEL in the writing transaction, so it is
+only delivered once committed. Every process runs one ChangeListener per
+registry database, dispatching events to the callbacks registered with
+register(). After a lost connection the listener reconnects with backoff
+and replays the change log past the last version it received, together
+with the lower versions it never received (transactions that had not
+committed yet).
+
+Listeners are threads, a process forked after starting them (a WSGI server
+preloading the application) starts its own in the child.
+"""
+import logging
+import os
+import select
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import timedelta
+from threading import Event, Lock, Thread
+from typing import Callable, Iterable
+
+import psycopg2
+from django.conf import settings
+from django.db import DatabaseError, connections, router
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from monitor.instrumentation import get_metrics, metrics_enabled
+from . import sharding
+from .models import RegistryChange, Subscriber
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class ChangeEvent:
+    model: str
+    pk: str
+    version: int
+    # time.time() when the change was published, inside the writing transaction
+    published: float
+    # Database the change was made on, not part of the payload
+    using: str | None = None
+
+    def payload(self) -> str:
+        return f'{self.model}|{self.version}|{self.published:.6f}|{self.pk}'
+
+    @classmethod
+    def parse(cls, payload: str, using: str | None = None) -> 'ChangeEvent':
+        model, version, published, pk = payload.split('|', 3)
+        return cls(model, pk, int(version), float(published), using)
+
+
+Callback = Callable[[list[ChangeEvent]], None]
+_callbacks: list[Callback] = []
+_callbacks_lock = Lock()
+
+
+def feed_enabled() -> bool:
+    return settings.REGISTRY_CHANGE_FEED
+
+
+def register(callback: Callback) -> None:
+    """
+    Calls callback with every batch of events received by this process,
+    including the changes it made itself. Events may repeat after a catch up.
+    """
+    with _callbacks_lock:
+        if callback not in _callbacks:
+            _callbacks.append(callback)
+
+
+def unregister(callback: Callback) -> None:
+    with _callbacks_lock:
+        if callback in _callbacks:
+            _callbacks.remove(callback)
+
+
+def dispatch(events: list[ChangeEvent]) -> None:
+    with _callbacks_lock:
+        callbacks = list(_callbacks)
+    for callback in callbacks:
+        try:
+            callback(events)
+        except Exception:
+            logger.exception('Change feed callback %r failed', callback)
+
+
+def feed_databases() -> list[str]:
+    if sharding.sharding_enabled():
+        return sharding.all_shards()
+    return [router.db_for_write(Subscriber)]
+
+
+def publish(model: str, pks: Iterable, using: str | None = None) -> list[ChangeEvent]:
+    """
+    Logs and notifies changes of `model` rows, must run on the connection
+    (and inside the transaction, if any) that wrote them.
+    """
+    using = using or router.db_for_write(Subscriber)
+    published = time.time()
+    rows = RegistryChange.objects.using(using).bulk_create(
+        [RegistryChange(model=model, object_id=str(pk)) for pk in pks]
+    )
+    events = [ChangeEvent(model, row.object_id, row.id, published, using) for row in rows]
+    if events:
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload',
+                [settings.REGISTRY_CHANGE_FEED_CHANNEL, [event.payload() for event in events]]
+            )
+    return events
+
+
+def prune(using: str | None = None, older_than: float | None = None) -> int:
+    """
+    Deletes change log rows older than REGISTRY_CHANGE_FEED_RETENTION seconds.
+    """
+    older_than = settings.REGISTRY_CHANGE_FEED_RETENTION if older_than is None else older_than
+    limit = timezone.now() - timedelta(seconds=older_than)
+    databases = [using] if using else feed_databases()
+    return sum(RegistryChange.objects.using(alias).filter(created__lt=limit).delete()[0] for alias in databases)
+
+
+class ChangeListener:
+    """
+    LISTENs on one database from a thread of its own, over a connection of
+    its own, and hands every batch of events to on_events.
+    Versions are allocated when a change is logged but delivered when it
+    commits, so a lower version may arrive after a higher one. The versions
+    skipped below last_version are kept as gaps (max_gaps at most, the
+    oldest are dropped as rolled back) and replayed with the newer ones
+    after a reconnect.
+    """
+
+    def __init__(self, alias: str, on_events: Callback = dispatch, channel: str | None = None,
+                 poll_interval: float = 1.0, max_gaps: int = 10000,
+                 clock: Callable[[], float] = time.time) -> None:
+        self.alias = alias
+        self.on_events = on_events
+        self.channel = channel or settings.REGISTRY_CHANGE_FEED_CHANNEL
+        self.poll_interval = poll_interval
+        self.max_gaps = max_gaps
+        self.clock = clock
+        # Highest version received, None before the first connection
+        self.last_version: int | None = None
+        self.gaps: set[int] = set()
+        self.reconnects = 0
+        # Server process of the LISTEN connection
+        self.backend_pid: int | None = None
+        # Seconds from publish to dispatch of the latest events
+        self.latencies: deque[float] = deque(maxlen=10000)
+        self.connected = Event()
+        self._stopped = Event()
+        self._thread: Thread | None = None
+
+    def connect(self):
+        wrapper = connections[self.alias]
+        connection = wrapper.get_new_connection(wrapper.get_connection_params())
+        connection.autocommit = True
+        self.backend_pid = connection.get_backend_pid()
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {wrapper.ops.quote_name(self.channel)}')
+        return connection
+
+    def latest_version(self) -> int:
+        return RegistryChange.objects.using(self.alias).aggregate(version=Max('id'))['version'] or 0
+
+    def catch_up(self) -> list[ChangeEvent]:
+        """
+        Logged changes never received: past last_version or in its gaps.
+        """
+        rows = RegistryChange.objects.using(self.alias) \
+            .filter(Q(id__gt=self.last_version or 0) | Q(id__in=sorted(self.gaps))).order_by('id') \
+            .values_list('model', 'object_id', 'id', 'created')
+        return [ChangeEvent(model, pk, version, created.timestamp(), self.alias)
+                for model, pk, version, created in rows]
+
+    def track(self, versions: list[int]) -> None:
+        self.gaps.difference_update(versions)
+        last_version = self.last_version or 0
+        latest = max(versions)
+        if latest > last_version:
+            received = set(versions)
+            self.gaps.update(version for version in range(last_version + 1, latest) if version not in received)
+            self.last_version = latest
+        if len(self.gaps) > self.max_gaps:
+            self.gaps = set(sorted(self.gaps)[-self.max_gaps:])
+
+    def handle(self, events: list[ChangeEvent]) -> None:
+        if not events:
+            return
+        now = self.clock()
+        latencies = [now - event.published for event in events]
+        self.latencies.extend(latencies)
+        if metrics_enabled():
+            histogram = get_metrics().change_feed_latency
+            for event, latency in zip(events, latencies):
+                histogram.observe(latency, event.model)
+        self.track([event.version for event in events])
+        self.on_events(events)
+
+    def listen(self, connection) -> None:
+        while not self._stopped.is_set():
+            if select.select([connection], [], [], self.poll_interval) != ([], [], []):
+                connection.poll()
+                notifies = connection.notifies[:]
+                del connection.notifies[:]
+                self.handle([ChangeEvent.parse(notify.payload, self.alias) for notify in notifies])
+
+    def run(self) -> None:
+        delay = settings.REGISTRY_CHANGE_FEED_RECONNECT_DELAY
+        while not self._stopped.is_set():
+            try:
+                connection = self.connect()
+            except (psycopg2.Error, DatabaseError, OSError) as exc:
+                logger.warning('Change feed of %s could not connect, retrying in %.1fs: %s', self.alias, delay, exc)
+                self._stopped.wait(delay)
+                delay = min(delay * 2, settings.REGISTRY_CHANGE_FEED_RECONNECT_MAX_DELAY)
+                continue
+            delay = settings.REGISTRY_CHANGE_FEED_RECONNECT_DELAY
+            try:
+                if self.last_version is None:
+                    # Listening already, later changes are delivered
+                    self.last_version = self.latest_version()
+                else:
+                    self.reconnects += 1
+                    self.handle(self.catch_up())
+                self.connected.set()
+                self.listen(connection)
+            except (psycopg2.Error, DatabaseError, OSError) as exc:
+                logger.warning('Change feed of %s lost its connection: %s', self.alias, exc)
+            finally:
+                self.connected.clear()
+                connection.close()
+                connections[self.alias].close()
+
+    def start(self) -> 'ChangeListener':
+        self._thread = Thread(target=self.run, name=f'change-feed-{self.alias}', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+_listeners: dict[str, ChangeListener] = {}
+_listeners_lock = Lock()
+
+
+def start_listeners() -> list[ChangeListener]:
+    """
+    Starts this process's listeners when REGISTRY_CHANGE_FEED is on, once.
+    """
+    if not feed_enabled():
+        return []
+    with _listeners_lock:
+        for alias in feed_databases():
+            if alias not in _listeners:
+                _listeners[alias] = ChangeListener(alias).start()
+        return list(_listeners.values())
+
+
+def stop_listeners(timeout: float | None = None) -> None:
+    with _listeners_lock:
+        listeners = list(_listeners.values())
+        _listeners.clear()
+    for listener in listeners:
+        listener.stop(timeout)
+
+
+def _restart_after_fork() -> None:
+    # Only the forking thread survives a fork, the inherited listeners are dead
+    global _listeners_lock
+    _listeners_lock = Lock()
+    if _listeners:
+        _listeners.clear()
+        start_listeners()
+
+
+os.register_at_fork(after_in_child=_restart_after_fork)
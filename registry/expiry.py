@@ -0,0 +1,48 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.db import router, transaction
+from django.utils import timezone
+
+from . import sharding
+from .models import Subscriber
+from .signals import notify_bulk_updated
+
+
+SubscriptionStatus = Subscriber.SubscriptionStatus
+
+# Statuses a subscriber whose key expired is not moved out of, the condition of registry_sub_expiring_idx
+FINAL_STATUSES = (SubscriptionStatus.UNSUBSCRIBED, SubscriptionStatus.EXPIRED)
+
+
+def expire_on(using: str, at: datetime, batch_size: int) -> int:
+    """
+    Marks the subscribers of one database whose key expired before `at`
+    EXPIRED, one UPDATE per batch of batch_size rows.
+    """
+    expired = 0
+    while True:
+        with transaction.atomic(using=using):
+            unique_key_ids = list(
+                Subscriber.objects.using(using).expired(at).exclude(status__in=FINAL_STATUSES)
+                .values_list('unique_key_id', flat=True)[:batch_size]
+            )
+            if not unique_key_ids:
+                return expired
+            expired += Subscriber.objects.using(using).filter(unique_key_id__in=unique_key_ids) \
+                .update(status=SubscriptionStatus.EXPIRED, updated=timezone.now())
+            notify_bulk_updated(unique_key_ids, using=using)
+        if len(unique_key_ids) < batch_size:
+            return expired
+
+
+def expire_subscribers(at: datetime | None = None, batch_size: int | None = None) -> int:
+    """
+    Marks every subscriber whose key_pair valid_until passed EXPIRED, on
+    every shard, and returns how many were marked.
+    """
+    at = at or timezone.now()
+    batch_size = batch_size or settings.KEY_EXPIRY_BATCH_SIZE
+    if not sharding.sharding_enabled():
+        return expire_on(router.db_for_write(Subscriber), at, batch_size)
+    return sum(sharding.scatter(lambda alias: expire_on(alias, at, batch_size)))
@@ -0,0 +1,324 @@
+"""
+Validation plans compiled from a DRF serializer tree.
+
+A plan walks the same fields, in the same order, as Serializer.run_validation
+but decides up front (once per thread) what every field needs: plain dict and
+list payloads skip get_value / validate_empty_values, and strings, choices,
+booleans and integers that are obviously valid are checked inline instead of
+going through to_internal_value and the per character null / surrogate
+validators. Anything else (missing or null values, other types, a failed
+check) is handed to the DRF field itself, so the validated data and the
+errors are exactly the ones the serializer produces.
+"""
+from collections import OrderedDict
+from threading import Lock, local
+from typing import Any, Callable
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.validators import (MaxLengthValidator, MaxValueValidator, MinLengthValidator, MinValueValidator,
+                                    ProhibitNullCharactersValidator)
+from rest_framework import serializers
+from rest_framework.fields import SkipField, empty, get_error_detail, set_value
+from rest_framework.serializers import as_serializer_error
+from rest_framework.validators import ProhibitSurrogateCharactersValidator
+
+
+# Returned by a leaf check that can't decide, the DRF field then validates the value
+_SLOW = object()
+
+
+def _run_validators(field: serializers.Field, validators: list, value: Any) -> None:
+    """
+    Field.run_validators over a subset of the field validators.
+    """
+    errors = []
+    for validator in validators:
+        try:
+            if getattr(validator, 'requires_context', False):
+                validator(value, field)
+            else:
+                validator(value)
+        except serializers.ValidationError as exc:
+            if isinstance(exc.detail, dict):
+                raise
+            errors.extend(exc.detail)
+        except DjangoValidationError as exc:
+            errors.extend(get_error_detail(exc))
+    if errors:
+        raise serializers.ValidationError(errors)
+
+
+def _length_limits(validators: list) -> tuple[int | None, int | None]:
+    max_length = min_length = None
+    for validator in validators:
+        if isinstance(validator, MaxLengthValidator):
+            max_length = validator.limit_value if max_length is None else min(max_length, validator.limit_value)
+        elif isinstance(validator, MinLengthValidator):
+            min_length = validator.limit_value if min_length is None else max(min_length, validator.limit_value)
+    return max_length, min_length
+
+
+def _char_check(field: serializers.CharField, extras_allowed: bool) -> Callable | None:
+    # Null and surrogate characters can't be in ASCII strings without NUL, the
+    # length validators are checked on the stripped value like DRF does
+    inline = (MaxLengthValidator, MinLengthValidator, ProhibitNullCharactersValidator,
+              ProhibitSurrogateCharactersValidator)
+    if any(isinstance(validator, (MaxLengthValidator, MinLengthValidator)) and callable(validator.limit_value)
+           for validator in field.validators):
+        return None
+    max_length, min_length = _length_limits(field.validators)
+    extras = [validator for validator in field.validators if not isinstance(validator, inline)]
+    if extras and not extras_allowed:
+        return None
+    trim = field.trim_whitespace
+
+    def check(data):
+        if type(data) is str:
+            value = data.strip() if trim else data
+        elif type(data) is int:
+            value = str(data)
+        else:
+            return _SLOW
+        if not value or not value.isascii() or '\x00' in value:
+            return _SLOW
+        if max_length is not None and len(value) > max_length:
+            return _SLOW
+        if min_length is not None and len(value) < min_length:
+            return _SLOW
+        if extras:
+            _run_validators(field, extras, value)
+        return value
+    return check
+
+
+def _choice_check(field: serializers.ChoiceField) -> Callable | None:
+    if field.validators:
+        return None
+    choices = field.choice_strings_to_values
+
+    def check(data):
+        if type(data) is str and data and data in choices:
+            return choices[data]
+        return _SLOW
+    return check
+
+
+def _boolean_check(field: serializers.BooleanField) -> Callable | None:
+    if field.validators:
+        return None
+
+    def check(data):
+        return data if data is True or data is False else _SLOW
+    return check
+
+
+def _integer_check(field: serializers.IntegerField) -> Callable | None:
+    maximum = minimum = None
+    for validator in field.validators:
+        if type(validator) not in (MaxValueValidator, MinValueValidator) or callable(validator.limit_value):
+            return None
+        if type(validator) is MaxValueValidator:
+            maximum = validator.limit_value if maximum is None else min(maximum, validator.limit_value)
+        else:
+            minimum = validator.limit_value if minimum is None else max(minimum, validator.limit_value)
+
+    def check(data):
+        if type(data) is not int:
+            return _SLOW
+        if maximum is not None and data > maximum:
+            return _SLOW
+        if minimum is not None and data < minimum:
+            return _SLOW
+        return data
+    return check
+
+
+def _list_check(field: serializers.ListField) -> Callable | None:
+    if field.validators:
+        return None
+    child = _leaf_check(field.child, extras_allowed=False)
+    if child is None:
+        return None
+    allow_empty = field.allow_empty
+
+    def check(data):
+        if type(data) is not list or not (data or allow_empty):
+            return _SLOW
+        result = []
+        for item in data:
+            value = child(item)
+            if value is _SLOW:
+                return _SLOW
+            result.append(value)
+        return result
+    return check
+
+
+def _leaf_check(field: serializers.Field, extras_allowed: bool = True) -> Callable | None:
+    # Exact types only, subclasses may change to_internal_value
+    kind = type(field)
+    if kind in (serializers.CharField, serializers.EmailField):
+        return _char_check(field, extras_allowed)
+    if kind is serializers.ChoiceField:
+        return _choice_check(field)
+    if kind is serializers.BooleanField:
+        return _boolean_check(field)
+    if kind is serializers.IntegerField:
+        return _integer_check(field)
+    if kind is serializers.ListField:
+        return _list_check(field)
+    return None
+
+
+def compile_field(field: serializers.Field) -> Callable[[Any], Any]:
+    """
+    A callable doing what field.run_validation does for a bound field.
+    """
+    if isinstance(field, serializers.ListSerializer):
+        return ListSerializerPlan(field).run
+    if isinstance(field, serializers.Serializer):
+        return SerializerPlan(field).run
+    check = _leaf_check(field)
+    if check is None:
+        return field.run_validation
+    slow = field.run_validation
+
+    def run(data):
+        value = check(data)
+        return slow(data) if value is _SLOW else value
+    return run
+
+
+def _validate_method(serializer: serializers.BaseSerializer, base: type) -> Callable | None:
+    # The default validate() returns its input untouched
+    if type(serializer).validate is base.validate:
+        return None
+    return serializer.validate
+
+
+class SerializerPlan:
+    """
+    Serializer.run_validation and to_internal_value of one bound serializer.
+    """
+
+    def __init__(self, serializer: serializers.Serializer) -> None:
+        self.serializer = serializer
+        self.fields = [
+            (field.field_name, field.source_attrs, compile_field(field),
+             getattr(serializer, 'validate_' + field.field_name, None))
+            for field in serializer._writable_fields
+        ]
+        self.run_validators = serializer.run_validators if serializer.validators else None
+        self.validate = _validate_method(serializer, serializers.Serializer)
+
+    def run(self, data):
+        if type(data) is not dict:
+            return self.serializer.run_validation(data)
+        ret = OrderedDict()
+        errors = OrderedDict()
+        for name, source_attrs, run, validate_method in self.fields:
+            try:
+                value = run(data.get(name, empty))
+                if validate_method is not None:
+                    value = validate_method(value)
+            except serializers.ValidationError as exc:
+                errors[name] = exc.detail
+            except DjangoValidationError as exc:
+                errors[name] = get_error_detail(exc)
+            except SkipField:
+                pass
+            else:
+                if len(source_attrs) == 1:
+                    ret[source_attrs[0]] = value
+                else:
+                    set_value(ret, source_attrs, value)
+        if errors:
+            raise serializers.ValidationError(errors)
+        return self.finish(ret)
+
+    def finish(self, value):
+        if self.run_validators is None and self.validate is None:
+            return value
+        try:
+            if self.run_validators is not None:
+                self.run_validators(value)
+            if self.validate is not None:
+                value = self.validate(value)
+                assert value is not None, '.validate() should return the validated data'
+        except (serializers.ValidationError, DjangoValidationError) as exc:
+            raise serializers.ValidationError(detail=as_serializer_error(exc))
+        return value
+
+
+class ListSerializerPlan(SerializerPlan):
+    """
+    ListSerializer.run_validation and to_internal_value, the length and
+    type errors are left to the list serializer.
+    """
+
+    def __init__(self, serializer: serializers.ListSerializer) -> None:
+        self.serializer = serializer
+        self.child = compile_field(serializer.child)
+        self.run_validators = serializer.run_validators if serializer.validators else None
+        self.validate = _validate_method(serializer, serializers.ListSerializer)
+
+    def run(self, data):
+        serializer = self.serializer
+        if (type(data) is not list or not (data or serializer.allow_empty)
+                or (serializer.max_length is not None and len(data) > serializer.max_length)
+                or (serializer.min_length is not None and len(data) < serializer.min_length)):
+            return serializer.run_validation(data)
+        ret = []
+        errors = []
+        for item in data:
+            try:
+                validated = self.child(item)
+            except serializers.ValidationError as exc:
+                errors.append(exc.detail)
+            else:
+                ret.append(validated)
+                errors.append({})
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return self.finish(ret)
+
+
+class CompiledValidator:
+    """
+    Validates payloads for a serializer class through a plan of a
+    prebuilt instance, one per thread since DRF fields are bound to it.
+    """
+
+    def __init__(self, serializer_class: type[serializers.Serializer]) -> None:
+        self.serializer_class = serializer_class
+        self._local = local()
+
+    @property
+    def plan(self) -> SerializerPlan:
+        plan = getattr(self._local, 'plan', None)
+        if plan is None:
+            plan = self._local.plan = SerializerPlan(self.serializer_class())
+        return plan
+
+    def run_validation(self, data: dict, context: dict | None = None) -> OrderedDict:
+        """
+        Same as serializer_class(data=data, context=context).run_validation(data).
+        """
+        plan = self.plan
+        plan.serializer._context = context or {}
+        try:
+            return plan.run(data)
+        finally:
+            plan.serializer._context = {}
+
+
+_validators: dict[type, CompiledValidator] = {}
+_validators_lock = Lock()
+
+
+def get_validator(serializer_class: type[serializers.Serializer]) -> CompiledValidator:
+    validator = _validators.get(serializer_class)
+    if validator is None:
+        with _validators_lock:
+            validator = _validators.setdefault(serializer_class, CompiledValidator(serializer_class))
+    return validator
@@ -0,0 +1,172 @@
+import json
+import time
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Any, Iterable, Iterator, TextIO
+
+from django.db import IntegrityError, transaction
+
+from . import pipeline, sharding
+from .models import NetworkParticipant, SellerOnRecord, Subscriber
+from .serializers import WriteSubscriberSerializer, log_requests
+from .signals import notify_bulk_created
+
+
+@dataclass
+class IngestError:
+    # Position of the payload in the input (line number - 1 for NDJSON)
+    index: int
+    request_id: str | None
+    errors: Any
+
+
+@dataclass
+class IngestReport:
+    received: int = 0
+    created: int = 0
+    batches: int = 0
+    seconds: float = 0
+    errors: list[IngestError] = field(default_factory=list)
+
+    @property
+    def records_per_second(self) -> float:
+        return self.received / self.seconds if self.seconds else 0.0
+
+
+@dataclass
+class _Record:
+    index: int
+    request_id: str | None
+    message: dict
+    subscriber: Subscriber
+    participants: list[NetworkParticipant]
+    sellers: list[SellerOnRecord]
+
+
+class SubscriberBulkIngestor:
+    """
+    Ingests many subscribe payloads. Every payload is validated once with
+    WriteSubscriberSerializer, then each batch is written with one
+    bulk_create per model inside a single transaction. Once it committed
+    the request ids are logged and the subscription pipeline is started
+    for the batch. Invalid payloads
+    and key collisions are reported per record without aborting their batch.
+    """
+
+    def __init__(self, batch_size: int = 500, ignore_expiry: bool = False) -> None:
+        self.batch_size = batch_size
+        self.context = {'ignore_expiry': ignore_expiry}
+
+    def ingest(self, payloads: Iterable[Any]) -> IngestReport:
+        report = IngestReport()
+        started = time.perf_counter()
+        iterator = iter(enumerate(payloads))
+        # The request ids of earlier batches may not be in the contract log yet
+        request_ids: set[str] = set()
+        while batch := list(islice(iterator, self.batch_size)):
+            report.received += len(batch)
+            report.batches += 1
+            records = self._validate(batch, report, request_ids)
+            report.created += self._write(records, report)
+        report.seconds = time.perf_counter() - started
+        return report
+
+    def ingest_ndjson(self, lines: TextIO | Iterable[str]) -> IngestReport:
+        return self.ingest(self._parse_lines(lines))
+
+    @staticmethod
+    def _parse_lines(lines: Iterable[str]) -> Iterator[Any]:
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as exc:
+                # Surfaces as a validation error of this record
+                yield {'__invalid_json__': str(exc)}
+
+    def _validate(self, batch: list[tuple[int, Any]], report: IngestReport,
+                  request_ids: set[str] | None = None) -> list[_Record]:
+        request_ids = set() if request_ids is None else request_ids
+        records: list[_Record] = []
+        subscriber_keys: set[str] = set()
+        seller_keys: set[str] = set()
+        for index, payload in batch:
+            request_id = self._request_id(payload)
+            if isinstance(payload, dict) and '__invalid_json__' in payload:
+                report.errors.append(IngestError(index, None, {'non_field_errors': [payload['__invalid_json__']]}))
+                continue
+            serializer = WriteSubscriberSerializer(data=payload, context=self.context)
+            if not serializer.is_valid():
+                report.errors.append(IngestError(index, request_id, serializer.errors))
+                continue
+            subscriber, participants, sellers = serializer.build_instances(serializer.validated_data)
+            # Rows already in the database are caught by the serializer, duplicates inside the batch are not
+            if subscriber.unique_key_id in subscriber_keys:
+                report.errors.append(IngestError(index, request_id, {
+                    'unique_key_id': ['Subscriber with key_id already exists.']
+                }))
+                continue
+            if request_id in request_ids:
+                report.errors.append(IngestError(index, request_id, {
+                    'message': {'request_id': ['This field must be unique.']}
+                }))
+                continue
+            seller_ids = [seller.unique_key_id for seller in sellers]
+            if len(set(seller_ids)) != len(seller_ids) or not seller_keys.isdisjoint(seller_ids):
+                report.errors.append(IngestError(index, request_id, {
+                    'seller_on_record': ['Seller on record with unique_key_id already exists.']
+                }))
+                continue
+            subscriber_keys.add(subscriber.unique_key_id)
+            request_ids.add(request_id)
+            seller_keys.update(seller_ids)
+            records.append(_Record(index, request_id, serializer.validated_data['message'], subscriber, participants,
+                                   sellers))
+        return records
+
+    def _write(self, records: list[_Record], report: IngestReport) -> int:
+        # Every subscriber tree goes to the shard of its subscriber_id
+        by_database: dict[str, list[_Record]] = {}
+        for record in records:
+            by_database.setdefault(sharding.write_database(record.subscriber.subscriber_id), []).append(record)
+        return sum(self._write_on(using, records, report) for using, records in by_database.items())
+
+    def _write_on(self, using: str, records: list[_Record], report: IngestReport) -> int:
+        try:
+            with transaction.atomic(using=using):
+                self._bulk_insert(records, using)
+            return len(records)
+        except IntegrityError:
+            # A concurrent writer took one of the keys, isolate the offending records
+            created = 0
+            for record in records:
+                try:
+                    with transaction.atomic(using=using):
+                        self._bulk_insert([record], using)
+                    created += 1
+                except IntegrityError as exc:
+                    report.errors.append(IngestError(record.index, record.request_id, {
+                        'non_field_errors': [str(exc).strip()]
+                    }))
+            return created
+
+    @staticmethod
+    def _bulk_insert(records: list[_Record], using: str) -> None:
+        subscribers = [record.subscriber for record in records]
+        participants = [participant for record in records for participant in record.participants]
+        Subscriber.objects.using(using).bulk_create(subscribers)
+        NetworkParticipant.objects.using(using).bulk_create(participants)
+        SellerOnRecord.objects.using(using).bulk_create([seller for record in records for seller in record.sellers])
+        notify_bulk_created(subscribers, participants, using=using)
+        unique_key_ids = [subscriber.unique_key_id for subscriber in subscribers]
+        requests = [(record.subscriber.subscriber_id, record.message) for record in records]
+        transaction.on_commit(lambda: log_requests(requests), using=using)
+        transaction.on_commit(lambda: pipeline.start(unique_key_ids), using=using)
+
+    @staticmethod
+    def _request_id(payload: Any) -> str | None:
+        try:
+            return payload['message']['request_id']
+        except (KeyError, TypeError):
+            return None
@@ -0,0 +1,360 @@
+"""
+In process ring of the parsed keys of every SUBSCRIBED subscriber, and of
+the sellers on record of those, whose key has not expired, indexed by
+unique_key_id. It is loaded with one
+streamed query per registry database, keeps entries of the key's window
+even before it opens and only hands out keys inside their window. Rows
+changed since the last refresh are reloaded every KEYRING_REFRESH_INTERVAL
+seconds, and right away on the change feed (or the local signals without it).
+"""
+import base64
+import binascii
+import logging
+import sys
+import time
+from datetime import datetime, timezone as dt_timezone
+from threading import Lock, RLock
+from typing import Callable, Iterable, Iterator
+
+from cryptography.hazmat.primitives.asymmetric import ed448, ed25519
+from django.conf import settings
+from django.db import DatabaseError, models, router
+from django.db.models.fields.json import KeyTextTransform
+
+from common.crypto.constants import SigningAlgorithm
+from common.crypto.exception import SigningAlgorithmNotSupported
+from common.crypto.main import EncryptionPublicKey, SigningAlgorithmHandlers, SigningPublicKey
+from common.crypto.x25519 import X25519PublicKey
+from . import sharding
+from .models import SellerOnRecord, Subscriber
+
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER = Subscriber._meta.model_name
+SELLER = SellerOnRecord._meta.model_name
+# Sellers sign as the subscriber of their network participant, and only while it is SUBSCRIBED
+SELLER_SUBSCRIBER_ID = 'network_participant__subscriber__subscriber_id'
+SELLER_STATUS = 'network_participant__subscriber__status'
+SUBSCRIBED = Subscriber.SubscriptionStatus.SUBSCRIBED
+
+# Raw public key length -> signing algorithm and key class, the algorithm is not stored with the key
+SIGNING_KEY_TYPES = {
+    32: (SigningAlgorithm.ED25519.value, ed25519.Ed25519PublicKey),
+    57: (SigningAlgorithm.ED448.value, ed448.Ed448PublicKey),
+}
+
+# (unique_key_id, subscriber_id, valid_from, valid_until, status, signing_public_key, encryption_public_key, kind)
+KeyRow = tuple[str, str, datetime | None, datetime | None, str, str | None, str | None, str]
+
+
+class KeyEntry:
+    __slots__ = ('kind', 'unique_key_id', 'subscriber_id', 'valid_from', 'valid_until',
+                 'signing_algo', 'signing_key', 'encryption_key')
+
+    def __init__(self, kind: str, unique_key_id: str, subscriber_id: str, valid_from: float, valid_until: float,
+                 signing_algo: str | None, signing_key: SigningPublicKey | None,
+                 encryption_key: EncryptionPublicKey | None) -> None:
+        self.kind = kind
+        self.unique_key_id = unique_key_id
+        self.subscriber_id = subscriber_id
+        self.valid_from = valid_from
+        self.valid_until = valid_until
+        # Compared instead of isinstance(), which is slow on the abstract key classes
+        self.signing_algo = signing_algo
+        self.signing_key = signing_key
+        self.encryption_key = encryption_key
+
+    def __repr__(self) -> str:
+        return f'<KeyEntry {self.kind} {self.unique_key_id}>'
+
+    def active(self, at: float) -> bool:
+        return self.valid_from <= at < self.valid_until
+
+    def load_signing_key(self, algo: str) -> SigningPublicKey:
+        """
+        Same contract as registry.authentication.SigningKey.load_signing_key.
+        """
+        if algo.upper() != self.signing_algo:
+            if algo.upper() not in SigningAlgorithmHandlers:
+                raise SigningAlgorithmNotSupported(algo)
+            raise ValueError(f'{self.unique_key_id} has no {algo} signing key')
+        return self.signing_key
+
+
+def _decode(public_key: str | None) -> bytes | None:
+    if not public_key:
+        return None
+    try:
+        return base64.b64decode(public_key, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def parse_signing_key(public_key: str | None) -> tuple[str | None, SigningPublicKey | None]:
+    raw = _decode(public_key)
+    algo, key_type = SIGNING_KEY_TYPES.get(len(raw), (None, None)) if raw is not None else (None, None)
+    return algo, key_type.from_public_bytes(raw) if key_type is not None else None
+
+
+def parse_encryption_key(public_key: str | None) -> EncryptionPublicKey | None:
+    raw = _decode(public_key)
+    if raw is None or len(raw) != 32:
+        return None
+    return X25519PublicKey.from_public_bytes(raw)
+
+
+def key_rows(queryset: models.QuerySet, kind: str) -> models.QuerySet:
+    """
+    KeyRow values of queryset, reading only the two public keys out of key_pair.
+    Columns come before expressions so both sides of a union select alike.
+    """
+    subscriber_id, status = ('subscriber_id', 'status') if kind == SUBSCRIBER else (SELLER_SUBSCRIBER_ID, SELLER_STATUS)
+    return queryset.order_by().values_list(
+        'unique_key_id', subscriber_id, 'valid_from', 'valid_until', status,
+        KeyTextTransform('signing_public_key', 'key_pair'),
+        KeyTextTransform('encryption_public_key', 'key_pair'),
+        models.Value(kind, output_field=models.CharField()),
+    )
+
+
+def keyring_databases() -> list[str]:
+    if sharding.sharding_enabled():
+        return sharding.all_shards()
+    return [router.db_for_write(Subscriber)]
+
+
+class KeyRing:
+    """
+    Lookups read a plain dict without locking, loads build a new dict and
+    swap it in, refreshes and reloads update entries under a lock.
+    """
+
+    def __init__(self, refresh_interval: float | None = None, chunk_size: int | None = None,
+                 clock: Callable[[], float] = time.time) -> None:
+        self.refresh_interval = settings.KEYRING_REFRESH_INTERVAL if refresh_interval is None else refresh_interval
+        self.chunk_size = chunk_size or settings.KEYRING_CHUNK_SIZE
+        self.clock = clock
+        self._entries: dict[str, KeyEntry] = {}
+        self._lock = RLock()
+        self._refreshing = Lock()
+        # clock() when the last load or refresh started, rows updated since are not in the ring yet
+        self.synced_at: float | None = None
+        # Rows skipped because neither of their keys could be parsed
+        self.invalid = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, unique_key_id: str) -> bool:
+        return unique_key_id in self._entries
+
+    @classmethod
+    def build(cls, **kwargs) -> 'KeyRing':
+        ring = cls(**kwargs)
+        ring.load()
+        return ring
+
+    def rows(self, using: str, subscribers: models.Q, sellers: models.Q) -> Iterator[KeyRow]:
+        subscribers = key_rows(Subscriber.objects.using(using).filter(subscribers), SUBSCRIBER)
+        sellers = key_rows(SellerOnRecord.objects.using(using).filter(sellers), SELLER)
+        return subscribers.union(sellers, all=True).iterator(chunk_size=self.chunk_size)
+
+    def entry(self, row: KeyRow) -> KeyEntry | None:
+        unique_key_id, subscriber_id, valid_from, valid_until, status, signing, encryption, kind = row
+        if valid_from is None or valid_until is None or status != SUBSCRIBED:
+            return None
+        (signing_algo, signing_key), encryption_key = parse_signing_key(signing), parse_encryption_key(encryption)
+        if signing_key is None and encryption_key is None:
+            self.invalid += 1
+            return None
+        # Sellers of one participant share its subscriber_id
+        return KeyEntry(kind, unique_key_id, sys.intern(subscriber_id or ''), valid_from.timestamp(),
+                        valid_until.timestamp(), signing_algo, signing_key, encryption_key)
+
+    def load(self, databases: Iterable[str] | None = None) -> None:
+        started = self.clock()
+        now = datetime.fromtimestamp(started, dt_timezone.utc)
+        entries: dict[str, KeyEntry] = {}
+        self.invalid = 0
+        for using in databases or keyring_databases():
+            rows = self.rows(using, models.Q(valid_until__gt=now, status=SUBSCRIBED),
+                             models.Q(valid_until__gt=now, **{SELLER_STATUS: SUBSCRIBED}))
+            for row in rows:
+                entry = self.entry(row)
+                if entry is not None:
+                    entries[entry.unique_key_id] = entry
+        with self._lock:
+            self._entries = entries
+            self.synced_at = started
+
+    def add_row(self, row: KeyRow) -> None:
+        """
+        Adds, replaces or drops (when expired or unparseable) the row's entry.
+        """
+        entry = self.entry(row)
+        with self._lock:
+            if entry is None or entry.valid_until <= self.clock():
+                self._entries.pop(row[0], None)
+            else:
+                self._entries[entry.unique_key_id] = entry
+
+    def discard(self, unique_key_id: str) -> None:
+        with self._lock:
+            self._entries.pop(unique_key_id, None)
+
+    def refresh(self, databases: Iterable[str] | None = None) -> int:
+        """
+        Reloads the rows updated since the last load or refresh, less
+        KEYRING_REFRESH_MARGIN seconds, with the sellers of the subscribers
+        updated, and drops expired entries. Deleted rows are only seen through
+        reload(). Returns the rows read.
+        """
+        if self.synced_at is None:
+            self.load(databases)
+            return len(self._entries)
+        started = self.clock()
+        since = datetime.fromtimestamp(self.synced_at - settings.KEYRING_REFRESH_MARGIN, dt_timezone.utc)
+        read = 0
+        for using in databases or keyring_databases():
+            sellers = models.Q(updated__gte=since) | models.Q(network_participant__subscriber__updated__gte=since)
+            for row in self.rows(using, models.Q(updated__gte=since), sellers):
+                self.add_row(row)
+                read += 1
+        with self._lock:
+            for unique_key_id in [key for key, entry in self._entries.items() if entry.valid_until <= started]:
+                del self._entries[unique_key_id]
+            self.synced_at = started
+        return read
+
+    def maybe_refresh(self) -> None:
+        if self.refresh_interval <= 0 or self.synced_at is None \
+                or self.clock() - self.synced_at < self.refresh_interval:
+            return
+        # One caller refreshes, the others keep reading the current entries
+        if not self._refreshing.acquire(blocking=False):
+            return
+        try:
+            self.refresh()
+        except DatabaseError as exc:
+            logger.warning('Key ring refresh failed, serving the loaded keys: %s', exc)
+        finally:
+            self._refreshing.release()
+
+    def reload(self, kind: str, pks: Iterable[str], databases: Iterable[str] | None = None) -> None:
+        """
+        Reads the given rows of one model again, rows gone are dropped. The
+        sellers of reloaded subscribers are read again too, they follow its status.
+        """
+        pks = set(pks)
+        if not pks:
+            return
+        for using in databases or keyring_databases():
+            if kind == SUBSCRIBER:
+                rows = self.rows(using, models.Q(unique_key_id__in=pks),
+                                 models.Q(network_participant__subscriber__unique_key_id__in=pks))
+            else:
+                rows = key_rows(SellerOnRecord.objects.using(using).filter(unique_key_id__in=pks), kind)
+            for row in rows:
+                self.add_row(row)
+                pks.discard(row[0])
+        for unique_key_id in pks:
+            self.discard(unique_key_id)
+
+    def apply_changes(self, events) -> None:
+        pks: dict[str, set[str]] = {}
+        for event in events:
+            if event.model in (SUBSCRIBER, SELLER):
+                pks.setdefault(event.model, set()).add(event.pk)
+        for kind, changed in pks.items():
+            self.reload(kind, changed)
+
+    def get(self, unique_key_id: str, at: float | None = None) -> KeyEntry | None:
+        """
+        The entry of unique_key_id when its key is valid at `at` (now by default).
+        """
+        entry = self._entries.get(unique_key_id)
+        if entry is None or not entry.active(self.clock() if at is None else at):
+            return None
+        return entry
+
+    def resolve(self, unique_key_id: str) -> KeyEntry | None:
+        """
+        Resolver interface of registry.authentication.AuthorizationVerifier.
+        """
+        self.maybe_refresh()
+        entry = self.get(unique_key_id)
+        return entry if entry is not None and entry.signing_key is not None else None
+
+    def encryption_key(self, unique_key_id: str) -> EncryptionPublicKey | None:
+        self.maybe_refresh()
+        entry = self.get(unique_key_id)
+        return entry.encryption_key if entry is not None else None
+
+    def memory_report(self) -> dict[str, int]:
+        """
+        Approximate bytes held by the ring as seen by Python, the key material
+        cryptography keeps outside of Python objects is not counted.
+        """
+        entries = list(self._entries.values())
+        report = {
+            'entries': len(entries),
+            'index': sys.getsizeof(self._entries),
+            'slots': sum(sys.getsizeof(entry) for entry in entries),
+            'unique_key_ids': sum(sys.getsizeof(entry.unique_key_id) for entry in entries),
+            'subscriber_ids': sum(sys.getsizeof(subscriber_id)
+                                  for subscriber_id in {entry.subscriber_id for entry in entries}),
+            'windows': sum(sys.getsizeof(entry.valid_from) + sys.getsizeof(entry.valid_until) for entry in entries),
+            'signing_keys': sum(sys.getsizeof(entry.signing_key) for entry in entries
+                                if entry.signing_key is not None),
+            'encryption_keys': sum(
+                sys.getsizeof(entry.encryption_key) + sys.getsizeof(entry.encryption_key.public_key)
+                + sys.getsizeof(entry.encryption_key.sealed_box) for entry in entries
+                if entry.encryption_key is not None
+            ),
+        }
+        report['total'] = sum(value for key, value in report.items() if key != 'entries')
+        return report
+
+
+_keyring: KeyRing | None = None
+_keyring_lock = RLock()
+
+
+def keyring_enabled() -> bool:
+    return settings.KEYRING_ENABLED
+
+
+def get_keyring() -> KeyRing:
+    """
+    Process wide ring, loaded from the database on first use.
+    """
+    global _keyring
+    if _keyring is None:
+        with _keyring_lock:
+            if _keyring is None:
+                _keyring = KeyRing.build()
+    return _keyring
+
+
+def reset_keyring() -> None:
+    global _keyring
+    with _keyring_lock:
+        _keyring = None
+
+
+def is_keyring_loaded() -> bool:
+    return _keyring is not None
+
+
+def warm_up() -> KeyRing | None:
+    """
+    Loads the ring at process start when KEYRING_ENABLED is on, so the first
+    requests don't pay for it.
+    """
+    if not keyring_enabled():
+        return None
+    started = time.perf_counter()
+    ring = get_keyring()
+    logger.info('Key ring loaded %d keys in %.2fs', len(ring), time.perf_counter() - started)
+    return ring
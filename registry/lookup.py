@@ -0,0 +1,98 @@
+from typing import Any
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Prefetch, QuerySet
+
+from . import bitmap_index, sharding
+from .models import NetworkParticipant, SellerOnRecord, Subscriber
+
+
+WILDCARD = '*'
+
+
+def _normalize(domain: str | None, type: str | None,
+               city: list[str] | None) -> tuple[str | None, str | None, list[str]]:
+    return (
+        domain if domain and domain != WILDCARD else None,
+        type if type and type != WILDCARD else None,
+        [code for code in city or [] if code != WILDCARD],
+    )
+
+
+def participant_filters(domain: str | None = None, type: str | None = None,
+                        city: list[str] | None = None) -> dict[str, Any]:
+    domain, type, cities = _normalize(domain, type, city)
+    filters: dict[str, Any] = {}
+    if domain:
+        filters['domain'] = domain
+    if type:
+        filters['type'] = type
+    # @> for a single city, && for any of many, both are served by the GIN index
+    if len(cities) == 1:
+        filters['city_code__contains'] = cities
+    elif cities:
+        filters['city_code__overlap'] = cities
+    return filters
+
+
+def lookup_subscribers(subscriber_id: str | None = None, unique_key_id: str | None = None,
+                       domain: str | None = None, type: str | None = None,
+                       city: list[str] | None = None, using: str | None = None) -> QuerySet[Subscriber]:
+    """
+    SUBSCRIBED subscribers having at least one network participant matching
+    the filters.
+    The matching participants are prefetched into `matched_participants`
+    together with their sellers on record, the whole lookup runs in three
+    queries regardless of the number of results.
+    With REGISTRY_BITMAP_INDEX the participants are matched in process and
+    only fetched by primary key, unless more than REGISTRY_BITMAP_INDEX_MAX_IDS
+    of them match.
+    """
+    # Only subscribers through the subscription pipeline are public, whichever path matches the participants
+    subscribers = Subscriber.objects.using(using).filter(status=Subscriber.SubscriptionStatus.SUBSCRIBED)
+    if subscriber_id:
+        subscribers = subscribers.filter(subscriber_id=subscriber_id)
+    if unique_key_id:
+        subscribers = subscribers.filter(unique_key_id=unique_key_id)
+
+    domain, type, cities = _normalize(domain, type, city)
+    participant_ids = None
+    if bitmap_index.index_enabled():
+        # Broad matches go to the GIN index instead of an IN list of every participant
+        participant_ids = bitmap_index.get_index().query(domain, type, cities,
+                                                         limit=settings.REGISTRY_BITMAP_INDEX_MAX_IDS)
+    if participant_ids is not None:
+        participants = NetworkParticipant.objects.using(using).filter(id__in=participant_ids)
+    else:
+        participants = NetworkParticipant.objects.using(using).filter(**participant_filters(domain, type, cities))
+    sellers = SellerOnRecord.objects.using(using)
+    if cities:
+        sellers = sellers.filter(city_code__overlap=cities)
+
+    return subscribers.filter(
+        Exists(participants.filter(subscriber=OuterRef('pk')))
+    ).prefetch_related(
+        Prefetch(
+            'network_participant',
+            queryset=participants.prefetch_related(Prefetch('seller_on_record', queryset=sellers)),
+            to_attr='matched_participants'
+        )
+    ).order_by('subscriber_id', 'unique_key_id')
+
+
+def find_subscribers(subscriber_id: str | None = None, **filters) -> list[Subscriber] | QuerySet[Subscriber]:
+    """
+    lookup_subscribers over every shard the subscribers may live on: the
+    shards of subscriber_id when given, all of them otherwise. The per
+    shard results are merged in the same subscriber_id, unique_key_id order.
+    """
+    if not sharding.sharding_enabled():
+        return lookup_subscribers(subscriber_id=subscriber_id, **filters)
+    shards = sharding.shards_of(subscriber_id) if subscriber_id else sharding.all_shards()
+    return sharding.gather_sorted(
+        sharding.scatter(
+            lambda alias: list(lookup_subscribers(subscriber_id=subscriber_id, using=alias, **filters)), shards
+        ),
+        key=lambda subscriber: (subscriber.subscriber_id, subscriber.unique_key_id),
+        unique=lambda subscriber: subscriber.unique_key_id,
+    )
@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.test.utils import setup_test_environment
+
+from benchmarks import suite
+
+
+class Command(BaseCommand):
+    help = ('Runs the benchmark suite (crypto, serializers, lookup), writes the results as JSON and compares '
+            'them with the stored baseline. Database benchmarks run against a throw away test database. '
+            'Exits with an error when a benchmark is slower than the baseline by more than --threshold, '
+            'or when the baseline ran over other dataset sizes')
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('benchmarks', nargs='*', help='Benchmark names, all of them by default')
+        parser.add_argument('--group', action='append', default=[], choices=suite.GROUPS,
+                            help='Run the benchmarks of this group, can be repeated')
+        parser.add_argument('--list', action='store_true', help='List the benchmarks and exit')
+        parser.add_argument('--dataset', default='small', choices=sorted(suite.DATASETS))
+        parser.add_argument('--keys', type=int, default=None, help='Keys used by the crypto benchmarks')
+        parser.add_argument('--body-size', type=int, default=None, help='Bytes digested per call')
+        parser.add_argument('--participants', type=int, default=None, help='Network participants looked up')
+        parser.add_argument('--cities', type=int, default=None)
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument('--min-time', type=float, default=0.05, help='Minimum seconds per round')
+        parser.add_argument('--output', default=None, help='Write the results to this file')
+        parser.add_argument('--baseline', default=str(suite.DEFAULT_BASELINE))
+        parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline')
+        parser.add_argument('--threshold', type=float, default=suite.DEFAULT_THRESHOLD,
+                            help='Fraction slower than the baseline reported as a regression')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the populated test database')
+
+    def handle(self, *args, **options) -> None:
+        try:
+            entries = suite.select(options['benchmarks'], options['group'])
+        except KeyError as exc:
+            raise CommandError(exc.args[0])
+        if options['list']:
+            for entry in entries:
+                self.stdout.write(f"{entry.name}{' (database)' if entry.database else ''}")
+            return
+        dataset = suite.get_dataset(
+            options['dataset'], keys=options['keys'], body_size=options['body_size'],
+            participants=options['participants'], cities=options['cities']
+        )
+        progress = lambda name, result: self.stdout.write(suite.format_result(name, result))
+        results = suite.new_results(dataset, options['dataset'])
+        plain = [entry for entry in entries if not entry.database]
+        database = [entry for entry in entries if entry.database]
+        results['benchmarks'].update(
+            suite.run_suite(plain, dataset, rounds=options['rounds'], min_time=options['min_time'],
+                            progress=progress)['benchmarks']
+        )
+        if database:
+            # Imported here, it sets up Django for the standalone benchmark scripts
+            from benchmarks.django_db import benchmark_database
+            setup_test_environment()
+            with benchmark_database(keepdb=options['keepdb']):
+                results['benchmarks'].update(
+                    suite.run_suite(database, dataset, rounds=options['rounds'], min_time=options['min_time'],
+                                    progress=progress)['benchmarks']
+                )
+
+        if options['output']:
+            suite.save_results(results, options['output'])
+        if options['save_baseline']:
+            suite.save_results(results, options['baseline'])
+            self.stdout.write(f"Baseline written to {options['baseline']}")
+            return
+        baseline = suite.load_results(options['baseline'])
+        if baseline is None:
+            self.stdout.write(f"No baseline at {options['baseline']}, run with --save-baseline to store one")
+            return
+        try:
+            comparisons = suite.compare(results, baseline, options['threshold'])
+        except suite.BaselineMismatch as exc:
+            raise CommandError(f"{exc}, run with --save-baseline to replace {options['baseline']}")
+        self.stdout.write(f"Against {options['baseline']} ({baseline['meta']['dataset']} dataset):")
+        for comparison in comparisons:
+            self.stdout.write(suite.format_comparison(comparison))
+        regressions = suite.regressions(comparisons)
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} benchmarks slower than the baseline by more than {options['threshold']:.0%}: "
+                + ', '.join(comparison.name for comparison in regressions)
+            )
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from registry.synthetic import SyntheticRegistry, load, write_requests
+
+
+class Command(BaseCommand):
+    help = ('Generates a deterministic synthetic registry from a seed: loads --subscribers subscriber trees '
+            '(COPY on Postgres) and writes --requests signed subscribe requests of further subscribers to '
+            '--output as NDJSON, for benchmarks.load_driver. Loaded rows send no signals, rebuild the bitmap '
+            'index afterwards when REGISTRY_BITMAP_INDEX is on')
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--subscribers', type=int, default=0, help='Subscribers loaded into the registry')
+        parser.add_argument('--requests', type=int, default=0,
+                            help='Subscribe requests written for subscribers that are not loaded')
+        parser.add_argument('--output', default='subscribe_requests.jsonl')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--start', type=int, default=0,
+                            help='Index of the first subscriber, to extend a network loaded earlier')
+        parser.add_argument('--cities', type=int, default=300)
+        parser.add_argument('--max-cities', type=int, default=8, help='City codes per network participant')
+        parser.add_argument('--max-sellers', type=int, default=5, help='Sellers on record per MSN participant')
+        parser.add_argument('--method', choices=('copy', 'bulk'), default='copy')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--valid-for', type=int, default=3600,
+                            help='Seconds the Authorization header of a request stays valid')
+
+    def handle(self, *args, **options) -> None:
+        if not options['subscribers'] and not options['requests']:
+            raise CommandError('Nothing to do, pass --subscribers and/or --requests')
+        registry = SyntheticRegistry(
+            seed=options['seed'], cities=options['cities'], max_cities=options['max_cities'],
+            max_sellers=options['max_sellers']
+        )
+        if options['subscribers']:
+            report = load(registry.subscribers(options['start'], options['subscribers']),
+                          batch_size=options['batch_size'], method=options['method'])
+            self.stdout.write(
+                f'{report.subscribers} subscribers, {report.participants} network participants and '
+                f'{report.sellers} sellers on record loaded in {report.seconds:.1f}s '
+                f'({report.rows_per_second:.0f} rows/s)'
+            )
+        if options['requests']:
+            started = time.perf_counter()
+            with open(options['output'], 'w') as file:
+                written = write_requests(
+                    registry.subscribers(options['start'] + options['subscribers'], options['requests']),
+                    file, valid_for=options['valid_for']
+                )
+            self.stdout.write(
+                f"{written} subscribe requests written to {options['output']} "
+                f'in {time.perf_counter() - started:.1f}s'
+            )
@@ -0,0 +1,33 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from registry.ingest import SubscriberBulkIngestor
+
+
+class Command(BaseCommand):
+    help = 'Bulk ingests subscribe requests from an NDJSON file, one request per line'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('path', help='NDJSON file, - reads stdin')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--ignore-expiry', action='store_true',
+                            help='Accept requests older than the 30s validity window (replays)')
+
+    def handle(self, *args, **options) -> None:
+        ingestor = SubscriberBulkIngestor(batch_size=options['batch_size'],
+                                          ignore_expiry=options['ignore_expiry'])
+        if options['path'] == '-':
+            report = ingestor.ingest_ndjson(sys.stdin)
+        else:
+            with open(options['path'], 'r') as file:
+                report = ingestor.ingest_ndjson(file)
+        for error in report.errors:
+            self.stderr.write(json.dumps({
+                'index': error.index, 'request_id': error.request_id, 'errors': error.errors
+            }, default=str))
+        self.stdout.write(
+            f'{report.created}/{report.received} subscribers created in {report.batches} batches, '
+            f'{len(report.errors)} errors, {report.records_per_second:.0f} records/s'
+        )
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from registry import sharding
+
+
+class Command(BaseCommand):
+    help = ('Moves every subscriber tree stored on the wrong shard to the shard REGISTRY_SHARDS assigns it. '
+            'Run it after adding shards, with the old shard list in REGISTRY_SHARDS_PREVIOUS so lookups '
+            'keep finding the subscribers that were not moved yet')
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--dry-run', action='store_true', help='Only count the subscribers to move')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after moving this many subscriber_ids')
+
+    def handle(self, *args, **options) -> None:
+        shard_map = sharding.get_shard_map()
+        if shard_map is None:
+            raise CommandError('REGISTRY_SHARDS is empty, the registry is not sharded')
+        moved = sharding.MoveReport()
+        subscriber_ids = 0
+        for shard in sharding.all_shards():
+            for subscriber_id in sharding.misplaced_subscribers(shard, shard_map):
+                if options['limit'] is not None and subscriber_ids >= options['limit']:
+                    break
+                subscriber_ids += 1
+                target = shard_map.shard_for(subscriber_id)
+                if options['dry_run']:
+                    self.stdout.write(f'{subscriber_id}: {shard} -> {target}')
+                    continue
+                report = sharding.move_subscriber(subscriber_id, shard, target)
+                moved.subscribers += report.subscribers
+                moved.participants += report.participants
+                moved.sellers += report.sellers
+        if options['dry_run']:
+            self.stdout.write(f'{subscriber_ids} subscriber ids to move')
+            return
+        self.stdout.write(
+            f'{subscriber_ids} subscriber ids moved: {moved.subscribers} subscribers, '
+            f'{moved.participants} network participants, {moved.sellers} sellers on record'
+        )
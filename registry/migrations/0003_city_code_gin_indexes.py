@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-18 19:32
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registry', '0002_alter_subscriber_callback_url'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='networkparticipant',
+            name='city_code',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=10), size=None),
+        ),
+        migrations.AlterField(
+            model_name='selleronrecord',
+            name='city_code',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=10), size=None),
+        ),
+        migrations.AddIndex(
+            model_name='networkparticipant',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['city_code'], name='registry_np_city_code_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='networkparticipant',
+            index=models.Index(fields=['domain', 'type'], name='registry_np_domain_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='selleronrecord',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['city_code'], name='registry_sor_city_code_gin'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.2 on 2026-10-18 20:08
+
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def _parse(value):
+    try:
+        return datetime.strptime(value, settings.DATETIME_FORMAT).replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return None
+
+
+def copy_key_validity(apps, schema_editor):
+    using = schema_editor.connection.alias
+    for model_name in ('Subscriber', 'SellerOnRecord'):
+        model = apps.get_model('registry', model_name)
+        batch = []
+        for row in model.objects.using(using).only('pk', 'key_pair').iterator(chunk_size=2000):
+            row.valid_from = _parse((row.key_pair or {}).get('valid_from'))
+            row.valid_until = _parse((row.key_pair or {}).get('valid_until'))
+            batch.append(row)
+            if len(batch) == 2000:
+                model.objects.using(using).bulk_update(batch, ['valid_from', 'valid_until'])
+                batch = []
+        model.objects.using(using).bulk_update(batch, ['valid_from', 'valid_until'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registry', '0003_city_code_gin_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='selleronrecord',
+            name='valid_from',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='selleronrecord',
+            name='valid_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='subscriber',
+            name='valid_from',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='subscriber',
+            name='valid_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='subscriber',
+            name='status',
+            field=models.CharField(choices=[('INITIATED', 'Initiated'), ('UNDER_SUBSCRIPTION', 'Under Subscription'), ('SUBSCRIBED', 'Subscribed'), ('INVALID_SSL', 'Invalid Ssl'), ('UNSUBSCRIBED', 'Unsubscribed'), ('EXPIRED', 'Expired')], default='INITIATED', max_length=20),
+        ),
+        migrations.RunPython(copy_key_validity, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='selleronrecord',
+            index=models.Index(fields=['valid_until', 'valid_from'], name='registry_sor_validity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscriber',
+            index=models.Index(fields=['valid_until', 'valid_from'], name='registry_sub_validity_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 20:21
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registry', '0004_key_validity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistryChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=32)),
+                ('object_id', models.CharField(max_length=100)),
+                ('created', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
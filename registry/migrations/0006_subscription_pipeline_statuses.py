@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 20:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registry', '0005_registry_change'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='subscriber',
+            name='status',
+            field=models.CharField(choices=[('INITIATED', 'Initiated'), ('UNDER_SUBSCRIPTION', 'Under Subscription'), ('SUBSCRIBED', 'Subscribed'), ('INVALID_SSL', 'Invalid Ssl'), ('UNSUBSCRIBED', 'Unsubscribed'), ('EXPIRED', 'Expired'), ('INVALID_KEY', 'Invalid Key'), ('NOT_WHITELISTED', 'Not Whitelisted')], default='INITIATED', max_length=20),
+        ),
+    ]
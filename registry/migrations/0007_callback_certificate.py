@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-18 21:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registry', '0006_subscription_pipeline_statuses'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CallbackCertificate',
+            fields=[
+                ('host', models.CharField(max_length=265, primary_key=True, serialize=False)),
+                ('valid', models.BooleanField()),
+                ('reachable', models.BooleanField(default=True)),
+                ('not_after', models.DateTimeField(blank=True, null=True)),
+                ('checked_at', models.DateTimeField()),
+                ('recheck_at', models.DateTimeField(db_index=True)),
+                ('error', models.TextField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 21:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registry', '0007_callback_certificate'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscriber',
+            index=models.Index(condition=models.Q(('status__in', ['UNSUBSCRIBED', 'EXPIRED']), _negated=True), fields=['valid_until'], name='registry_sub_expiring_idx'),
+        ),
+    ]
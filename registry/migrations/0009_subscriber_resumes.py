@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 21:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registry', '0008_subscriber_expiring_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscriber',
+            name='resumes',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='subscriber',
+            name='status',
+            field=models.CharField(choices=[('INITIATED', 'Initiated'), ('UNDER_SUBSCRIPTION', 'Under Subscription'), ('SUBSCRIBED', 'Subscribed'), ('INVALID_SSL', 'Invalid Ssl'), ('UNSUBSCRIBED', 'Unsubscribed'), ('EXPIRED', 'Expired'), ('INVALID_KEY', 'Invalid Key'), ('NOT_WHITELISTED', 'Not Whitelisted'), ('UNREACHABLE', 'Unreachable')], default='INITIATED', max_length=20),
+        ),
+    ]
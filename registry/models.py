@@ -1,9 +1,32 @@
 from django.db import models
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.utils import timezone
+from datetime import datetime, timedelta
 from uuid import uuid4
 # Create your models here.
 
-   
+
+class KeyValidityQuerySet(models.QuerySet):
+    """
+    Queries on the valid_from / valid_until columns copied out of key_pair,
+    rows whose key_pair carries no validity window match none of them.
+    """
+
+    def active(self, at: datetime | None = None) -> 'KeyValidityQuerySet':
+        at = at or timezone.now()
+        return self.filter(valid_from__lte=at, valid_until__gt=at)
+
+    def expiring(self, within: timedelta, at: datetime | None = None) -> 'KeyValidityQuerySet':
+        """
+        Keys still valid at `at` whose validity ends in the next `within`.
+        """
+        at = at or timezone.now()
+        return self.filter(valid_until__gt=at, valid_until__lte=at + within)
+
+    def expired(self, at: datetime | None = None) -> 'KeyValidityQuerySet':
+        return self.filter(valid_until__lte=at or timezone.now())
+
 
 class Subscriber(models.Model):
     
@@ -23,13 +46,21 @@ class Subscriber(models.Model):
         SUBSCRIBED = 'SUBSCRIBED'
         INVALID_SSL = 'INVALID_SSL'
         UNSUBSCRIBED = 'UNSUBSCRIBED'
-        
+        EXPIRED = 'EXPIRED'
+        # Final statuses of the subscription pipeline (registry.pipeline)
+        INVALID_KEY = 'INVALID_KEY'
+        NOT_WHITELISTED = 'NOT_WHITELISTED'
+        UNREACHABLE = 'UNREACHABLE'
+
 
     unique_key_id = models.CharField(max_length=70, primary_key=True, blank=False, null=False)
     subscriber_id = models.CharField(max_length=265,  editable=False, db_index=True)
     callback_url = models.TextField(blank=False, null=False)
     country = models.CharField(max_length=3, blank=False, null=False)
     key_pair = models.JSONField(default=dict, blank=False, null=False)
+    # key_pair['valid_from'] / ['valid_until'], kept in sync by the serializers
+    valid_from = models.DateTimeField(blank=True, null=True, editable=False)
+    valid_until = models.DateTimeField(blank=True, null=True, editable=False)
     gst = models.JSONField(default=dict, blank=False, null= False)
     pan = models.JSONField(default=dict, blank=False, null=False)
     name_of_authorised_signatory = models.CharField(max_length=80)
@@ -45,9 +76,22 @@ class Subscriber(models.Model):
                               choices=SubscriptionStatus.choices,
                               default=SubscriptionStatus.INITIATED
                             )
+    # Times registry.pipeline.resume() started the subscription over
+    resumes = models.PositiveSmallIntegerField(default=0, editable=False)
     created = models.DateTimeField(auto_now=True)
     updated = models.DateTimeField(auto_now=True)
 
+    objects = KeyValidityQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Serves active(), expiring() and expired() with one range scan on valid_until
+            models.Index(fields=['valid_until', 'valid_from'], name='registry_sub_validity_idx'),
+            # Serves the expiry sweep, rows it already moved to a final status drop out of the index
+            models.Index(fields=['valid_until'], name='registry_sub_expiring_idx',
+                         condition=~models.Q(status__in=['UNSUBSCRIBED', 'EXPIRED'])),
+        ]
+
 
 class NetworkParticipant(models.Model):
     id = models.UUIDField(default=uuid4, primary_key=True)
@@ -63,20 +107,57 @@ class NetworkParticipant(models.Model):
                             blank=True, null=True  
                         )
     msn = models.BooleanField(default=False)
-    city_code = ArrayField(models.CharField(max_length=10), db_index=True, blank=False, null=False)
+    city_code = ArrayField(models.CharField(max_length=10), blank=False, null=False)
     created = models.DateTimeField(auto_now=True)
     updated = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # B-tree can't serve @> / && on arrays, GIN can
+            GinIndex(fields=['city_code'], name='registry_np_city_code_gin'),
+            models.Index(fields=['domain', 'type'], name='registry_np_domain_type_idx'),
+        ]
+
 
 class SellerOnRecord(models.Model):
     unique_key_id = models.CharField(max_length=100, primary_key=True)
     network_participant = models.ForeignKey(NetworkParticipant, on_delete=models.CASCADE, related_name='seller_on_record')
     key_pair = models.JSONField(default=dict, blank=False, null=False)
-    city_code = ArrayField(models.CharField(max_length=10), db_index=True, blank=False, null=False)
+    valid_from = models.DateTimeField(blank=True, null=True, editable=False)
+    valid_until = models.DateTimeField(blank=True, null=True, editable=False)
+    city_code = ArrayField(models.CharField(max_length=10), blank=False, null=False)
     created = models.DateTimeField(auto_now=True)
     updated = models.DateTimeField(auto_now=True)
- 
 
+    objects = KeyValidityQuerySet.as_manager()
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=['city_code'], name='registry_sor_city_code_gin'),
+            models.Index(fields=['valid_until', 'valid_from'], name='registry_sor_validity_idx'),
+        ]
 
-    
+
+class RegistryChange(models.Model):
+    """
+    Change log behind the change feed (registry.change_feed), the id is the
+    version of the change. Listeners read it back to catch up after a disconnect.
+    """
+    model = models.CharField(max_length=32)
+    object_id = models.CharField(max_length=100)
+    created = models.DateTimeField(default=timezone.now, db_index=True)
+
+
+class CallbackCertificate(models.Model):
+    """
+    Last TLS check of a callback host, written as https://<host> the way
+    subscriber_id is. The certificate sweep (registry.tasks.check_certificates)
+    checks the hosts whose recheck_at passed and the hosts never checked.
+    """
+    host = models.CharField(max_length=265, primary_key=True)
+    valid = models.BooleanField()
+    reachable = models.BooleanField(default=True)
+    not_after = models.DateTimeField(blank=True, null=True)
+    checked_at = models.DateTimeField()
+    recheck_at = models.DateTimeField(db_index=True)
+    error = models.TextField(blank=True, null=True)
@@ -0,0 +1,401 @@
+"""
+Post-subscribe workflow as a staged pipeline of Celery tasks (registry.tasks):
+
+    validate_keys -> check_ssl -> verify_callback -> check_whitelist -> finalize
+
+Every stage takes a batch of unique_key_ids, moves the subscribers failing
+it to their final status with one UPDATE per status and hands the others to
+the next stage as one batch. Every stage has a queue per lane: new
+subscribers run in the onboarding lane (<prefix>.<stage>) and bulk
+re-verification in the reverify lane (<prefix>.<stage>.bulk), so onboarding
+never waits behind re-verification as long as some workers consume only the
+onboarding queues.
+
+The stages calling subscriber hosts (check_ssl, verify_callback) take from a
+per host rate limit shared through a cache, subscribers over it go back to
+the stage when the window ends. Subscribers failing on the network are
+retried with exponential backoff, up to SUBSCRIPTION_MAX_RETRIES times. New
+subscribers are then left UNDER_SUBSCRIPTION until the periodic resume()
+sweep starts them over, at most SUBSCRIPTION_MAX_RESUMES times before they
+are marked UNREACHABLE; re-verified subscribers keep their status.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from datetime import timedelta
+from fnmatch import fnmatchcase
+from typing import Callable, Iterable
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from monitor.instrumentation import get_metrics, metrics_enabled
+from . import sharding
+from .callback import CallbackTarget, CallbackVerifier, set_statuses
+from .expiry import FINAL_STATUSES
+from .keyring import parse_encryption_key, parse_signing_key
+from .models import Subscriber
+from .signals import notify_bulk_updated
+from .ssl_check import CertificateChecker, get_certificate_cache, host_of
+
+
+logger = logging.getLogger(__name__)
+
+SubscriptionStatus = Subscriber.SubscriptionStatus
+
+ONBOARDING = 'onboarding'
+REVERIFY = 'reverify'
+LANES = (ONBOARDING, REVERIFY)
+
+VALIDATE_KEYS = 'validate_keys'
+CHECK_SSL = 'check_ssl'
+VERIFY_CALLBACK = 'verify_callback'
+CHECK_WHITELIST = 'check_whitelist'
+FINALIZE = 'finalize'
+STAGES = (VALIDATE_KEYS, CHECK_SSL, VERIFY_CALLBACK, CHECK_WHITELIST, FINALIZE)
+
+# Statuses of subscribers the pipeline has not finished with
+STALLED_STATUSES = (SubscriptionStatus.INITIATED, SubscriptionStatus.UNDER_SUBSCRIPTION)
+
+ROW_FIELDS = ('unique_key_id', 'subscriber_id', 'callback_url', 'key_pair', 'valid_from', 'valid_until', 'status')
+
+# forward(stage, unique_key_ids, lane, attempt, countdown)
+Forward = Callable[[str, list[str], str, int, float | None], None]
+
+
+def queue_name(stage: str, lane: str) -> str:
+    queue = f'{settings.SUBSCRIPTION_QUEUE_PREFIX}.{stage}'
+    return queue if lane == ONBOARDING else f'{queue}.bulk'
+
+
+def queues(lane: str) -> list[str]:
+    return [queue_name(stage, lane) for stage in STAGES]
+
+
+def backoff(attempt: int) -> float:
+    """
+    Seconds before retrying a subscriber that failed `attempt` retries ago,
+    doubling per attempt with jitter so failed hosts aren't hit in step.
+    """
+    ceiling = min(settings.SUBSCRIPTION_RETRY_DELAY * 2 ** attempt, settings.SUBSCRIPTION_RETRY_MAX_DELAY)
+    return random.uniform(ceiling / 2, ceiling)
+
+
+class HostRateLimiter:
+    """
+    Fixed window limit of `rate` calls per host every `period` seconds,
+    counted in a cache shared by every worker. A rate of 0 disables it.
+    A local memory cache would count per process, it is refused unless
+    SUBSCRIPTION_RATE_LIMIT_SINGLE_PROCESS is on.
+    """
+
+    def __init__(self, rate: int | None = None, period: float | None = None, cache_alias: str | None = None,
+                 clock: Callable[[], float] = time.time) -> None:
+        self.rate = settings.SUBSCRIPTION_HOST_RATE if rate is None else rate
+        self.period = period or settings.SUBSCRIPTION_HOST_RATE_PERIOD
+        cache_alias = cache_alias or settings.SUBSCRIPTION_RATE_LIMIT_CACHE
+        self.cache = caches[cache_alias]
+        if self.rate > 0 and isinstance(self.cache, LocMemCache) \
+                and not settings.SUBSCRIPTION_RATE_LIMIT_SINGLE_PROCESS:
+            raise ImproperlyConfigured(
+                f'The {cache_alias!r} cache is local to the process, the subscriber host rate limit needs a shared one'
+            )
+        self.clock = clock
+
+    def take(self, host: str, wanted: int = 1) -> int:
+        """
+        Calls granted out of `wanted` in the current window.
+        """
+        if self.rate <= 0:
+            return wanted
+        window = int(self.clock() // self.period)
+        key = f'subscription-rate:{host}:{window}'
+        timeout = int(self.period) + 1
+        self.cache.add(key, 0, timeout)
+        try:
+            used = self.cache.incr(key, wanted)
+        except ValueError:
+            # Expired between add() and incr()
+            self.cache.set(key, wanted, timeout)
+            used = wanted
+        return max(0, min(wanted, self.rate - (used - wanted)))
+
+    def wait(self) -> float:
+        """
+        Seconds until the current window ends.
+        """
+        return self.period - self.clock() % self.period
+
+
+@dataclass
+class StageOutcome:
+    # Handed to the next stage
+    passed: list[str] = field(default_factory=list)
+    # Status -> subscribers moved to it
+    statuses: dict[str, list[str]] = field(default_factory=lambda: defaultdict(list))
+    # Failed on the network, run through the stage again after a backoff
+    retry: list[str] = field(default_factory=list)
+    # Over a host's rate limit, run through the stage again in deferred_for seconds
+    deferred: list[str] = field(default_factory=list)
+    deferred_for: float = 0.0
+
+
+@dataclass
+class StageReport:
+    stage: str
+    lane: str
+    attempt: int
+    items: int
+    passed: int
+    statuses: dict[str, int]
+    retried: int
+    deferred: int
+    seconds: float
+
+    @property
+    def items_per_second(self) -> float:
+        return self.items / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), 'items_per_second': self.items_per_second}
+
+
+class SubscriptionPipeline:
+    """
+    Runs one batch through one stage, forward() hands the outcome on (to the
+    stage queues by default, see enqueue()).
+    """
+
+    def __init__(self, limiter: HostRateLimiter | None = None, verifier: CallbackVerifier | None = None,
+                 checker: CertificateChecker | None = None, forward: Forward | None = None,
+                 clock: Callable[[], float] = time.time) -> None:
+        self.limiter = limiter or HostRateLimiter()
+        self.verifier = verifier or CallbackVerifier()
+        self.checker = checker or CertificateChecker(get_certificate_cache())
+        self.forward = forward or enqueue
+        self.clock = clock
+
+    def load(self, unique_key_ids: Iterable[str]) -> list[dict]:
+        unique_key_ids = list(unique_key_ids)
+
+        def select(using: str) -> list[dict]:
+            # Subscribers that left the registry or expired since drop out of the pipeline
+            return list(
+                Subscriber.objects.using(using).filter(unique_key_id__in=unique_key_ids)
+                .exclude(status__in=FINAL_STATUSES).values(*ROW_FIELDS)
+            )
+        # A rebalance in progress may leave a copy on two shards
+        shards = sharding.scatter(select, sharding.registry_databases())
+        return list({row['unique_key_id']: row for rows in shards for row in rows}.values())
+
+    def validate_keys(self, rows: list[dict], lane: str) -> StageOutcome:
+        outcome = StageOutcome()
+        now = self.clock()
+        for row in rows:
+            key_pair = row['key_pair'] or {}
+            unique_key_id = row['unique_key_id']
+            if row['valid_until'] is not None and row['valid_until'].timestamp() <= now:
+                outcome.statuses[SubscriptionStatus.EXPIRED].append(unique_key_id)
+            elif row['valid_from'] is None or row['valid_until'] is None \
+                    or parse_signing_key(key_pair.get('signing_public_key'))[1] is None \
+                    or parse_encryption_key(key_pair.get('encryption_public_key')) is None:
+                outcome.statuses[SubscriptionStatus.INVALID_KEY].append(unique_key_id)
+            else:
+                outcome.passed.append(unique_key_id)
+                if lane == ONBOARDING and row['status'] == SubscriptionStatus.INITIATED:
+                    outcome.statuses[SubscriptionStatus.UNDER_SUBSCRIPTION].append(unique_key_id)
+        return outcome
+
+    def check_ssl(self, rows: list[dict], lane: str) -> StageOutcome:
+        outcome = StageOutcome()
+        by_address: dict[str, list[str]] = defaultdict(list)
+        hosts: dict[str, tuple[str, int]] = {}
+        for row in rows:
+            target = CallbackTarget.from_subscriber(row)
+            host, port = host_of(target)
+            by_address[f'{host}:{port}'].append(target.unique_key_id)
+            hosts[f'{host}:{port}'] = (host, port)
+        granted = {}
+        for address, (host, port) in hosts.items():
+            # Results still cached cost no handshake
+            if self.checker.cache.get(address) is None and not self.limiter.take(host):
+                outcome.deferred.extend(by_address[address])
+            else:
+                granted[address] = (host, port)
+        results = asyncio.run(self.checker.check_many(granted.values())) if granted else {}
+        for address, result in results.items():
+            if not result.reachable:
+                outcome.retry.extend(by_address[address])
+            elif not result.valid:
+                outcome.statuses[SubscriptionStatus.INVALID_SSL].extend(by_address[address])
+            else:
+                outcome.passed.extend(by_address[address])
+        if outcome.deferred:
+            outcome.deferred_for = self.limiter.wait()
+        return outcome
+
+    def verify_callback(self, rows: list[dict], lane: str) -> StageOutcome:
+        outcome = StageOutcome()
+        by_host: dict[str, list[CallbackTarget]] = defaultdict(list)
+        for row in rows:
+            target = CallbackTarget.from_subscriber(row)
+            by_host[urlsplit(target.url).hostname or ''].append(target)
+        targets = []
+        for host, host_targets in by_host.items():
+            granted = self.limiter.take(host, len(host_targets))
+            targets.extend(host_targets[:granted])
+            outcome.deferred.extend(target.unique_key_id for target in host_targets[granted:])
+        for result in asyncio.run(self.verifier.verify_many(targets)) if targets else []:
+            if result.verified:
+                outcome.passed.append(result.unique_key_id)
+            elif result.retryable:
+                outcome.retry.append(result.unique_key_id)
+            else:
+                outcome.statuses[result.status].append(result.unique_key_id)
+        if outcome.deferred:
+            outcome.deferred_for = self.limiter.wait()
+        return outcome
+
+    def check_whitelist(self, rows: list[dict], lane: str) -> StageOutcome:
+        outcome = StageOutcome()
+        patterns = settings.SUBSCRIBER_WHITELIST
+        for row in rows:
+            if patterns is None or any(fnmatchcase(row['subscriber_id'], pattern) for pattern in patterns):
+                outcome.passed.append(row['unique_key_id'])
+            else:
+                outcome.statuses[SubscriptionStatus.NOT_WHITELISTED].append(row['unique_key_id'])
+        return outcome
+
+    def finalize(self, rows: list[dict], lane: str) -> StageOutcome:
+        outcome = StageOutcome(passed=[row['unique_key_id'] for row in rows])
+        outcome.statuses[SubscriptionStatus.SUBSCRIBED] = [
+            row['unique_key_id'] for row in rows if row['status'] != SubscriptionStatus.SUBSCRIBED
+        ]
+        return outcome
+
+    def run(self, stage: str, unique_key_ids: list[str], lane: str = ONBOARDING, attempt: int = 0) -> StageReport:
+        if stage not in STAGES:
+            raise ValueError(f'Unknown subscription stage {stage}')
+        started = time.perf_counter()
+        rows = self.load(unique_key_ids)
+        outcome = getattr(self, stage)(rows, lane)
+        if outcome.retry and attempt >= settings.SUBSCRIPTION_MAX_RETRIES:
+            if lane == ONBOARDING:
+                outcome.statuses[SubscriptionStatus.UNDER_SUBSCRIPTION].extend(outcome.retry)
+            else:
+                # An outage during re-verification doesn't take subscribers out of /lookup
+                logger.warning('Subscription stage %s (%s) gave up on %d subscribers, status kept', stage, lane,
+                               len(outcome.retry))
+            outcome.retry = []
+        set_statuses(outcome.statuses)
+        if outcome.passed and stage != FINALIZE:
+            self.forward(STAGES[STAGES.index(stage) + 1], outcome.passed, lane, 0, None)
+        if outcome.retry:
+            self.forward(stage, outcome.retry, lane, attempt + 1, backoff(attempt))
+        if outcome.deferred:
+            self.forward(stage, outcome.deferred, lane, attempt, outcome.deferred_for)
+        seconds = time.perf_counter() - started
+        report = StageReport(
+            stage=stage, lane=lane, attempt=attempt, items=len(rows), passed=len(outcome.passed),
+            statuses={status: len(keys) for status, keys in outcome.statuses.items() if keys},
+            retried=len(outcome.retry), deferred=len(outcome.deferred), seconds=seconds,
+        )
+        if metrics_enabled():
+            metrics = get_metrics()
+            metrics.subscription_stage_duration.observe(seconds, stage, lane)
+            metrics.subscription_stage_batch_size.observe(len(rows), stage, lane)
+        logger.info('Subscription stage %s (%s) ran %d subscribers in %.3fs, %.0f/s', stage, lane, len(rows),
+                    seconds, report.items_per_second)
+        return report
+
+
+def batches(unique_key_ids: list[str], size: int | None = None) -> Iterable[list[str]]:
+    size = size or settings.SUBSCRIPTION_BATCH_SIZE
+    for start in range(0, len(unique_key_ids), size):
+        yield unique_key_ids[start:start + size]
+
+
+def enqueue(stage: str, unique_key_ids: list[str], lane: str = ONBOARDING, attempt: int = 0,
+            countdown: float | None = None) -> None:
+    """
+    Sends the subscribers to the task of `stage` on the stage's queue of
+    `lane`, SUBSCRIPTION_BATCH_SIZE per task.
+    """
+    from . import tasks
+    task = getattr(tasks, f'subscription_{stage}')
+    for batch in batches(unique_key_ids):
+        task.apply_async(args=[batch, lane, attempt], queue=queue_name(stage, lane), countdown=countdown)
+
+
+def start(unique_key_ids: list[str], lane: str = ONBOARDING) -> None:
+    enqueue(VALIDATE_KEYS, unique_key_ids, lane)
+
+
+def resume(stalled_for: float | None = None, limit: int | None = None, forward: Forward | None = None) -> int:
+    """
+    Starts the pipeline again for the subscribers left INITIATED or
+    UNDER_SUBSCRIPTION for more than stalled_for seconds: out of retries,
+    or whose start was lost. They are touched first, so the next sweeps
+    skip them until they stall again, and those already resumed
+    SUBSCRIPTION_MAX_RESUMES times are marked UNREACHABLE instead.
+    Returns how many were queued.
+    """
+    stalled_for = settings.SUBSCRIPTION_RESUME_AFTER if stalled_for is None else stalled_for
+    limit = limit or settings.SUBSCRIPTION_RESUME_BATCH_SIZE
+    before = timezone.now() - timedelta(seconds=stalled_for)
+    queued = 0
+    for using in sharding.registry_databases():
+        with transaction.atomic(using=using):
+            stalled = list(
+                Subscriber.objects.using(using).select_for_update(skip_locked=True)
+                .filter(status__in=STALLED_STATUSES, updated__lt=before).order_by('updated')
+                .values_list('unique_key_id', 'resumes')[:limit]
+            )
+            if not stalled:
+                continue
+            unique_key_ids = [key for key, resumes in stalled if resumes < settings.SUBSCRIPTION_MAX_RESUMES]
+            unreachable = [key for key, resumes in stalled if resumes >= settings.SUBSCRIPTION_MAX_RESUMES]
+            subscribers = Subscriber.objects.using(using)
+            subscribers.filter(unique_key_id__in=unique_key_ids).update(resumes=F('resumes') + 1,
+                                                                        updated=timezone.now())
+            subscribers.filter(unique_key_id__in=unreachable).update(status=SubscriptionStatus.UNREACHABLE,
+                                                                     updated=timezone.now())
+            notify_bulk_updated(unique_key_ids + unreachable, using=using)
+        if unique_key_ids:
+            (forward or enqueue)(VALIDATE_KEYS, unique_key_ids, ONBOARDING, 0, None)
+            queued += len(unique_key_ids)
+    return queued
+
+
+def reverify(unique_key_ids: list[str] | None = None, chunk_size: int = 5000) -> int:
+    """
+    Runs the given (or all SUBSCRIBED) subscribers through the pipeline
+    again in the reverify lane, returns how many were queued.
+    """
+    queued = 0
+    batch: list[str] = []
+    for using in sharding.registry_databases():
+        subscribers = Subscriber.objects.using(using)
+        if unique_key_ids is not None:
+            subscribers = subscribers.filter(unique_key_id__in=unique_key_ids)
+        else:
+            subscribers = subscribers.filter(status=SubscriptionStatus.SUBSCRIBED)
+        for unique_key_id in subscribers.order_by().values_list('unique_key_id', flat=True).iterator(chunk_size):
+            batch.append(unique_key_id)
+            if len(batch) == settings.SUBSCRIPTION_BATCH_SIZE:
+                start(batch, REVERIFY)
+                queued += len(batch)
+                batch = []
+    if batch:
+        start(batch, REVERIFY)
+        queued += len(batch)
+    return queued
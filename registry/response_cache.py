@@ -0,0 +1,182 @@
+import hashlib
+from dataclasses import dataclass
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from .models import NetworkParticipant, SellerOnRecord, Subscriber
+
+
+# Stands in for the nested list while a fragment is rendered, then split out
+CHILDREN_MARKER = '__wade_fragment_children__'
+_RENDERED_MARKER = JSONRenderer().render(CHILDREN_MARKER)
+
+SUBSCRIBER = 'subscriber'
+PARTICIPANT = 'participant'
+SELLER = 'seller'
+
+
+@dataclass(frozen=True, slots=True)
+class Fragment:
+    """
+    Rendered JSON of one object split around its nested list: the object
+    is head + [children joined by ,] + tail, or head alone without children.
+    """
+    head: bytes
+    tail: bytes
+    digest: bytes
+
+    @classmethod
+    def from_parts(cls, head: bytes, tail: bytes = b'') -> 'Fragment':
+        return cls(head, tail, hashlib.blake2b(head + b'\0' + tail, digest_size=16).digest())
+
+    def render(self, children: Iterable[bytes] = ()) -> bytes:
+        if not self.tail:
+            return self.head
+        return self.head + b'[' + b','.join(children) + b']' + self.tail
+
+
+class _Children(serializers.Field):
+    def __init__(self) -> None:
+        super().__init__(read_only=True)
+
+    def get_attribute(self, instance):
+        return instance
+
+    def to_representation(self, value) -> str:
+        return CHILDREN_MARKER
+
+
+def render_fragment(serializer: serializers.Serializer, children: str | None = None) -> Fragment:
+    """
+    Renders a serializer with the same JSONRenderer as the API, the
+    children field (if any) keeps its position but is not serialized.
+    """
+    if children is None:
+        return Fragment.from_parts(JSONRenderer().render(serializer.data))
+    serializer.fields[children] = _Children()
+    head, tail = JSONRenderer().render(serializer.data).split(_RENDERED_MARKER)
+    return Fragment.from_parts(head, tail)
+
+
+def render(kind: str, instance) -> Fragment:
+    # serializers imports the signals which import this module
+    from .serializers import LookupSubscriberSerializer, NetworkParticipantSerializer, SellerOnRecordSerializer
+    if kind == SUBSCRIBER:
+        return render_fragment(LookupSubscriberSerializer(instance), 'network_participant')
+    if kind == PARTICIPANT:
+        return render_fragment(NetworkParticipantSerializer(instance), 'seller_on_record')
+    return render_fragment(SellerOnRecordSerializer(instance))
+
+
+def cache_key(kind: str, pk) -> str:
+    return f'lookup:{kind}:{pk}'
+
+
+class LookupResponse:
+    """
+    A lookup result assembled from cached fragments. The ETag is derived
+    from the fragment digests, answering a matching If-None-Match never
+    joins the body.
+    """
+
+    def __init__(self, subscribers: list[tuple[Fragment, list[tuple[Fragment, list[Fragment]]]]]) -> None:
+        self.subscribers = subscribers
+
+    @property
+    def etag(self) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        for subscriber, participants in self.subscribers:
+            digest.update(subscriber.digest + len(participants).to_bytes(4, 'big'))
+            for participant, sellers in participants:
+                digest.update(participant.digest + len(sellers).to_bytes(4, 'big'))
+                for seller in sellers:
+                    digest.update(seller.digest)
+        return f'"{digest.hexdigest()}"'
+
+    @property
+    def body(self) -> bytes:
+        return b'[' + b','.join(
+            subscriber.render(
+                participant.render(seller.render() for seller in sellers) for participant, sellers in participants
+            )
+            for subscriber, participants in self.subscribers
+        ) + b']'
+
+
+class ResponseCache:
+    """
+    Rendered lookup fragments of every subscriber, network participant and
+    seller on record, kept in a Django cache until the row changes.
+    Fragments are stored with the `updated` of the row they were rendered
+    from and only served for a row with the same `updated`: a lookup that
+    read a row before a write and stores its fragment after the write
+    invalidated it never serves the old row again.
+    """
+
+    def __init__(self, alias: str = 'default', timeout: float | None = None) -> None:
+        self.alias = alias
+        self.timeout = timeout
+        self.hits = self.misses = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def fragments(self, kind: str, instances: list) -> list[Fragment]:
+        keys = [cache_key(kind, instance.pk) for instance in instances]
+        cached = self.cache.get_many(keys)
+        missing = {}
+        fragments = []
+        for key, instance in zip(keys, instances):
+            entry = cached.get(key)
+            if entry is None or entry[0] != instance.updated:
+                entry = missing[key] = (instance.updated, render(kind, instance))
+            fragments.append(entry[1])
+        if missing:
+            self.cache.set_many(missing, self.timeout)
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        return fragments
+
+    def response(self, subscribers: Iterable[Subscriber]) -> LookupResponse:
+        """
+        Subscribers as returned by lookup_subscribers, with their
+        matched_participants and prefetched sellers on record.
+        """
+        subscribers = list(subscribers)
+        participants = [list(subscriber.matched_participants) for subscriber in subscribers]
+        sellers = [[list(participant.seller_on_record.all()) for participant in group] for group in participants]
+        subscriber_fragments = self.fragments(SUBSCRIBER, subscribers)
+        participant_fragments = iter(self.fragments(PARTICIPANT, [item for group in participants for item in group]))
+        seller_fragments = iter(self.fragments(SELLER, [item for group in sellers for rows in group for item in rows]))
+        return LookupResponse([
+            (fragment, [(next(participant_fragments), [next(seller_fragments) for _ in rows]) for rows in group])
+            for fragment, group in zip(subscriber_fragments, sellers)
+        ])
+
+    def invalidate(self, kind: str, pks: Iterable) -> None:
+        keys = [cache_key(kind, pk) for pk in pks]
+        if keys:
+            self.cache.delete_many(keys)
+
+
+def cache_enabled() -> bool:
+    return settings.LOOKUP_RESPONSE_CACHE
+
+
+_response_cache: ResponseCache | None = None
+
+
+def get_response_cache() -> ResponseCache:
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache(settings.LOOKUP_RESPONSE_CACHE_ALIAS, settings.LOOKUP_RESPONSE_CACHE_TIMEOUT)
+    return _response_cache
+
+
+def kind_of(model) -> str | None:
+    return {Subscriber: SUBSCRIBER, NetworkParticipant: PARTICIPANT, SellerOnRecord: SELLER}.get(model)
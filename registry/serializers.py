@@ -1,14 +1,78 @@
-from typing import Any, List
+from typing import Any, Iterable, List
 from .models import * 
 from rest_framework import serializers
 from rest_framework import validators
 from monitor.models import ContractRequestLogger
+from monitor.replay import UniqueRequestIdValidator, get_replay_guard
+from monitor.writer import get_contract_logger
 from django.conf import settings
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from collections import OrderedDict
+from django.db import transaction
+import re
+from urllib.parse import urlsplit
+from . import fast_validation, pipeline, sharding
+from .signals import notify_bulk_created
 
 # TODO: Validate city code
 
+# The layout of settings.DATETIME_FORMAT most keys are sent with
+ISO_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+_ISO_DATETIME = re.compile(r'(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})\.(\d{1,6})Z', re.ASCII)
+# A subscriber_id is a bare domain name: no scheme, port, path or user info
+_HOSTNAME = re.compile(r'(?=.{1,253}$)([a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z]{2,63}', re.ASCII | re.IGNORECASE)
+
+
+def parse_datetime(value: str) -> datetime:
+    """
+    datetime.strptime(value, settings.DATETIME_FORMAT), the common
+    zero padded layout is read without going through strptime.
+    """
+    if settings.DATETIME_FORMAT == ISO_DATETIME_FORMAT:
+        match = _ISO_DATETIME.fullmatch(value)
+        if match is not None:
+            year, month, day, hour, minute, second, fraction = match.groups()
+            try:
+                return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second),
+                                int(fraction.ljust(6, '0')))
+            except ValueError:
+                pass
+    return datetime.strptime(value, settings.DATETIME_FORMAT)
+
+
+def key_validity(key_pair: dict) -> dict[str, datetime | None]:
+    """
+    The valid_from / valid_until columns of a key_pair, its timestamps are
+    UTC. A missing or unreadable timestamp is None.
+    """
+    validity = {}
+    for name in ('valid_from', 'valid_until'):
+        try:
+            validity[name] = parse_datetime(key_pair[name]).replace(tzinfo=timezone.utc)
+        except (KeyError, TypeError, ValueError):
+            validity[name] = None
+    return validity
+
+
+class ShardedUniqueValidator(validators.UniqueValidator):
+    """
+    UniqueValidator over every shard, querysets without an instance are
+    otherwise routed to REGISTRY_DATABASE alone.
+    """
+
+    def __call__(self, value: Any, serializer_field: serializers.Field) -> None:
+        if not sharding.sharding_enabled():
+            return super().__call__(value, serializer_field)
+        field_name = serializer_field.source_attrs[-1]
+        instance = getattr(serializer_field.parent, 'instance', None)
+
+        def taken(using: str) -> bool:
+            queryset = self.filter_queryset(value, self.queryset.using(using), field_name)
+            return validators.qs_exists(self.exclude_current_instance(queryset, instance))
+        if any(sharding.scatter(taken)):
+            raise serializers.ValidationError(self.message, code='unique')
+
+
 class KeyPairDetailSerializer(serializers.Serializer):
     signing_public_key = serializers.CharField(required=True)
     encryption_public_key = serializers.CharField(required=True)
@@ -18,11 +82,11 @@ class KeyPairDetailSerializer(serializers.Serializer):
     def validate(self, attrs: Any) -> Any:
         validated_data =  super().validate(attrs)
         try:
-            valid_from = datetime.strptime(validated_data['valid_from'], settings.DATETIME_FORMAT)
+            valid_from = parse_datetime(validated_data['valid_from'])
         except Exception as e:
             raise serializers.ValidationError({'valid_from': 'Invalid datetime format'}, code='invalid')
         try:
-            valid_until = datetime.strptime(validated_data['valid_until'], settings.DATETIME_FORMAT)
+            valid_until = parse_datetime(validated_data['valid_until'])
         except:
             raise serializers.ValidationError({'valid_until': 'Invalid datetime format'}, code='invalid')
         if valid_until < valid_from:
@@ -35,8 +99,9 @@ class SellerOnRecordSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = SellerOnRecord
-        exclude = ('network_participant',)
+        exclude = ('network_participant', 'valid_from', 'valid_until')
         read_only_fields = ('created', 'updated')
+        extra_kwargs = {'unique_key_id': {'validators': [ShardedUniqueValidator(SellerOnRecord.objects.all())]}}
     
 
 class NetworkParticipantSerializer(serializers.ModelSerializer):
@@ -64,8 +129,9 @@ class NetworkParticipantSerializer(serializers.ModelSerializer):
             seller_on_record = validated_data.pop('seller_on_record')
         network_participant =  NetworkParticipant.objects.create(subscriber=subscriber, **validated_data)
         if seller_on_record:
-            SellerOnRecord.objects.bulk_create(
-                [SellerOnRecord(network_participant = network_participant, **seller) for seller in seller_on_record]
+            SellerOnRecord.objects.using(network_participant._state.db).bulk_create(
+                [SellerOnRecord(network_participant = network_participant, **seller, **key_validity(seller['key_pair']))
+                 for seller in seller_on_record]
             )
         return network_participant
 
@@ -89,14 +155,58 @@ class SubscriberSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Subscriber
-        fields = '__all__'
+        # Copies of key_pair['valid_from'] / ['valid_until'], filled from key_pair
+        exclude = ('valid_from', 'valid_until')
         read_only_fields = ('status', 'created', 'updated')
         create_only_fields = ('subscriber_id',)
+        extra_kwargs = {'unique_key_id': {'validators': [ShardedUniqueValidator(Subscriber.objects.all())]}}
     
+    def validate_subscriber_id(self, value: str) -> str:
+        if not _HOSTNAME.fullmatch(value):
+            raise serializers.ValidationError('Must be the fully qualified domain name of the subscriber.')
+        return value
+
+    def validate_callback_url(self, value: str) -> str:
+        # The challenge is always sent to https://<subscriber_id><callback_url>, never to another host
+        url = urlsplit(value)
+        if url.scheme or url.netloc or not value.startswith('/') or value.startswith('//') or '\\' in value:
+            raise serializers.ValidationError('Must be a path on the subscriber_id host.')
+        return value
+
     def create(self, validated_data: OrderedDict) -> Any:
         raise Exception('method call now allowed directly')
 
 
+class LookupRequestSerializer(serializers.Serializer):
+    subscriber_id = serializers.CharField(required=False)
+    ukId = serializers.CharField(required=False)
+    domain = serializers.ChoiceField(choices=Subscriber.ONDCDomainType.choices + [('*', '*')], required=False)
+    type = serializers.ChoiceField(choices=Subscriber.SubscriberType.choices + [('*', '*')], required=False)
+    city = serializers.ListField(child=serializers.CharField(), required=False, allow_empty=False)
+
+    def to_internal_value(self, data: Any) -> Any:
+        # Beckn sends a single city code, many are accepted as a list
+        if hasattr(data, 'get') and isinstance(data.get('city'), str):
+            data = {**data, 'city': [data['city']]}
+        return super().to_internal_value(data)
+
+
+class LookupSubscriberSerializer(serializers.ModelSerializer):
+    """
+    What the public /lookup tells about a subscriber: its keys, their
+    validity window, its callback and participants. Contact, tax and
+    signatory details stay private.
+    """
+    ukId = serializers.CharField(source='unique_key_id', read_only=True)
+    key_pair = KeyPairDetailSerializer(read_only=True)
+    network_participant = NetworkParticipantSerializer(many=True, read_only=True, source='matched_participants')
+
+    class Meta:
+        model = Subscriber
+        fields = ('subscriber_id', 'ukId', 'key_pair', 'callback_url', 'network_participant')
+        read_only_fields = fields
+
+
 class WriteSubscriberOperationNumberSerializer(serializers.Serializer):
     ops_no = serializers.IntegerField(
         required=True,
@@ -107,17 +217,31 @@ class WriteSubscriberOperationNumberSerializer(serializers.Serializer):
 class WriteSubscriberContextSerializer(serializers.Serializer):
     operation = WriteSubscriberOperationNumberSerializer(required=True)
 
+def log_requests(requests: Iterable[tuple[str, dict]]) -> None:
+    """
+    Records the (subscriber_id, message) of committed subscribe requests in
+    the contract log and the replay guard, so their request_id is refused.
+    """
+    guard = get_replay_guard()
+    for subscriber_id, message in requests:
+        get_contract_logger().log(target=settings.HOSTNAME, origin=subscriber_id, request_id=message['request_id'],
+                                  created=message['timestamp'])
+        guard.record(message['request_id'])
+
+
 class WriteSubscriberMessageSerializer(serializers.Serializer):
-    request_id = serializers.CharField(required=True, validators=[
-        validators.UniqueValidator(ContractRequestLogger.objects.filter(target=settings.HOSTNAME))
-    ])
+    request_id = serializers.CharField(required=True, validators=[UniqueRequestIdValidator()])
     timestamp = serializers.DateTimeField(required=True)
     entity = SubscriberSerializer(required=True)
     network_participant = NetworkParticipantSerializer(many=True, required=True)
 
     def validate_timestamp(self, value: datetime):
+        # Replays of archived requests (bulk ingestion) opt out of the expiry check
+        if self.context.get('ignore_expiry'):
+            return value
         if datetime.now(value.tzinfo) > value + timedelta(seconds=30):
             raise serializers.ValidationError(f'The request has expired. Max validity of any request is 30s')
+        return value
 
  
 class WriteSubscriberSerializer(serializers.Serializer):
@@ -126,40 +250,44 @@ class WriteSubscriberSerializer(serializers.Serializer):
 
 
     def validate_operation(self, operation: int, network_participant: List[OrderedDict]):
+        # One pass counting buyers, non-MSN sellers and MSN sellers
+        buyers = sellers = msn_sellers = 0
+        for part in network_participant:
+            if part['type'] == Subscriber.SubscriberType.BAP:
+                buyers += 1
+            elif part['type'] == Subscriber.SubscriberType.BPP:
+                if part['msn']:
+                    msn_sellers += 1
+                else:
+                    sellers += 1
+        total = len(network_participant)
         validated = False
-        get_filtered_list = lambda constraint: list(filter(constraint, network_participant))
         err_string = "Unknown ops_no"
-        constraint_buyer = lambda part: part['type'] == Subscriber.SubscriberType.BAP
-        constraint_seller = lambda part: part['type'] == Subscriber.SubscriberType.BPP and not part['msn']
-        constraint_msn_seller = lambda part: part['type'] == Subscriber.SubscriberType.BPP and part['msn']
         match operation:
             case 1:
-                validated = len(network_participant) == len(get_filtered_list(constraint_buyer))   
+                validated = total == buyers
                 err_string = "ops_no 1 can only create new BAP."
             case 2:
-                validated = len(network_participant) == len(get_filtered_list(constraint_seller))
+                validated = total == sellers
                 err_string = "ops_no 2 can only create new Non-MSN BPP."
             case 3:
-                validated = len(network_participant) == len(get_filtered_list(constraint_msn_seller))
+                validated = total == msn_sellers
                 err_string = "ops_no 3 can only create new MSN BPP."
             case 4:
-                validated =   ( 
-                    any(get_filtered_list(constraint_buyer)) and \
-                    any(get_filtered_list(constraint_seller)) and \
-                    not any(get_filtered_list(constraint_msn_seller))
-                )
+                validated = buyers > 0 and sellers > 0 and msn_sellers == 0
                 err_string = "ops_no 4 can only create BAP and Non-MSN BPP together."
             case 5:
-                validated =   ( 
-                    any(get_filtered_list(constraint_buyer)) and \
-                    not any(get_filtered_list(constraint_seller)) and \
-                    any(get_filtered_list(constraint_msn_seller))
-                )
+                validated = buyers > 0 and sellers == 0 and msn_sellers > 0
                 err_string = "ops_no 5 can only create BAP and MSN BPP together."
 
         if not validated:
             raise serializers.ValidationError({'operation': err_string})
 
+    def run_validation(self, data=serializers.empty):
+        # SUBSCRIBE_FAST_VALIDATION runs a compiled plan of this serializer, same result and errors
+        if settings.SUBSCRIBE_FAST_VALIDATION and type(data) is dict and not self.partial:
+            return fast_validation.get_validator(type(self)).run_validation(data, self.context)
+        return super().run_validation(data)
 
     def validate(self, attrs: Any) -> Any:
         validated_data: OrderedDict =  super().validate(attrs)
@@ -169,17 +297,42 @@ class WriteSubscriberSerializer(serializers.Serializer):
         return validated_data
 
 
+    @staticmethod
+    def build_instances(validated_data: OrderedDict) -> tuple[Subscriber, List[NetworkParticipant], List[SellerOnRecord]]:
+        """
+        Unsaved model instances of a validated subscribe request, participant
+        ids are generated client side so the whole tree can be bulk inserted.
+        """
+        message = validated_data['message']
+        subscriber = Subscriber(**message['entity'], **key_validity(message['entity']['key_pair']))
+        participants, sellers = [], []
+        for participant in message['network_participant']:
+            participant = dict(participant)
+            seller_on_record = participant.pop('seller_on_record', None) or []
+            network_participant = NetworkParticipant(subscriber=subscriber, **participant)
+            participants.append(network_participant)
+            sellers.extend(
+                SellerOnRecord(network_participant=network_participant, **seller, **key_validity(seller['key_pair']))
+                for seller in seller_on_record
+            )
+        return subscriber, participants, sellers
+
     #TODO: Add update function (subscriber details, network participant, seller_on_record)
     def create(self, validated_data):
-        if Subscriber.objects.filter(unique_key_id=validated_data.get('unique_key_id')).exists():
+        unique_key_id = validated_data['message']['entity']['unique_key_id']
+        if sharding.exists(Subscriber, unique_key_id=unique_key_id):
             raise serializers.ValidationError({'unique_key_id': 'Subscriber with key_id already exists.'})
-        subscriber = Subscriber.objects.create(**validated_data['message']['entity'])
-        for participant in validated_data['message']['network_participant']:
-            serialized_participant = NetworkParticipantSerializer(data=participant, context=self.context)
-            serialized_participant.is_valid()
-            serialized_participant.create(subscriber, participant)
+        subscriber, participants, sellers = self.build_instances(validated_data)
+        message = validated_data['message']
+        using = sharding.write_database(subscriber.subscriber_id)
+        with transaction.atomic(using=using):
+            subscriber.save(force_insert=True, using=using)
+            NetworkParticipant.objects.using(using).bulk_create(participants)
+            SellerOnRecord.objects.using(using).bulk_create(sellers)
+            notify_bulk_created([subscriber], participants, using=using)
+            transaction.on_commit(lambda: log_requests([(subscriber.subscriber_id, message)]), using=using)
+            transaction.on_commit(lambda: pipeline.start([subscriber.unique_key_id]), using=using)
         return subscriber
-        # TODO: Queue post processing
     # Only updates the Subscriber model
     def update(self, instance: Any, validated_data: Any) -> Subscriber:
         return self.message.entity.update(instance, validated_data['message']['entity'])
@@ -187,6 +340,5 @@ class WriteSubscriberSerializer(serializers.Serializer):
 # TODO: API to PUT, PATCH seller_on_record in subscriber
 # TODO: API to PUT, PATCH network participant
 # TODO: Authentication to perform updates 
-#TODO: Add queue process to validate subscriber whitelisting on ONDC site
 
 
@@ -0,0 +1,254 @@
+import bisect
+import hashlib
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Callable, Iterable, Iterator, TypeVar
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connections, router, transaction
+from django.dispatch import receiver
+
+
+T = TypeVar('T')
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+class ShardMap:
+    """
+    Consistent hash ring of database aliases. Every shard owns
+    virtual_nodes points of the ring and a subscriber_id belongs to the
+    first point after its hash, so adding a shard only moves the
+    subscribers that land on the new shard's points.
+    """
+
+    def __init__(self, shards: Iterable[str], virtual_nodes: int = 64) -> None:
+        self.shards = list(dict.fromkeys(shards))
+        if not self.shards:
+            raise ValueError('A shard map needs at least one shard')
+        self.virtual_nodes = virtual_nodes
+        ring = sorted((_hash(f'{shard}#{node}'), shard) for shard in self.shards for node in range(virtual_nodes))
+        self._points = [point for point, _ in ring]
+        self._owners = [shard for _, shard in ring]
+
+    def shard_for(self, subscriber_id: str) -> str:
+        position = bisect.bisect(self._points, _hash(subscriber_id)) % len(self._points)
+        return self._owners[position]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.shards)
+
+    def __len__(self) -> int:
+        return len(self.shards)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, ShardMap) and (self.shards, self.virtual_nodes) == (other.shards, other.virtual_nodes)
+
+
+_maps: dict[str, ShardMap | None] = {}
+_maps_lock = Lock()
+_executor: ThreadPoolExecutor | None = None
+
+
+def _build(setting: str) -> ShardMap | None:
+    if setting not in _maps:
+        with _maps_lock:
+            if setting not in _maps:
+                shards = getattr(settings, setting)
+                _maps[setting] = ShardMap(shards, settings.REGISTRY_SHARD_VIRTUAL_NODES) if shards else None
+    return _maps[setting]
+
+
+def sharding_enabled() -> bool:
+    return bool(settings.REGISTRY_SHARDS)
+
+
+def get_shard_map() -> ShardMap | None:
+    """
+    The current shard map, None when the registry is not sharded.
+    """
+    return _build('REGISTRY_SHARDS')
+
+
+def get_previous_shard_map() -> ShardMap | None:
+    """
+    The map a rebalance is moving subscribers away from, still read as a fallback.
+    """
+    return _build('REGISTRY_SHARDS_PREVIOUS')
+
+
+def reset_shard_maps() -> None:
+    global _executor
+    with _maps_lock:
+        _maps.clear()
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+
+
+@receiver(setting_changed)
+def _reset_on_setting_changed(setting: str, **kwargs) -> None:
+    if setting.startswith('REGISTRY_SHARD'):
+        reset_shard_maps()
+
+
+def all_shards() -> list[str]:
+    shards = list(get_shard_map() or [])
+    previous = get_previous_shard_map()
+    return list(dict.fromkeys([*shards, *(previous or [])]))
+
+
+def shards_of(subscriber_id: str) -> list[str]:
+    """
+    Where a subscriber tree lives, then where it may still live while a
+    rebalance has not moved it yet.
+    """
+    shards = [get_shard_map().shard_for(subscriber_id)]
+    previous = get_previous_shard_map()
+    if previous is not None and previous.shard_for(subscriber_id) not in shards:
+        shards.append(previous.shard_for(subscriber_id))
+    return shards
+
+
+def write_database(subscriber_id: str) -> str:
+    """
+    Database receiving the writes of a subscriber tree.
+    """
+    from .models import Subscriber
+    if not sharding_enabled():
+        return router.db_for_write(Subscriber)
+    return get_shard_map().shard_for(subscriber_id)
+
+
+def subscriber_id_of(instance: Any) -> str | None:
+    """
+    subscriber_id of a Subscriber, NetworkParticipant or SellerOnRecord,
+    only following parents already loaded on the instance.
+    """
+    cache = instance._state.fields_cache
+    if 'network_participant' in cache:
+        instance = cache['network_participant']
+        cache = instance._state.fields_cache
+    if 'subscriber' in cache:
+        instance = cache['subscriber']
+    # NetworkParticipant.subscriber_id is the foreign key, not the subscriber_id field
+    if instance._meta.model_name != 'subscriber':
+        return None
+    return instance.subscriber_id or None
+
+
+def scatter(call: Callable[[str], T], shards: Iterable[str] | None = None) -> list[T]:
+    """
+    Runs call(alias) on every shard at once and returns the results in shard
+    order. Inside a transaction the calls run in the calling thread, other
+    threads use their own connections and would miss its uncommitted rows.
+    """
+    global _executor
+    shards = list(shards if shards is not None else all_shards())
+    if len(shards) == 1 or any(connections[alias].in_atomic_block for alias in shards):
+        return [call(alias) for alias in shards]
+    if _executor is None:
+        with _maps_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max(len(all_shards()), 1),
+                                               thread_name_prefix='registry-shard')
+    return list(_executor.map(call, shards))
+
+
+def exists(model, **filters) -> bool:
+    if not sharding_enabled():
+        return model.objects.filter(**filters).exists()
+    return any(scatter(lambda alias: model.objects.using(alias).filter(**filters).exists()))
+
+
+def registry_databases() -> list[str]:
+    """
+    Databases holding registry rows: every shard, or the registry primary.
+    """
+    from .models import Subscriber
+    if sharding_enabled():
+        return all_shards()
+    return [router.db_for_write(Subscriber)]
+
+
+def locate(model, pks: Iterable[Any]) -> dict[str, list[Any]]:
+    """
+    The given primary keys by the database holding them, one query per shard
+    and none without sharding. Keys on no database are left out, keys a
+    rebalance left on two shards are listed under both.
+    """
+    pks = list(pks)
+    databases = registry_databases()
+    if len(databases) == 1:
+        return {databases[0]: pks} if pks else {}
+    if not pks:
+        return {}
+    found = scatter(
+        lambda alias: list(model.objects.using(alias).filter(pk__in=pks).values_list('pk', flat=True)), databases
+    )
+    return {alias: keys for alias, keys in zip(databases, found) if keys}
+
+
+def gather_sorted(results: Iterable[Iterable[T]], key: Callable[[T], Any],
+                  unique: Callable[[T], Any] | None = None) -> list[T]:
+    """
+    Merges per shard results already sorted by key, dropping the copies a
+    rebalance in progress may leave on two shards.
+    """
+    merged, seen = [], set()
+    for item in heapq.merge(*results, key=key):
+        if unique is not None:
+            identity = unique(item)
+            if identity in seen:
+                continue
+            seen.add(identity)
+        merged.append(item)
+    return merged
+
+
+@dataclass
+class MoveReport:
+    subscribers: int = 0
+    participants: int = 0
+    sellers: int = 0
+
+
+def move_subscriber(subscriber_id: str, source: str, target: str) -> MoveReport:
+    """
+    Copies a subscriber tree to the target shard then deletes it from the
+    source. The source rows stay locked for the move so concurrent writes
+    wait for it, and the copy commits before the delete: a failure leaves
+    a duplicate, never a loss, and running the move again completes it.
+    """
+    from .models import NetworkParticipant, SellerOnRecord, Subscriber
+    from .signals import notify_bulk_created
+
+    with transaction.atomic(using=source):
+        subscribers = list(Subscriber.objects.using(source).select_for_update().filter(subscriber_id=subscriber_id))
+        participants = list(NetworkParticipant.objects.using(source).filter(subscriber__in=subscribers))
+        sellers = list(SellerOnRecord.objects.using(source).filter(network_participant__in=participants))
+        with transaction.atomic(using=target):
+            Subscriber.objects.using(target).bulk_create(subscribers, ignore_conflicts=True)
+            NetworkParticipant.objects.using(target).bulk_create(participants, ignore_conflicts=True)
+            SellerOnRecord.objects.using(target).bulk_create(sellers, ignore_conflicts=True)
+        Subscriber.objects.using(source).filter(subscriber_id=subscriber_id).delete()
+    # Deleting unindexed the participants that now live on the target shard
+    notify_bulk_created(subscribers, participants, using=target)
+    return MoveReport(len(subscribers), len(participants), len(sellers))
+
+
+def misplaced_subscribers(shard: str, shard_map: ShardMap, chunk_size: int = 2000) -> Iterator[str]:
+    """
+    subscriber_ids stored on a shard the map assigns to another shard.
+    """
+    from .models import Subscriber
+    subscriber_ids = Subscriber.objects.using(shard).order_by('subscriber_id') \
+        .values_list('subscriber_id', flat=True).distinct()
+    for subscriber_id in subscriber_ids.iterator(chunk_size=chunk_size):
+        if shard_map.shard_for(subscriber_id) != shard:
+            yield subscriber_id
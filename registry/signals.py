@@ -0,0 +1,147 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+import uuid
+
+from . import bitmap_index, change_feed, keyring, response_cache, sharding
+from .authentication import default_resolver
+from .models import NetworkParticipant, SellerOnRecord, Subscriber
+
+
+@receiver([post_save, post_delete], sender=Subscriber)
+def invalidate_subscriber_key(sender, instance: Subscriber, **kwargs) -> None:
+    # After commit, a request racing the write could otherwise cache the old key again
+    unique_key_id = instance.unique_key_id
+    transaction.on_commit(lambda: default_resolver.invalidate(unique_key_id), using=instance._state.db)
+
+
+@receiver([post_save, post_delete], sender=Subscriber)
+@receiver([post_save, post_delete], sender=SellerOnRecord)
+def reload_keyring_key(sender, instance, **kwargs) -> None:
+    # With the change feed on apply_changes reloads it, in this process too
+    if keyring.is_keyring_loaded() and not change_feed.feed_enabled():
+        kind, pk = sender._meta.model_name, instance.pk
+        transaction.on_commit(lambda: keyring.get_keyring().reload(kind, [pk]), using=instance._state.db)
+
+
+# bulk_create doesn't send signals, callers must rebuild the bitmap index after bulk loads
+@receiver(post_save, sender=NetworkParticipant)
+def index_participant(sender, instance: NetworkParticipant, **kwargs) -> None:
+    if bitmap_index.index_enabled() and bitmap_index.is_index_built():
+        transaction.on_commit(lambda: bitmap_index.get_index().add(instance), using=instance._state.db)
+
+
+@receiver(post_delete, sender=NetworkParticipant)
+def unindex_participant(sender, instance: NetworkParticipant, **kwargs) -> None:
+    if bitmap_index.index_enabled() and bitmap_index.is_index_built():
+        participant_id = instance.id
+        transaction.on_commit(lambda: bitmap_index.get_index().remove(participant_id), using=instance._state.db)
+
+
+@receiver([post_save, post_delete], sender=Subscriber)
+@receiver([post_save, post_delete], sender=NetworkParticipant)
+@receiver([post_save, post_delete], sender=SellerOnRecord)
+def invalidate_lookup_fragment(sender, instance, **kwargs) -> None:
+    # After commit, a lookup racing the write could otherwise cache the old row again
+    pk = instance.pk
+    transaction.on_commit(
+        lambda: response_cache.get_response_cache().invalidate(response_cache.kind_of(sender), [pk]),
+        using=instance._state.db
+    )
+
+
+@receiver([post_save, post_delete], sender=Subscriber)
+@receiver([post_save, post_delete], sender=NetworkParticipant)
+@receiver([post_save, post_delete], sender=SellerOnRecord)
+def publish_change(sender, instance, **kwargs) -> None:
+    if change_feed.feed_enabled():
+        change_feed.publish(sender._meta.model_name, [instance.pk], using=instance._state.db)
+
+
+def notify_bulk_updated(unique_key_ids: list[str], using: str | None = None) -> None:
+    """
+    QuerySet.update() sends no signals, callers updating subscribers in bulk
+    must call this for the updated rows.
+    """
+    if change_feed.feed_enabled() and unique_key_ids:
+        change_feed.publish(Subscriber._meta.model_name, unique_key_ids, using=using)
+    def refresh() -> None:
+        for unique_key_id in unique_key_ids:
+            default_resolver.invalidate(unique_key_id)
+        response_cache.get_response_cache().invalidate(response_cache.SUBSCRIBER, unique_key_ids)
+        # With the change feed on apply_changes reloads them
+        if keyring.is_keyring_loaded() and not change_feed.feed_enabled():
+            keyring.get_keyring().reload(Subscriber._meta.model_name, unique_key_ids)
+    transaction.on_commit(refresh, using=using)
+
+
+def notify_bulk_created(subscribers: list[Subscriber], participants: list[NetworkParticipant],
+                        using: str | None = None) -> None:
+    """
+    Does for bulk_create what the post_save receivers above do for save(),
+    must be called inside the transaction that inserted the rows on `using`.
+    """
+    if change_feed.feed_enabled():
+        change_feed.publish(Subscriber._meta.model_name, [subscriber.pk for subscriber in subscribers], using=using)
+        change_feed.publish(NetworkParticipant._meta.model_name, [participant.pk for participant in participants],
+                            using=using)
+    def refresh() -> None:
+        for subscriber in subscribers:
+            default_resolver.invalidate(subscriber.unique_key_id)
+        cache = response_cache.get_response_cache()
+        cache.invalidate(response_cache.SUBSCRIBER, [subscriber.pk for subscriber in subscribers])
+        cache.invalidate(response_cache.PARTICIPANT, [participant.pk for participant in participants])
+        if bitmap_index.index_enabled() and bitmap_index.is_index_built():
+            index = bitmap_index.get_index()
+            for participant in participants:
+                index.add(participant)
+    transaction.on_commit(refresh, using=using)
+
+
+def apply_changes(events: list[change_feed.ChangeEvent]) -> None:
+    """
+    Change feed callback dropping what this process holds of rows changed by
+    any process: resolved signing keys, key ring entries, lookup fragments
+    (when their cache is local to the process) and bitmap index entries.
+    """
+    pks: dict[str, set[str]] = {}
+    for event in events:
+        pks.setdefault(event.model, set()).add(event.pk)
+    cache = response_cache.get_response_cache()
+    for unique_key_id in pks.get(Subscriber._meta.model_name, ()):
+        default_resolver.invalidate(unique_key_id)
+    if keyring.is_keyring_loaded():
+        keyring.get_keyring().apply_changes(events)
+    for model, kind in ((Subscriber, response_cache.SUBSCRIBER), (NetworkParticipant, response_cache.PARTICIPANT),
+                        (SellerOnRecord, response_cache.SELLER)):
+        if model._meta.model_name in pks:
+            cache.invalidate(kind, pks[model._meta.model_name])
+    participant_ids: dict[str | None, set[uuid.UUID]] = {}
+    for event in events:
+        if event.model == NetworkParticipant._meta.model_name:
+            participant_ids.setdefault(event.using, set()).add(uuid.UUID(event.pk))
+    if participant_ids and bitmap_index.index_enabled() and bitmap_index.is_index_built():
+        index = bitmap_index.get_index()
+        for using, ids in participant_ids.items():
+            ids -= _index_participants(index, ids, using)
+            # Gone from the database of the event, a rebalance may have moved them to another shard
+            for other in sharding.registry_databases():
+                if ids and other != using:
+                    ids -= _index_participants(index, ids, other)
+            for participant_id in ids:
+                index.remove(participant_id)
+
+
+def _index_participants(index: bitmap_index.ParticipantBitmapIndex, ids: set[uuid.UUID],
+                        using: str | None) -> set[uuid.UUID]:
+    """
+    Indexes the participants of `ids` stored on `using`, returns their ids.
+    """
+    rows = NetworkParticipant.objects.using(using).filter(id__in=ids) \
+        .values_list('id', 'subscriber_id', 'domain', 'type', 'city_code')
+    found = set()
+    for row in rows:
+        index.add_row(*row)
+        found.add(row[0])
+    return found
@@ -0,0 +1,269 @@
+import asyncio
+import ssl
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone as dt_timezone
+from threading import Lock
+from typing import Callable, Iterable
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import sharding
+from .callback import CallbackTarget, set_statuses
+from .models import CallbackCertificate, Subscriber
+
+
+SubscriptionStatus = Subscriber.SubscriptionStatus
+
+# Subscribers whose certificate is not checked, their status doesn't depend on it
+SKIPPED_STATUSES = (SubscriptionStatus.UNSUBSCRIBED, SubscriptionStatus.EXPIRED, SubscriptionStatus.INVALID_KEY,
+                    SubscriptionStatus.NOT_WHITELISTED, SubscriptionStatus.UNREACHABLE)
+
+
+@dataclass(frozen=True)
+class CertificateResult:
+    host: str
+    port: int
+    valid: bool
+    checked_at: float
+    not_after: float | None = None
+    error: str | None = None
+    # False when the host could not be reached, which says nothing about its certificate
+    reachable: bool = True
+
+    @property
+    def address(self) -> str:
+        return f'{self.host}:{self.port}'
+
+    @property
+    def expires_at(self) -> datetime | None:
+        if self.not_after is None:
+            return None
+        return datetime.fromtimestamp(self.not_after, tz=dt_timezone.utc)
+
+
+def host_of(target: CallbackTarget) -> tuple[str, int]:
+    url = urlsplit(target.url)
+    return url.hostname or '', url.port or (443 if url.scheme == 'https' else 80)
+
+
+def split_address(address: str, default_port: int | None = None) -> tuple[str, int]:
+    """
+    host and port of a host:port address, or of a host alone with default_port.
+    """
+    url = urlsplit(f'//{address}')
+    return url.hostname or '', url.port or default_port
+
+
+class CertificateCache:
+    """
+    Handshake results per host:port. A valid result is kept for ttl seconds
+    but never past recheck_margin seconds before the certificate expires,
+    failures are kept for failure_ttl seconds.
+    """
+
+    def __init__(self, ttl: float, failure_ttl: float, recheck_margin: float,
+                 clock: Callable[[], float] = time.time) -> None:
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.recheck_margin = recheck_margin
+        self.clock = clock
+        self._results: dict[str, tuple[float, CertificateResult]] = {}
+        self._lock = Lock()
+
+    def recheck_at(self, result: CertificateResult) -> float:
+        if not result.valid or result.not_after is None:
+            return result.checked_at + self.failure_ttl
+        before_expiry = max(result.not_after - self.recheck_margin, result.checked_at + self.failure_ttl)
+        return min(result.checked_at + self.ttl, before_expiry, result.not_after)
+
+    def get(self, address: str) -> CertificateResult | None:
+        with self._lock:
+            entry = self._results.get(address)
+            if entry is None:
+                return None
+            if entry[0] <= self.clock():
+                del self._results[address]
+                return None
+            return entry[1]
+
+    def put(self, result: CertificateResult) -> None:
+        with self._lock:
+            self._results[result.address] = (self.recheck_at(result), result)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+
+class CertificateChecker:
+    """
+    Runs TLS handshakes against many hosts at once, every host:port is
+    checked once per call and answered from the cache while it is fresh.
+    """
+
+    def __init__(self, cache: CertificateCache, context: ssl.SSLContext | None = None,
+                 timeout: float | None = None, concurrency: int | None = None) -> None:
+        self.cache = cache
+        self.context = context or ssl.create_default_context()
+        self.timeout = timeout or settings.SSL_CHECK_TIMEOUT
+        self.concurrency = concurrency or settings.SSL_CHECK_CONCURRENCY
+        self.handshakes = 0
+
+    async def handshake(self, host: str, port: int) -> CertificateResult:
+        self.handshakes += 1
+        checked_at = self.cache.clock()
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port, ssl=self.context, server_hostname=host), self.timeout
+            )
+        except ssl.SSLError as exc:
+            return CertificateResult(host, port, False, checked_at, error=f'{type(exc).__name__}: {exc}')
+        except (OSError, asyncio.TimeoutError) as exc:
+            return CertificateResult(host, port, False, checked_at, error=f'{type(exc).__name__}: {exc}',
+                                     reachable=False)
+        try:
+            certificate = writer.get_extra_info('peercert') or {}
+            not_after = certificate.get('notAfter')
+            return CertificateResult(host, port, True, checked_at,
+                                     not_after=ssl.cert_time_to_seconds(not_after) if not_after else None)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (OSError, ssl.SSLError):
+                pass
+
+    async def check_many(self, addresses: Iterable[tuple[str, int]]) -> dict[str, CertificateResult]:
+        """
+        Results keyed by host:port.
+        """
+        results: dict[str, CertificateResult] = {}
+        pending: dict[str, tuple[str, int]] = {}
+        for host, port in addresses:
+            address = f'{host}:{port}'
+            if address in results or address in pending:
+                continue
+            cached = self.cache.get(address)
+            if cached is not None:
+                results[address] = cached
+            else:
+                pending[address] = (host, port)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def limited(host: str, port: int) -> CertificateResult:
+            async with semaphore:
+                return await self.handshake(host, port)
+
+        for result in await asyncio.gather(*(limited(host, port) for host, port in pending.values())):
+            self.cache.put(result)
+            results[result.address] = result
+        return results
+
+
+_cache: CertificateCache | None = None
+_cache_lock = Lock()
+
+
+def get_certificate_cache() -> CertificateCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CertificateCache(settings.SSL_CHECK_TTL, settings.SSL_CHECK_FAILURE_TTL,
+                                          settings.SSL_CHECK_RECHECK_MARGIN)
+    return _cache
+
+
+def callback_host(host: str, port: int) -> str:
+    """
+    The subscriber_id whose callbacks are sent to host:port.
+    """
+    return host if port == 443 else f'{host}:{port}'
+
+
+def due_hosts(limit: int | None = None, now: datetime | None = None, using: str | None = None) -> list[str]:
+    """
+    Callback hosts (as subscriber_ids) of the checked subscribers of one
+    database never checked yet or whose recheck_at passed, in one query.
+    """
+    fresh = CallbackCertificate.objects.using(using).filter(recheck_at__gt=now or timezone.now()).values('host')
+    hosts = Subscriber.objects.using(using).exclude(status__in=SKIPPED_STATUSES).exclude(subscriber_id__in=fresh) \
+        .order_by('subscriber_id').values_list('subscriber_id', flat=True).distinct()
+    return list(hosts[:limit])
+
+
+def record_results(results: Iterable[CertificateResult], cache: CertificateCache, using: str | None = None) -> None:
+    """
+    Stores every result with the time it is due again, for the sweep.
+    """
+    def at(timestamp: float | None) -> datetime | None:
+        return None if timestamp is None else datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+
+    CallbackCertificate.objects.using(using).bulk_create(
+        [
+            CallbackCertificate(
+                host=callback_host(result.host, result.port), valid=result.valid, reachable=result.reachable,
+                not_after=at(result.not_after), checked_at=at(result.checked_at),
+                recheck_at=at(cache.recheck_at(result)), error=result.error,
+            )
+            for result in results
+        ],
+        update_conflicts=True, unique_fields=['host'],
+        update_fields=['valid', 'reachable', 'not_after', 'checked_at', 'recheck_at', 'error'],
+    )
+
+
+def check_subscribers(addresses: list[str] | None = None,
+                      checker: CertificateChecker | None = None) -> dict[str, CertificateResult]:
+    """
+    Checks the callback hosts of every subscribed or subscribing subscriber,
+    or only the given host:port addresses (or hosts, on port 443), on every
+    shard. Subscribers behind a broken certificate become INVALID_SSL,
+    INVALID_SSL ones behind a now valid certificate go back to INITIATED for
+    a new callback verification. Unreachable hosts keep their status. Every
+    result is recorded in CallbackCertificate, on the shard of its host.
+    """
+    def select(using: str) -> list[dict]:
+        rows = Subscriber.objects.using(using).exclude(status__in=SKIPPED_STATUSES)
+        if addresses is not None:
+            # Callbacks always go to https://<subscriber_id>, the host is the subscriber_id
+            rows = rows.filter(
+                subscriber_id__in=[callback_host(*split_address(address, 443)) for address in addresses]
+            )
+        return list(rows.values('unique_key_id', 'subscriber_id', 'status'))
+
+    databases = sharding.registry_databases()
+    by_address: dict[str, list[dict]] = defaultdict(list)
+    hosts: dict[str, tuple[str, int]] = {}
+    on_database: dict[str, set[str]] = defaultdict(set)
+    for using, rows in zip(databases, sharding.scatter(select, databases)):
+        for row in rows:
+            host, port = split_address(row['subscriber_id'], 443)
+            address = f'{host}:{port}'
+            by_address[address].append(row)
+            hosts[address] = (host, port)
+            on_database[using].add(address)
+    if not hosts:
+        return {}
+    checker = checker or CertificateChecker(get_certificate_cache())
+    results = asyncio.run(checker.check_many(hosts.values()))
+    for using, database_addresses in on_database.items():
+        record_results([results[address] for address in database_addresses], checker.cache, using=using)
+    statuses: dict[str, list[str]] = defaultdict(list)
+    for address, result in results.items():
+        if not result.reachable:
+            continue
+        for row in by_address[address]:
+            if not result.valid and row['status'] != SubscriptionStatus.INVALID_SSL:
+                statuses[SubscriptionStatus.INVALID_SSL].append(row['unique_key_id'])
+            elif result.valid and row['status'] == SubscriptionStatus.INVALID_SSL:
+                statuses[SubscriptionStatus.INITIATED].append(row['unique_key_id'])
+    set_statuses(statuses)
+    return results
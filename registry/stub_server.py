@@ -0,0 +1,153 @@
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+import httpx
+from nacl.encoding import Base64Encoder
+from nacl.public import PrivateKey, SealedBox
+
+from .ssl_check import CertificateCache, CertificateChecker, CertificateResult
+
+
+class CallbackStubServer:
+    """
+    Local stand-in for subscriber on_subscribe endpoints, used by the tests
+    and benchmarks. Every subscriber_id answers with its own behaviour:
+        ok    - decrypts the challenge and answers it
+        wrong - answers something else
+        error - responds with 500
+        slow  - waits slow_delay seconds before answering
+    Every answer is also delayed by `delay` seconds to mimic network latency.
+    """
+
+    def __init__(self, delay: float = 0.0, slow_delay: float = 1.0, host: str = '127.0.0.1') -> None:
+        self.delay = delay
+        self.slow_delay = slow_delay
+        self.keys: dict[str, PrivateKey] = {}
+        self.behaviours: dict[str, str] = {}
+        self.requests = 0
+        # Highest number of requests handled at the same time
+        self.peak = 0
+        self._active = 0
+        self._lock = Lock()
+        self.server = ThreadingHTTPServer((host, 0), self._handler())
+        self.server.daemon_threads = True
+        self._thread: Thread | None = None
+
+    def register(self, subscriber_id: str, behaviour: str = 'ok') -> str:
+        """
+        Returns the base64 X25519 public key the registry must encrypt with.
+        """
+        key = self.keys.setdefault(subscriber_id, PrivateKey.generate())
+        self.behaviours[subscriber_id] = behaviour
+        return key.public_key.encode(Base64Encoder).decode()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def transport(self, scheme: str = 'http') -> 'StubTransport':
+        """
+        Transport for a CallbackVerifier, sending the callbacks of every
+        subscriber_id here.
+        """
+        return StubTransport(self, scheme)
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def respond(self, status: int, body: dict) -> None:
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self) -> None:
+                with stub._lock:
+                    stub.requests += 1
+                    stub._active += 1
+                    stub.peak = max(stub.peak, stub._active)
+                try:
+                    self.answer()
+                finally:
+                    with stub._lock:
+                        stub._active -= 1
+
+            def answer(self) -> None:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                subscriber_id = body.get('subscriber_id')
+                behaviour = stub.behaviours.get(subscriber_id)
+                if behaviour is None or behaviour == 'error':
+                    return self.respond(500, {'error': 'unavailable'})
+                time.sleep(stub.delay + (stub.slow_delay if behaviour == 'slow' else 0.0))
+                answer = SealedBox(stub.keys[subscriber_id]).decrypt(
+                    body['challenge'].encode(), encoder=Base64Encoder
+                ).decode()
+                self.respond(200, {'answer': answer if behaviour != 'wrong' else answer[::-1] + 'x'})
+
+        return Handler
+
+    def start(self) -> 'CallbackStubServer':
+        self._thread = Thread(target=self.server.serve_forever, name='callback-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> 'CallbackStubServer':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+class StubTransport(httpx.AsyncBaseTransport):
+    """
+    Rewrites every https://<subscriber_id>/... callback to the stub server.
+    With scheme='https' it speaks TLS to the plain HTTP stub, which fails the
+    handshake like a broken certificate would. The connection pool is made
+    per event loop, every asyncio.run of the verifier closes it.
+    """
+
+    def __init__(self, stub: CallbackStubServer, scheme: str = 'http') -> None:
+        self.stub = stub
+        self.scheme = scheme
+        self._transport: httpx.AsyncHTTPTransport | None = None
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self._transport is None:
+            self._transport = httpx.AsyncHTTPTransport()
+        host, port = self.stub.server.server_address[:2]
+        request.url = request.url.copy_with(scheme=self.scheme, host=host, port=port)
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        if self._transport is not None:
+            transport, self._transport = self._transport, None
+            await transport.aclose()
+
+
+class StubCertificateChecker(CertificateChecker):
+    """
+    Finds a valid certificate on every host without connecting, for
+    subscribers whose callbacks the stub server answers.
+    """
+
+    def __init__(self, cache: CertificateCache | None = None) -> None:
+        super().__init__(cache or CertificateCache(3600, 60, 600), timeout=1, concurrency=1)
+
+    async def handshake(self, host: str, port: int) -> CertificateResult:
+        self.handshakes += 1
+        return CertificateResult(host, port, True, self.cache.clock())
@@ -0,0 +1,323 @@
+"""
+Deterministic synthetic registry data: subscribers with mixed BAP, BPP and
+MSN participants, sellers on record, city codes and real Ed25519 / X25519
+key pairs. Subscriber `index` of a seed is always the same, so a network
+loaded with `manage.py generate_registry` and the subscribe requests
+written next to it never collide.
+"""
+import base64
+import io
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from functools import cached_property
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Iterable, Iterator, TextIO
+
+from cryptography.hazmat.primitives.asymmetric import ed25519
+from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.db import connections, models, transaction
+from nacl.public import PrivateKey
+
+from common.crypto.authorization import sign_authorization_header
+from . import sharding
+from .models import NetworkParticipant, SellerOnRecord, Subscriber
+from .serializers import key_validity
+
+
+BAP, BPP = Subscriber.SubscriberType.BAP, Subscriber.SubscriberType.BPP
+DOMAINS = [choice for choice, _ in Subscriber.ONDCDomainType.choices]
+# Share of subscribers per ops_no: BAP, BPP, MSN BPP, BAP + BPP, BAP + MSN BPP
+OPERATION_MIX = {1: 0.35, 2: 0.25, 3: 0.1, 4: 0.2, 5: 0.1}
+FIRST_NAMES = ('Anand', 'Priya', 'Rahul', 'Sneha', 'Vikram', 'Meera', 'Arjun', 'Kavya', 'Rohan', 'Isha')
+LAST_NAMES = ('Sharma', 'Iyer', 'Patel', 'Reddy', 'Gupta', 'Nair', 'Singh', 'Das', 'Menon', 'Joshi')
+STATES = ('Karnataka', 'Maharashtra', 'Delhi', 'Tamil Nadu', 'Gujarat', 'Kerala', 'West Bengal', 'Telangana')
+
+
+def encode(raw: bytes) -> str:
+    return base64.b64encode(raw).decode()
+
+
+@dataclass(frozen=True)
+class KeyPair:
+    """
+    Ed25519 signing and X25519 encryption keys derived from 64 seeded bytes.
+    """
+    seed: bytes
+
+    @property
+    def signing_key(self) -> ed25519.Ed25519PrivateKey:
+        return ed25519.Ed25519PrivateKey.from_private_bytes(self.seed[:32])
+
+    @property
+    def signing_public_key(self) -> str:
+        return encode(self.signing_key.public_key().public_bytes_raw())
+
+    @property
+    def encryption_public_key(self) -> str:
+        return encode(bytes(PrivateKey(self.seed[32:]).public_key))
+
+    def detail(self, valid_from: datetime, valid_until: datetime) -> dict:
+        return {
+            'signing_public_key': self.signing_public_key,
+            'encryption_public_key': self.encryption_public_key,
+            'valid_from': valid_from.strftime(settings.DATETIME_FORMAT),
+            'valid_until': valid_until.strftime(settings.DATETIME_FORMAT),
+        }
+
+
+@dataclass
+class SyntheticSubscriber:
+    index: int
+    keys: KeyPair
+    # Body of the subscribe request registering this subscriber
+    payload: dict
+
+    @property
+    def entity(self) -> dict:
+        return self.payload['message']['entity']
+
+    @property
+    def request_id(self) -> str:
+        return self.payload['message']['request_id']
+
+    def instances(self, status: str = Subscriber.SubscriptionStatus.SUBSCRIBED,
+                  ) -> tuple[Subscriber, list[NetworkParticipant], list[SellerOnRecord]]:
+        subscriber = Subscriber(status=status, **self.entity, **key_validity(self.entity['key_pair']))
+        participants, sellers = [], []
+        for position, participant in enumerate(self.payload['message']['network_participant']):
+            participant = dict(participant)
+            seller_on_record = participant.pop('seller_on_record', None) or []
+            network_participant = NetworkParticipant(
+                id=uuid.uuid5(uuid.NAMESPACE_URL, f'{subscriber.unique_key_id}/{position}'),
+                subscriber=subscriber, **participant
+            )
+            participants.append(network_participant)
+            sellers.extend(
+                SellerOnRecord(network_participant=network_participant, **seller, **key_validity(seller['key_pair']))
+                for seller in seller_on_record
+            )
+        return subscriber, participants, sellers
+
+
+@dataclass
+class SyntheticRegistry:
+    """
+    Subscriber number `index` only depends on the seed and the index.
+    """
+    seed: int = 42
+    cities: int = 300
+    max_cities: int = 8
+    max_sellers: int = 5
+    operation_mix: dict[int, float] = field(default_factory=lambda: dict(OPERATION_MIX))
+    # Key validity starts at this instant, fixed so that the data doesn't depend on the clock
+    epoch: datetime = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+    @cached_property
+    def city_codes(self) -> list[str]:
+        return [f'std:{code:03d}' for code in range(self.cities)]
+
+    def keys(self, rng: random.Random) -> KeyPair:
+        return KeyPair(rng.randbytes(64))
+
+    def participant(self, rng: random.Random, subscriber_id: str, type: str, msn: bool = False) -> dict:
+        domain = rng.choice(DOMAINS)
+        city_code = rng.sample(self.city_codes, rng.randint(1, min(self.max_cities, self.cities)))
+        participant = {
+            'subscriber_url': f'https://{subscriber_id}/beckn/{domain}',
+            'domain': domain, 'type': type, 'msn': msn, 'city_code': city_code,
+        }
+        if msn:
+            participant['seller_on_record'] = [
+                {
+                    'unique_key_id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                    'key_pair': self.keys(rng).detail(self.epoch, self.epoch + timedelta(days=365)),
+                    'city_code': rng.sample(city_code, rng.randint(1, len(city_code))),
+                }
+                for _ in range(rng.randint(1, self.max_sellers))
+            ]
+        return participant
+
+    def subscriber(self, index: int) -> SyntheticSubscriber:
+        rng = random.Random(f'{self.seed}:{index}')
+        keys = self.keys(rng)
+        operation = rng.choices(list(self.operation_mix), weights=list(self.operation_mix.values()))[0]
+        subscriber_id = f'np{index}.{rng.choice(DOMAINS)}.example.in'
+        participants = {
+            1: lambda: [self.participant(rng, subscriber_id, BAP)],
+            2: lambda: [self.participant(rng, subscriber_id, BPP)],
+            3: lambda: [self.participant(rng, subscriber_id, BPP, msn=True)],
+            4: lambda: [self.participant(rng, subscriber_id, BAP), self.participant(rng, subscriber_id, BPP)],
+            5: lambda: [self.participant(rng, subscriber_id, BAP),
+                        self.participant(rng, subscriber_id, BPP, msn=True)],
+        }[operation]()
+        signatory = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+        entity_name = f'{rng.choice(LAST_NAMES)} {rng.choice(("Traders", "Retail", "Logistics", "Mobility"))} {index}'
+        valid_from = self.epoch + timedelta(seconds=rng.randrange(180 * 24 * 3600))
+        entity = {
+            'gst': {
+                'legal_entity_name': entity_name,
+                'business_address': f'{rng.randint(1, 999)}, Sector {rng.randint(1, 60)}, {rng.choice(STATES)}',
+                'city_code': [rng.choice(self.city_codes)],
+                'gst_no': f'{rng.randint(1, 37):02d}{rng.getrandbits(40):010X}1Z{rng.randint(0, 9)}',
+            },
+            'pan': {
+                'name_as_per_pan': entity_name,
+                'pan_no': f'{rng.getrandbits(24):06X}{rng.randint(1000, 9999)}',
+                'date_of_incorporation': f'{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1950, 2022)}',
+            },
+            'name_of_authorised_signatory': signatory,
+            'address_of_authorised_signatory': f'{rng.randint(1, 999)}, {rng.choice(STATES)}',
+            'email_id': f"{signatory.lower().replace(' ', '.')}{index}@example.in",
+            'mobile_no': str(rng.randint(6000000000, 9999999999)),
+            'country': 'IND',
+            'subscriber_id': subscriber_id,
+            'unique_key_id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            'callback_url': '/ondc/onboarding',
+            'key_pair': keys.detail(valid_from, valid_from + timedelta(days=365)),
+        }
+        payload = {
+            'context': {'operation': {'ops_no': operation}},
+            'message': {
+                'request_id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                'timestamp': valid_from.strftime(settings.DATETIME_FORMAT),
+                'entity': entity,
+                'network_participant': participants,
+            },
+        }
+        return SyntheticSubscriber(index, keys, payload)
+
+    def subscribers(self, start: int, count: int) -> Iterator[SyntheticSubscriber]:
+        for index in range(start, start + count):
+            yield self.subscriber(index)
+
+
+def canonical_body(payload: dict) -> bytes:
+    """
+    The bytes a request line is sent and signed as.
+    """
+    return json.dumps(payload, separators=(',', ':')).encode()
+
+
+def signed_request(subscriber: SyntheticSubscriber, now: float | None = None, valid_for: int = 3600) -> dict:
+    """
+    A subscribe request line: the body stamped with `now`, signed with the
+    subscriber's own key. The private key is included (the data is
+    synthetic) so that a load driver can stamp and sign it again.
+    """
+    now = time.time() if now is None else now
+    payload = json.loads(json.dumps(subscriber.payload))
+    payload['message']['timestamp'] = datetime.fromtimestamp(now, timezone.utc).strftime(settings.DATETIME_FORMAT)
+    entity = payload['message']['entity']
+    created = int(now)
+    return {
+        'request_id': subscriber.request_id,
+        'method': 'POST',
+        'path': '/subscribe',
+        'headers': {
+            'Content-Type': 'application/json',
+            'Authorization': sign_authorization_header(
+                subscriber.keys.signing_key, entity['subscriber_id'], entity['unique_key_id'],
+                canonical_body(payload), created, created + valid_for
+            ),
+        },
+        'body': payload,
+        'signing_private_key': encode(subscriber.keys.seed[:32]),
+    }
+
+
+def write_requests(subscribers: Iterable[SyntheticSubscriber], file: TextIO, valid_for: int = 3600) -> int:
+    written = 0
+    for subscriber in subscribers:
+        file.write(json.dumps(signed_request(subscriber, valid_for=valid_for)) + '\n')
+        written += 1
+    return written
+
+
+def _copy_value(field: models.Field, value) -> str:
+    if value is None:
+        return '\\N'
+    if isinstance(field, ArrayField):
+        value = '{' + ','.join(
+            '"' + str(item).replace('\\', '\\\\').replace('"', '\\"') + '"' for item in value
+        ) + '}'
+    elif isinstance(field, models.JSONField):
+        value = json.dumps(value)
+    elif isinstance(field, models.BooleanField):
+        return 't' if value else 'f'
+    elif isinstance(value, datetime):
+        value = value.isoformat()
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_rows(model: type[models.Model], instances: list[models.Model], using: str) -> None:
+    """
+    Inserts unsaved instances with COPY on Postgres, bulk_create elsewhere.
+    No signals are sent and auto_now fields are set to now.
+    """
+    if not instances:
+        return
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        model.objects.using(using).bulk_create(instances)
+        return
+    fields = model._meta.concrete_fields
+    buffer = io.StringIO()
+    for instance in instances:
+        buffer.write('\t'.join(_copy_value(field, field.pre_save(instance, True)) for field in fields))
+        buffer.write('\n')
+    buffer.seek(0)
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(f'COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) FROM STDIN', buffer)
+
+
+@dataclass
+class LoadReport:
+    subscribers: int = 0
+    participants: int = 0
+    sellers: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        rows = self.subscribers + self.participants + self.sellers
+        return rows / self.seconds if self.seconds else 0.0
+
+
+def load(subscribers: Iterable[SyntheticSubscriber], batch_size: int = 5000, method: str = 'copy',
+         status: str = Subscriber.SubscriptionStatus.SUBSCRIBED) -> LoadReport:
+    """
+    Writes the subscriber trees in batches, one transaction per batch and
+    database (shard). method is 'copy' or 'bulk' (bulk_create).
+    """
+    if method not in ('copy', 'bulk'):
+        raise ValueError(f'Unknown load method {method}')
+    report = LoadReport()
+    started = time.perf_counter()
+    iterator = iter(subscribers)
+    while batch := list(islice(iterator, batch_size)):
+        rows: dict[str, tuple[list, list, list]] = {}
+        for synthetic in batch:
+            subscriber, participants, sellers = synthetic.instances(status)
+            trees = rows.setdefault(sharding.write_database(subscriber.subscriber_id), ([], [], []))
+            trees[0].append(subscriber)
+            trees[1].extend(participants)
+            trees[2].extend(sellers)
+        for using, (roots, participants, sellers) in rows.items():
+            with transaction.atomic(using=using):
+                for model, instances in ((Subscriber, roots), (NetworkParticipant, participants),
+                                         (SellerOnRecord, sellers)):
+                    if method == 'copy':
+                        copy_rows(model, instances, using)
+                    else:
+                        model.objects.using(using).bulk_create(instances, batch_size=batch_size)
+            report.subscribers += len(roots)
+            report.participants += len(participants)
+            report.sellers += len(sellers)
+    report.seconds = time.perf_counter() - started
+    return report
@@ -0,0 +1,91 @@
+from celery import shared_task
+from django.conf import settings
+from django.db import DatabaseError
+
+from . import change_feed, pipeline, sharding
+from .expiry import expire_subscribers
+from .ssl_check import check_subscribers, due_hosts
+
+
+@shared_task(ignore_result=True)
+def check_certificates(addresses: list[str] | None = None) -> int:
+    """
+    Checks the certificates of the given host:port addresses or, from the
+    periodic sweep, of the next SSL_CHECK_BATCH_SIZE callback hosts due:
+    never checked or past their recheck_at, shortly before their
+    certificate expires.
+    """
+    if addresses is None:
+        addresses = [host for using in sharding.registry_databases()
+                     for host in due_hosts(settings.SSL_CHECK_BATCH_SIZE, using=using)]
+    return len(check_subscribers(addresses)) if addresses else 0
+
+
+@shared_task(ignore_result=True)
+def expire_keys() -> int:
+    """
+    Periodic sweep marking the subscribers whose key expired EXPIRED.
+    """
+    return expire_subscribers()
+
+
+@shared_task(ignore_result=True)
+def prune_changes() -> int:
+    """
+    Periodic cleanup of the change feed log past REGISTRY_CHANGE_FEED_RETENTION.
+    """
+    return change_feed.prune()
+
+
+# Stage tasks of the subscription pipeline (registry.pipeline), each sent to
+# its stage's queue of the lane by pipeline.enqueue(). Database failures retry
+# the whole batch with backoff, network failures are retried per subscriber.
+STAGE_TASK_OPTIONS = dict(
+    ignore_result=True, acks_late=True, autoretry_for=(DatabaseError,), max_retries=settings.SUBSCRIPTION_MAX_RETRIES,
+    retry_backoff=int(settings.SUBSCRIPTION_RETRY_DELAY), retry_backoff_max=int(settings.SUBSCRIPTION_RETRY_MAX_DELAY),
+    retry_jitter=True,
+)
+
+
+@shared_task(**STAGE_TASK_OPTIONS)
+def subscription_validate_keys(unique_key_ids: list[str], lane: str = pipeline.ONBOARDING, attempt: int = 0) -> dict:
+    return pipeline.SubscriptionPipeline().run(pipeline.VALIDATE_KEYS, unique_key_ids, lane, attempt).as_dict()
+
+
+@shared_task(**STAGE_TASK_OPTIONS)
+def subscription_check_ssl(unique_key_ids: list[str], lane: str = pipeline.ONBOARDING, attempt: int = 0) -> dict:
+    return pipeline.SubscriptionPipeline().run(pipeline.CHECK_SSL, unique_key_ids, lane, attempt).as_dict()
+
+
+@shared_task(**STAGE_TASK_OPTIONS)
+def subscription_verify_callback(unique_key_ids: list[str], lane: str = pipeline.ONBOARDING,
+                                 attempt: int = 0) -> dict:
+    return pipeline.SubscriptionPipeline().run(pipeline.VERIFY_CALLBACK, unique_key_ids, lane, attempt).as_dict()
+
+
+@shared_task(**STAGE_TASK_OPTIONS)
+def subscription_check_whitelist(unique_key_ids: list[str], lane: str = pipeline.ONBOARDING,
+                                 attempt: int = 0) -> dict:
+    return pipeline.SubscriptionPipeline().run(pipeline.CHECK_WHITELIST, unique_key_ids, lane, attempt).as_dict()
+
+
+@shared_task(**STAGE_TASK_OPTIONS)
+def subscription_finalize(unique_key_ids: list[str], lane: str = pipeline.ONBOARDING, attempt: int = 0) -> dict:
+    return pipeline.SubscriptionPipeline().run(pipeline.FINALIZE, unique_key_ids, lane, attempt).as_dict()
+
+
+@shared_task(ignore_result=True)
+def reverify_subscriptions(unique_key_ids: list[str] | None = None) -> int:
+    """
+    Sends the given (or all SUBSCRIBED) subscribers through the pipeline
+    again on the bulk queues.
+    """
+    return pipeline.reverify(unique_key_ids)
+
+
+@shared_task(ignore_result=True)
+def resume_subscriptions() -> int:
+    """
+    Periodic sweep starting the pipeline again for stalled subscribers.
+    """
+    return pipeline.resume()
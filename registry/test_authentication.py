@@ -0,0 +1,159 @@
+from datetime import timedelta
+
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from .authentication import *
+from .models import Subscriber
+
+import base64
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519
+from common.crypto.authorization import build_authorization_header, signing_string
+from common.crypto.constants import HashingAlgorithm
+from common.crypto.exception import AuthorizationExpired, SignatureVerificationFailed
+
+
+class StaticResolver(SubscriberKeyResolver):
+
+    def __init__(self, keys: dict[str, SigningKey], **kwargs) -> None:
+        super().__init__(**{'ttl': 60, **kwargs})
+        self.keys = keys
+        self.loads = 0
+
+    def load(self, unique_key_id: str) -> SigningKey | None:
+        self.loads += 1
+        return self.keys.get(unique_key_id)
+
+
+def sign_request(private_key: ed25519.Ed25519PrivateKey, body: bytes, created: int, expires: int,
+                 subscriber_id: str = 'sit.grab.in', unique_key_id: str = 'key-1') -> str:
+    digest = Cryptographer.digest(HashingAlgorithm.BLAKE2B, body)
+    signature = private_key.sign(signing_string(created, expires, digest).encode())
+    return build_authorization_header(subscriber_id, unique_key_id, 'ed25519', created, expires,
+                                      base64.b64encode(signature).decode())
+
+
+def encode_public_key(private_key: ed25519.Ed25519PrivateKey) -> str:
+    return base64.b64encode(private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PublicFormat.Raw
+    )).decode()
+
+
+class TestAuthorizationVerifier(SimpleTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.private_key = ed25519.Ed25519PrivateKey.generate()
+        self.resolver = StaticResolver({
+            'key-1': SigningKey('sit.grab.in', 'key-1', encode_public_key(self.private_key))
+        })
+        self.now = 1700000000
+        self.verifier = AuthorizationVerifier(self.resolver, clock_skew=0, clock=lambda: self.now)
+        self.body = b'{"context": {"action": "search"}}'
+
+    def test_verify_pass(self):
+        header = sign_request(self.private_key, self.body, self.now - 10, self.now + 10)
+        verified = self.verifier.verify(header, self.body)
+        self.assertEqual(verified.key.subscriber_id, 'sit.grab.in')
+        self.assertEqual(verified.digest, Cryptographer.digest(HashingAlgorithm.BLAKE2B, self.body))
+        self.assertEqual(tuple(verified.timings), AuthorizationVerifier.STAGES)
+
+    def test_verify_with_precomputed_digest(self):
+        header = sign_request(self.private_key, self.body, self.now - 10, self.now + 10)
+        digest = Cryptographer.digest(HashingAlgorithm.BLAKE2B, self.body)
+        self.assertEqual(self.verifier.verify(header, digest=digest).digest, digest)
+
+    def test_key_is_loaded_once(self):
+        header = sign_request(self.private_key, self.body, self.now - 10, self.now + 10)
+        for _ in range(3):
+            self.verifier.verify(header, self.body)
+        self.assertEqual(self.resolver.loads, 1)
+
+    def test_expired_window_fails_before_lookup(self):
+        header = sign_request(self.private_key, self.body, self.now - 20, self.now - 10)
+        self.assertRaises(AuthorizationExpired, self.verifier.verify, header, self.body)
+        self.assertEqual(self.resolver.loads, 0)
+
+    def test_tampered_body_fails(self):
+        header = sign_request(self.private_key, self.body, self.now - 10, self.now + 10)
+        self.assertRaises(SignatureVerificationFailed, self.verifier.verify, header, self.body + b' ')
+
+    def test_unknown_key_fails(self):
+        header = sign_request(self.private_key, self.body, self.now - 10, self.now + 10, unique_key_id='key-2')
+        self.assertRaises(UnknownSigningKey, self.verifier.verify, header, self.body)
+        header = sign_request(self.private_key, self.body, self.now - 10, self.now + 10, subscriber_id='other')
+        self.assertRaises(UnknownSigningKey, self.verifier.verify, header, self.body)
+
+    def test_request_key_resolver(self):
+        entity = {'subscriber_id': 'sit.grab.in', 'unique_key_id': 'key-1',
+                  'key_pair': {'signing_public_key': encode_public_key(self.private_key)}}
+        verifier = AuthorizationVerifier(RequestKeyResolver(entity), clock_skew=0, clock=lambda: self.now)
+        header = sign_request(self.private_key, self.body, self.now - 10, self.now + 10)
+        self.assertEqual(verifier.verify(header, self.body).key.unique_key_id, 'key-1')
+        header = sign_request(self.private_key, self.body, self.now - 10, self.now + 10, unique_key_id='key-2')
+        self.assertRaises(UnknownSigningKey, verifier.verify, header, self.body)
+        verifier = AuthorizationVerifier(RequestKeyResolver(None), clock_skew=0, clock=lambda: self.now)
+        self.assertRaises(UnknownSigningKey, verifier.verify, header, self.body)
+
+
+class TestSubscriberKeyResolverCache(SimpleTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.now = 0.0
+        keys = {f'key-{index}': SigningKey('sit.grab.in', f'key-{index}', 'public') for index in range(3)}
+        self.resolver = StaticResolver(keys, negative_ttl=5, maxsize=2, clock=lambda: self.now)
+
+    def test_size_is_bounded(self):
+        for unique_key_id in ('key-0', 'key-1', 'key-0', 'key-2', 'missing'):
+            self.resolver.resolve(unique_key_id)
+        self.assertEqual(len(self.resolver), 2)
+        self.assertEqual(list(self.resolver._entries), ['key-2', 'missing'])
+
+    def test_unknown_keys_expire_sooner(self):
+        self.assertIsNone(self.resolver.resolve('missing'))
+        self.resolver.keys['missing'] = SigningKey('sit.grab.in', 'missing', 'public')
+        self.now = 4
+        self.assertIsNone(self.resolver.resolve('missing'))
+        self.now = 6
+        self.assertIsNotNone(self.resolver.resolve('missing'))
+
+
+class TestSubscriberKeyResolver(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        default_resolver.clear()
+        self.subscriber = Subscriber.objects.create(
+            unique_key_id='key-1', subscriber_id='sit.grab.in', callback_url='/ondc/onboarding',
+            country='IND', key_pair={'signing_public_key': 'QSax2KT4UiTUWUqoVUaEcWhBcGTTNu+Sf8EMDRY1GaE='},
+            status=Subscriber.SubscriptionStatus.SUBSCRIBED,
+            valid_from=timezone.now() - timedelta(days=1), valid_until=timezone.now() + timedelta(days=1),
+        )
+
+    def test_resolve_uses_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(default_resolver.resolve('key-1').subscriber_id, 'sit.grab.in')
+            default_resolver.resolve('key-1')
+
+    def test_save_invalidates(self):
+        default_resolver.resolve('key-1')
+        self.subscriber.key_pair = {'signing_public_key': 'O74ukMymk4KZnVs3sZhU2U7RXpaZ/qiOUMk5NWt6rbI='}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subscriber.save()
+        self.assertEqual(
+            default_resolver.resolve('key-1').signing_public_key,
+            'O74ukMymk4KZnVs3sZhU2U7RXpaZ/qiOUMk5NWt6rbI='
+        )
+
+    def test_only_subscribed_keys_resolve(self):
+        Subscriber.objects.filter(pk='key-1').update(status=Subscriber.SubscriptionStatus.UNSUBSCRIBED)
+        self.assertIsNone(SubscriberKeyResolver(negative_ttl=0).resolve('key-1'))
+
+    def test_keys_outside_their_window_do_not_resolve(self):
+        Subscriber.objects.filter(pk='key-1').update(valid_until=timezone.now() - timedelta(minutes=1))
+        self.assertIsNone(SubscriberKeyResolver(negative_ttl=0).resolve('key-1'))
+        Subscriber.objects.filter(pk='key-1').update(valid_from=timezone.now() + timedelta(minutes=1),
+                                                     valid_until=timezone.now() + timedelta(days=1))
+        self.assertIsNone(SubscriberKeyResolver(negative_ttl=0).resolve('key-1'))
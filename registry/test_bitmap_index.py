@@ -0,0 +1,95 @@
+from django.test import SimpleTestCase, TestCase, override_settings
+from .bitmap_index import *
+from .lookup import lookup_subscribers, participant_filters
+from .models import *
+from .test_views import LookupTestMixin
+
+from itertools import product
+from uuid import uuid4
+
+
+class TestParticipantBitmapIndex(SimpleTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.index = ParticipantBitmapIndex()
+        self.ids = [uuid4() for _ in range(4)]
+        self.index.add_row(self.ids[0], 'key-1', 'retail', 'BAP', ['std:080'])
+        self.index.add_row(self.ids[1], 'key-2', 'retail', 'BPP', ['std:080', 'std:011'])
+        self.index.add_row(self.ids[2], 'key-2', 'mobility', 'BPP', ['std:022'])
+        self.index.add_row(self.ids[3], 'key-3', 'retail', 'BPP', ['std:011'])
+
+    def test_query(self):
+        self.assertEqual(set(self.index.query('retail', 'BPP', ['std:011'])), {self.ids[1], self.ids[3]})
+        self.assertEqual(set(self.index.query(city=['std:022', 'std:080'])), set(self.ids[:3]))
+        self.assertEqual(self.index.query('logistics'), [])
+        self.assertEqual(self.index.query(city=['std:999']), [])
+        self.assertEqual(self.index.count(), 4)
+        self.assertEqual(self.index.query_subscribers('retail', 'BPP'), {'key-2', 'key-3'})
+
+    def test_query_limit(self):
+        self.assertIsNone(self.index.query('retail', limit=2))
+        self.assertEqual(set(self.index.query('retail', 'BPP', limit=2)), {self.ids[1], self.ids[3]})
+
+    def test_sparse_positions(self):
+        many = [uuid4() for _ in range(1000)]
+        for position, participant_id in enumerate(many):
+            self.index.add_row(participant_id, f'key-{position}', 'logistics', 'BAP', [f'std:{position % 7}'])
+        self.assertEqual(self.index.query('logistics', city=['std:3']), many[3::7])
+
+    def test_remove_and_reuse_position(self):
+        self.index.remove(self.ids[1])
+        self.assertNotIn(self.ids[1], self.index)
+        self.assertEqual(self.index.query('retail', 'BPP'), [self.ids[3]])
+        new_id = uuid4()
+        self.index.add_row(new_id, 'key-4', 'logistics', 'BAP', ['std:011'])
+        self.assertEqual(len(self.index), 4)
+        self.assertEqual(self.index.query(city=['std:011'], type='BAP'), [new_id])
+        self.assertEqual(self.index.memory_report()['participants'], 4)
+
+    def test_update_replaces_attributes(self):
+        self.index.add_row(self.ids[0], 'key-1', 'mobility', 'BAP', ['std:033'])
+        self.assertEqual(self.index.query('retail', 'BAP'), [])
+        self.assertEqual(self.index.query('mobility', city=['std:033']), [self.ids[0]])
+
+
+class TestParticipantBitmapIndexEquivalence(LookupTestMixin, TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.create_network()
+        reset_index()
+
+    def tearDown(self) -> None:
+        reset_index()
+        super().tearDown()
+
+    def test_matches_orm(self):
+        index = ParticipantBitmapIndex.build()
+        domains = [None] + [choice for choice, _ in Subscriber.ONDCDomainType.choices]
+        types = [None] + [choice for choice, _ in Subscriber.SubscriberType.choices]
+        cities = [None, ['std:080'], ['std:011', 'std:022'], ['std:999']]
+        for domain, type, city in product(domains, types, cities):
+            expected = set(NetworkParticipant.objects.filter(
+                **participant_filters(domain, type, city)
+            ).values_list('id', flat=True))
+            self.assertEqual(set(index.query(domain, type, city)), expected, (domain, type, city))
+
+    @override_settings(REGISTRY_BITMAP_INDEX=True)
+    def test_signals_keep_index_current(self):
+        get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            participant = NetworkParticipant.objects.create(
+                subscriber_id='key-1', domain='logistics', type='BAP', city_code=['std:044']
+            )
+        self.assertEqual(get_index().query('logistics'), [participant.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            participant.delete()
+        self.assertEqual(get_index().query('logistics'), [])
+
+    @override_settings(REGISTRY_BITMAP_INDEX=True)
+    def test_lookup_with_index(self):
+        with_index = [item.unique_key_id for item in lookup_subscribers(domain='retail', city=['std:011'])]
+        with override_settings(REGISTRY_BITMAP_INDEX=False):
+            without_index = [item.unique_key_id for item in lookup_subscribers(domain='retail', city=['std:011'])]
+        self.assertEqual(with_index, without_index)
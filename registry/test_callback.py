@@ -0,0 +1,81 @@
+import asyncio
+
+from django.test import SimpleTestCase
+from .callback import *
+from .models import *
+from .stub_server import CallbackStubServer
+
+
+class TestCallbackTarget(SimpleTestCase):
+
+    def test_callback_url_path(self):
+        target = CallbackTarget('key-1', 'buyer.example.com', '/ondc/onboarding', '')
+        self.assertEqual(target.url, 'https://buyer.example.com/ondc/onboarding/on_subscribe')
+        self.assertEqual(CallbackTarget('key-1', 'buyer.example.com', '/', '').url,
+                         'https://buyer.example.com/on_subscribe')
+
+    def test_absolute_callback_url_stays_on_the_subscriber_host(self):
+        for callback_url in ('http://127.0.0.1:8000/cb/', '//127.0.0.1:8000/cb'):
+            target = CallbackTarget('key-1', 'buyer.example.com', callback_url, '')
+            self.assertEqual(target.url, 'https://buyer.example.com/cb/on_subscribe')
+
+    def test_from_subscriber_row(self):
+        target = CallbackTarget.from_subscriber({
+            'unique_key_id': 'key-1', 'subscriber_id': 'buyer.example.com', 'callback_url': '/cb',
+            'key_pair': {'encryption_public_key': 'abc'}
+        })
+        self.assertEqual(target.encryption_public_key, 'abc')
+
+
+class TestCallbackVerifier(SimpleTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.stub = CallbackStubServer(slow_delay=1.0).start()
+        self.addCleanup(self.stub.stop)
+
+    def target(self, subscriber_id: str, behaviour: str = 'ok') -> CallbackTarget:
+        public_key = self.stub.register(subscriber_id, behaviour)
+        return CallbackTarget(f'key-{subscriber_id}', subscriber_id, '/ondc', public_key)
+
+    def verifier(self, scheme: str = 'http', **kwargs) -> CallbackVerifier:
+        return CallbackVerifier(transport=self.stub.transport(scheme), **kwargs)
+
+    def test_statuses(self):
+        targets = [
+            self.target('ok.example.com'),
+            self.target('wrong.example.com', 'wrong'),
+            self.target('error.example.com', 'error'),
+            self.target('slow.example.com', 'slow'),
+        ]
+        results = asyncio.run(self.verifier(timeout=0.3).verify_many(targets))
+        self.assertEqual([result.unique_key_id for result in results], [target.unique_key_id for target in targets])
+        self.assertTrue(results[0].verified)
+        self.assertIsNone(results[0].error)
+        for result in results[1:]:
+            self.assertEqual(result.status, Subscriber.SubscriptionStatus.UNDER_SUBSCRIPTION)
+            self.assertIsNotNone(result.error)
+        self.assertIn('mismatch', results[1].error)
+        self.assertIn('HTTPStatusError', results[2].error)
+        self.assertIn('Timeout', results[3].error)
+
+    def test_invalid_encryption_key(self):
+        target = CallbackTarget('key-1', 'ok.example.com', '/ondc', 'not-a-key')
+        result, = asyncio.run(self.verifier().verify_many([target]))
+        self.assertFalse(result.verified)
+        self.assertEqual(self.stub.requests, 0)
+
+    def test_per_host_limit(self):
+        self.stub.delay = 0.05
+        public_key = self.stub.register('busy.example.com')
+        targets = [CallbackTarget(f'key-{index}', 'busy.example.com', '/ondc', public_key) for index in range(12)]
+        results = asyncio.run(self.verifier(per_host_limit=3).verify_many(targets))
+        self.assertTrue(all(result.verified for result in results))
+        self.assertEqual(self.stub.requests, 12)
+        self.assertLessEqual(self.stub.peak, 3)
+
+    def test_ssl_error_is_invalid_ssl(self):
+        # Speaking TLS to the plain HTTP stub fails the handshake
+        target = self.target('ssl.example.com')
+        result, = asyncio.run(self.verifier('https', timeout=2).verify_many([target]))
+        self.assertEqual(result.status, Subscriber.SubscriptionStatus.INVALID_SSL)
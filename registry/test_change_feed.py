@@ -0,0 +1,97 @@
+import time
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from .authentication import SigningKey, default_resolver
+from .change_feed import *
+from .models import *
+from .signals import apply_changes
+
+
+class TestChangeEvents(SimpleTestCase):
+
+    def test_payload(self):
+        event = ChangeEvent('selleronrecord', 'sor|1', 42, 1700000000.25)
+        self.assertEqual(event.payload(), 'selleronrecord|42|1700000000.250000|sor|1')
+        self.assertEqual(ChangeEvent.parse(event.payload()), event)
+        self.assertEqual(ChangeEvent.parse(event.payload(), 'registry').using, 'registry')
+
+    def test_failing_callback_does_not_stop_dispatch(self):
+        received = []
+
+        def failing(events):
+            raise RuntimeError('boom')
+
+        for callback in (failing, received.extend):
+            register(callback)
+            self.addCleanup(unregister, callback)
+        events = [ChangeEvent('subscriber', 'key-1', 1, 0.0)]
+        with self.assertLogs('registry.change_feed', 'ERROR'):
+            dispatch(events)
+        self.assertEqual(received, events)
+
+    def test_listener_latency(self):
+        received = []
+        listener = ChangeListener('default', on_events=received.extend, clock=lambda: 100.5)
+        listener.handle([ChangeEvent('subscriber', 'key-1', 7, 100.0), ChangeEvent('subscriber', 'key-2', 5, 100.25)])
+        self.assertEqual(list(listener.latencies), [0.5, 0.25])
+        self.assertEqual(listener.last_version, 7)
+        self.assertEqual(len(received), 2)
+
+    def test_listener_keeps_versions_to_replay(self):
+        listener = ChangeListener('default', on_events=lambda events: None, max_gaps=3)
+        listener.last_version = 10
+        listener.handle([ChangeEvent('subscriber', 'key-1', 13, 0.0), ChangeEvent('subscriber', 'key-2', 15, 0.0)])
+        self.assertEqual((listener.last_version, listener.gaps), (15, {11, 12, 14}))
+        # Committed after the higher versions
+        listener.handle([ChangeEvent('subscriber', 'key-3', 12, 0.0)])
+        self.assertEqual((listener.last_version, listener.gaps), (15, {11, 14}))
+        listener.handle([ChangeEvent('subscriber', 'key-4', 20, 0.0)])
+        self.assertEqual((listener.last_version, listener.gaps), (20, {17, 18, 19}))
+
+    def test_apply_changes_drops_resolved_keys(self):
+        default_resolver._entries['key-1'] = (time.monotonic() + 60, SigningKey('np.example.com', 'key-1', 'public'))
+        apply_changes([ChangeEvent('subscriber', 'key-1', 1, 0.0)])
+        self.assertNotIn('key-1', default_resolver._entries)
+
+
+@override_settings(REGISTRY_CHANGE_FEED=True)
+class TestChangeListener(TransactionTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.received: list[ChangeEvent] = []
+        self.listener = ChangeListener('default', on_events=self.received.extend, poll_interval=0.05).start()
+        self.addCleanup(self.listener.stop, 5)
+        self.assertTrue(self.listener.connected.wait(5))
+
+    def create_subscriber(self, unique_key_id: str) -> Subscriber:
+        return Subscriber.objects.create(unique_key_id=unique_key_id, subscriber_id=f'{unique_key_id}.example.com',
+                                         callback_url='/', country='IND')
+
+    def wait_for(self, pk: str, timeout: float = 5) -> ChangeEvent:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            for event in list(self.received):
+                if event.pk == pk:
+                    return event
+            time.sleep(0.01)
+        self.fail(f'No change event for {pk}')
+
+    def test_save_is_delivered(self):
+        self.create_subscriber('key-1')
+        event = self.wait_for('key-1')
+        self.assertEqual(event.model, 'subscriber')
+        self.assertEqual(event.version, RegistryChange.objects.get(object_id='key-1').id)
+        self.assertLess(self.listener.latencies[-1], 5)
+
+    def test_catch_up_after_reconnect(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)', [self.listener.backend_pid])
+        self.create_subscriber('key-2')
+        self.assertEqual(self.wait_for('key-2').using, 'default')
+        self.assertGreaterEqual(self.listener.reconnects, 1)
+
+    def test_prune(self):
+        self.create_subscriber('key-3')
+        self.assertEqual(prune(older_than=3600), 0)
+        self.assertEqual(prune(older_than=-1), 1)
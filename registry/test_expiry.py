@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.test import SimpleTestCase, TestCase
+from .expiry import *
+from .models import *
+from .serializers import key_validity
+from .synthetic import SyntheticRegistry
+
+
+NOW = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class TestKeyValidity(SimpleTestCase):
+
+    def test_utc_columns(self):
+        self.assertEqual(
+            key_validity({'valid_from': '2026-01-01T00:00:00.000Z', 'valid_until': '2027-01-01T05:30:00.5Z'}),
+            {'valid_from': NOW, 'valid_until': datetime(2027, 1, 1, 5, 30, 0, 500000, tzinfo=dt_timezone.utc)}
+        )
+
+    def test_unreadable_timestamps(self):
+        self.assertEqual(key_validity({'valid_from': 'yesterday'}), {'valid_from': None, 'valid_until': None})
+
+    def test_instances_carry_the_columns(self):
+        subscriber = SyntheticRegistry(epoch=NOW).subscriber(1)
+        instance, participants, sellers = subscriber.instances()
+        self.assertEqual(instance.valid_until - instance.valid_from, timedelta(days=365))
+        self.assertGreaterEqual(instance.valid_from, NOW)
+        for seller in sellers:
+            self.assertEqual((seller.valid_from, seller.valid_until), (NOW, NOW + timedelta(days=365)))
+
+
+class TestKeyValidityQuerySet(TestCase):
+
+    def create_subscriber(self, unique_key_id: str, valid_from: datetime | None, valid_until: datetime | None,
+                          status: str = Subscriber.SubscriptionStatus.SUBSCRIBED) -> Subscriber:
+        return Subscriber.objects.create(
+            unique_key_id=unique_key_id, subscriber_id=f'{unique_key_id}.example.com', callback_url='/',
+            country='IND', valid_from=valid_from, valid_until=valid_until, status=status,
+        )
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.create_subscriber('active', NOW - timedelta(days=30), NOW + timedelta(days=30))
+        self.create_subscriber('expiring', NOW - timedelta(days=30), NOW + timedelta(days=3))
+        self.create_subscriber('expired', NOW - timedelta(days=30), NOW - timedelta(seconds=1))
+        self.create_subscriber('future', NOW + timedelta(days=1), NOW + timedelta(days=30))
+        self.create_subscriber('unknown', None, None)
+        self.create_subscriber('unsubscribed', NOW - timedelta(days=30), NOW - timedelta(days=1),
+                               Subscriber.SubscriptionStatus.UNSUBSCRIBED)
+
+    def keys(self, queryset) -> set[str]:
+        return set(queryset.values_list('unique_key_id', flat=True))
+
+    def test_active(self):
+        self.assertEqual(self.keys(Subscriber.objects.active(NOW)), {'active', 'expiring'})
+
+    def test_expiring(self):
+        self.assertEqual(self.keys(Subscriber.objects.expiring(timedelta(days=7), NOW)), {'expiring'})
+
+    def test_expired(self):
+        self.assertEqual(self.keys(Subscriber.objects.expired(NOW)), {'expired', 'unsubscribed'})
+
+    def test_sweep_marks_expired_subscribers(self):
+        self.assertEqual(expire_subscribers(NOW, batch_size=1), 1)
+        statuses = dict(Subscriber.objects.values_list('unique_key_id', 'status'))
+        self.assertEqual(statuses['expired'], Subscriber.SubscriptionStatus.EXPIRED)
+        self.assertEqual(statuses['unsubscribed'], Subscriber.SubscriptionStatus.UNSUBSCRIBED)
+        self.assertEqual(statuses['active'], Subscriber.SubscriptionStatus.SUBSCRIBED)
+        self.assertEqual(expire_subscribers(NOW + timedelta(days=7)), 1)
+        self.assertEqual(expire_subscribers(NOW + timedelta(days=7)), 0)
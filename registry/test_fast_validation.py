@@ -0,0 +1,128 @@
+import copy
+import json
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.exceptions import ErrorDetail
+from .serializers import WriteSubscriberSerializer, parse_datetime
+
+
+FIXTURES = ('subscribe_request_passing.json', 'subscribe_request_fail.json', 'subscriber_update_passing.json')
+
+# Values every leaf of a fixture is replaced with in turn
+REPLACEMENTS = (None, '', '   ', 0, 7, -1, 13, True, False, 1.5, [], {}, ['std:080'], 'x' * 300, 'a\x00b',
+                'é', '  padded  ', 'BAP', 'BPP', 'retail', 'not-an-email', '2022-7-8T1:2:3.1Z')
+
+
+def normalize(detail):
+    if isinstance(detail, ErrorDetail):
+        return str(detail), detail.code
+    if isinstance(detail, dict):
+        return {key: normalize(value) for key, value in detail.items()}
+    if isinstance(detail, list):
+        return [normalize(value) for value in detail]
+    return detail
+
+
+def load_fixtures() -> list[dict]:
+    directory = Path(__file__).parent / 'fixtures'
+    fixtures = []
+    for name in FIXTURES:
+        with open(directory / name) as file:
+            fixtures.extend(json.load(file))
+    return fixtures
+
+
+def paths(payload, prefix=()):
+    yield prefix
+    if isinstance(payload, dict):
+        for key, value in payload.items():
+            yield from paths(value, prefix + (key,))
+    elif isinstance(payload, list):
+        for index, value in enumerate(payload):
+            yield from paths(value, prefix + (index,))
+
+
+def mutations(payload):
+    """
+    The payload with every key removed in turn and every value replaced
+    by each of REPLACEMENTS.
+    """
+    for path in paths(payload):
+        if not path:
+            continue
+        *parents, last = path
+        for replacement in (KeyError, *REPLACEMENTS):
+            mutated = copy.deepcopy(payload)
+            node = mutated
+            for key in parents:
+                node = node[key]
+            if replacement is KeyError:
+                if isinstance(node, list):
+                    continue
+                del node[last]
+            else:
+                node[last] = copy.deepcopy(replacement)
+            yield path, replacement, mutated
+
+
+def fresh(fixture: dict) -> dict:
+    fixture = copy.deepcopy(fixture)
+    fixture['message']['timestamp'] = datetime.now(dt_timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    return fixture
+
+
+class TestFastValidation(TestCase):
+
+    def validate(self, payload, fast: bool):
+        with override_settings(SUBSCRIBE_FAST_VALIDATION=fast):
+            serializer = WriteSubscriberSerializer(data=copy.deepcopy(payload))
+            try:
+                valid = serializer.is_valid()
+            except Exception as exc:
+                # e.g. validate_operation on a participant without type, both paths must fail alike
+                return type(exc)
+        return valid, normalize(serializer.errors), serializer.validated_data
+
+    def assertSameResult(self, payload):
+        self.assertEqual(self.validate(payload, fast=True), self.validate(payload, fast=False))
+
+    def test_fixtures(self):
+        for index, fixture in enumerate(load_fixtures()):
+            with self.subTest(fixture=index):
+                self.assertSameResult(fresh(fixture))
+                # Expired
+                self.assertSameResult(fixture)
+
+    def test_mutated_fixtures(self):
+        for index, fixture in enumerate(load_fixtures()):
+            for path, replacement, payload in mutations(fresh(fixture)):
+                with self.subTest(fixture=index, path=path, replacement=replacement):
+                    self.assertSameResult(payload)
+
+    def test_not_a_mapping(self):
+        for payload in (None, [], 'subscribe', 1):
+            with self.subTest(payload=payload):
+                self.assertSameResult(payload)
+
+    def test_context_is_passed(self):
+        fixture = load_fixtures()[0]
+        with override_settings(SUBSCRIBE_FAST_VALIDATION=True):
+            serializer = WriteSubscriberSerializer(data=copy.deepcopy(fixture), context={'ignore_expiry': True})
+            self.assertTrue(serializer.is_valid())
+            # The prebuilt serializer doesn't keep the context of the last call
+            self.assertFalse(WriteSubscriberSerializer(data=copy.deepcopy(fixture)).is_valid())
+
+
+class TestParseDatetime(SimpleTestCase):
+
+    def test_same_as_strptime(self):
+        for value in ('2022-07-08T13:44:54.101Z', '2022-07-08T13:44:54.000001Z', '2024-02-29T00:00:00.5Z',
+                      '2022-7-8T1:2:3.1Z'):
+            self.assertEqual(parse_datetime(value), datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%fZ'))
+
+    def test_rejects_like_strptime(self):
+        for value in ('2023-02-29T00:00:00.5Z', '2022-13-08T13:44:54.101Z', '2022-07-08T24:00:00.1Z',
+                      '2022-07-08T13:44:54Z', '2022-07-08 13:44:54.101Z', '', '2022-07-08T13:44:54.1234567Z'):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                parse_datetime(value)
@@ -0,0 +1,85 @@
+from django.test import TestCase
+from monitor.models import ContractRequestId
+from monitor.writer import get_contract_logger
+from .ingest import *
+from .models import *
+
+import copy
+import io
+import json
+from pathlib import Path
+
+
+class TestSubscriberBulkIngestor(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        directory = Path(__file__).parent
+        with open(Path.joinpath(directory, "fixtures/subscribe_request_passing.json"), "r") as file:
+            self.subscribe_pass_fixtures = json.load(file)
+        with open(Path.joinpath(directory, "fixtures/subscribe_request_fail.json"), "r") as file:
+            self.subscribe_fail_fixtures = json.load(file)
+
+    def test_ingest_pass(self):
+        report = SubscriberBulkIngestor(batch_size=2, ignore_expiry=True).ingest(self.subscribe_pass_fixtures)
+        self.assertEqual(report.errors, [])
+        self.assertEqual((report.received, report.created, report.batches), (5, 5, 3))
+        self.assertEqual(Subscriber.objects.count(), 5)
+        self.assertEqual(NetworkParticipant.objects.count(), 7)
+        self.assertEqual(SellerOnRecord.objects.count(), 2)
+        self.assertFalse(Subscriber.objects.filter(valid_until__isnull=True).exists())
+        self.assertFalse(SellerOnRecord.objects.filter(valid_from__isnull=True).exists())
+
+    def test_request_ids_are_logged(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            SubscriberBulkIngestor(ignore_expiry=True).ingest(self.subscribe_pass_fixtures[:2])
+        # The pipeline start is left out, it needs a broker
+        callbacks[-2]()
+        get_contract_logger().flush()
+        self.assertEqual(sorted(ContractRequestId.objects.values_list('request_id', flat=True)),
+                         sorted(fixture['message']['request_id'] for fixture in self.subscribe_pass_fixtures[:2]))
+
+    def test_request_id_is_used_once(self):
+        duplicate = copy.deepcopy(self.subscribe_pass_fixtures[1])
+        duplicate['message']['request_id'] = self.subscribe_pass_fixtures[0]['message']['request_id']
+        report = SubscriberBulkIngestor(batch_size=1, ignore_expiry=True).ingest(
+            [self.subscribe_pass_fixtures[0], duplicate]
+        )
+        self.assertEqual(report.created, 1)
+        self.assertIn('request_id', report.errors[0].errors['message'])
+
+    def test_expired_requests_are_rejected_by_default(self):
+        report = SubscriberBulkIngestor().ingest(self.subscribe_pass_fixtures[:1])
+        self.assertEqual(report.created, 0)
+        self.assertIn('timestamp', report.errors[0].errors['message'])
+
+    def test_errors_do_not_abort_the_batch(self):
+        payloads = [self.subscribe_fail_fixtures[0]] + self.subscribe_pass_fixtures[:2]
+        duplicate = copy.deepcopy(self.subscribe_pass_fixtures[1])
+        duplicate['message']['request_id'] = 'another-request'
+        payloads.append(duplicate)
+        report = SubscriberBulkIngestor(ignore_expiry=True).ingest(payloads)
+        self.assertEqual(report.created, 2)
+        self.assertEqual([error.index for error in report.errors], [0, 3])
+        self.assertIn('operation', report.errors[0].errors)
+        self.assertIn('unique_key_id', report.errors[1].errors)
+
+    def test_existing_subscriber_is_reported(self):
+        SubscriberBulkIngestor(ignore_expiry=True).ingest(self.subscribe_pass_fixtures[:1])
+        report = SubscriberBulkIngestor(ignore_expiry=True).ingest(self.subscribe_pass_fixtures[:1])
+        self.assertEqual(report.created, 0)
+        self.assertEqual(len(report.errors), 1)
+
+    def test_ingest_ndjson(self):
+        lines = [json.dumps(fixture) for fixture in self.subscribe_pass_fixtures[:2]]
+        lines.insert(1, '{"context": ')
+        report = SubscriberBulkIngestor(ignore_expiry=True).ingest_ndjson(io.StringIO('\n'.join(lines) + '\n'))
+        self.assertEqual(report.created, 2)
+        self.assertEqual([error.index for error in report.errors], [1])
+
+    def test_one_insert_per_model_per_batch(self):
+        ingestor = SubscriberBulkIngestor(ignore_expiry=True)
+        records = ingestor._validate(list(enumerate(self.subscribe_pass_fixtures)), IngestReport())
+        # savepoint, one insert per model, release
+        with self.assertNumQueries(5):
+            self.assertEqual(ingestor._write(records, IngestReport()), 5)
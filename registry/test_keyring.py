@@ -0,0 +1,135 @@
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from cryptography.hazmat.primitives.asymmetric import ed25519
+from django.test import SimpleTestCase, TestCase
+from common.crypto.exception import SignatureVerificationFailed, SigningAlgorithmNotSupported
+from .authentication import AuthorizationVerifier
+from .change_feed import ChangeEvent
+from .keyring import *
+from .models import *
+from .synthetic import KeyPair, encode
+from .test_authentication import sign_request
+
+
+NOW = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+KEYS = KeyPair(bytes(range(64)))
+
+
+def key_row(unique_key_id: str, valid_from: datetime | None = NOW - timedelta(days=1),
+            valid_until: datetime | None = NOW + timedelta(days=1), kind: str = SUBSCRIBER,
+            signing: str | None = KEYS.signing_public_key, status: str = SUBSCRIBED) -> KeyRow:
+    return (unique_key_id, 'np.example.com', valid_from, valid_until, status, signing, KEYS.encryption_public_key,
+            kind)
+
+
+class TestKeyRingEntries(SimpleTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.now = NOW.timestamp()
+        self.ring = KeyRing(refresh_interval=0, chunk_size=100, clock=lambda: self.now)
+
+    def test_entries_hold_parsed_keys(self):
+        self.ring.add_row(key_row('key-1'))
+        entry = self.ring.get('key-1')
+        self.assertFalse(hasattr(entry, '__dict__'))
+        self.assertIsInstance(entry.load_signing_key('ed25519'), ed25519.Ed25519PublicKey)
+        self.assertEqual(encode(self.ring.encryption_key('key-1').public_bytes()), KEYS.encryption_public_key)
+        with self.assertRaises(ValueError):
+            entry.load_signing_key('ed448')
+        with self.assertRaises(SigningAlgorithmNotSupported):
+            entry.load_signing_key('rsa')
+
+    def test_validity_window(self):
+        self.ring.add_row(key_row('future', NOW + timedelta(hours=1), NOW + timedelta(days=1)))
+        self.ring.add_row(key_row('expired', NOW - timedelta(days=2), NOW - timedelta(days=1)))
+        self.ring.add_row(key_row('unknown', None, None))
+        self.assertIsNone(self.ring.get('future'))
+        self.assertIsNotNone(self.ring.get('future', at=self.now + 7200))
+        self.assertNotIn('expired', self.ring)
+        self.assertNotIn('unknown', self.ring)
+
+    def test_only_subscribed_keys(self):
+        self.ring.add_row(key_row('key-1'))
+        self.ring.add_row(key_row('key-1', status=Subscriber.SubscriptionStatus.UNSUBSCRIBED))
+        self.ring.add_row(key_row('key-2', status=Subscriber.SubscriptionStatus.INITIATED))
+        self.assertNotIn('key-1', self.ring)
+        self.assertNotIn('key-2', self.ring)
+
+    def test_unparseable_keys(self):
+        self.ring.add_row(('key-1', 'np.example.com', NOW, NOW + timedelta(days=1), SUBSCRIBED, 'not base64', 'AAAA',
+                          SELLER))
+        self.assertNotIn('key-1', self.ring)
+        self.assertEqual(self.ring.invalid, 1)
+        self.ring.add_row(key_row('key-2', signing=None))
+        self.assertIsNone(self.ring.resolve('key-2'))
+        self.assertIsNotNone(self.ring.encryption_key('key-2'))
+
+    def test_verifier_resolves_from_the_ring(self):
+        private_key = ed25519.Ed25519PrivateKey.from_private_bytes(KEYS.seed[:32])
+        self.ring.add_row(key_row('key-1'))
+        verifier = AuthorizationVerifier(self.ring, clock_skew=0, clock=lambda: self.now)
+        body = b'{"context": {"action": "search"}}'
+        header = sign_request(private_key, body, int(self.now) - 10, int(self.now) + 10,
+                              subscriber_id='np.example.com')
+        self.assertEqual(verifier.verify(header, body).key.unique_key_id, 'key-1')
+        other = sign_request(ed25519.Ed25519PrivateKey.generate(), body, int(self.now) - 10, int(self.now) + 10,
+                             subscriber_id='np.example.com')
+        with self.assertRaises(SignatureVerificationFailed):
+            verifier.verify(other, body)
+
+    def test_memory_report(self):
+        for index in range(10):
+            self.ring.add_row(key_row(f'key-{index}'))
+        report = self.ring.memory_report()
+        self.assertEqual(report['entries'], 10)
+        self.assertEqual(report['total'], sum(value for key, value in report.items()
+                                              if key not in ('entries', 'total')))
+
+
+class TestKeyRingLoading(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.now = NOW.timestamp()
+        detail = KEYS.detail(NOW - timedelta(days=1), NOW + timedelta(days=1))
+        self.subscriber = self.create_subscriber('key-1', NOW - timedelta(days=1), NOW + timedelta(days=1), detail)
+        self.create_subscriber('expired', NOW - timedelta(days=2), NOW - timedelta(days=1), detail)
+        participant = NetworkParticipant.objects.create(subscriber=self.subscriber, domain='retail', type='BPP',
+                                                        msn=True, city_code=['std:080'])
+        SellerOnRecord.objects.create(unique_key_id='seller-1', network_participant=participant, key_pair=detail,
+                                      valid_from=NOW - timedelta(days=1), valid_until=NOW + timedelta(days=1),
+                                      city_code=['std:080'])
+        self.ring = KeyRing.build(refresh_interval=0, chunk_size=1, clock=lambda: self.now)
+
+    def create_subscriber(self, unique_key_id: str, valid_from: datetime, valid_until: datetime,
+                          key_pair: dict) -> Subscriber:
+        return Subscriber.objects.create(
+            unique_key_id=unique_key_id, subscriber_id=f'{unique_key_id}.example.com', callback_url='/',
+            country='IND', key_pair=key_pair, valid_from=valid_from, valid_until=valid_until,
+            status=Subscriber.SubscriptionStatus.SUBSCRIBED,
+        )
+
+    def test_load(self):
+        self.assertEqual(set(self.ring._entries), {'key-1', 'seller-1'})
+        self.assertEqual(self.ring.get('seller-1').subscriber_id, 'key-1.example.com')
+        self.assertEqual(self.ring.get('seller-1').kind, SELLER)
+
+    def test_refresh_reads_updated_rows(self):
+        self.create_subscriber('key-2', NOW - timedelta(days=1), NOW + timedelta(days=1),
+                               KEYS.detail(NOW - timedelta(days=1), NOW + timedelta(days=1)))
+        self.assertGreaterEqual(self.ring.refresh(), 1)
+        self.assertIn('key-2', self.ring)
+
+    def test_reload_drops_deleted_rows(self):
+        SellerOnRecord.objects.filter(unique_key_id='seller-1').delete()
+        self.ring.apply_changes([ChangeEvent(SELLER, 'seller-1', 1, 0.0),
+                                 ChangeEvent(NetworkParticipant._meta.model_name, str(uuid.uuid4()), 2, 0.0)])
+        self.assertNotIn('seller-1', self.ring)
+        self.assertIn('key-1', self.ring)
+
+    def test_unsubscribing_drops_the_sellers_too(self):
+        Subscriber.objects.filter(unique_key_id='key-1').update(status=Subscriber.SubscriptionStatus.UNSUBSCRIBED)
+        self.ring.reload(SUBSCRIBER, ['key-1'])
+        self.assertNotIn('key-1', self.ring)
+        self.assertNotIn('seller-1', self.ring)
@@ -0,0 +1,220 @@
+import base64
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TestCase, override_settings
+from .callback import CallbackVerifier
+from .models import *
+from .pipeline import *
+from .stub_server import CallbackStubServer, StubCertificateChecker
+
+
+NOW = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+SIGNING_KEY = base64.b64encode(bytes(32)).decode()
+
+
+class Collector:
+    """
+    forward() keeping what the pipeline would have enqueued.
+    """
+
+    def __init__(self) -> None:
+        self.sent = []
+
+    def __call__(self, stage, unique_key_ids, lane, attempt, countdown) -> None:
+        self.sent.append((stage, list(unique_key_ids), lane, attempt, countdown))
+
+
+def row(unique_key_id: str, callback_url: str = '/', encryption_key: str = SIGNING_KEY,
+        status: str = Subscriber.SubscriptionStatus.INITIATED, **fields) -> dict:
+    return {
+        'unique_key_id': unique_key_id, 'subscriber_id': f'{unique_key_id}.example.com', 'callback_url': callback_url,
+        'key_pair': {'signing_public_key': SIGNING_KEY, 'encryption_public_key': encryption_key},
+        'valid_from': NOW - timedelta(days=1), 'valid_until': NOW + timedelta(days=1), 'status': status, **fields,
+    }
+
+
+class TestPipelineHelpers(SimpleTestCase):
+
+    def test_queue_names(self):
+        self.assertEqual(queue_name(CHECK_SSL, ONBOARDING), 'subscription.check_ssl')
+        self.assertEqual(queue_name(CHECK_SSL, REVERIFY), 'subscription.check_ssl.bulk')
+        self.assertTrue(set(queues(ONBOARDING)).isdisjoint(queues(REVERIFY)))
+
+    @override_settings(SUBSCRIPTION_RETRY_DELAY=5.0, SUBSCRIPTION_RETRY_MAX_DELAY=60.0)
+    def test_backoff(self):
+        self.assertTrue(2.5 <= backoff(0) <= 5.0)
+        self.assertTrue(5.0 <= backoff(1) <= 10.0)
+        self.assertTrue(30.0 <= backoff(10) <= 60.0)
+
+    def test_batches(self):
+        self.assertEqual(list(batches(['a', 'b', 'c'], 2)), [['a', 'b'], ['c']])
+
+    @override_settings(SUBSCRIPTION_RATE_LIMIT_SINGLE_PROCESS=True)
+    def test_host_rate_limiter(self):
+        now = [100.0]
+        limiter = HostRateLimiter(rate=3, period=1.0, cache_alias='default', clock=lambda: now[0])
+        self.assertEqual(limiter.take('a.example.com', 2), 2)
+        self.assertEqual(limiter.take('a.example.com', 2), 1)
+        self.assertEqual(limiter.take('a.example.com'), 0)
+        self.assertEqual(limiter.take('b.example.com', 5), 3)
+        now[0] = 100.75
+        self.assertAlmostEqual(limiter.wait(), 0.25)
+        now[0] = 101.0
+        self.assertEqual(limiter.take('a.example.com'), 1)
+        self.assertEqual(HostRateLimiter(rate=0).take('a.example.com', 50), 50)
+
+    def test_host_rate_limiter_needs_a_shared_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            HostRateLimiter(rate=3, cache_alias='default')
+        self.assertIsNotNone(HostRateLimiter(rate=3, cache_alias='shared'))
+
+
+class TestPipelineStages(SimpleTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.pipeline = SubscriptionPipeline(HostRateLimiter(rate=0), forward=Collector(),
+                                             clock=lambda: NOW.timestamp())
+
+    def test_validate_keys(self):
+        outcome = self.pipeline.validate_keys([
+            row('ok'),
+            row('subscribed', status=Subscriber.SubscriptionStatus.SUBSCRIBED),
+            row('bad-key', encryption_key='not a key'),
+            row('no-window', valid_from=None),
+            row('expired', valid_until=NOW - timedelta(seconds=1)),
+        ], ONBOARDING)
+        self.assertEqual(outcome.passed, ['ok', 'subscribed'])
+        self.assertEqual(outcome.statuses, {
+            Subscriber.SubscriptionStatus.UNDER_SUBSCRIPTION: ['ok'],
+            Subscriber.SubscriptionStatus.INVALID_KEY: ['bad-key', 'no-window'],
+            Subscriber.SubscriptionStatus.EXPIRED: ['expired'],
+        })
+
+    @override_settings(SUBSCRIBER_WHITELIST=['*.ondc.org', 'buyer.example.com'])
+    def test_check_whitelist(self):
+        rows = [row('x', subscriber_id='np.ondc.org'), row('y', subscriber_id='buyer.example.com'),
+                row('z', subscriber_id='other.example.com')]
+        outcome = self.pipeline.check_whitelist(rows, ONBOARDING)
+        self.assertEqual(outcome.passed, ['x', 'y'])
+        self.assertEqual(outcome.statuses, {Subscriber.SubscriptionStatus.NOT_WHITELISTED: ['z']})
+
+    def test_check_ssl_once_per_host(self):
+        self.pipeline.checker = StubCertificateChecker()
+        # An absolute callback_url stored before validation is still checked on the subscriber_id host
+        rows = [row('x', callback_url='http://127.0.0.1:1/cb'), row('y', subscriber_id='x.example.com'), row('z')]
+        outcome = self.pipeline.check_ssl(rows, ONBOARDING)
+        self.assertEqual(sorted(outcome.passed), ['x', 'y', 'z'])
+        self.assertEqual(self.pipeline.checker.handshakes, 2)
+        self.assertEqual(set(self.pipeline.checker.cache._results), {'x.example.com:443', 'z.example.com:443'})
+
+    def test_verify_callback(self):
+        with CallbackStubServer(slow_delay=1.0) as stub:
+            self.pipeline.verifier = CallbackVerifier(timeout=0.3, transport=stub.transport())
+            rows = [row(name, '/ondc', stub.register(f'{name}.example.com', name))
+                    for name in ('ok', 'wrong', 'error', 'slow')]
+            outcome = self.pipeline.verify_callback(rows, ONBOARDING)
+        self.assertEqual(outcome.passed, ['ok'])
+        self.assertEqual(outcome.retry, ['slow'])
+        self.assertEqual(outcome.statuses, {Subscriber.SubscriptionStatus.UNDER_SUBSCRIPTION: ['wrong', 'error']})
+
+    @override_settings(SUBSCRIPTION_RATE_LIMIT_SINGLE_PROCESS=True)
+    def test_verify_callback_defers_over_host_rate(self):
+        self.pipeline.limiter = HostRateLimiter(rate=1, period=60.0, cache_alias='default')
+        with CallbackStubServer() as stub:
+            self.pipeline.verifier = CallbackVerifier(transport=stub.transport())
+            rows = [row(f'ok-{index}', '/ondc', stub.register('ok.example.com'), subscriber_id='ok.example.com')
+                    for index in range(3)]
+            outcome = self.pipeline.verify_callback(rows, ONBOARDING)
+        self.assertEqual(outcome.passed, ['ok-0'])
+        self.assertEqual(outcome.deferred, ['ok-1', 'ok-2'])
+        self.assertGreater(outcome.deferred_for, 0)
+
+
+class TestSubscriptionPipeline(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.stub = CallbackStubServer(slow_delay=1.0).start()
+        self.addCleanup(self.stub.stop)
+        self.forward = Collector()
+        self.pipeline = SubscriptionPipeline(HostRateLimiter(rate=0),
+                                             CallbackVerifier(timeout=0.3, transport=self.stub.transport()),
+                                             StubCertificateChecker(), forward=self.forward,
+                                             clock=lambda: NOW.timestamp())
+
+    def create_subscriber(self, name: str, behaviour: str = 'ok', **fields) -> Subscriber:
+        values = row(name, '/ondc', self.stub.register(f'{name}.example.com', behaviour))
+        return Subscriber.objects.create(country='IND', **{**values, **fields})
+
+    def drain(self, stage: str, unique_key_ids: list[str], lane: str = ONBOARDING) -> list[StageReport]:
+        """
+        Runs the pipeline in process, stage by stage, ignoring countdowns.
+        """
+        reports = [self.pipeline.run(stage, unique_key_ids, lane)]
+        while self.forward.sent:
+            stage, unique_key_ids, lane, attempt, countdown = self.forward.sent.pop(0)
+            reports.append(self.pipeline.run(stage, unique_key_ids, lane, attempt))
+        return reports
+
+    def status(self, unique_key_id: str) -> str:
+        return Subscriber.objects.get(unique_key_id=unique_key_id).status
+
+    @override_settings(SUBSCRIBER_WHITELIST=['ok.example.com', 'wrong.example.com', 'slow.example.com'],
+                       SUBSCRIPTION_MAX_RETRIES=1)
+    def test_onboarding(self):
+        self.create_subscriber('ok')
+        self.create_subscriber('wrong', 'wrong')
+        self.create_subscriber('slow', 'slow')
+        self.create_subscriber('blocked')
+        self.create_subscriber('bad-key', key_pair={'signing_public_key': 'x', 'encryption_public_key': 'y'})
+        reports = self.drain(VALIDATE_KEYS, ['ok', 'wrong', 'slow', 'blocked', 'bad-key'])
+        self.assertEqual(self.status('ok'), Subscriber.SubscriptionStatus.SUBSCRIBED)
+        self.assertEqual(self.status('wrong'), Subscriber.SubscriptionStatus.UNDER_SUBSCRIPTION)
+        self.assertEqual(self.status('slow'), Subscriber.SubscriptionStatus.UNDER_SUBSCRIPTION)
+        self.assertEqual(self.status('blocked'), Subscriber.SubscriptionStatus.NOT_WHITELISTED)
+        self.assertEqual(self.status('bad-key'), Subscriber.SubscriptionStatus.INVALID_KEY)
+        self.assertEqual([report.stage for report in reports], [
+            VALIDATE_KEYS, CHECK_SSL, VERIFY_CALLBACK, CHECK_WHITELIST, VERIFY_CALLBACK, FINALIZE
+        ])
+        self.assertEqual(reports[4].attempt, 1)
+
+    def test_reverify_skips_unsubscribed(self):
+        self.create_subscriber('ok', status=Subscriber.SubscriptionStatus.SUBSCRIBED)
+        self.create_subscriber('gone', status=Subscriber.SubscriptionStatus.UNSUBSCRIBED)
+        reports = self.drain(VALIDATE_KEYS, ['ok', 'gone'], REVERIFY)
+        self.assertEqual([report.items for report in reports], [1] * len(STAGES))
+        self.assertEqual(reports[-1].statuses, {})
+        self.assertEqual(self.status('ok'), Subscriber.SubscriptionStatus.SUBSCRIBED)
+        self.assertEqual(self.status('gone'), Subscriber.SubscriptionStatus.UNSUBSCRIBED)
+
+    @override_settings(SUBSCRIPTION_MAX_RETRIES=0)
+    def test_reverify_keeps_status_out_of_retries(self):
+        self.create_subscriber('slow', 'slow', status=Subscriber.SubscriptionStatus.SUBSCRIBED)
+        report = self.pipeline.run(VERIFY_CALLBACK, ['slow'], REVERIFY)
+        self.assertEqual((report.retried, report.statuses), (0, {}))
+        self.assertEqual(self.forward.sent, [])
+        self.assertEqual(self.status('slow'), Subscriber.SubscriptionStatus.SUBSCRIBED)
+
+    @override_settings(SUBSCRIPTION_MAX_RESUMES=2)
+    def test_resume_gives_up(self):
+        self.create_subscriber('stalled', status=Subscriber.SubscriptionStatus.UNDER_SUBSCRIPTION)
+        for queued in (1, 1, 0):
+            Subscriber.objects.update(updated=NOW)
+            self.assertEqual(resume(stalled_for=60, forward=self.forward), queued)
+        self.assertEqual(Subscriber.objects.get(unique_key_id='stalled').resumes, 2)
+        self.assertEqual(self.status('stalled'), Subscriber.SubscriptionStatus.UNREACHABLE)
+
+    def test_resume_stalled(self):
+        self.create_subscriber('stalled', status=Subscriber.SubscriptionStatus.UNDER_SUBSCRIPTION)
+        self.create_subscriber('running', status=Subscriber.SubscriptionStatus.UNDER_SUBSCRIPTION)
+        self.create_subscriber('done', status=Subscriber.SubscriptionStatus.SUBSCRIBED)
+        Subscriber.objects.exclude(unique_key_id='running').update(updated=NOW)
+        self.assertEqual(resume(stalled_for=60, forward=self.forward), 1)
+        self.assertEqual(self.forward.sent, [(VALIDATE_KEYS, ['stalled'], ONBOARDING, 0, None)])
+        # Touched, the next sweep leaves it to the run just queued
+        self.assertEqual(resume(stalled_for=60, forward=self.forward), 0)
+        self.forward.sent.clear()
+        self.drain(VALIDATE_KEYS, ['stalled'])
+        self.assertEqual(self.status('stalled'), Subscriber.SubscriptionStatus.SUBSCRIBED)
@@ -0,0 +1,101 @@
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from .lookup import lookup_subscribers
+from .models import *
+from .response_cache import *
+from .serializers import LookupSubscriberSerializer
+from .signals import notify_bulk_updated
+from .test_views import LookupTestMixin
+
+
+@override_settings(LOOKUP_RESPONSE_CACHE=True)
+class TestLookupResponseCache(LookupTestMixin, TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        caches['default'].clear()
+        self.create_network()
+        self.cache = get_response_cache()
+
+    def lookup(self, etag: str | None = None, **body):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.post(reverse('lookup'), body, content_type='application/json', **headers)
+
+    def test_same_bytes_as_serializers(self):
+        for filters in ({'domain': 'retail', 'city': ['std:011']}, {'city': ['*']}, {'subscriber_id': 'msn.example.com'}):
+            expected = JSONRenderer().render(LookupSubscriberSerializer(lookup_subscribers(**filters), many=True).data)
+            # Rendered, then assembled from the cache
+            self.assertEqual(self.cache.response(lookup_subscribers(**filters)).body, expected)
+            self.assertEqual(self.cache.response(lookup_subscribers(**filters)).body, expected)
+
+    def test_fragments_are_cached(self):
+        self.cache.response(lookup_subscribers())
+        misses = self.cache.misses
+        self.cache.response(lookup_subscribers())
+        self.assertEqual(self.cache.misses, misses)
+
+    def test_etag_and_not_modified(self):
+        response = self.lookup(domain='retail')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual([item['ukId'] for item in response.json()], ['key-1', 'key-3', 'key-2'])
+        response = self.client.get(reverse('lookup') + '?domain=retail', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertNotEqual(self.lookup(domain='mobility')['ETag'], etag)
+
+    def test_post_is_answered_in_full(self):
+        etag = self.lookup(domain='retail')['ETag']
+        response = self.lookup(etag, domain='retail')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()), 3)
+
+    def test_conditional_get(self):
+        url = reverse('lookup') + '?domain=retail&city=std:011&city=std:022'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_invalidated_on_save(self):
+        etag = self.lookup(domain='retail')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            seller = SellerOnRecord.objects.get(unique_key_id='sor-1')
+            seller.city_code = ['std:011', 'std:080']
+            seller.save()
+        response = self.lookup(etag, domain='retail')
+        self.assertEqual(response.status_code, 200)
+        sellers = response.json()[1]['network_participant'][0]['seller_on_record']
+        self.assertIn(['std:011', 'std:080'], [seller['city_code'] for seller in sellers])
+        # Only the changed row was rendered again
+        misses = self.cache.misses
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscriber.objects.filter(unique_key_id='key-1').update(callback_url='/ondc/v2')
+            notify_bulk_updated(['key-1'])
+        self.assertEqual(self.lookup(domain='retail').json()[0]['callback_url'], '/ondc/v2')
+        self.assertEqual(self.cache.misses, misses + 1)
+
+    def test_stale_fragment_is_not_served(self):
+        subscriber = lookup_subscribers(subscriber_id='buyer.example.com').get()
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscriber.objects.filter(unique_key_id='key-1').update(callback_url='/ondc/v2', updated=timezone.now())
+            notify_bulk_updated(['key-1'])
+        # A lookup that read the row before the write stores its fragment after the invalidation
+        self.cache.fragments(SUBSCRIBER, [subscriber])
+        self.assertEqual(self.lookup(subscriber_id='buyer.example.com').json()[0]['callback_url'], '/ondc/v2')
+
+    def test_unsubscribed_are_not_served(self):
+        self.lookup(domain='retail')
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscriber.objects.filter(unique_key_id='key-2').update(status=Subscriber.SubscriptionStatus.UNSUBSCRIBED)
+            notify_bulk_updated(['key-2'])
+        self.assertEqual([item['ukId'] for item in self.lookup(domain='retail').json()], ['key-1', 'key-3'])
+
+    def test_invalidated_on_delete(self):
+        self.lookup(domain='retail')
+        with self.captureOnCommitCallbacks(execute=True):
+            NetworkParticipant.objects.filter(subscriber_id='key-2', domain='retail').delete()
+        self.assertEqual([item['ukId'] for item in self.lookup(domain='retail').json()], ['key-1', 'key-3'])
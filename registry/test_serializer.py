@@ -1,4 +1,4 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 from .serializers import *
 import json
 import pytest
@@ -7,6 +7,25 @@ from datetime import datetime
 
 
 
+class TestSubscriberSerializerFields(SimpleTestCase):
+
+    def test_callback_url_is_a_path(self):
+        serializer = SubscriberSerializer()
+        self.assertEqual(serializer.validate_callback_url('/ondc/onboarding'), '/ondc/onboarding')
+        for callback_url in ('http://127.0.0.1:8000/cb', 'https://other.example.com/cb', '//other.example.com/cb',
+                             'ondc/onboarding', '/\\other.example.com'):
+            with self.assertRaises(serializers.ValidationError):
+                serializer.validate_callback_url(callback_url)
+
+    def test_subscriber_id_is_a_domain_name(self):
+        serializer = SubscriberSerializer()
+        self.assertEqual(serializer.validate_subscriber_id('sit.grab.in'), 'sit.grab.in')
+        for subscriber_id in ('localhost', 'sit.grab.in:8443', 'user@sit.grab.in', 'sit.grab.in/path',
+                              'https://sit.grab.in', '127.0.0.1'):
+            with self.assertRaises(serializers.ValidationError):
+                serializer.validate_subscriber_id(subscriber_id)
+
+
 class TestWriteSubscriberSerializer(TestCase):
     serializer_class = WriteSubscriberSerializer
 
@@ -0,0 +1,196 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from wade.db_router import DatabaseRouter, ReplicaSet
+from .authentication import SubscriberKeyResolver
+from .bitmap_index import get_index, reset_index
+from .callback import set_statuses
+from .lookup import find_subscribers
+from .models import *
+from .pipeline import SubscriptionPipeline
+from .serializers import ShardedUniqueValidator, SubscriberSerializer, serializers
+from .sharding import *
+from .test_views import LookupTestMixin
+
+
+class TestShardMap(SimpleTestCase):
+
+    def test_deterministic_and_balanced(self):
+        shard_map = ShardMap(['s1', 's2', 's3', 's4'])
+        ids = [f'participant{index}.example.com' for index in range(20000)]
+        placement = [shard_map.shard_for(subscriber_id) for subscriber_id in ids]
+        self.assertEqual(placement, [ShardMap(['s1', 's2', 's3', 's4']).shard_for(subscriber_id) for subscriber_id in ids])
+        for shard in shard_map:
+            self.assertAlmostEqual(placement.count(shard) / len(ids), 0.25, delta=0.08)
+
+    def test_adding_a_shard_only_moves_to_it(self):
+        before, after = ShardMap(['s1', 's2', 's3', 's4']), ShardMap(['s1', 's2', 's3', 's4', 's5'])
+        ids = [f'participant{index}.example.com' for index in range(20000)]
+        moved = [subscriber_id for subscriber_id in ids if before.shard_for(subscriber_id) != after.shard_for(subscriber_id)]
+        self.assertEqual({after.shard_for(subscriber_id) for subscriber_id in moved}, {'s5'})
+        self.assertAlmostEqual(len(moved) / len(ids), 0.2, delta=0.08)
+
+    def test_needs_a_shard(self):
+        with self.assertRaises(ValueError):
+            ShardMap([])
+
+    def test_gather_sorted(self):
+        merged = gather_sorted([[1, 3, 5], [2, 3, 6]], key=lambda item: item, unique=lambda item: item)
+        self.assertEqual(merged, [1, 2, 3, 5, 6])
+
+
+@override_settings(REGISTRY_SHARDS=['default', 'registry'], REGISTRY_SHARDS_PREVIOUS=['default'])
+class TestShardRouting(SimpleTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.router = DatabaseRouter(primary='default', replicas=ReplicaSet({}), apps=('registry',))
+        self.shard_map = get_shard_map()
+
+    def test_tree_is_co_located(self):
+        subscriber = Subscriber(unique_key_id='key-1', subscriber_id='buyer.example.com')
+        participant = NetworkParticipant(subscriber=subscriber)
+        seller = SellerOnRecord(unique_key_id='sor-1', network_participant=participant)
+        shard = self.shard_map.shard_for('buyer.example.com')
+        for instance in (subscriber, participant, seller):
+            self.assertEqual(subscriber_id_of(instance), 'buyer.example.com')
+            self.assertEqual(self.router.db_for_write(type(instance), instance=instance), shard)
+
+    def test_saved_instance_stays_on_its_shard(self):
+        subscriber = Subscriber(unique_key_id='key-1', subscriber_id='buyer.example.com')
+        other = 'registry' if self.shard_map.shard_for('buyer.example.com') == 'default' else 'default'
+        subscriber._state.db = other
+        self.assertEqual(self.router.db_for_write(Subscriber, instance=subscriber), other)
+        self.assertEqual(self.router.db_for_read(NetworkParticipant, instance=subscriber), other)
+
+    def test_participant_without_loaded_parent(self):
+        participant = NetworkParticipant(subscriber_id='key-1')
+        self.assertIsNone(subscriber_id_of(participant))
+        self.assertEqual(self.router.db_for_write(NetworkParticipant, instance=participant), 'default')
+
+    def test_no_cross_shard_relations(self):
+        subscriber, participant = Subscriber(), NetworkParticipant()
+        subscriber._state.db, participant._state.db = 'default', 'registry'
+        self.assertFalse(self.router.allow_relation(subscriber, participant))
+        participant._state.db = 'default'
+        self.assertTrue(self.router.allow_relation(subscriber, participant))
+
+    def test_registry_migrates_on_every_shard(self):
+        self.assertTrue(self.router.allow_migrate('registry', 'registry'))
+        self.assertTrue(self.router.allow_migrate('default', 'registry'))
+        self.assertFalse(self.router.allow_migrate('registry', 'monitor'))
+
+    def test_shards_of_reads_previous_map(self):
+        moved = next(f'sub{index}.example.com' for index in range(1000)
+                     if self.shard_map.shard_for(f'sub{index}.example.com') == 'registry')
+        self.assertEqual(shards_of(moved), ['registry', 'default'])
+        self.assertEqual(all_shards(), ['default', 'registry'])
+
+
+@override_settings(REGISTRY_SHARDS=['default', 'registry'])
+class TestShardedRegistry(LookupTestMixin, TestCase):
+    databases = {'default', 'registry'}
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        # The registry alias is not a shard while the test databases are migrated,
+        # its tables are created inside the class transaction and rolled back with it
+        connection = connections['registry']
+        existing = connection.introspection.table_names()
+        with connection.schema_editor() as editor:
+            for model in (Subscriber, NetworkParticipant, SellerOnRecord):
+                if model._meta.db_table not in existing:
+                    editor.create_model(model)
+
+    def count(self, alias: str) -> int:
+        return Subscriber.objects.using(alias).count()
+
+    def test_scatter_gather_lookup(self):
+        self.create_network()
+        placement = {subscriber_id: get_shard_map().shard_for(subscriber_id)
+                     for subscriber_id in ('buyer.example.com', 'seller.example.com', 'msn.example.com')}
+        for subscriber_id, shard in placement.items():
+            self.assertTrue(Subscriber.objects.using(shard).filter(subscriber_id=subscriber_id).exists())
+            self.assertTrue(NetworkParticipant.objects.using(shard).filter(
+                subscriber__subscriber_id=subscriber_id).exists())
+        self.assertEqual(self.count('default') + self.count('registry'), 3)
+        result = find_subscribers(domain='retail', type='BPP', city=['std:011'])
+        self.assertEqual([subscriber.subscriber_id for subscriber in result], ['msn.example.com', 'seller.example.com'])
+        sellers = result[0].matched_participants[0].seller_on_record.all()
+        self.assertEqual([seller.unique_key_id for seller in sellers], ['sor-1'])
+        self.assertEqual([subscriber.unique_key_id for subscriber in find_subscribers(subscriber_id='buyer.example.com')],
+                         ['key-1'])
+
+    def test_rebalance(self):
+        with override_settings(REGISTRY_SHARDS=['default']):
+            self.create_network()
+        self.assertEqual(self.count('default'), 3)
+        with override_settings(REGISTRY_SHARDS_PREVIOUS=['default']):
+            # Not moved yet, still found through the previous map
+            self.assertEqual(len(find_subscribers(city=['*'])), 3)
+            out = StringIO()
+            call_command('rebalance_shards', stdout=out)
+        expected = {alias: [subscriber_id for subscriber_id in ('buyer.example.com', 'seller.example.com', 'msn.example.com')
+                            if get_shard_map().shard_for(subscriber_id) == alias] for alias in ('default', 'registry')}
+        for alias, subscriber_ids in expected.items():
+            self.assertEqual(sorted(Subscriber.objects.using(alias).values_list('subscriber_id', flat=True)),
+                             sorted(subscriber_ids))
+        moved = len(expected['registry'])
+        self.assertIn(f'{moved} subscriber ids moved', out.getvalue())
+        self.assertEqual(len(find_subscribers(city=['*'])), 3)
+        self.assertEqual(SellerOnRecord.objects.using('default').count() + SellerOnRecord.objects.using('registry').count(), 2)
+
+    def test_unhinted_reads_reach_every_shard(self):
+        self.create_network()
+        keys = ['key-1', 'key-2', 'key-3']
+        located = locate(Subscriber, keys + ['key-4'])
+        self.assertEqual(sorted(key for shard_keys in located.values() for key in shard_keys), keys)
+        self.assertEqual(located[get_shard_map().shard_for('buyer.example.com')].count('key-1'), 1)
+        self.assertEqual(sorted(row['unique_key_id'] for row in SubscriptionPipeline(forward=print).load(keys)), keys)
+        self.assertEqual(set_statuses({Subscriber.SubscriptionStatus.UNDER_SUBSCRIPTION: keys}),
+                         {Subscriber.SubscriptionStatus.UNDER_SUBSCRIPTION: 3})
+        set_statuses({Subscriber.SubscriptionStatus.SUBSCRIBED: keys})
+        resolver = SubscriberKeyResolver(ttl=0, negative_ttl=0)
+        for key in keys:
+            self.assertIsNotNone(resolver.resolve(key))
+        validator = ShardedUniqueValidator(Subscriber.objects.all())
+        field = SubscriberSerializer().fields['unique_key_id']
+        for key in keys:
+            with self.assertRaises(serializers.ValidationError):
+                validator(key, field)
+        validator('key-4', field)
+
+    @override_settings(REGISTRY_BITMAP_INDEX=True)
+    def test_bitmap_index_spans_shards(self):
+        self.create_network()
+        shards = {get_shard_map().shard_for(subscriber_id)
+                  for subscriber_id in ('buyer.example.com', 'seller.example.com', 'msn.example.com')}
+        self.assertEqual(shards, {'default', 'registry'})
+        reset_index()
+        try:
+            self.assertEqual(len(get_index()), NetworkParticipant.objects.using('default').count()
+                             + NetworkParticipant.objects.using('registry').count())
+            everyone = find_subscribers(city=['*'])
+            result = find_subscribers(domain='retail', type='BPP', city=['std:011'])
+        finally:
+            reset_index()
+        self.assertEqual(len(everyone), 3)
+        self.assertEqual([subscriber.subscriber_id for subscriber in result], ['msn.example.com', 'seller.example.com'])
+
+    @override_settings(REGISTRY_BITMAP_INDEX=True)
+    def test_bitmap_index_follows_shard_writes(self):
+        subscriber = self.create_subscriber('key-9', 'buyer.example.com', [])
+        self.assertEqual(subscriber._state.db, 'registry')
+        reset_index()
+        self.addCleanup(reset_index)
+        get_index()
+        with self.captureOnCommitCallbacks(using='registry', execute=True):
+            participant = NetworkParticipant.objects.create(subscriber=subscriber, domain='logistics', type='BAP',
+                                                            city_code=['std:044'])
+        self.assertEqual(get_index().query('logistics'), [participant.id])
+        with self.captureOnCommitCallbacks(using='registry', execute=True):
+            participant.delete()
+        self.assertEqual(get_index().query('logistics'), [])
@@ -0,0 +1,214 @@
+import asyncio
+import socket
+import socketserver
+import ssl
+import tempfile
+import time
+from datetime import datetime, timezone as dt_timezone
+from threading import Thread
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+from django.test import SimpleTestCase, TestCase
+from .models import *
+from .ssl_check import *
+
+
+def self_signed_certificate(not_after: datetime) -> tuple[bytes, bytes]:
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'localhost')])
+    certificate = x509.CertificateBuilder() \
+        .subject_name(name).issuer_name(name).public_key(key.public_key()) \
+        .serial_number(x509.random_serial_number()) \
+        .not_valid_before(datetime(2020, 1, 1)).not_valid_after(not_after) \
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName('localhost')]), critical=False) \
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True) \
+        .sign(key, hashes.SHA256())
+    return (
+        certificate.public_bytes(serialization.Encoding.PEM),
+        key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                          serialization.NoEncryption()),
+    )
+
+
+class TLSServer:
+    """
+    Completes TLS handshakes with a self-signed certificate and closes.
+    """
+
+    def __init__(self, not_after: datetime) -> None:
+        self.certificate, key = self_signed_certificate(not_after)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        with tempfile.NamedTemporaryFile() as cert_file, tempfile.NamedTemporaryFile() as key_file:
+            cert_file.write(self.certificate)
+            key_file.write(key)
+            cert_file.flush()
+            key_file.flush()
+            context.load_cert_chain(cert_file.name, key_file.name)
+        self.handshakes = 0
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self) -> None:
+                server.handshakes += 1
+                try:
+                    with context.wrap_socket(self.request, server_side=True) as connection:
+                        connection.recv(1)
+                except (OSError, ssl.SSLError):
+                    pass
+
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def trusting_context(self) -> ssl.SSLContext:
+        context = ssl.create_default_context()
+        context.load_verify_locations(cadata=self.certificate.decode())
+        return context
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class Clock:
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class TestCertificateChecker(SimpleTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.not_after = datetime(2099, 1, 1)
+        self.server = TLSServer(self.not_after)
+        self.addCleanup(self.server.stop)
+        self.clock = Clock(time.time())
+        self.cache = CertificateCache(ttl=3600, failure_ttl=60, recheck_margin=600, clock=self.clock)
+
+    def check(self, checker: CertificateChecker, *addresses: tuple[str, int]) -> dict[str, CertificateResult]:
+        return asyncio.run(checker.check_many(addresses))
+
+    def test_untrusted_self_signed(self):
+        checker = CertificateChecker(self.cache, timeout=5)
+        result = self.check(checker, ('localhost', self.server.port))[f'localhost:{self.server.port}']
+        self.assertFalse(result.valid)
+        self.assertTrue(result.reachable)
+        self.assertIn('CERTIFICATE_VERIFY_FAILED', result.error)
+
+    def test_trusted_certificate(self):
+        checker = CertificateChecker(self.cache, self.server.trusting_context(), timeout=5)
+        result = self.check(checker, ('localhost', self.server.port))[f'localhost:{self.server.port}']
+        self.assertTrue(result.valid)
+        self.assertEqual(result.expires_at, self.not_after.replace(tzinfo=dt_timezone.utc))
+
+    def test_expired_certificate(self):
+        server = TLSServer(datetime(2021, 1, 1))
+        self.addCleanup(server.stop)
+        checker = CertificateChecker(self.cache, server.trusting_context(), timeout=5)
+        result = self.check(checker, ('localhost', server.port))[f'localhost:{server.port}']
+        self.assertFalse(result.valid)
+        self.assertIn('expired', result.error)
+
+    def test_unreachable(self):
+        checker = CertificateChecker(self.cache, timeout=5)
+        port = free_port()
+        result = self.check(checker, ('localhost', port))[f'localhost:{port}']
+        self.assertFalse(result.reachable)
+
+    def test_deduplicates_hosts_and_caches(self):
+        checker = CertificateChecker(self.cache, self.server.trusting_context(), timeout=5)
+        results = self.check(checker, *[('localhost', self.server.port)] * 5)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(checker.handshakes, 1)
+        self.check(checker, ('localhost', self.server.port))
+        self.assertEqual(checker.handshakes, 1)
+        self.clock.now += 3601
+        self.check(checker, ('localhost', self.server.port))
+        self.assertEqual(checker.handshakes, 2)
+        self.assertEqual(self.server.handshakes, 2)
+
+    def test_recheck_before_expiry(self):
+        now = self.clock.now
+        expiring = CertificateResult('a', 443, True, now, not_after=now + 1800)
+        self.assertEqual(self.cache.recheck_at(expiring), now + 1200)
+        lasting = CertificateResult('b', 443, True, now, not_after=now + 10 ** 6)
+        self.assertEqual(self.cache.recheck_at(lasting), now + 3600)
+        # Inside the margin the result is still kept for failure_ttl
+        closing = CertificateResult('c', 443, True, now, not_after=now + 300)
+        self.assertEqual(self.cache.recheck_at(closing), now + 60)
+        failed = CertificateResult('d', 443, False, now)
+        self.assertEqual(self.cache.recheck_at(failed), now + 60)
+
+    def test_addresses(self):
+        self.assertEqual(split_address('np.example.com', 443), ('np.example.com', 443))
+        self.assertEqual(split_address('localhost:8443'), ('localhost', 8443))
+        self.assertEqual(callback_host('np.example.com', 443), 'np.example.com')
+        self.assertEqual(callback_host('localhost', 8443), 'localhost:8443')
+
+
+class TestCheckSubscribers(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.server = TLSServer(datetime(2099, 1, 1))
+        self.addCleanup(self.server.stop)
+
+    def create_subscriber(self, unique_key_id: str, port: int, status: str) -> Subscriber:
+        return Subscriber.objects.create(
+            # Stored directly, the serializers only accept subscriber_ids without a port
+            unique_key_id=unique_key_id, subscriber_id=f'localhost:{port}',
+            callback_url='/ondc', country='IND', key_pair={}, status=status
+        )
+
+    def test_marks_invalid_ssl_per_host(self):
+        status = Subscriber.SubscriptionStatus
+        for index in range(3):
+            self.create_subscriber(f'key-{index}', self.server.port, status.SUBSCRIBED)
+        self.create_subscriber('gone', self.server.port, status.UNSUBSCRIBED)
+        self.create_subscriber('down', free_port(), status.SUBSCRIBED)
+        checker = CertificateChecker(CertificateCache(3600, 60, 600), timeout=5)
+        results = check_subscribers(checker=checker)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(checker.handshakes, 2)
+        statuses = dict(Subscriber.objects.values_list('unique_key_id', 'status'))
+        self.assertEqual(statuses, {
+            'key-0': status.INVALID_SSL, 'key-1': status.INVALID_SSL, 'key-2': status.INVALID_SSL,
+            'gone': status.UNSUBSCRIBED, 'down': status.SUBSCRIBED,
+        })
+
+    def test_restores_fixed_hosts(self):
+        status = Subscriber.SubscriptionStatus
+        self.create_subscriber('key-1', self.server.port, status.INVALID_SSL)
+        checker = CertificateChecker(CertificateCache(3600, 60, 600), self.server.trusting_context(), timeout=5)
+        check_subscribers([f'localhost:{self.server.port}'], checker=checker)
+        self.assertEqual(Subscriber.objects.get().status, status.INITIATED)
+
+    def test_sweep_checks_due_hosts(self):
+        status = Subscriber.SubscriptionStatus
+        self.create_subscriber('key-1', self.server.port, status.SUBSCRIBED)
+        self.create_subscriber('gone', free_port(), status.UNSUBSCRIBED)
+        host = f'localhost:{self.server.port}'
+        self.assertEqual(due_hosts(), [host])
+        checker = CertificateChecker(CertificateCache(3600, 60, 600), self.server.trusting_context(), timeout=5)
+        check_subscribers(due_hosts(), checker=checker)
+        certificate = CallbackCertificate.objects.get()
+        self.assertEqual(certificate.host, host)
+        self.assertTrue(certificate.valid)
+        self.assertEqual(due_hosts(), [])
+        self.assertEqual(due_hosts(now=certificate.recheck_at), [host])
@@ -0,0 +1,103 @@
+import io
+import json
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from common.crypto.authorization import parse_authorization_header, signing_string
+from common.crypto.constants import HashingAlgorithm
+from common.crypto.main import Cryptographer
+from .lookup import lookup_subscribers
+from .models import *
+from .serializers import WriteSubscriberSerializer
+from .synthetic import *
+
+
+class TestSyntheticRegistry(SimpleTestCase):
+
+    def test_deterministic(self):
+        first, second = SyntheticRegistry(seed=7), SyntheticRegistry(seed=7)
+        self.assertEqual(first.subscriber(12).payload, second.subscriber(12).payload)
+        self.assertEqual(first.subscriber(12).keys, second.subscriber(12).keys)
+        self.assertNotEqual(first.subscriber(12).payload, SyntheticRegistry(seed=8).subscriber(12).payload)
+        self.assertNotEqual(first.subscriber(12).entity['unique_key_id'], first.subscriber(13).entity['unique_key_id'])
+
+    def test_participant_mix(self):
+        subscribers = list(SyntheticRegistry(cities=20).subscribers(0, 300))
+        self.assertEqual({subscriber.payload['context']['operation']['ops_no'] for subscriber in subscribers},
+                         set(OPERATION_MIX))
+        for subscriber in subscribers:
+            for participant in subscriber.payload['message']['network_participant']:
+                self.assertEqual(participant['msn'], 'seller_on_record' in participant)
+                self.assertTrue(set(participant['city_code']) <= {f'std:{code:03d}' for code in range(20)})
+                for seller in participant.get('seller_on_record', []):
+                    self.assertTrue(set(seller['city_code']) <= set(participant['city_code']))
+
+    def test_signed_request(self):
+        subscriber = SyntheticRegistry().subscriber(3)
+        request = signed_request(subscriber, now=1700000000)
+        self.assertEqual(request['body']['message']['timestamp'], '2023-11-14T22:13:20.000000Z')
+        header = parse_authorization_header(request['headers']['Authorization'])
+        self.assertEqual((header.subscriber_id, header.unique_key_id, header.expires),
+                         (subscriber.entity['subscriber_id'], subscriber.entity['unique_key_id'], 1700003600))
+        digest = Cryptographer.digest(HashingAlgorithm.BLAKE2B, canonical_body(request['body']))
+        signing_key = Cryptographer(subscriber.entity['key_pair']['signing_public_key'], 'ED25519')
+        self.assertTrue(signing_key.verify_signature(
+            header.signature, signing_string(header.created, header.expires, digest)
+        ))
+
+    def test_write_requests(self):
+        file = io.StringIO()
+        self.assertEqual(write_requests(SyntheticRegistry().subscribers(0, 3), file), 3)
+        lines = [json.loads(line) for line in file.getvalue().splitlines()]
+        self.assertEqual([line['path'] for line in lines], ['/subscribe'] * 3)
+
+
+class TestSyntheticLoad(TestCase):
+
+    def test_payloads_validate(self):
+        for subscriber in SyntheticRegistry().subscribers(0, 20):
+            serializer = WriteSubscriberSerializer(data=signed_request(subscriber)['body'])
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+
+    def test_load(self):
+        for method in ('copy', 'bulk'):
+            start = 0 if method == 'copy' else 50
+            report = load(SyntheticRegistry(cities=10).subscribers(start, 50), batch_size=20, method=method)
+            self.assertEqual(report.subscribers, 50)
+            self.assertEqual(Subscriber.objects.filter(status=Subscriber.SubscriptionStatus.SUBSCRIBED).count(),
+                             start + 50)
+            self.assertEqual(NetworkParticipant.objects.count(), sum(
+                len(subscriber.payload['message']['network_participant'])
+                for subscriber in SyntheticRegistry(cities=10).subscribers(0, start + 50)
+            ))
+        self.assertTrue(list(lookup_subscribers(city=['std:001'])))
+
+    def subscribe(self, request: dict, authorization: str | None = None):
+        headers = {'HTTP_AUTHORIZATION': authorization or request['headers']['Authorization']}
+        return self.client.post(reverse('subscribe'), canonical_body(request['body']), content_type='application/json',
+                                **headers)
+
+    @override_settings(SUBSCRIBE_ENABLED=True)
+    def test_subscribe_view(self):
+        request = signed_request(SyntheticRegistry().subscriber(0))
+        response = self.subscribe(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Subscriber.objects.filter(unique_key_id=request['headers']['Authorization'].split('|')[1])
+                        .exists())
+        response = self.subscribe(request)
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(SUBSCRIBE_ENABLED=True)
+    def test_subscribe_view_needs_the_registered_key(self):
+        registry = SyntheticRegistry()
+        request = signed_request(registry.subscriber(1))
+        response = self.client.post(reverse('subscribe'), canonical_body(request['body']),
+                                    content_type='application/json')
+        self.assertIn(response.status_code, (401, 403))
+        # Signed by another subscriber's key
+        self.assertIn(self.subscribe(request, signed_request(registry.subscriber(2))['headers']['Authorization'])
+                      .status_code, (401, 403))
+        self.assertFalse(Subscriber.objects.exists())
+
+    def test_subscribe_view_is_off_by_default(self):
+        request = signed_request(SyntheticRegistry().subscriber(0))
+        self.assertEqual(self.subscribe(request).status_code, 404)
@@ -0,0 +1,117 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from .models import *
+
+
+class LookupTestMixin:
+
+    @staticmethod
+    def create_subscriber(unique_key_id: str, subscriber_id: str, participants: list[dict]) -> Subscriber:
+        subscriber = Subscriber.objects.create(
+            unique_key_id=unique_key_id, subscriber_id=subscriber_id, callback_url='/ondc/onboarding',
+            country='IND', key_pair={'signing_public_key': 'QSax2KT4UiTUWUqoVUaEcWhBcGTTNu+Sf8EMDRY1GaE='},
+            status=Subscriber.SubscriptionStatus.SUBSCRIBED, email_id='ops@example.com', mobile_no='9999999999',
+            valid_from=timezone.now() - timedelta(days=1), valid_until=timezone.now() + timedelta(days=365),
+        )
+        for participant in participants:
+            sellers = participant.pop('seller_on_record', [])
+            network_participant = NetworkParticipant.objects.create(subscriber=subscriber, **participant)
+            for seller in sellers:
+                SellerOnRecord.objects.create(network_participant=network_participant, **seller)
+        return subscriber
+
+    def create_network(self) -> None:
+        self.create_subscriber('key-1', 'buyer.example.com', [
+            {'domain': 'retail', 'type': 'BAP', 'city_code': ['std:080']},
+        ])
+        self.create_subscriber('key-2', 'seller.example.com', [
+            {'domain': 'retail', 'type': 'BPP', 'city_code': ['std:080', 'std:011']},
+            {'domain': 'mobility', 'type': 'BPP', 'city_code': ['std:022']},
+        ])
+        self.create_subscriber('key-3', 'msn.example.com', [
+            {'domain': 'retail', 'type': 'BPP', 'msn': True, 'city_code': ['std:011'], 'seller_on_record': [
+                {'unique_key_id': 'sor-1', 'city_code': ['std:011'], 'key_pair': {}},
+                {'unique_key_id': 'sor-2', 'city_code': ['std:022'], 'key_pair': {}},
+            ]},
+        ])
+
+
+class TestLookupView(LookupTestMixin, TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.create_network()
+
+    def lookup(self, **body) -> list:
+        response = self.client.post(reverse('lookup'), body, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_lookup_by_domain_type_city(self):
+        result = self.lookup(domain='retail', type='BPP', city='std:011')
+        self.assertEqual([item['subscriber_id'] for item in result], ['msn.example.com', 'seller.example.com'])
+        seller = result[1]
+        self.assertEqual([part['domain'] for part in seller['network_participant']], ['retail'])
+        msn = result[0]['network_participant'][0]
+        self.assertEqual([sor['unique_key_id'] for sor in msn['seller_on_record']], ['sor-1'])
+
+    def test_lookup_by_subscriber_id(self):
+        result = self.lookup(subscriber_id='buyer.example.com')
+        self.assertEqual([item['ukId'] for item in result], ['key-1'])
+
+    def test_lookup_hides_private_details(self):
+        item, = self.lookup(subscriber_id='buyer.example.com')
+        self.assertEqual(set(item), {'subscriber_id', 'ukId', 'key_pair', 'callback_url', 'network_participant'})
+
+    def test_lookup_only_subscribed(self):
+        Subscriber.objects.filter(unique_key_id='key-1').update(status=Subscriber.SubscriptionStatus.UNSUBSCRIBED)
+        Subscriber.objects.filter(unique_key_id='key-2').update(status=Subscriber.SubscriptionStatus.INITIATED)
+        self.assertEqual([item['ukId'] for item in self.lookup(domain='*')], ['key-3'])
+
+    def test_lookup_many_cities(self):
+        result = self.lookup(city=['std:022', 'std:080'])
+        self.assertEqual([item['subscriber_id'] for item in result], ['buyer.example.com', 'seller.example.com'])
+
+    def test_lookup_wildcard(self):
+        self.assertEqual(len(self.lookup(domain='*', city='*')), 3)
+
+    def test_lookup_invalid_domain(self):
+        response = self.client.post(reverse('lookup'), {'domain': 'space'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_lookup_fixed_query_count(self):
+        # subscribers, participants, sellers on record
+        with self.assertNumQueries(3):
+            self.lookup(domain='retail')
+        for index in range(10):
+            self.create_subscriber(f'extra-{index}', f'extra{index}.example.com', [
+                {'domain': 'retail', 'type': 'BPP', 'msn': True, 'city_code': ['std:080'], 'seller_on_record': [
+                    {'unique_key_id': f'extra-sor-{index}', 'city_code': ['std:080'], 'key_pair': {}},
+                ]},
+            ])
+        with self.assertNumQueries(3):
+            self.lookup(domain='retail')
+
+
+class TestCityCodeIndexes(LookupTestMixin, TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.create_network()
+        # A handful of rows never make the planner pick an index on its own
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def test_contains_uses_gin_index(self):
+        plan = NetworkParticipant.objects.filter(city_code__contains=['std:080']).explain()
+        self.assertIn('registry_np_city_code_gin', plan)
+
+    def test_overlap_uses_gin_index(self):
+        plan = NetworkParticipant.objects.filter(city_code__overlap=['std:080', 'std:011']).explain()
+        self.assertIn('registry_np_city_code_gin', plan)
+        plan = SellerOnRecord.objects.filter(city_code__overlap=['std:011']).explain()
+        self.assertIn('registry_sor_city_code_gin', plan)
@@ -0,0 +1,8 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('lookup', views.LookupView.as_view(), name='lookup'),
+    path('subscribe', views.SubscribeView.as_view(), name='subscribe'),
+]
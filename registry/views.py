@@ -1,3 +1,93 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import parse_etags
+from rest_framework.exceptions import AuthenticationFailed, NotFound
+from rest_framework.permissions import AllowAny
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from common.crypto.exception import AuthorizationError
+from monitor.instrumentation import stage
+
+from . import response_cache
+from .authentication import AuthorizationVerifier, RequestKeyResolver
+from .lookup import find_subscribers
+from .serializers import LookupRequestSerializer, LookupSubscriberSerializer, WriteSubscriberSerializer
+
+
+class LookupView(APIView):
+    """
+    Lookup by POSTed JSON body or by GET query parameters. With
+    LOOKUP_RESPONSE_CACHE the response is assembled from cached fragments
+    and carries an ETag, a GET with a matching If-None-Match is answered
+    with 304. A POST is always answered in full (RFC 9110 13.1.2).
+    """
+    permission_classes = [AllowAny]
+
+    def lookup(self, request: Request, data) -> HttpResponse:
+        lookup = LookupRequestSerializer(data=data)
+        with stage('validate'):
+            lookup.is_valid(raise_exception=True)
+        filters = lookup.validated_data
+        with stage('find'):
+            subscribers = find_subscribers(
+                subscriber_id=filters.get('subscriber_id'),
+                unique_key_id=filters.get('ukId'),
+                domain=filters.get('domain'),
+                type=filters.get('type'),
+                city=filters.get('city'),
+            )
+        if not response_cache.cache_enabled():
+            with stage('render'):
+                return Response(LookupSubscriberSerializer(subscribers, many=True).data)
+        with stage('render'):
+            cached = response_cache.get_response_cache().response(subscribers)
+        etag = cached.etag
+        if request.method in ('GET', 'HEAD') and etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(cached.body, content_type='application/json')
+        response['ETag'] = etag
+        return response
+
+    def get(self, request: Request) -> HttpResponse:
+        params = request.query_params
+        data = {key: params[key] for key in ('subscriber_id', 'ukId', 'domain', 'type') if key in params}
+        if 'city' in params:
+            data['city'] = params.getlist('city')
+        return self.lookup(request, data)
+
+    def post(self, request: Request) -> HttpResponse:
+        return self.lookup(request, request.data)
+
+
+class SubscribeView(APIView):
+    """
+    Registers a subscriber from a subscribe request, the callback and
+    certificate checks run afterwards from the task queue. The request must
+    carry an Authorization header signed with the signing key it registers.
+    Answers 404 unless SUBSCRIBE_ENABLED.
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request: Request) -> Response:
+        if not settings.SUBSCRIBE_ENABLED:
+            raise NotFound()
+        # Read before request.data, the raw body is gone once the stream is parsed
+        body = request.body
+        with stage('authorize'):
+            try:
+                entity = request.data['message']['entity']
+            except (KeyError, TypeError):
+                entity = {}
+            try:
+                AuthorizationVerifier(RequestKeyResolver(entity)).verify(request.headers.get('Authorization', ''), body)
+            except AuthorizationError as exc:
+                raise AuthenticationFailed(str(exc))
+        serializer = WriteSubscriberSerializer(data=request.data)
+        with stage('validate'):
+            serializer.is_valid(raise_exception=True)
+        with stage('save'):
+            serializer.save()
+        return Response({'message': {'ack': {'status': 'ACK'}}})
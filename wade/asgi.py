@@ -13,4 +13,12 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'wade.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from monitor.instrumentation import MetricsMiddleware  # noqa: E402, needs the apps loaded
+from registry.change_feed import start_listeners  # noqa: E402
+from registry.keyring import warm_up  # noqa: E402
+
+application = MetricsMiddleware(django_application)
+start_listeners()
+warm_up()
@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'wade.settings')
 
@@ -7,4 +8,16 @@ app = Celery('wade')
 
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
-app.autodiscover_tasks()
\ No newline at end of file
+app.autodiscover_tasks()
+
+
+@worker_process_init.connect
+def start_change_feed(**kwargs) -> None:
+    from registry.change_feed import start_listeners
+    start_listeners()
+
+
+@worker_process_init.connect
+def load_keyring(**kwargs) -> None:
+    from registry.keyring import warm_up
+    warm_up()
@@ -1,12 +1,230 @@
-from registry.models import Subscriber
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from typing import Callable, Iterator
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from registry import sharding
+
+
+# Set for the duration of a request, holds whether the request wrote to the registry primary
+_request_scope: ContextVar[dict | None] = ContextVar('db_router_request_scope', default=None)
+
+
+@contextmanager
+def request_scope() -> Iterator[dict]:
+    """
+    Reads following a registry write inside the scope go to the primary.
+    """
+    scope = {'pinned': False}
+    token = _request_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _request_scope.reset(token)
+
+
+class ReadYourWritesMiddleware:
+    """
+    Opens a request_scope around every request so a request reads its own
+    writes, other requests keep reading from the replicas.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with request_scope():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with request_scope():
+            return await self.get_response(request)
+
+
+# Seconds behind the primary, 0 when the replica replayed everything it received
+REPLICA_LAG_SQL = """
+    SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END
+"""
+
+
+def probe_replica_lag(alias: str) -> float:
+    with connections[alias].cursor() as cursor:
+        cursor.execute(REPLICA_LAG_SQL)
+        lag = cursor.fetchone()[0]
+    return float(lag or 0)
+
+
+class ReplicaSet:
+    """
+    Replicas of one primary with their weights. Every replica is probed
+    for replication lag at most once per check_interval seconds, replicas
+    lagging more than max_lag seconds (or failing the probe) are left out
+    until a later probe finds them caught up.
+
+    Selection:
+        weighted     - random choice proportional to the weights
+        least_loaded - fewest in flight queries per unit of weight
+    """
+
+    WEIGHTED = 'weighted'
+    LEAST_LOADED = 'least_loaded'
+
+    def __init__(self, replicas: dict[str, float], selection: str = WEIGHTED, max_lag: float = 5.0,
+                 check_interval: float = 5.0, lag_probe: Callable[[str], float] = probe_replica_lag,
+                 clock: Callable[[], float] = time.monotonic, rng: random.Random | None = None) -> None:
+        if selection not in (self.WEIGHTED, self.LEAST_LOADED):
+            raise ValueError(f'Unknown replica selection {selection}')
+        self.replicas = dict(replicas)
+        self.selection = selection
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag_probe = lag_probe
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.in_flight: dict[str, int] = dict.fromkeys(self.replicas, 0)
+        self.lag: dict[str, float | None] = dict.fromkeys(self.replicas, 0.0)
+        self._checked: dict[str, float] = {}
+        self._lock = Lock()
+
+    def _healthy(self, alias: str) -> bool:
+        now = self.clock()
+        checked = self._checked.get(alias)
+        if checked is None or now - checked >= self.check_interval:
+            self._checked[alias] = now
+            try:
+                self.lag[alias] = self.lag_probe(alias)
+            except Exception:
+                self.lag[alias] = None
+        lag = self.lag[alias]
+        return lag is not None and lag <= self.max_lag
+
+    def healthy(self) -> list[str]:
+        return [alias for alias in self.replicas if self._healthy(alias)]
+
+    def choose(self) -> str | None:
+        """
+        A replica in rotation, None when every replica lags.
+        """
+        candidates = self.healthy()
+        if not candidates:
+            return None
+        if self.selection == self.LEAST_LOADED:
+            with self._lock:
+                return min(candidates, key=lambda alias: self.in_flight[alias] / self.replicas[alias])
+        return self.rng.choices(candidates, weights=[self.replicas[alias] for alias in candidates])[0]
+
+    def track(self, alias: str) -> Callable:
+        """
+        Connection execute wrapper counting the queries running on a replica.
+        """
+        def wrapper(execute, sql, params, many, context):
+            with self._lock:
+                self.in_flight[alias] += 1
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                with self._lock:
+                    self.in_flight[alias] -= 1
+        return wrapper
+
+    def install(self, sender, connection, **kwargs) -> None:
+        if connection.alias in self.replicas and not getattr(connection, '_replica_load_tracked', False):
+            connection.execute_wrappers.append(self.track(connection.alias))
+            connection._replica_load_tracked = True
+
 
 class DatabaseRouter:
-    def db_for_read(self, model, **hints) -> str:
-        if model == Subscriber:
-            return "wade_registry"
-        return "default"
-    
-    def db_for_write(self, model, **hints) -> str:
-        if model == Subscriber:
-            return "wade_registry"
-        return "default"
\ No newline at end of file
+    """
+    Routes the registry app models (Subscriber, NetworkParticipant,
+    SellerOnRecord) together to REGISTRY_DATABASE, their reads are spread
+    over REGISTRY_DATABASE_REPLICAS unless the current request already
+    wrote to the registry. Everything else uses the default database.
+
+    With REGISTRY_SHARDS every subscriber tree lives on the shard of its
+    subscriber_id. Instances are routed to their shard (children follow
+    the parent they were created with), querysets without an instance go
+    to REGISTRY_DATABASE and must pick a shard with .using() or go through
+    registry.sharding.scatter.
+    """
+
+    def __init__(self, primary: str | None = None, replicas: ReplicaSet | None = None,
+                 apps: tuple[str, ...] | None = None) -> None:
+        self.primary = primary or settings.REGISTRY_DATABASE
+        self.apps = apps or settings.REGISTRY_DATABASE_APPS
+        if replicas is None:
+            replicas = ReplicaSet(
+                settings.REGISTRY_DATABASE_REPLICAS,
+                selection=settings.REGISTRY_DATABASE_REPLICA_SELECTION,
+                max_lag=settings.REGISTRY_DATABASE_REPLICA_MAX_LAG,
+                check_interval=settings.REGISTRY_DATABASE_REPLICA_CHECK_INTERVAL,
+            )
+            if settings.REGISTRY_DATABASE_REPLICA_SELECTION == ReplicaSet.LEAST_LOADED:
+                connection_created.connect(replicas.install, weak=False)
+        self.replicas = replicas
+
+    @property
+    def aliases(self) -> set[str]:
+        return {self.primary, *self.replicas.replicas, *sharding.all_shards()}
+
+    @staticmethod
+    def _shard_of(instance) -> str | None:
+        if instance is None or not sharding.sharding_enabled():
+            return None
+        if instance._state.db in sharding.all_shards():
+            return instance._state.db
+        subscriber_id = sharding.subscriber_id_of(instance)
+        return sharding.get_shard_map().shard_for(subscriber_id) if subscriber_id else None
+
+    def _routed(self, model) -> bool:
+        return model._meta.app_label in self.apps
+
+    def db_for_read(self, model, **hints) -> str | None:
+        if not self._routed(model):
+            return 'default'
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in self.aliases:
+            return instance._state.db
+        shard = self._shard_of(instance)
+        if shard is not None:
+            return shard
+        scope = _request_scope.get()
+        if scope is not None and scope['pinned']:
+            return self.primary
+        return self.replicas.choose() or self.primary
+
+    def db_for_write(self, model, **hints) -> str | None:
+        if not self._routed(model):
+            return 'default'
+        scope = _request_scope.get()
+        if scope is not None:
+            scope['pinned'] = True
+        return self._shard_of(hints.get('instance')) or self.primary
+
+    def allow_relation(self, obj1, obj2, **hints) -> bool | None:
+        routed = [obj._state.db in self.aliases for obj in (obj1, obj2)]
+        if all(routed):
+            shards = sharding.all_shards()
+            # A subscriber tree never spans shards
+            return obj1._state.db == obj2._state.db or not {obj1._state.db, obj2._state.db} & set(shards)
+        return False if any(routed) else None
+
+    def allow_migrate(self, db: str, app_label: str, model_name: str | None = None, **hints) -> bool | None:
+        if db in self.replicas.replicas:
+            return False
+        if app_label in self.apps:
+            return db == self.primary or db in sharding.all_shards()
+        return db == 'default'
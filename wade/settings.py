@@ -62,6 +62,9 @@ REST_FRAMEWORK = {
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'monitor.profiler.ProfilerMiddleware',
+    'wade.db_router.ReadYourWritesMiddleware',
+    'monitor.instrumentation.RouteMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -110,9 +113,52 @@ DATABASES = {
         'PASSWORD': 'postgres@123',
         'HOST': 'localhost',
         'PORT': 5432
-    }
+    },
+    # Read replica of default, used once listed in REGISTRY_DATABASE_REPLICAS.
+    # Tests point it at the default test database over a connection of its own
+    'replica': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': 'wade',
+        'USER': 'postgres',
+        'PASSWORD': 'postgres@123',
+        'HOST': 'localhost',
+        'PORT': 5432,
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['wade.db_router.DatabaseRouter']
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/ref/settings/#caches
+# 'default' is local to every process, 'shared' is seen by every web and worker process
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://localhost:6379/3',
+    },
+}
+
+# REGISTRY DATABASE
+# Apps routed together to the registry primary, and its replicas as {alias: weight}
+REGISTRY_DATABASE = 'default'
+REGISTRY_DATABASE_APPS = ('registry',)
+REGISTRY_DATABASE_REPLICAS = {}
+REGISTRY_DATABASE_REPLICA_SELECTION = 'weighted'  # 'weighted' or 'least_loaded'
+# Replicas more than MAX_LAG seconds behind are left out, lag is probed every CHECK_INTERVAL seconds
+REGISTRY_DATABASE_REPLICA_MAX_LAG = 5.0
+REGISTRY_DATABASE_REPLICA_CHECK_INTERVAL = 5.0
+# Aliases the registry is hash sharded across on subscriber_id, empty keeps it on REGISTRY_DATABASE.
+# While `manage.py rebalance_shards` moves subscribers to a new map the old one is kept in
+# REGISTRY_SHARDS_PREVIOUS and still read from
+REGISTRY_SHARDS = []
+REGISTRY_SHARDS_PREVIOUS = []
+REGISTRY_SHARD_VIRTUAL_NODES = 64
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -156,9 +202,194 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 DATETIME_FORMAT="%Y-%m-%dT%H:%M:%S.%fZ"
 
+# BECKN AUTHORIZATION
+# Seconds of clock drift tolerated around the created/expires window
+AUTHORIZATION_CLOCK_SKEW = 5
+# Seconds a resolved subscriber signing key is kept in process
+AUTHORIZATION_KEY_TTL = 300
+# Seconds an unknown (or not SUBSCRIBED) key id is remembered, 0 queries it on every request
+AUTHORIZATION_UNKNOWN_KEY_TTL = 5
+# Key ids kept in process at most, least recently used ones are dropped first
+AUTHORIZATION_KEY_CACHE_SIZE = 10000
+
+# REPLAY GUARD
+# Recently seen request ids. The window must cover the 30s request validity plus clock skew.
+# 'redis' is shared by every process and exact, it decides without touching ContractRequestLogger.
+# 'local' Bloom filters are per process: ids found there are confirmed in ContractRequestLogger,
+# and ids not found are checked there too unless REPLAY_GUARD_SINGLE_PROCESS says this is the
+# only process accepting requests
+REPLAY_GUARD_BACKEND = 'local'  # 'local' or 'redis'
+REPLAY_GUARD_SINGLE_PROCESS = False
+REPLAY_GUARD_WINDOW = 35
+REPLAY_GUARD_BUCKET_SECONDS = 5
+# Expected request ids per bucket and tolerated false positive rate of the local Bloom filters
+REPLAY_GUARD_BUCKET_CAPACITY = 100000
+REPLAY_GUARD_ERROR_RATE = 0.001
+REPLAY_GUARD_REDIS_URL = 'redis://localhost:6379/2'
+
+# CONTRACT REQUEST LOG
+# sync writes every row on the request path, buffered batches them from a background
+# thread and celery hands the batches to monitor.tasks.write_contract_requests.
+# Buffered rows still waiting when a process is killed are lost
+CONTRACT_LOG_DURABILITY = 'sync'
+CONTRACT_LOG_BATCH_SIZE = 500
+# Max seconds a row waits in the buffer before being written
+CONTRACT_LOG_FLUSH_INTERVAL = 0.05
+# Rows held before log() blocks, and seconds it blocks before writing its row synchronously
+CONTRACT_LOG_MAX_BUFFER = 10000
+CONTRACT_LOG_BLOCK_TIMEOUT = 1.0
+# Seconds before a failed batch is retried, doubled per consecutive failure up to the max
+CONTRACT_LOG_RETRY_DELAY = 0.5
+CONTRACT_LOG_MAX_RETRY_DELAY = 30.0
+# Range partitions of the log table, maintained by `manage.py contract_log_partitions`
+CONTRACT_LOG_PARTITION_INTERVAL = 'month'  # 'day' or 'month'
+CONTRACT_LOG_PARTITIONS_AHEAD = 2
+CONTRACT_LOG_RETENTION_DAYS = 90
+# Expired partitions are written here as NDJSON segments before being dropped, None drops them
+CONTRACT_LOG_ARCHIVE_DIR = None
+
+# REGISTRY LOOKUP
+# Match lookups against an in process bitmap index of network participants
+REGISTRY_BITMAP_INDEX = False
+# Lookups matching more participants than this are filtered in SQL rather than by an IN list of their ids
+REGISTRY_BITMAP_INDEX_MAX_IDS = 1000
+# Serve lookups from rendered fragments cached per subscriber, participant and seller on record,
+# with ETag / If-None-Match. Rows are invalidated on save and delete, so the cache alias must be
+# shared by every process serving lookups (the default local memory cache is per process)
+LOOKUP_RESPONSE_CACHE = False
+LOOKUP_RESPONSE_CACHE_ALIAS = 'default'
+LOOKUP_RESPONSE_CACHE_TIMEOUT = None
+
+# SUBSCRIBE ENDPOINT
+# POST /subscribe registers subscribers signed with the signing key they register. Off, it answers 404
+SUBSCRIBE_ENABLED = False
+
+# SUBSCRIBE VALIDATION
+# Validate subscribe requests through a plan compiled from WriteSubscriberSerializer
+# (registry.fast_validation), accepting and rejecting the same payloads with the same errors
+SUBSCRIBE_FAST_VALIDATION = False
+
+# ON_SUBSCRIBE CALLBACK
+# Seconds allowed for every on_subscribe call
+CALLBACK_TIMEOUT = 10.0
+# Pooled connections shared by all calls, and concurrent calls allowed per subscriber host
+CALLBACK_MAX_CONNECTIONS = 100
+CALLBACK_PER_HOST_LIMIT = 4
+
+# CALLBACK CERTIFICATES
+# Seconds allowed for a TLS handshake and handshakes running at once
+SSL_CHECK_TIMEOUT = 10.0
+SSL_CHECK_CONCURRENCY = 50
+# Seconds a valid result is trusted, never past SSL_CHECK_RECHECK_MARGIN seconds before the
+# certificate expires, and seconds a failed handshake is trusted
+SSL_CHECK_TTL = 24 * 60 * 60
+SSL_CHECK_RECHECK_MARGIN = 60 * 60
+SSL_CHECK_FAILURE_TTL = 10 * 60
+# Seconds between registry.tasks.check_certificates sweeps, and hosts due checked per sweep on each shard
+SSL_CHECK_SWEEP_INTERVAL = 5 * 60
+SSL_CHECK_BATCH_SIZE = 1000
+
+# METRICS
+# Record request, stage, ORM query and Celery enqueue timings (monitor.instrumentation) and serve
+# them on /metrics. Label combinations per histogram are capped, the rest is counted under 'other'
+METRICS_ENABLED = True
+METRICS_MAX_SERIES = 500
+
+# REQUEST PROFILER
+# monitor.profiler samples the stack of a PROFILER_SAMPLE_RATE fraction of requests, and of requests
+# carrying a `manage.py profile_token` token in PROFILER_HEADER, every PROFILER_INTERVAL seconds.
+# Profiles are written to PROFILER_DIRECTORY as speedscope or collapsed files, the newest
+# PROFILER_MAX_FILES are kept. Off, the middleware is left out of the chain
+PROFILER_ENABLED = False
+PROFILER_SAMPLE_RATE = 0.0
+PROFILER_HEADER = 'X-Wade-Profile'
+PROFILER_TOKEN_MAX_AGE = 60 * 60
+PROFILER_INTERVAL = 0.005
+PROFILER_DIRECTORY = BASE_DIR / 'profiles'
+PROFILER_FORMAT = 'speedscope'
+PROFILER_MAX_FILES = 100
+
+# REGISTRY CHANGE FEED
+# Publish registry writes on a Postgres NOTIFY channel (registry.change_feed), every process listens
+# and drops what it caches of changed rows. A lost listener reconnects with a backoff doubling from
+# RECONNECT_DELAY to RECONNECT_MAX_DELAY seconds, then replays the change log entries it did not
+# receive. Log rows are kept RETENTION seconds
+REGISTRY_CHANGE_FEED = False
+REGISTRY_CHANGE_FEED_CHANNEL = 'wade_registry_changes'
+REGISTRY_CHANGE_FEED_RECONNECT_DELAY = 0.5
+REGISTRY_CHANGE_FEED_RECONNECT_MAX_DELAY = 30.0
+REGISTRY_CHANGE_FEED_RETENTION = 24 * 60 * 60
+
+# KEY VALIDITY
+# Seconds between registry.tasks.expire_keys sweeps marking subscribers with an expired key EXPIRED,
+# and subscribers updated per statement
+KEY_EXPIRY_SWEEP_INTERVAL = 5 * 60
+KEY_EXPIRY_BATCH_SIZE = 5000
+
+# KEY RING
+# Resolve signing keys (and read encryption keys) from an in process ring of the parsed keys of every
+# subscriber and seller on record whose key has not expired (registry.keyring), loaded at process start
+# with one streamed query, KEYRING_CHUNK_SIZE rows per fetch. Rows updated since the last refresh, less
+# KEYRING_REFRESH_MARGIN seconds, are reloaded every KEYRING_REFRESH_INTERVAL seconds
+KEYRING_ENABLED = False
+KEYRING_REFRESH_INTERVAL = 30
+KEYRING_REFRESH_MARGIN = 5.0
+KEYRING_CHUNK_SIZE = 5000
+
+# SUBSCRIPTION PIPELINE
+# New subscribers go through validate_keys -> check_ssl -> verify_callback -> check_whitelist -> finalize,
+# one Celery task per stage (registry.pipeline), SUBSCRIPTION_BATCH_SIZE subscribers per task. Every stage
+# has an onboarding queue <SUBSCRIPTION_QUEUE_PREFIX>.<stage> and a bulk re-verification queue
+# <SUBSCRIPTION_QUEUE_PREFIX>.<stage>.bulk; run some workers on the onboarding queues only so new
+# subscribers never wait behind re-verification
+SUBSCRIPTION_QUEUE_PREFIX = 'subscription'
+SUBSCRIPTION_BATCH_SIZE = 200
+# Calls to one subscriber host allowed every SUBSCRIPTION_HOST_RATE_PERIOD seconds (0 disables the limit),
+# counted in a cache every worker shares. A local memory cache is refused unless
+# SUBSCRIPTION_RATE_LIMIT_SINGLE_PROCESS says a single process runs the pipeline
+SUBSCRIPTION_HOST_RATE = 10
+SUBSCRIPTION_HOST_RATE_PERIOD = 1.0
+SUBSCRIPTION_RATE_LIMIT_CACHE = 'shared'
+SUBSCRIPTION_RATE_LIMIT_SINGLE_PROCESS = False
+# Subscribers failing on the network are retried after a backoff doubling from SUBSCRIPTION_RETRY_DELAY up
+# to SUBSCRIPTION_RETRY_MAX_DELAY seconds. After SUBSCRIPTION_MAX_RETRIES new subscribers are left
+# UNDER_SUBSCRIPTION, re-verified ones keep their status
+SUBSCRIPTION_MAX_RETRIES = 5
+SUBSCRIPTION_RETRY_DELAY = 5.0
+SUBSCRIPTION_RETRY_MAX_DELAY = 600.0
+# Every SUBSCRIPTION_RESUME_INTERVAL seconds up to SUBSCRIPTION_RESUME_BATCH_SIZE subscribers per shard left
+# INITIATED or UNDER_SUBSCRIPTION for SUBSCRIPTION_RESUME_AFTER seconds (out of retries, or never started)
+# are sent through the pipeline again, those already resumed SUBSCRIPTION_MAX_RESUMES times are marked UNREACHABLE
+SUBSCRIPTION_RESUME_INTERVAL = 15 * 60
+SUBSCRIPTION_RESUME_AFTER = 60 * 60
+SUBSCRIPTION_RESUME_BATCH_SIZE = 10000
+SUBSCRIPTION_MAX_RESUMES = 24
+# subscriber_id glob patterns allowed to subscribe, None lets every subscriber through
+SUBSCRIBER_WHITELIST = None
+
 # CELERY SETUP
 CELERY_TIMEZONE = "Asia/Kolkata"
 #TODO: Update the settings to cover urls
 CELERY_BROKER_URL = 'redis://:jarden@103@localhost:6379/1'
 CELERY_RESULT_BACKEND = 'django-db'
 CELERY_CACHE_BACKEND = 'default'
+# A worker takes one batch at a time, so prefetched bulk batches don't hold up onboarding ones
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_BEAT_SCHEDULE = {
+    'expire-keys': {
+        'task': 'registry.tasks.expire_keys',
+        'schedule': KEY_EXPIRY_SWEEP_INTERVAL,
+    },
+    'check-certificates': {
+        'task': 'registry.tasks.check_certificates',
+        'schedule': SSL_CHECK_SWEEP_INTERVAL,
+    },
+    'resume-subscriptions': {
+        'task': 'registry.tasks.resume_subscriptions',
+        'schedule': SUBSCRIPTION_RESUME_INTERVAL,
+    },
+    'prune-registry-changes': {
+        'task': 'registry.tasks.prune_changes',
+        'schedule': 60 * 60,
+    },
+}
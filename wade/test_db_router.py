@@ -0,0 +1,192 @@
+import random
+
+from django.contrib.auth.models import User
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from monitor.models import ContractRequestLogger
+from registry.models import NetworkParticipant, SellerOnRecord, Subscriber
+from .db_router import *
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestReplicaSet(SimpleTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.lags = {'replica-1': 0.0, 'replica-2': 0.0}
+        self.probes = 0
+        self.clock = Clock()
+
+    def probe(self, alias: str) -> float:
+        self.probes += 1
+        lag = self.lags[alias]
+        if lag is None:
+            raise ConnectionError(alias)
+        return lag
+
+    def replica_set(self, weights: dict[str, float], **kwargs) -> ReplicaSet:
+        return ReplicaSet(weights, max_lag=5, check_interval=10, lag_probe=self.probe, clock=self.clock,
+                          rng=random.Random(7), **kwargs)
+
+    def test_weighted(self):
+        replicas = self.replica_set({'replica-1': 3, 'replica-2': 1})
+        chosen = [replicas.choose() for _ in range(4000)]
+        self.assertAlmostEqual(chosen.count('replica-1') / len(chosen), 0.75, delta=0.03)
+
+    def test_least_loaded(self):
+        replicas = self.replica_set({'replica-1': 1, 'replica-2': 2}, selection=ReplicaSet.LEAST_LOADED)
+        replicas.in_flight.update({'replica-1': 1, 'replica-2': 1})
+        self.assertEqual(replicas.choose(), 'replica-2')
+        replicas.in_flight.update({'replica-1': 0, 'replica-2': 1})
+        self.assertEqual(replicas.choose(), 'replica-1')
+
+    def test_lagging_replica_out_of_rotation(self):
+        replicas = self.replica_set({'replica-1': 1, 'replica-2': 1})
+        self.assertEqual({replicas.choose() for _ in range(50)}, {'replica-1', 'replica-2'})
+        self.lags['replica-1'] = 30.0
+        self.assertEqual({replicas.choose() for _ in range(50)}, {'replica-1', 'replica-2'})
+        # The lag is only probed again after check_interval
+        self.clock.now = 10
+        self.assertEqual({replicas.choose() for _ in range(50)}, {'replica-2'})
+        self.assertEqual(self.probes, 4)
+        self.lags['replica-2'] = None
+        self.clock.now = 20
+        self.assertIsNone(replicas.choose())
+        self.lags.update({'replica-1': 1.0, 'replica-2': 0.0})
+        self.clock.now = 30
+        self.assertEqual(replicas.healthy(), ['replica-1', 'replica-2'])
+
+    def test_track_counts_in_flight(self):
+        replicas = self.replica_set({'replica-1': 1})
+        seen = []
+        replicas.track('replica-1')(lambda *args: seen.append(replicas.in_flight['replica-1']), 'SELECT 1', None, False, {})
+        self.assertEqual(seen, [1])
+        self.assertEqual(replicas.in_flight['replica-1'], 0)
+
+    def test_unknown_selection(self):
+        with self.assertRaises(ValueError):
+            ReplicaSet({}, selection='random')
+
+
+class TestDatabaseRouter(SimpleTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.replicas = ReplicaSet({'replica-1': 1, 'replica-2': 1}, lag_probe=lambda alias: 0.0,
+                                   rng=random.Random(1))
+        self.router = DatabaseRouter(primary='registry', replicas=self.replicas, apps=('registry',))
+
+    def test_registry_models_routed_together(self):
+        for model in (Subscriber, NetworkParticipant, SellerOnRecord):
+            self.assertEqual(self.router.db_for_write(model), 'registry')
+            self.assertIn(self.router.db_for_read(model), {'replica-1', 'replica-2'})
+        for model in (ContractRequestLogger, User):
+            self.assertEqual(self.router.db_for_write(model), 'default')
+            self.assertEqual(self.router.db_for_read(model), 'default')
+
+    def test_falls_back_to_primary(self):
+        router = DatabaseRouter(primary='registry', replicas=ReplicaSet({}), apps=('registry',))
+        self.assertEqual(router.db_for_read(Subscriber), 'registry')
+
+    def test_read_your_writes_in_scope(self):
+        with request_scope():
+            self.assertNotEqual(self.router.db_for_read(Subscriber), 'registry')
+            self.router.db_for_write(Subscriber)
+            self.assertEqual(self.router.db_for_read(NetworkParticipant), 'registry')
+        # Writes outside of a request do not pin later reads
+        self.router.db_for_write(Subscriber)
+        self.assertNotEqual(self.router.db_for_read(Subscriber), 'registry')
+
+    def test_non_registry_write_does_not_pin(self):
+        with request_scope():
+            self.router.db_for_write(ContractRequestLogger)
+            self.assertNotEqual(self.router.db_for_read(Subscriber), 'registry')
+
+    def test_instance_hint(self):
+        subscriber = Subscriber(unique_key_id='key-1')
+        subscriber._state.db = 'replica-2'
+        self.assertEqual(self.router.db_for_read(NetworkParticipant, instance=subscriber), 'replica-2')
+
+    def test_allow_relation(self):
+        subscriber, participant, log = Subscriber(), NetworkParticipant(), ContractRequestLogger()
+        subscriber._state.db, participant._state.db, log._state.db = 'registry', 'replica-1', 'other'
+        self.assertTrue(self.router.allow_relation(subscriber, participant))
+        self.assertFalse(self.router.allow_relation(subscriber, log))
+
+    def test_allow_migrate(self):
+        self.assertTrue(self.router.allow_migrate('registry', 'registry'))
+        self.assertFalse(self.router.allow_migrate('default', 'registry'))
+        self.assertFalse(self.router.allow_migrate('replica-1', 'registry'))
+        self.assertFalse(self.router.allow_migrate('replica-1', 'monitor'))
+        self.assertTrue(self.router.allow_migrate('default', 'monitor'))
+        self.assertFalse(self.router.allow_migrate('registry', 'auth'))
+
+    def test_middleware_scopes_each_request(self):
+        reads = []
+
+        def view(request):
+            reads.append(self.router.db_for_read(Subscriber))
+            self.router.db_for_write(Subscriber)
+            reads.append(self.router.db_for_read(Subscriber))
+            return None
+
+        middleware = ReadYourWritesMiddleware(view)
+        request = RequestFactory().get('/')
+        middleware(request)
+        middleware(request)
+        self.assertEqual([read == 'registry' for read in reads], [False, True, False, True])
+
+
+class TestRoutingOnConnections(TestCase):
+    """
+    The router installed over real connections. The replica is a second
+    connection to the test database: it doesn't see what the test's open
+    transaction wrote on default, like a replica that hasn't replayed it yet.
+    """
+    databases = {'default', 'replica'}
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.replicas = ReplicaSet({'replica': 1}, max_lag=5, check_interval=0)
+        override = override_settings(
+            DATABASE_ROUTERS=[DatabaseRouter(primary='default', replicas=self.replicas, apps=('registry',))]
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.subscriber = Subscriber.objects.create(unique_key_id='key-1', subscriber_id='np.example.com',
+                                                    callback_url='/', country='IND')
+
+    def test_writes_go_to_the_primary_and_reads_to_the_replica(self):
+        self.assertEqual(self.subscriber._state.db, 'default')
+        self.assertEqual(Subscriber.objects.all().db, 'replica')
+        self.assertFalse(Subscriber.objects.filter(pk='key-1').exists())
+        self.assertTrue(Subscriber.objects.using('default').filter(pk='key-1').exists())
+
+    def test_lag_probe(self):
+        # Not a standby, nothing to replay
+        self.assertEqual(probe_replica_lag('replica'), 0.0)
+        self.assertEqual(self.replicas.healthy(), ['replica'])
+
+    def test_lagging_replica_reads_from_the_primary(self):
+        self.replicas.lag_probe = lambda alias: 30.0
+        self.assertEqual(Subscriber.objects.all().db, 'default')
+        self.assertEqual(Subscriber.objects.get(pk='key-1').country, 'IND')
+
+    def test_read_your_writes(self):
+        with request_scope():
+            self.assertFalse(Subscriber.objects.filter(pk='key-1').exists())
+            Subscriber.objects.filter(pk='key-1').update(country='IN')
+            self.assertEqual(Subscriber.objects.get(pk='key-1').country, 'IN')
+        self.assertFalse(Subscriber.objects.filter(pk='key-1').exists())
+
+    def test_related_reads_follow_the_instance(self):
+        NetworkParticipant.objects.create(subscriber=self.subscriber, domain='retail', type='BAP',
+                                          city_code=['std:080'])
+        self.assertEqual(self.subscriber.network_participant.count(), 1)
+        self.assertEqual(NetworkParticipant.objects.count(), 0)
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'wade.settings')
 
 application = get_wsgi_application()
+
+from registry.change_feed import start_listeners  # noqa: E402, needs the apps loaded
+from registry.keyring import warm_up  # noqa: E402
+
+start_listeners()
+warm_up()